@@ -0,0 +1,205 @@
+/**
+ * Copyright (c) 2026 Apple Inc. All rights reserved.
+ *
+ * Licensed under the Apache License, Version 2.0 (the "License");
+ * you may not use this file except in compliance with the License.
+ * You may obtain a copy of the License at
+ *
+ *     http://www.apache.org/licenses/LICENSE-2.0
+ *
+ * Unless required by applicable law or agreed to in writing, software
+ * distributed under the License is distributed on an "AS IS" BASIS,
+ * WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+ * See the License for the specific language governing permissions and
+ * limitations under the License.
+ **/
+
+/*
+ * Micro-benchmark for the base64 codec in src/base64.c.
+ *
+ * Build and run from the top of the tree:
+ *
+ *     cc -O2 -Isrc -o bench_base64 benchmarks/bench_base64.c src/base64.c
+ *     ./bench_base64
+ *
+ * For token sizes from 100 bytes to 4 MB it checks that encode/decode round
+ * trip (including decoding in place), then reports encode and decode
+ * throughput. The character-at-a-time decoder the codec replaced is kept
+ * here as a reference so the two can be compared on the same machine.
+ */
+
+#include "base64.h"
+
+#include <stdio.h>
+#include <stdlib.h>
+#include <string.h>
+#include <time.h>
+
+static signed char legacy_index_64[128] =
+{
+    -1,-1,-1,-1, -1,-1,-1,-1, -1,-1,-1,-1, -1,-1,-1,-1,
+    -1,-1,-1,-1, -1,-1,-1,-1, -1,-1,-1,-1, -1,-1,-1,-1,
+    -1,-1,-1,-1, -1,-1,-1,-1, -1,-1,-1,62, -1,-1,-1,63,
+    52,53,54,55, 56,57,58,59, 60,61,-1,-1, -1,-1,-1,-1,
+    -1, 0, 1, 2,  3, 4, 5, 6,  7, 8, 9,10, 11,12,13,14,
+    15,16,17,18, 19,20,21,22, 23,24,25,-1, -1,-1,-1,-1,
+    -1,26,27,28, 29,30,31,32, 33,34,35,36, 37,38,39,40,
+    41,42,43,44, 45,46,47,48, 49,50,51,-1, -1,-1,-1,-1
+};
+#define CHAR64(c)  (((c) < 0 || (c) > 127) ? -1 : legacy_index_64[(c)])
+
+static unsigned char *legacy_decode(const char *value, size_t *rlen)
+{
+    int c1, c2, c3, c4;
+    size_t vlen = strlen(value);
+    unsigned char *result = malloc((vlen * 3) / 4 + 1);
+    unsigned char *out = result;
+
+    *rlen = 0;
+    if (result == NULL) {
+        return NULL;
+    }
+    while (value[0]) {
+        c1 = value[0];
+        c2 = value[1];
+        c3 = value[2];
+        c4 = value[3];
+        if (CHAR64(c1) == -1 || CHAR64(c2) == -1 ||
+            (c3 != '=' && CHAR64(c3) == -1) ||
+            (c4 != '=' && CHAR64(c4) == -1)) {
+            *result = 0;
+            *rlen = 0;
+            return result;
+        }
+        value += 4;
+        *out++ = (CHAR64(c1) << 2) | (CHAR64(c2) >> 4);
+        *rlen += 1;
+        if (c3 != '=') {
+            *out++ = ((CHAR64(c2) << 4) & 0xf0) | (CHAR64(c3) >> 2);
+            *rlen += 1;
+            if (c4 != '=') {
+                *out++ = ((CHAR64(c3) << 6) & 0xc0) | CHAR64(c4);
+                *rlen += 1;
+            }
+        }
+    }
+    return result;
+}
+
+static double now(void)
+{
+    struct timespec ts;
+    clock_gettime(CLOCK_MONOTONIC, &ts);
+    return ts.tv_sec + ts.tv_nsec / 1e9;
+}
+
+static void fail(const char *what, size_t size)
+{
+    fprintf(stderr, "FAILED: %s at %zu bytes\n", what, size);
+    exit(1);
+}
+
+static void check(const unsigned char *data, size_t size)
+{
+    char *encoded = base64_encode(data, size);
+    size_t elen = strlen(encoded);
+    unsigned char *decoded = malloc(base64_decoded_length(elen) + 1);
+    size_t rlen;
+
+    if (elen != base64_encoded_length(size)) {
+        fail("encoded length", size);
+    }
+    if (base64_decode(encoded, elen, decoded, &rlen) != BASE64_OK ||
+        rlen != size || memcmp(decoded, data, size) != 0) {
+        fail("round trip", size);
+    }
+    if (base64_decode(encoded, elen, (unsigned char *)encoded, &rlen) != BASE64_OK ||
+        rlen != size || memcmp(encoded, data, size) != 0) {
+        fail("in place round trip", size);
+    }
+
+    free(encoded);
+    encoded = base64_encode(data, size);
+    if (elen > 4) {
+        encoded[elen / 2] = '*';
+        if (base64_decode(encoded, elen, decoded, &rlen) != BASE64_INVALID) {
+            fail("invalid character accepted", size);
+        }
+    }
+    if (elen > 0 &&
+        base64_decode(encoded, elen - 1, decoded, &rlen) != BASE64_INVALID) {
+        fail("truncated input accepted", size);
+    }
+
+    free(encoded);
+    free(decoded);
+}
+
+static void bench(const unsigned char *data, size_t size)
+{
+    // Aim for roughly 256 MB of work per measurement
+    size_t iterations = (256u << 20) / size + 1;
+    char *encoded = base64_encode(data, size);
+    size_t elen = strlen(encoded);
+    unsigned char *decoded = malloc(base64_decoded_length(elen) + 1);
+    size_t rlen, i;
+    double start, encode_time, decode_time, legacy_time;
+
+    start = now();
+    for (i = 0; i < iterations; i++) {
+        free(base64_encode(data, size));
+    }
+    encode_time = now() - start;
+
+    start = now();
+    for (i = 0; i < iterations; i++) {
+        base64_decode(encoded, elen, decoded, &rlen);
+    }
+    decode_time = now() - start;
+
+    start = now();
+    for (i = 0; i < iterations; i++) {
+        free(legacy_decode(encoded, &rlen));
+    }
+    legacy_time = now() - start;
+
+    printf(
+        "%9zu  %11.1f  %11.1f  %11.1f\n", size,
+        size * iterations / encode_time / (1 << 20),
+        size * iterations / decode_time / (1 << 20),
+        size * iterations / legacy_time / (1 << 20)
+    );
+
+    free(encoded);
+    free(decoded);
+}
+
+int main(void)
+{
+    static const size_t sizes[] = {
+        100, 1000, 4096, 16384, 65536, 1 << 20, 4 << 20
+    };
+    size_t max_size = sizes[sizeof(sizes) / sizeof(sizes[0]) - 1];
+    unsigned char *data = malloc(max_size);
+    size_t i;
+
+    srand(1);
+    for (i = 0; i < max_size; i++) {
+        data[i] = (unsigned char)rand();
+    }
+
+    for (i = 0; i < 260; i++) {
+        check(data, i);
+    }
+    for (i = 0; i < sizeof(sizes) / sizeof(sizes[0]); i++) {
+        check(data, sizes[i]);
+    }
+
+    printf("     size  encode MB/s  decode MB/s  legacy MB/s\n");
+    for (i = 0; i < sizeof(sizes) / sizeof(sizes[0]); i++) {
+        bench(data, sizes[i]);
+    }
+
+    free(data);
+    return 0;
+}
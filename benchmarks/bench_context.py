@@ -0,0 +1,64 @@
+##
+# Copyright (c) 2026 Apple Inc. All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+##
+
+"""
+Measure the per-call cost of creating a Kerberos library context.
+
+Runs getServerPrincipalDetails in a loop twice: once reusing the cached
+per-thread context, and once calling reloadConfig before every call, which
+forces a fresh krb5_init_context just like every call did before contexts
+were cached. The difference is the saving per call.
+
+Uses the same KERBEROS_* environment variables as the tests.
+"""
+
+from __future__ import print_function
+
+import os
+import sys
+import time
+
+import kerberos
+
+hostname = os.environ.get('KERBEROS_HOSTNAME', 'hostname.example.com')
+
+
+def run(count, reload_each_time):
+    start = time.time()
+    for _ in range(count):
+        if reload_each_time:
+            kerberos.reloadConfig()
+        kerberos.getServerPrincipalDetails("HTTP", hostname)
+    return (time.time() - start) / count
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+
+    # Warm up so both runs start from a loaded library
+    run(100, False)
+
+    cached = run(count, False)
+    fresh = run(count, True)
+
+    print("calls per run:            {}".format(count))
+    print("fresh context per call:   {:.1f} us".format(fresh * 1e6))
+    print("cached context per call:  {:.1f} us".format(cached * 1e6))
+    print("saving per call:          {:.1f} us".format((fresh - cached) * 1e6))
+
+
+if __name__ == '__main__':
+    main()
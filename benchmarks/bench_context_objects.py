@@ -0,0 +1,99 @@
+##
+# Copyright (c) 2026 Apple Inc. All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+##
+
+"""
+Compare the per-call overhead of the capsule contexts returned by
+authGSSClientInit with GSSClientContext objects.
+
+Sets up an authenticated client context of each kind, then times reading the
+response and user name, and wrapping a message, through the module functions
+and through the object's attributes and methods.
+
+Uses the same KERBEROS_* environment variables as the tests.
+"""
+
+from __future__ import print_function
+
+import base64
+import os
+import sys
+import timeit
+
+import kerberos
+
+hostname = os.environ.get('KERBEROS_HOSTNAME', 'hostname.example.com')
+
+
+def handshake(vc):
+    service = "HTTP@%s" % hostname
+    _ignore, vs = kerberos.authGSSServerInit(service)
+    kerberos.authGSSClientStep(vc, "")
+    kerberos.authGSSServerStep(vs, kerberos.authGSSClientResponse(vc))
+    kerberos.authGSSClientStep(vc, kerberos.authGSSServerResponse(vs))
+    return vs
+
+
+def per_call(statement, count, **names):
+    return min(timeit.repeat(statement, globals=names, number=count, repeat=5)) / count
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    service = "HTTP@%s" % hostname
+    payload = base64.b64encode(b"x" * 64).decode("ascii")
+
+    # Keep the server contexts alive for the length of the runs
+    _ignore, capsule = kerberos.authGSSClientInit(service)
+    servers = [handshake(capsule)]
+    context = kerberos.GSSClientContext(service)
+    servers.append(handshake(context))
+
+    runs = [
+        (
+            "response",
+            "kerberos.authGSSClientResponse(vc)",
+            "vc.response",
+        ),
+        (
+            "username",
+            "kerberos.authGSSClientUserName(vc)",
+            "vc.username",
+        ),
+        (
+            "wrap",
+            "kerberos.authGSSClientWrap(vc, payload)",
+            "vc.wrap(payload)",
+        ),
+    ]
+
+    print("calls per run: {}".format(count))
+    print("{:<10} {:>12} {:>12}".format("", "capsule us", "object us"))
+    for name, capsule_statement, object_statement in runs:
+        capsule_time = per_call(
+            capsule_statement, count,
+            kerberos=kerberos, vc=capsule, payload=payload,
+        )
+        object_time = per_call(
+            object_statement, count,
+            kerberos=kerberos, vc=context, payload=payload,
+        )
+        print("{:<10} {:>12.3f} {:>12.3f}".format(
+            name, capsule_time * 1e6, object_time * 1e6
+        ))
+
+
+if __name__ == '__main__':
+    main()
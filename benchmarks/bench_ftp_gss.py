@@ -0,0 +1,303 @@
+##
+# Copyright (c) 2026 Apple Inc. All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+##
+
+"""
+Measure the throughput of protected FTP data transfers with bin/ftp-gss.
+
+Starts a minimal RFC 2228 FTP server in a child process on the loopback
+interface, which authenticates with the HTTP/KERBEROS_HOSTNAME keytab, answers
+RETR with a generated payload and discards STOR data. The SecureFtp client
+then downloads and uploads the payload at each data protection level (PROT C,
+S and P), and for S and P both with and without the helper thread that
+overlaps wrapping with socket I/O. Reports MB/s for each.
+
+The payload size in megabytes may be given on the command line. Uses the same
+KERBEROS_* environment variables as the tests, for example:
+
+    python benchmarks/localkdc.py -- python benchmarks/bench_ftp_gss.py 256
+"""
+
+from __future__ import print_function
+
+import base64
+import importlib.machinery
+import importlib.util
+import multiprocessing
+import os
+import socket
+import socketserver
+import sys
+import time
+
+import kerberos
+import kerberos_stream
+
+hostname = os.environ.get('KERBEROS_HOSTNAME', 'hostname.example.com')
+username = os.environ.get('KERBEROS_USERNAME', 'administrator')
+service = "HTTP@%s" % hostname
+
+# The largest protection buffer the server agrees to
+SERVER_BUFFER_SIZE = 1048576
+
+BLOCK = os.urandom(1048576)
+
+
+def load_secure_ftp():
+    path = os.path.join(
+        os.path.dirname(os.path.abspath(__file__)), os.pardir, "bin", "ftp-gss"
+    )
+    loader = importlib.machinery.SourceFileLoader("ftp_gss", path)
+    spec = importlib.util.spec_from_loader("ftp_gss", loader)
+    module = importlib.util.module_from_spec(spec)
+    loader.exec_module(module)
+    return module.SecureFtp
+
+
+def payload(size):
+    """
+    Yield size bytes in views of a single block.
+    """
+    view = memoryview(BLOCK)
+    while size > 0:
+        chunk = view[:min(size, len(view))]
+        size -= len(chunk)
+        yield chunk
+
+
+class PayloadFile(object):
+    """
+    A file of size bytes that is never held in memory. readinto leaves the
+    buffer as it is.
+    """
+
+    def __init__(self, size):
+        self.remaining = size
+
+    def readinto(self, buffer):
+        count = min(len(buffer), self.remaining)
+        self.remaining -= count
+        return count
+
+    def read(self, size=-1):
+        if size < 0 or size > len(BLOCK):
+            size = len(BLOCK)
+        count = min(size, self.remaining)
+        self.remaining -= count
+        return BLOCK[:count]
+
+
+class FTPHandler(socketserver.StreamRequestHandler):
+    """
+    The server side of one control connection, just enough of RFC 959 and
+    RFC 2228 for the benchmark.
+    """
+
+    def setup(self):
+        socketserver.StreamRequestHandler.setup(self)
+        self.context = None
+        self.protection = "C"
+        self.buffer_size = 0
+        self.passive = None
+
+
+    def reply(self, line):
+        if self.context is not None:
+            token = kerberos.authGSSServerWrapRaw(
+                self.context, line.encode("utf-8")
+            )
+            line = "631 " + base64.b64encode(token).decode("ascii")
+        self.wfile.write((line + "\r\n").encode("utf-8"))
+
+
+    def handle(self):
+        self.reply("220 Benchmark server ready")
+        for raw in self.rfile:
+            line = raw.decode("utf-8").rstrip("\r\n")
+            if line.startswith("MIC "):
+                message, _ignore_conf = kerberos.authGSSServerUnwrapRaw(
+                    self.context, base64.b64decode(line[4:])
+                )
+                line = message.decode("utf-8")
+            command, _ignore, argument = line.partition(" ")
+            handler = getattr(self, "ftp_" + command.upper(), None)
+            if handler is None:
+                self.reply("502 Command not implemented")
+            elif handler(argument) is False:
+                return
+
+
+    def ftp_AUTH(self, argument):
+        self.reply("334 Using authentication type GSSAPI; ADAT must follow")
+
+
+    def ftp_ADAT(self, argument):
+        context = kerberos.GSSServerContext(self.server.credential)
+        if context.step(argument) == 1:
+            self.reply("235 ADAT=" + (context.response or ""))
+            self.context = context
+        else:
+            self.reply("335 ADAT=" + context.response)
+
+
+    def ftp_USER(self, argument):
+        self.reply("232 User logged in")
+
+
+    def ftp_PBSZ(self, argument):
+        self.buffer_size = min(int(argument), SERVER_BUFFER_SIZE)
+        self.reply("200 PBSZ=%d" % self.buffer_size)
+
+
+    def ftp_PROT(self, argument):
+        self.protection = argument.upper()
+        self.reply("200 Protection level set")
+
+
+    def ftp_TYPE(self, argument):
+        self.reply("200 Type set")
+
+
+    def ftp_PASV(self, argument):
+        self.passive = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.passive.bind(("127.0.0.1", 0))
+        self.passive.listen(1)
+        port = self.passive.getsockname()[1]
+        self.reply("227 Entering Passive Mode (127,0,0,1,%d,%d)" % (
+            port >> 8, port & 0xff
+        ))
+
+
+    def _accept(self):
+        self.reply("150 Opening data connection")
+        conn, _ignore = self.passive.accept()
+        self.passive.close()
+        self.passive = None
+        return conn
+
+
+    def ftp_RETR(self, argument):
+        conn = self._accept()
+        with conn, conn.makefile("wb") as fp:
+            blocks = payload(self.server.payload_size)
+            if self.protection == "C":
+                for block in blocks:
+                    fp.write(block)
+            else:
+                protect = int(self.protection == "P")
+                kerberos_stream.write_frames(kerberos_stream.wrap_stream(
+                    self.context, blocks, protect, self.buffer_size
+                ), fp)
+                kerberos_stream.write_frames(
+                    [kerberos.authGSSServerWrapIov(self.context, b"", protect)],
+                    fp,
+                )
+        self.reply("226 Transfer complete")
+
+
+    def ftp_STOR(self, argument):
+        conn = self._accept()
+        with conn, conn.makefile("rb") as fp:
+            if self.protection == "C":
+                while fp.read(SERVER_BUFFER_SIZE):
+                    pass
+            else:
+                for message in kerberos_stream.unwrap_stream(
+                    self.context,
+                    kerberos_stream.read_frames(fp, self.buffer_size),
+                    self.protection == "P",
+                ):
+                    if not message:
+                        break
+        self.reply("226 Transfer complete")
+
+
+    def ftp_QUIT(self, argument):
+        self.reply("221 Goodbye")
+        return False
+
+
+
+def serve(ports, payload_size):
+    server = socketserver.TCPServer(("127.0.0.1", 0), FTPHandler)
+    server.credential = kerberos.acquireServerCredential(service)
+    server.payload_size = payload_size
+    ports.put(server.server_address[1])
+    server.serve_forever()
+
+
+def transfer(SecureFtp, port, level, depth, payload_size):
+    ftp = SecureFtp()
+    ftp.connect("127.0.0.1", port)
+    ftp.gssapi_login(username, service=service)
+    ftp.pipeline_depth = depth
+    if level == "S":
+        ftp.prot_s()
+    elif level == "P":
+        ftp.prot_p()
+
+    received = [0]
+
+    def count(data):
+        received[0] += len(data)
+
+    start = time.perf_counter()
+    ftp.retrbinary("RETR payload", count, SERVER_BUFFER_SIZE)
+    retr = time.perf_counter() - start
+    assert received[0] == payload_size, "Payload truncated"
+
+    start = time.perf_counter()
+    ftp.storbinary(
+        "STOR payload", PayloadFile(payload_size), SERVER_BUFFER_SIZE
+    )
+    stor = time.perf_counter() - start
+
+    ftp.quit()
+    return payload_size / retr / 1e6, payload_size / stor / 1e6
+
+
+def main():
+    megabytes = int(sys.argv[1]) if len(sys.argv) > 1 else 256
+    payload_size = megabytes * 1048576
+    SecureFtp = load_secure_ftp()
+
+    ports = multiprocessing.Queue()
+    server = multiprocessing.Process(target=serve, args=(ports, payload_size))
+    server.daemon = True
+    server.start()
+    port = ports.get()
+
+    runs = [
+        ("PROT C", "C", 0),
+        ("PROT S", "S", 0),
+        ("PROT S pipelined", "S", 4),
+        ("PROT P", "P", 0),
+        ("PROT P pipelined", "P", 4),
+    ]
+
+    print("payload:                   {} MB".format(megabytes))
+    try:
+        for name, level, depth in runs:
+            retr, stor = transfer(SecureFtp, port, level, depth, payload_size)
+            print("{:<26} RETR {:8.1f} MB/s   STOR {:8.1f} MB/s".format(
+                name + ":", retr, stor
+            ))
+    finally:
+        server.terminate()
+        server.join()
+
+
+if __name__ == '__main__':
+    main()
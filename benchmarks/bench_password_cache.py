@@ -0,0 +1,74 @@
+##
+# Copyright (c) 2026 Apple Inc. All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+##
+
+"""
+Measure checkPassword latency with and without the password cache.
+
+Checks the same credentials repeatedly, as a Basic auth gateway does for a
+client that sends them with every request, and reports the median and 99th
+percentile latency plus the number of KDC round trips for each run.
+
+Uses the same KERBEROS_* environment variables as the tests.
+"""
+
+from __future__ import print_function
+
+import os
+import sys
+import time
+
+import kerberos
+
+username = os.environ.get('KERBEROS_USERNAME', 'administrator')
+password = os.environ.get('KERBEROS_PASSWORD', 'Password01')
+realm = os.environ.get('KERBEROS_REALM', 'example.com')
+hostname = os.environ.get('KERBEROS_HOSTNAME', 'hostname.example.com')
+
+
+def run(count):
+    service = "HTTP/%s" % hostname
+    latencies = []
+    for _ in range(count):
+        start = time.time()
+        kerberos.checkPassword(username, password, service, realm.upper())
+        latencies.append(time.time() - start)
+    latencies.sort()
+    return latencies[len(latencies) // 2], latencies[int(len(latencies) * 0.99)]
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+
+    kerberos.disablePasswordCache()
+    before = kerberos.getPasswordCacheStats()
+    uncached = run(count)
+
+    kerberos.enablePasswordCache()
+    cached = run(count)
+    after = kerberos.getPasswordCacheStats()
+    kerberos.disablePasswordCache()
+
+    print("checks per run:  {}".format(count))
+    print("uncached:        p50 {:.1f} us, p99 {:.1f} us, {} KDC checks".format(
+        uncached[0] * 1e6, uncached[1] * 1e6, count
+    ))
+    print("cached:          p50 {:.1f} us, p99 {:.1f} us, {} KDC checks".format(
+        cached[0] * 1e6, cached[1] * 1e6, after["misses"] - before["misses"]
+    ))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,141 @@
+##
+# Copyright (c) 2026 Apple Inc. All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+##
+
+"""
+Measure request throughput of kerberos_requests.NegotiateAuth.
+
+Starts a local HTTP/1.1 server with keep-alive that puts every request through
+the SPNEGO WSGI middleware, then sends authenticated GET requests to it:
+
+  - challenge: a new handler for each request, so each one is answered with a
+    401 challenge and sent again with a token.
+  - preemptive: one handler that has learned the server requires Negotiate,
+    so each request carries a token from the start.
+
+Both reuse one pooled connection and verify the mutual authentication token.
+Reports requests per second and round trips per request.
+
+The client needs a TGT for the test user, and the server a keytab for
+HTTP/KERBEROS_HOSTNAME, as set up for the tests against the local test KDC.
+Uses the same KERBEROS_* environment variables as the tests.
+"""
+
+from __future__ import print_function
+
+import os
+import sys
+import threading
+import time
+
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import requests
+
+import kerberos_requests
+import kerberos_spnego
+
+hostname = os.environ.get('KERBEROS_HOSTNAME', 'hostname.example.com')
+service = "HTTP@%s" % hostname
+
+
+def app(environ, start_response):
+    start_response("200 OK", [("Content-Type", "text/plain")])
+    return [b"ok"]
+
+
+middleware = kerberos_spnego.NegotiateMiddleware(app, service)
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        environ = {"REQUEST_METHOD": "GET", "PATH_INFO": self.path}
+        authorization = self.headers.get("Authorization")
+        if authorization is not None:
+            environ["HTTP_AUTHORIZATION"] = authorization
+        response = {}
+
+        def start_response(status, headers, exc_info=None):
+            response["status"] = status
+            response["headers"] = headers
+
+        body = b"".join(middleware(environ, start_response))
+
+        code, reason = response["status"].split(" ", 1)
+        self.send_response(int(code), reason)
+        for name, value in response["headers"]:
+            self.send_header(name, value)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def measure(session, url, duration, make_auth):
+    count = 0
+    round_trips = 0
+    start = time.perf_counter()
+    end = start + duration
+    while time.perf_counter() < end:
+        response = session.get(url, auth=make_auth())
+        response.raise_for_status()
+        round_trips += len(response.history) + 1
+        count += 1
+    # The last request may finish well after the nominal duration
+    return count, round_trips, time.perf_counter() - start
+
+
+def main():
+    duration = float(sys.argv[1]) if len(sys.argv) > 1 else 10.0
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    # Connect by address, but name the server as the keytab does
+    url = "http://127.0.0.1:%d/" % server.server_address[1]
+    shared = kerberos_requests.NegotiateAuth(hostname_override=hostname)
+
+    session = requests.Session()
+
+    # Warm up so the service ticket is already in the client's cache
+    session.get(url, auth=shared).raise_for_status()
+
+    for label, make_auth in (
+        ("challenge", lambda: kerberos_requests.NegotiateAuth(
+            hostname_override=hostname
+        )),
+        ("preemptive", lambda: shared),
+    ):
+        count, round_trips, elapsed = measure(
+            session, url, duration, make_auth
+        )
+        print(
+            "{:<12} requests per second: {:>8.0f}   "
+            "round trips per request: {:.2f}".format(
+                label, count / elapsed, float(round_trips) / count
+            )
+        )
+
+    session.close()
+    server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
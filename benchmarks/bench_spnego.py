@@ -0,0 +1,111 @@
+##
+# Copyright (c) 2026 Apple Inc. All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+##
+
+"""
+Load test the SPNEGO WSGI middleware.
+
+Starts one process per core (or the number given on the command line). Each
+process repeatedly runs a complete Negotiate handshake in-process: a client
+context produces a token, the middleware accepts it and calls a trivial
+application, and the client verifies the mutual authentication token. Reports
+handshakes per second overall and per core.
+
+The client needs a TGT for the test user, and the server a keytab for
+HTTP/KERBEROS_HOSTNAME, as set up for the tests against the local test KDC.
+Uses the same KERBEROS_* environment variables as the tests.
+"""
+
+from __future__ import print_function
+
+import multiprocessing
+import os
+import sys
+import time
+
+import kerberos
+import kerberos_spnego
+
+hostname = os.environ.get('KERBEROS_HOSTNAME', 'hostname.example.com')
+service = "HTTP@%s" % hostname
+
+
+def app(environ, start_response):
+    start_response("200 OK", [("Content-Type", "text/plain")])
+    return [b"ok"]
+
+
+def start_response(status, headers, exc_info=None):
+    start_response.headers = dict(headers)
+
+
+def handshake(middleware):
+    _ignore, vc = kerberos.authGSSClientInit(
+        service, gssflags=kerberos.GSS_C_MUTUAL_FLAG
+    )
+    kerberos.authGSSClientStep(vc, "")
+    environ = {
+        "HTTP_AUTHORIZATION": "Negotiate " + kerberos.authGSSClientResponse(vc)
+    }
+    middleware(environ, start_response)
+    token = start_response.headers["WWW-Authenticate"].split(" ", 1)[1]
+    kerberos.authGSSClientStep(vc, token)
+    kerberos.authGSSClientClean(vc)
+
+
+def worker(duration, results):
+    middleware = kerberos_spnego.NegotiateMiddleware(app, service)
+
+    # Warm up so the service ticket is already in the client's cache
+    handshake(middleware)
+
+    count = 0
+    start = time.perf_counter()
+    end = start + duration
+    while time.perf_counter() < end:
+        handshake(middleware)
+        count += 1
+    # The last handshake may finish well after the nominal duration
+    results.put((count, time.perf_counter() - start))
+
+
+def main():
+    processes = (
+        int(sys.argv[1]) if len(sys.argv) > 1 else multiprocessing.cpu_count()
+    )
+    duration = float(sys.argv[2]) if len(sys.argv) > 2 else 10.0
+
+    results = multiprocessing.Queue()
+    workers = [
+        multiprocessing.Process(target=worker, args=(duration, results))
+        for _ in range(processes)
+    ]
+    for process in workers:
+        process.start()
+    # The workers run side by side, so their rates add up
+    rate = 0.0
+    for _ in workers:
+        count, elapsed = results.get()
+        rate += count / elapsed
+    for process in workers:
+        process.join()
+
+    print("processes:                 {}".format(processes))
+    print("handshakes per second:     {:.0f}".format(rate))
+    print("handshakes per sec/core:   {:.0f}".format(rate / processes))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,105 @@
+##
+# Copyright (c) 2026 Apple Inc. All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+##
+
+"""
+Compare the base64 and raw bytes token APIs for message wrapping.
+
+Sets up an authenticated client/server pair, then repeatedly wraps a message
+on the client and unwraps it on the server, once using authGSSClientWrap with
+base64 strings, once using authGSSClientWrapRaw/authGSSServerUnwrapRaw with
+bytes, and once wrapping batches of messages with authGSSClientWrapMany.
+Reports the time per round trip and the peak Python memory allocated during
+each run.
+
+Uses the same KERBEROS_* environment variables as the tests.
+"""
+
+from __future__ import print_function
+
+import base64
+import os
+import sys
+import time
+import tracemalloc
+
+import kerberos
+
+hostname = os.environ.get('KERBEROS_HOSTNAME', 'hostname.example.com')
+
+
+def handshake():
+    service = "HTTP@%s" % hostname
+    _ignore, vc = kerberos.authGSSClientInit(service)
+    _ignore, vs = kerberos.authGSSServerInit(service)
+    _ignore, token = kerberos.authGSSClientStepRaw(vc)
+    _ignore, token = kerberos.authGSSServerStepRaw(vs, token)
+    kerberos.authGSSClientStepRaw(vc, token)
+    return vc, vs
+
+
+def run_base64(vc, vs, payload, count):
+    encoded = base64.b64encode(payload).decode("ascii")
+    for _ in range(count):
+        kerberos.authGSSClientWrap(vc, encoded)
+        wrapped = base64.b64decode(kerberos.authGSSClientResponse(vc))
+        kerberos.authGSSServerUnwrapRaw(vs, wrapped)
+
+
+def run_raw(vc, vs, payload, count):
+    for _ in range(count):
+        wrapped = kerberos.authGSSClientWrapRaw(vc, payload)
+        kerberos.authGSSServerUnwrapRaw(vs, wrapped)
+
+
+def run_batch(vc, vs, payload, count):
+    batch = [payload] * 100
+    for _ in range(count // len(batch)):
+        for wrapped in kerberos.authGSSClientWrapMany(vc, batch):
+            kerberos.authGSSServerUnwrapRaw(vs, wrapped)
+
+
+def measure(fn, vc, vs, payload, count):
+    tracemalloc.start()
+    start = time.time()
+    fn(vc, vs, payload, count)
+    elapsed = time.time() - start
+    _ignore, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return elapsed / count, peak
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+    size = int(sys.argv[2]) if len(sys.argv) > 2 else 4096
+    payload = os.urandom(size)
+
+    vc, vs = handshake()
+
+    # Warm up so both runs start from a loaded library
+    run_raw(vc, vs, payload, 100)
+
+    b64_time, b64_peak = measure(run_base64, vc, vs, payload, count)
+    raw_time, raw_peak = measure(run_raw, vc, vs, payload, count)
+    batch_time, batch_peak = measure(run_batch, vc, vs, payload, count)
+
+    print("round trips per run:  {} x {} bytes".format(count, size))
+    print("base64 per round trip: {:.1f} us, peak {} bytes".format(b64_time * 1e6, b64_peak))
+    print("raw per round trip:    {:.1f} us, peak {} bytes".format(raw_time * 1e6, raw_peak))
+    print("batch per round trip:  {:.1f} us, peak {} bytes".format(batch_time * 1e6, batch_peak))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,318 @@
+##
+# Copyright (c) 2026 Apple Inc. All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+##
+
+"""
+A throwaway MIT Kerberos realm for benchmarks and tests.
+
+L{LocalKDC} creates a realm database, a user principal, an HTTP service
+principal and its keytab in a temporary directory, starts C{krb5kdc} on a free
+local port and obtains a ticket for the user. L{LocalKDC.environ} holds the
+C{KRB5_*} variables pointing the Kerberos library at it, together with the
+C{KERBEROS_*} variables read by the tests and benchmarks. Everything is
+removed when the KDC is stopped.
+
+Run as a script to execute a command inside a realm, e.g. the test suite:
+
+    python benchmarks/localkdc.py -- python -m pytest tests
+
+Requires the MIT KDC programs (krb5kdc, kdb5_util, kadmin.local and kinit),
+for example from the krb5-kdc and krb5-admin-server packages.
+"""
+
+from __future__ import print_function
+
+import os
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+REALM = "BENCH.TEST"
+HOSTNAME = "server.bench.test"
+USERNAME = "benchuser"
+PASSWORD = "Bench-Password-01"
+
+_KRB5_CONF = """\
+[libdefaults]
+    default_realm = {realm}
+    dns_lookup_kdc = false
+    dns_lookup_realm = false
+    dns_canonicalize_hostname = false
+    rdns = false
+    forwardable = true
+
+[realms]
+    {realm} = {{
+        kdc = 127.0.0.1:{port}
+        admin_server = 127.0.0.1:{port}
+    }}
+
+[domain_realm]
+    .bench.test = {realm}
+    bench.test = {realm}
+"""
+
+_KDC_CONF = """\
+[kdcdefaults]
+    kdc_ports = {port}
+    kdc_tcp_ports = {port}
+
+[realms]
+    {realm} = {{
+        database_name = {dir}/principal
+        key_stash_file = {dir}/stash
+        acl_file = {dir}/kadm5.acl
+        max_life = 1d
+        max_renewable_life = 7d
+    }}
+
+[logging]
+    kdc = FILE:{dir}/kdc.log
+"""
+
+_PROGRAM_DIRS = ("/usr/sbin", "/usr/local/sbin", "/usr/lib/mit/sbin")
+
+
+
+def _find_program(name):
+    path = shutil.which(name)
+    if path is None:
+        for directory in _PROGRAM_DIRS:
+            candidate = os.path.join(directory, name)
+            if os.access(candidate, os.X_OK):
+                path = candidate
+                break
+    if path is None:
+        raise RuntimeError(
+            "{} not found: install the MIT Kerberos KDC programs".format(name)
+        )
+    return path
+
+
+
+def _free_port():
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    try:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+    finally:
+        sock.close()
+
+
+
+class LocalKDC(object):
+    """
+    A temporary realm with a running KDC. Use as a context manager, or call
+    L{start} and L{stop}.
+    """
+
+    def __init__(self, realm=REALM, hostname=HOSTNAME):
+        self.realm = realm
+        self.hostname = hostname
+        self.username = USERNAME
+        self.password = PASSWORD
+        self.directory = None
+        self.port = None
+        self.environ = {}
+        self._process = None
+
+
+    def __enter__(self):
+        self.start()
+        return self
+
+
+    def __exit__(self, *exc_info):
+        self.stop()
+        return False
+
+
+    def path(self, name):
+        return os.path.join(self.directory, name)
+
+
+    def start(self):
+        self.directory = tempfile.mkdtemp(prefix="pykerberos-kdc-")
+        self.port = _free_port()
+        try:
+            self._configure()
+            self._create_realm()
+            self._start_kdc()
+            self._kinit()
+        except Exception:
+            self.stop()
+            raise
+
+
+    def stop(self):
+        if self._process is not None:
+            self._process.terminate()
+            try:
+                self._process.wait(10)
+            except subprocess.TimeoutExpired:
+                self._process.kill()
+                self._process.wait()
+            self._process = None
+        if self.directory is not None:
+            shutil.rmtree(self.directory, ignore_errors=True)
+            self.directory = None
+
+
+    def run(self, *args, **kwargs):
+        """
+        Runs a program with the realm's environment, raising
+        C{subprocess.CalledProcessError} if it fails.
+        """
+        env = dict(os.environ)
+        env.update(self.environ)
+        return subprocess.run(
+            args, env=env, check=True, stdout=subprocess.PIPE,
+            stderr=subprocess.STDOUT, **kwargs
+        )
+
+
+    def kadmin(self, *queries):
+        """
+        Runs kadmin.local queries in a single process.
+        """
+        script = "".join(query + "\n" for query in queries)
+        self.run(
+            _find_program("kadmin.local"), "-r", self.realm,
+            input=script.encode("utf-8"),
+        )
+
+
+    def add_service_keytab(self, keytab, count, service="HTTP"):
+        """
+        Writes a keytab holding count random service principals named
+        C{service/host<N>.bench.test}, for timing lookups in large keytabs.
+        The realm's own service principal is added last.
+        """
+        queries = []
+        for index in range(count):
+            principal = "{}/host{}.bench.test@{}".format(
+                service, index, self.realm
+            )
+            queries.append("addprinc -randkey {}".format(principal))
+            queries.append(
+                "ktadd -k {} -norandkey {}".format(keytab, principal)
+            )
+        queries.append("ktadd -k {} -norandkey {}".format(
+            keytab, self.service_principal
+        ))
+        self.kadmin(*queries)
+
+
+    @property
+    def service_principal(self):
+        return "HTTP/{}@{}".format(self.hostname, self.realm)
+
+
+    @property
+    def user_principal(self):
+        return "{}@{}".format(self.username, self.realm)
+
+
+    def _configure(self):
+        with open(self.path("krb5.conf"), "w") as f:
+            f.write(_KRB5_CONF.format(realm=self.realm, port=self.port))
+        with open(self.path("kdc.conf"), "w") as f:
+            f.write(_KDC_CONF.format(
+                realm=self.realm, port=self.port, dir=self.directory
+            ))
+        with open(self.path("kadm5.acl"), "w") as f:
+            f.write("*/admin@{} *\n".format(self.realm))
+
+        self.environ = {
+            "KRB5_CONFIG": self.path("krb5.conf"),
+            "KRB5_KDC_PROFILE": self.path("kdc.conf"),
+            "KRB5_KTNAME": "FILE:" + self.path("service.keytab"),
+            "KRB5CCNAME": "FILE:" + self.path("ccache"),
+            "KRB5RCACHEDIR": self.directory,
+            "KERBEROS_USERNAME": self.username,
+            "KERBEROS_PASSWORD": self.password,
+            "KERBEROS_REALM": self.realm,
+            "KERBEROS_HOSTNAME": self.hostname,
+        }
+
+
+    def _create_realm(self):
+        self.run(
+            _find_program("kdb5_util"), "create", "-s", "-r", self.realm,
+            "-P", "master-" + self.password,
+        )
+        self.kadmin(
+            "addprinc -pw {} {}".format(self.password, self.user_principal),
+            "addprinc -randkey {}".format(self.service_principal),
+            "ktadd -k {} {}".format(
+                self.path("service.keytab"), self.service_principal
+            ),
+            "ktadd -k {} -norandkey {}".format(
+                self.path("user.keytab"), self.user_principal
+            ),
+        )
+
+
+    def _start_kdc(self):
+        env = dict(os.environ)
+        env.update(self.environ)
+        self._process = subprocess.Popen(
+            [_find_program("krb5kdc"), "-n", "-r", self.realm],
+            env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+        )
+
+        deadline = time.time() + 10
+        while time.time() < deadline:
+            if self._process.poll() is not None:
+                raise RuntimeError(
+                    "krb5kdc exited with status {}, see {}".format(
+                        self._process.returncode, self.path("kdc.log")
+                    )
+                )
+            try:
+                socket.create_connection(("127.0.0.1", self.port), 0.2).close()
+                return
+            except (OSError, socket.error):
+                time.sleep(0.05)
+
+        raise RuntimeError("krb5kdc did not start listening")
+
+
+    def _kinit(self):
+        self.run(
+            _find_program("kinit"), "-f", "-k", "-t", self.path("user.keytab"),
+            self.user_principal,
+        )
+
+
+
+def main(argv):
+    if "--" in argv:
+        argv = argv[argv.index("--") + 1:]
+    if not argv:
+        print("usage: localkdc.py -- command [args...]", file=sys.stderr)
+        return 2
+
+    with LocalKDC() as kdc:
+        env = dict(os.environ)
+        env.update(kdc.environ)
+        return subprocess.call(argv, env=env)
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
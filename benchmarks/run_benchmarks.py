@@ -0,0 +1,505 @@
+##
+# Copyright (c) 2026 Apple Inc. All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+##
+
+"""
+Reproducible benchmark suite run against a throwaway local KDC.
+
+Starts a L{localkdc.LocalKDC} and runs each benchmark in a fresh Python
+process pointed at it, so that library state, memory and file descriptors do
+not carry over from one benchmark to the next:
+
+    - handshake: full client/server handshakes per second, with a service
+      name and with a shared acceptor credential
+    - handshake_threads: handshakes per second with a shared acceptor
+      credential from several threads at once, which scales with cores on
+      a free-threaded Python and shows how much the GIL is released otherwise
+    - client_init: client contexts created per second, each stepped once,
+      with a service name and principal as strings and with a Name and a
+      Credential created once
+    - wrap: wrap and unwrap throughput for a range of message sizes, with
+      the copying and the in-place (IOV) functions
+    - check_password: checkPassword latency percentiles
+    - check_password_many: checks per second for a batch, with
+      checkPasswords on worker threads and with kerberos_kdc on one thread
+    - context_init: PasswordVerifier objects created per second, each with
+      its own Kerberos context, reading krb5.conf and with setConfig
+    - principal_lookup: getServerPrincipalDetails latency against keytabs of
+      increasing size, for the first (index building) call and later calls
+    - soak: resident memory and open file descriptors sampled over many
+      handshake, wrap and unwrap iterations
+
+Results are written as JSON, to stdout or to the file given with --output, so
+that runs can be compared to track regressions. --quick shrinks every
+benchmark to a smoke test. --only runs a subset.
+
+    python benchmarks/run_benchmarks.py --output results.json
+"""
+
+from __future__ import print_function
+
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+
+from localkdc import LocalKDC
+
+FULL = {
+    "handshake": {"count": 5000},
+    "handshake_threads": {"threads": [1, 2, 4, 8], "count": 2000},
+    "client_init": {"count": 20000},
+    "wrap": {
+        "sizes": [64, 1024, 16384, 65536, 1048576],
+        "bytes": 64 * 1024 * 1024,
+    },
+    "check_password": {"count": 500},
+    "check_password_many": {"count": 2000},
+    "context_init": {"count": 20000},
+    "principal_lookup": {"keytab_sizes": [100, 1000, 10000], "count": 20000},
+    "soak": {"iterations": 1000000, "samples": 20},
+}
+
+QUICK = {
+    "handshake": {"count": 100},
+    "handshake_threads": {"threads": [1, 2], "count": 50},
+    "client_init": {"count": 200},
+    "wrap": {"sizes": [64, 65536], "bytes": 1024 * 1024},
+    "check_password": {"count": 20},
+    "check_password_many": {"count": 50},
+    "context_init": {"count": 200},
+    "principal_lookup": {"keytab_sizes": [100], "count": 1000},
+    "soak": {"iterations": 2000, "samples": 4},
+}
+
+
+# Benchmarks, run in the child process
+
+
+def _percentiles(samples):
+    samples = sorted(samples)
+
+    def at(fraction):
+        return samples[min(len(samples) - 1, int(fraction * len(samples)))]
+
+    return {
+        "mean": sum(samples) / len(samples),
+        "p50": at(0.50),
+        "p95": at(0.95),
+        "p99": at(0.99),
+        "max": samples[-1],
+    }
+
+
+def _handshake(kerberos, service, acceptor):
+    _ignore, vc = kerberos.authGSSClientInit(service)
+    _ignore, vs = kerberos.authGSSServerInit(acceptor)
+    _ignore, token = kerberos.authGSSClientStepRaw(vc)
+    _ignore, token = kerberos.authGSSServerStepRaw(vs, token)
+    kerberos.authGSSClientStepRaw(vc, token)
+    return vc, vs
+
+
+def bench_handshake(kerberos, service, params):
+    count = params["count"]
+    results = {}
+    acceptors = [
+        ("service_name", service),
+        ("shared_credential", kerberos.acquireServerCredential(service)),
+    ]
+
+    for name, acceptor in acceptors:
+        _handshake(kerberos, service, acceptor)
+        start = time.perf_counter()
+        for _ in range(count):
+            _handshake(kerberos, service, acceptor)
+        elapsed = time.perf_counter() - start
+        results[name] = {
+            "count": count,
+            "per_second": count / elapsed,
+            "seconds_per_handshake": elapsed / count,
+        }
+
+    return results
+
+
+def bench_handshake_threads(kerberos, service, params):
+    import threading
+
+    count = params["count"]
+    acceptor = kerberos.acquireServerCredential(service)
+    _handshake(kerberos, service, acceptor)
+    results = {
+        "gil_enabled": getattr(sys, "_is_gil_enabled", lambda: True)(),
+    }
+
+    for threads in params["threads"]:
+        barrier = threading.Barrier(threads + 1)
+
+        def run():
+            barrier.wait()
+            for _ in range(count):
+                _handshake(kerberos, service, acceptor)
+
+        workers = [threading.Thread(target=run) for _ in range(threads)]
+        for worker in workers:
+            worker.start()
+        barrier.wait()
+        start = time.perf_counter()
+        for worker in workers:
+            worker.join()
+        elapsed = time.perf_counter() - start
+
+        results[str(threads)] = {
+            "threads": threads,
+            "count": count * threads,
+            "per_second": count * threads / elapsed,
+        }
+
+    return results
+
+
+def bench_client_init(kerberos, service, params):
+    count = params["count"]
+    principal = "%s@%s" % (
+        os.environ["KERBEROS_USERNAME"], os.environ["KERBEROS_REALM"].upper()
+    )
+    name = kerberos.Name(service)
+    credential = kerberos.Credential(principal)
+    variants = [
+        ("strings", lambda: kerberos.authGSSClientInit(
+            service, principal=principal
+        )),
+        ("handles", lambda: kerberos.authGSSClientInit(
+            name, credential=credential
+        )),
+    ]
+    results = {}
+
+    for variant, init in variants:
+        kerberos.authGSSClientStepRaw(init()[1])
+        start = time.perf_counter()
+        for _ in range(count):
+            _ignore, vc = init()
+            kerberos.authGSSClientStepRaw(vc)
+        elapsed = time.perf_counter() - start
+        results[variant] = {
+            "count": count,
+            "per_second": count / elapsed,
+        }
+
+    return results
+
+
+def bench_wrap(kerberos, service, params):
+    vc, vs = _handshake(kerberos, service, service)
+    results = {}
+
+    for size in params["sizes"]:
+        message = os.urandom(size)
+        count = max(1, params["bytes"] // size)
+
+        start = time.perf_counter()
+        for _ in range(count):
+            token = kerberos.authGSSClientWrapRaw(vc, message, 1)
+        wrap_elapsed = time.perf_counter() - start
+
+        start = time.perf_counter()
+        for _ in range(count):
+            kerberos.authGSSServerUnwrapRaw(vs, token)
+        unwrap_elapsed = time.perf_counter() - start
+
+        start = time.perf_counter()
+        for _ in range(count):
+            token = kerberos.authGSSClientWrapIov(vc, message, 1)
+        wrap_iov_elapsed = time.perf_counter() - start
+
+        start = time.perf_counter()
+        for _ in range(count):
+            kerberos.authGSSServerUnwrapIov(vs, token)
+        unwrap_iov_elapsed = time.perf_counter() - start
+
+        results[str(size)] = {
+            "count": count,
+            "wrap_mb_per_second": size * count / wrap_elapsed / 1e6,
+            "unwrap_mb_per_second": size * count / unwrap_elapsed / 1e6,
+            "wrap_iov_mb_per_second": size * count / wrap_iov_elapsed / 1e6,
+            "unwrap_iov_mb_per_second": size * count / unwrap_iov_elapsed / 1e6,
+            "wrap_seconds_per_call": wrap_elapsed / count,
+            "unwrap_seconds_per_call": unwrap_elapsed / count,
+        }
+
+    return results
+
+
+def bench_check_password(kerberos, service, params):
+    username = os.environ["KERBEROS_USERNAME"]
+    password = os.environ["KERBEROS_PASSWORD"]
+    realm = os.environ["KERBEROS_REALM"]
+    principal = "HTTP/" + os.environ["KERBEROS_HOSTNAME"]
+    samples = []
+
+    kerberos.checkPassword(username, password, principal, realm)
+    for _ in range(params["count"]):
+        start = time.perf_counter()
+        kerberos.checkPassword(username, password, principal, realm)
+        samples.append(time.perf_counter() - start)
+
+    result = _percentiles(samples)
+    result["count"] = params["count"]
+    return result
+
+
+def bench_check_password_many(kerberos, service, params):
+    import kerberos_kdc
+
+    username = os.environ["KERBEROS_USERNAME"]
+    password = os.environ["KERBEROS_PASSWORD"]
+    realm = os.environ["KERBEROS_REALM"]
+    principal = "HTTP/" + os.environ["KERBEROS_HOSTNAME"]
+    count = params["count"]
+    credentials = [(username, password, principal, realm)] * count
+
+    start = time.perf_counter()
+    results = kerberos.checkPasswords(credentials)
+    threads = time.perf_counter() - start
+    assert all(result is True for result in results)
+
+    start = time.perf_counter()
+    checks = [kerberos_kdc.PasswordCheck(*item) for item in credentials]
+    kerberos_kdc.run(checks)
+    event_loop = time.perf_counter() - start
+    assert all(check.result() for check in checks)
+
+    return {
+        "count": count,
+        "threads_per_second": count / threads,
+        "one_thread_per_second": count / event_loop,
+    }
+
+
+def bench_context_init(kerberos, service, params):
+    username = os.environ["KERBEROS_USERNAME"]
+    realm = os.environ["KERBEROS_REALM"]
+    principal = "HTTP/" + os.environ["KERBEROS_HOSTNAME"]
+    count = params["count"]
+
+    def rate():
+        start = time.perf_counter()
+        for _ in range(count):
+            kerberos.PasswordVerifier(username, "", principal, realm).close()
+        return count / (time.perf_counter() - start)
+
+    files = rate()
+    kerberos.setConfig({
+        "libdefaults": {"default_realm": realm, "dns_lookup_kdc": False},
+        "realms": {realm: {"kdc": kerberos.getRealmKDCs(realm)}},
+    })
+    try:
+        memory = rate()
+    finally:
+        kerberos.setConfig(None)
+
+    return {
+        "count": count,
+        "files_per_second": files,
+        "set_config_per_second": memory,
+    }
+
+
+def bench_principal_lookup(kerberos, service, params):
+    hostname = os.environ["KERBEROS_HOSTNAME"]
+    count = params["count"]
+
+    start = time.perf_counter()
+    kerberos.getServerPrincipalDetails("HTTP", hostname)
+    first = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for _ in range(count):
+        kerberos.getServerPrincipalDetails("HTTP", hostname)
+    elapsed = time.perf_counter() - start
+
+    return {
+        "keytab_size": params["keytab_size"],
+        "count": count,
+        "first_call_seconds": first,
+        "seconds_per_call": elapsed / count,
+    }
+
+
+def _resources():
+    with open("/proc/self/statm") as f:
+        rss_pages = int(f.read().split()[1])
+    return {
+        "rss_bytes": rss_pages * os.sysconf("SC_PAGE_SIZE"),
+        "open_fds": len(os.listdir("/proc/self/fd")),
+    }
+
+
+def bench_soak(kerberos, service, params):
+    iterations = params["iterations"]
+    every = max(1, iterations // params["samples"])
+    acceptor = kerberos.acquireServerCredential(service)
+    message = b"x" * 256
+    samples = []
+
+    start = time.perf_counter()
+    for iteration in range(iterations):
+        if iteration % every == 0:
+            sample = _resources()
+            sample["iteration"] = iteration
+            samples.append(sample)
+        vc, vs = _handshake(kerberos, service, acceptor)
+        token = kerberos.authGSSClientWrapRaw(vc, message, 1)
+        kerberos.authGSSServerUnwrapRaw(vs, token)
+        del vc, vs
+    elapsed = time.perf_counter() - start
+
+    sample = _resources()
+    sample["iteration"] = iterations
+    samples.append(sample)
+
+    # Compare against the second sample, after caches have warmed up
+    baseline = samples[1] if len(samples) > 2 else samples[0]
+    return {
+        "iterations": iterations,
+        "seconds": elapsed,
+        "samples": samples,
+        "rss_growth_bytes": samples[-1]["rss_bytes"] - baseline["rss_bytes"],
+        "fd_growth": samples[-1]["open_fds"] - baseline["open_fds"],
+    }
+
+
+BENCHMARKS = {
+    "handshake": bench_handshake,
+    "handshake_threads": bench_handshake_threads,
+    "client_init": bench_client_init,
+    "wrap": bench_wrap,
+    "check_password": bench_check_password,
+    "check_password_many": bench_check_password_many,
+    "context_init": bench_context_init,
+    "principal_lookup": bench_principal_lookup,
+    "soak": bench_soak,
+}
+
+
+def run_child(name, params):
+    import kerberos
+
+    service = "HTTP@" + os.environ["KERBEROS_HOSTNAME"]
+    result = BENCHMARKS[name](kerberos, service, params)
+    json.dump(result, sys.stdout)
+
+
+# The parent process
+
+
+def spawn(kdc, name, params, environ=None):
+    env = dict(os.environ)
+    env.update(kdc.environ)
+    env.update(environ or {})
+    output = subprocess.check_output(
+        [
+            sys.executable, os.path.abspath(__file__),
+            "--child", name, "--params", json.dumps(params),
+        ],
+        env=env,
+    )
+    return json.loads(output.decode("utf-8"))
+
+
+def run_principal_lookup(kdc, params):
+    results = []
+    for size in params["keytab_sizes"]:
+        keytab = kdc.path("lookup-{}.keytab".format(size))
+        kdc.add_service_keytab(keytab, size, service="LOOKUP{}".format(size))
+        child_params = {"keytab_size": size, "count": params["count"]}
+        results.append(spawn(
+            kdc, "principal_lookup", child_params,
+            {"KRB5_KTNAME": "FILE:" + keytab},
+        ))
+    return results
+
+
+def metadata():
+    def output(*args):
+        try:
+            return subprocess.check_output(
+                args, stderr=subprocess.DEVNULL
+            ).decode("utf-8").strip()
+        except (OSError, subprocess.CalledProcessError):
+            return None
+
+    return {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "python": platform.python_version(),
+        "implementation": platform.python_implementation(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "krb5": output("krb5-config", "--version"),
+        "commit": output(
+            "git", "-C", os.path.dirname(os.path.abspath(__file__)),
+            "rev-parse", "HEAD",
+        ),
+    }
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--output", help="write the JSON results to this file")
+    parser.add_argument(
+        "--quick", action="store_true", help="run a short smoke test"
+    )
+    parser.add_argument(
+        "--only", action="append", choices=sorted(BENCHMARKS),
+        help="run only this benchmark; may be repeated",
+    )
+    parser.add_argument("--child", help=argparse.SUPPRESS)
+    parser.add_argument("--params", help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.child:
+        run_child(args.child, json.loads(args.params))
+        return 0
+
+    config = QUICK if args.quick else FULL
+    names = [name for name in BENCHMARKS if not args.only or name in args.only]
+    report = {"metadata": metadata(), "quick": args.quick, "results": {}}
+
+    with LocalKDC() as kdc:
+        for name in names:
+            print("running {}".format(name), file=sys.stderr)
+            if name == "principal_lookup":
+                result = run_principal_lookup(kdc, config[name])
+            else:
+                result = spawn(kdc, name, config[name])
+            report["results"][name] = result
+
+    text = json.dumps(report, indent=2, sort_keys=True)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
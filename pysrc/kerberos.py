@@ -77,6 +77,246 @@ def checkPassword(user, pswd, service, default_realm):
 
 
 
+def checkPasswords(credentials, max_workers=0):
+    """
+    This function verifies many user name and password pairs in one call, in
+    the same way as L{checkPassword}.
+    The checks run in parallel on native worker threads with the GIL released,
+    so bulk verification is limited by the KDC rather than by the interpreter.
+
+    IMPORTANT: This method is vulnerable to KDC spoofing attacks in the same way
+    as L{checkPassword} and it should only used for testing.
+
+    @param credentials: An iterable of C{(user, pswd, service, default_realm)}
+        tuples, each with the same meaning as the arguments of
+        L{checkPassword}.
+
+    @param max_workers: Optional integer giving the maximum number of worker
+        threads to use. If zero or not supplied, the number of online CPUs is
+        used.
+
+    @return: A list with one entry per tuple in credentials, in the same order.
+        Each entry is C{True} if authentication succeeded, otherwise it is the
+        exception (e.g. a L{BasicAuthError}) that L{checkPassword} would have
+        raised for that tuple.
+    """
+
+
+
+def getRealmKDCs(realm):
+    """
+    List the KDCs of a realm given by the C{kdc} setting of its section in the
+    Kerberos configuration. KDCs that are only published in DNS are not
+    included.
+
+    @param realm: A string containing the realm name (e.g., C{"EXAMPLE.COM"}).
+
+    @return: A list of strings as written in the configuration, such as
+        C{"kdc.example.com"}, C{"kdc.example.com:88"} or C{"tcp/[::1]:88"}.
+        The list is empty if the realm lists no KDCs.
+
+    @raise KrbError: If the configuration cannot be read.
+    """
+
+
+
+def prewarmServiceTickets(spns, principal=None, max_workers=0):
+    """
+    Get service tickets for many services into the credential cache at once,
+    so that the first L{authGSSClientStep} for each of them finds its ticket
+    cached instead of waiting for the KDC. The requests run in parallel on
+    native worker threads with the GIL released.
+
+    @param spns: An iterable of service names in the form C{"type@fqdn"}, as
+        for L{authGSSClientInit}.
+
+    @param principal: Optional string containing the client principal whose
+        credentials are used, as for L{authGSSClientInit}. If C{None}, the
+        default credentials are used.
+
+    @param max_workers: Optional integer giving the maximum number of worker
+        threads to use. If zero or not supplied, the number of online CPUs is
+        used.
+
+    @return: A list with one C{(spn, seconds, error)} tuple per service, in
+        the same order, where seconds is how long getting the ticket took and
+        error is C{None} on success or the L{GSSError} instance describing the
+        failure.
+    """
+
+
+
+def enablePasswordCache(max_entries=1024, ttl=300, negative_ttl=1,
+                        max_negative_ttl=30, work_factor=512):
+    """
+    Start caching the outcome of L{checkPassword} and L{checkPasswords}, so
+    that credentials checked recently are answered without contacting the KDC.
+    Calling this again changes the settings and empties the cache.
+
+    Entries are keyed by a salted scrypt digest of the user name, password,
+    service and realm; the passwords themselves are never stored. A password
+    changed or disabled in the KDC continues to be accepted until its entry
+    expires.
+
+    Rejected credentials are cached too, so repeated attempts with the same
+    bad password fail without a KDC request for a blocking period. The period
+    starts at negative_ttl and doubles with each further failure, up to
+    max_negative_ttl. Only failures caused by the credentials are cached, not
+    e.g. an unreachable KDC.
+
+    @param max_entries: The maximum number of cached outcomes. When full, the
+        least recently used entry is discarded.
+
+    @param ttl: The number of seconds a successful check is remembered for.
+
+    @param negative_ttl: The number of seconds a first failure is remembered
+        for.
+
+    @param max_negative_ttl: The longest blocking period after repeated
+        failures, in seconds.
+
+    @param work_factor: The scrypt cost parameter N, a power of two. Each check
+        uses 1 KB of memory per unit and takes correspondingly longer.
+    """
+
+
+
+def disablePasswordCache():
+    """
+    Stop caching password check outcomes and discard the cache.
+    """
+
+
+
+def clearPasswordCache():
+    """
+    Discard all cached password check outcomes, keeping the cache enabled.
+    """
+
+
+
+def getPasswordCacheStats():
+    """
+    Get the password cache counters. They keep counting across
+    L{enablePasswordCache} and L{clearPasswordCache} calls.
+
+    @return: A dict with keys C{"hits"} (checks accepted from the cache),
+        C{"negative_hits"} (checks refused from the cache), C{"misses"}
+        (checks that went to the KDC) and C{"entries"} (outcomes currently
+        cached).
+    """
+
+
+
+def enableSessionCache(max_entries=4096, ttl=300):
+    """
+    Start remembering authenticated sessions on the acceptor. Once a
+    handshake completes, L{authGSSServerCacheSession} stores the client
+    principal under a session identifier the server issues, such as a cookie
+    or connection ID, and L{authGSSServerLookupSession} then authenticates
+    later requests in that session without another handshake. Calling this
+    again changes the settings and empties the cache.
+
+    Identifiers are stored as salted SHA-256 digests. Anyone holding a
+    session identifier is treated as its client until the entry expires, so
+    identifiers must be unguessable and kept as secret as the session itself.
+
+    @param max_entries: The maximum number of remembered sessions. When full,
+        the least recently used entry is discarded.
+
+    @param ttl: The number of seconds a session is remembered for. An entry
+        never outlives the context that authenticated it, and so the client's
+        ticket.
+    """
+
+
+
+def disableSessionCache():
+    """
+    Stop remembering sessions and discard the cache.
+    """
+
+
+
+def clearSessionCache():
+    """
+    Forget every remembered session, keeping the cache enabled.
+    """
+
+
+
+def getSessionCacheStats():
+    """
+    Get the session cache counters. They keep counting across
+    L{enableSessionCache} and L{clearSessionCache} calls.
+
+    @return: A dict with keys C{"hits"} (lookups that found a session),
+        C{"misses"} (lookups that did not), C{"hit_rate"} (hits as a fraction
+        of all lookups), C{"stores"} (sessions remembered) and C{"entries"}
+        (sessions currently remembered).
+    """
+
+
+
+def enableStats():
+    """
+    Start counting and timing the Kerberos library calls made by this module:
+    C{"acquire_cred"}, C{"init_sec_context"}, C{"accept_sec_context"},
+    C{"wrap"}, C{"unwrap"}, C{"keytab_scan"} (reading the keytab to look up
+    service principals), C{"get_init_creds_password"} (the KDC exchange in
+    L{checkPassword} and L{changePassword}) and C{"change_password"}.
+    Statistics are disabled by default, when they cost nothing.
+    """
+
+
+
+def disableStats():
+    """
+    Stop counting library calls. The counters keep their values.
+    """
+
+
+
+def resetStats():
+    """
+    Zero the library call counters.
+    """
+
+
+
+def getStats():
+    """
+    Get the library call counters collected while L{enableStats} was in
+    effect.
+
+    @return: A dict mapping each operation name listed in L{enableStats} to a
+        dict with keys C{"calls"}, C{"errors"} (calls that failed),
+        C{"total"} and C{"max"} (in seconds) and C{"histogram"}. The
+        histogram is a list of (limit, count) tuples counting the calls that
+        took less than limit seconds and at least the previous limit. Limits
+        double from one microsecond; the last is C{None} and counts all slower
+        calls.
+    """
+
+
+
+def setTraceCallback(callback):
+    """
+    Set a callable to be invoked after every instrumented library call,
+    whether or not L{enableStats} is in effect. Calls may be traced on any
+    thread, including the worker threads of L{checkPasswords} and
+    L{kerberos.aio}. The callable must not use Kerberos contexts, and any
+    exception it raises is reported and ignored. It can only be set in the
+    main interpreter; elsewhere this raises C{RuntimeError}. Calls made in
+    other interpreters are not traced.
+
+    @param callback: A callable taking the operation name, the time taken in
+        seconds and a boolean telling whether the call failed, or C{None} to
+        stop tracing.
+    """
+
+
+
 def changePassword(user, oldpswd, newpswd):
     """
     This function allows to change the user password on the KDC.
@@ -102,6 +342,9 @@ def getServerPrincipalDetails(service, hostname):
     This function returns the service principal for the server given a service
     type and hostname.
     Details are looked up via the C{/etc/keytab} file.
+    The principals in the keytab are indexed the first time they are needed
+    and the index is only rebuilt when the keytab file changes, so lookups do
+    not scan the keytab each time.
 
     @param service: A string containing the Kerberos service type for the
         server.
@@ -113,6 +356,94 @@ def getServerPrincipalDetails(service, hostname):
 
 
 
+def getServerPrincipalDetailsMany(pairs):
+    """
+    This function looks up the service principals for many service type and
+    hostname pairs at once, in the same way as L{getServerPrincipalDetails}.
+
+    @param pairs: An iterable of C{(service, hostname)} tuples.
+
+    @return: A list with one entry per tuple in pairs, in the same order. Each
+        entry is a string containing the service principal, or C{None} if no
+        matching principal is in the keytab.
+    """
+
+
+
+def getKeytabPrincipals():
+    """
+    This function lists every entry of the keytab used by
+    L{getServerPrincipalDetails}, which is useful to discover all the services
+    a host can accept in a single pass.
+
+    @return: A list of C{(principal, kvno, enctype)} tuples in keytab order,
+        where principal is a string and kvno and enctype are integers.
+    """
+
+
+
+def reloadConfig():
+    """
+    L{checkPassword}, L{checkPasswords}, L{changePassword},
+    L{getServerPrincipalDetails} and L{authGSSServerStoreDelegate} reuse one
+    Kerberos library context per thread instead of creating one on every call,
+    which means the Kerberos configuration (e.g. C{krb5.conf}) is only read
+    once per thread.
+    This function discards those cached contexts so that the configuration is
+    read again the next time one is needed. Call it after changing the
+    configuration files or environment variables such as C{KRB5_CONFIG} or
+    C{KRB5_KTNAME}.
+
+    @return: None
+    """
+
+
+
+def setConfig(config):
+    """
+    Use a Kerberos configuration given as a dict instead of C{krb5.conf} and
+    C{KRB5_CONFIG}. The dict is converted once and kept in memory, so the
+    Kerberos library contexts created by this module afterwards, which are
+    those described under L{reloadConfig} plus one per L{PasswordVerifier},
+    neither read nor parse any file. Contexts already cached are replaced.
+    This lets settings such as KDC lists, C{dns_lookup_kdc},
+    C{udp_preference_limit} or C{kdc_timesync} be chosen per deployment.
+
+    The GSSAPI functions (L{authGSSClientInit}, L{authGSSServerStep} and so
+    on) create their Kerberos contexts inside the GSSAPI library, which keeps
+    reading the configuration files.
+
+    @param config: A dict laid out like C{krb5.conf}, mapping each section
+        name to a dict of relations. A relation value is a string, an integer,
+        a boolean (written as C{"true"} or C{"false"}), a list of those to
+        give the relation several times, or a dict for a subsection. For
+        example::
+
+            {
+                "libdefaults": {
+                    "default_realm": "EXAMPLE.COM",
+                    "dns_lookup_kdc": False,
+                    "udp_preference_limit": 1,
+                },
+                "realms": {
+                    "EXAMPLE.COM": {
+                        "kdc": ["kdc1.example.com", "kdc2.example.com:88"],
+                    },
+                },
+            }
+
+        If C{None}, the configuration files are used again.
+
+    @return: None
+
+    @raise TypeError: If C{config} is not laid out as above.
+
+    @raise KrbError: If the Kerberos library does not accept the
+        configuration, in which case the previous one stays in use.
+    """
+
+
+
 """
 GSSAPI Function Result Codes:
 
@@ -147,7 +478,7 @@ def authGSSClientInit(service, **kwargs):
     result to dispose of the context once all GSSAPI operations are complete.
 
     @param service: A string containing the service principal in the form
-        C{"type@fqdn"}.
+        C{"type@fqdn"}, or a L{Name} imported from one.
 
     @param principal: Optional string containing the client principal in the
         form C{"user@realm"}.
@@ -160,6 +491,13 @@ def authGSSClientInit(service, **kwargs):
 
     @param mech_oid: Optional GGS mech OID
 
+    @param ccache: Optional name of a credential cache to take the client
+        credentials from, such as one returned by L{authGSSServerCacheName}.
+        Ignored if C{delegated} holds credentials.
+
+    @param credential: Optional L{Credential} to use as the client
+        credentials, in place of C{principal}, C{ccache} and C{delegated}.
+
     @return: A tuple of (result, context) where result is the result code (see
         above) and context is an opaque value that will need to be passed to
         subsequent functions.
@@ -275,6 +613,30 @@ def authGSSClientStep(context, challenge, **kwargs):
 
 
 
+def authGSSClientStepRaw(context, token=None, **kwargs):
+    """
+    Processes a single GSSAPI client-side step like L{authGSSClientStep}, but
+    takes and returns raw tokens rather than base64-encoded strings. Use this
+    for protocols that carry tokens as binary data, to avoid encoding and
+    decoding them twice.
+
+    @param context: The context object returned from L{authGSSClientInit}.
+
+    @param token: Optional bytes-like object (e.g. C{bytes}, C{bytearray} or
+        C{memoryview}) containing the raw server token. It is passed to GSSAPI
+        without being copied. Omit it, or pass C{None}, for the first step.
+
+    @param channel_bindings: Optional channel bindings, as for
+        L{authGSSClientStep}.
+
+    @return: A tuple of (result, response) where result is the result code (see
+        above) and response is a bytes object containing the raw token to send
+        to the server, which may be empty.
+        L{authGSSClientResponse} is not updated.
+    """
+
+
+
 def authGSSClientResponse(context):
     """
     Get the client response from the last successful GSSAPI client-side step.
@@ -343,6 +705,186 @@ def authGSSClientWrap(context, data, user=None, protect=0):
 
 
 
+def acquireServerCredential(service):
+    """
+    Acquires the credentials a server needs to accept GSSAPI authentication for
+    the given service principal, so that they can be shared by many server
+    contexts instead of being acquired again by every L{authGSSServerInit}.
+    The credential object may be used from several threads at once. It is
+    acquired again automatically when the keytab file changes; server contexts
+    that are still using the previous credentials keep them until they are
+    destroyed.
+
+    @param service: A string containing the service principal in the form
+        C{"type@fqdn"}, or the literal string C{"DELEGATE"}, as for
+        L{authGSSServerInit}.
+
+    @return: An opaque credential object that can be passed to
+        L{authGSSServerInit} in place of the service.
+    """
+
+
+
+def authGSSClientUnwrapRaw(context, data):
+    """
+    Perform the client side GSSAPI unwrap of a raw token.
+
+    @param context: The context object returned from L{authGSSClientInit}.
+
+    @param data: A bytes-like object containing the raw token from the server.
+        It is passed to GSSAPI without being copied.
+
+    @return: A bytes object containing the unwrapped message. Whether it was
+        encrypted is available from L{authGSSClientResponseConf}.
+    """
+
+
+
+def authGSSClientWrapRaw(context, data, protect=0):
+    """
+    Perform the client side GSSAPI wrap of raw data.
+
+    @param context: The context object returned from L{authGSSClientInit}.
+
+    @param data: A bytes-like object containing the message to wrap. It is
+        passed to GSSAPI without being copied.
+
+    @param protect: If C{0}, then just provide integrity protection.
+        If C{1}, then provide confidentiality as well.
+
+    @return: A bytes object containing the raw token to send to the server.
+    """
+
+
+
+def authGSSClientWrapMany(context, messages, protect=0):
+    """
+    Perform the client side GSSAPI wrap of a batch of messages in one call,
+    without holding the GIL while they are processed. The messages are
+    wrapped in order, so the tokens must be delivered in the same order.
+
+    @param context: The context object returned from L{authGSSClientInit}.
+
+    @param messages: An iterable of bytes-like objects, each containing one
+        message to wrap.
+
+    @param protect: If C{0}, then just provide integrity protection.
+        If C{1}, then provide confidentiality as well.
+
+    @return: A list with one entry per message: a bytes object containing the
+        raw token to send to the server, or the L{GSSError} instance if that
+        message could not be wrapped. A failure does not stop the rest of the
+        batch.
+    """
+
+
+
+def authGSSClientUnwrapMany(context, messages):
+    """
+    Perform the client side GSSAPI unwrap of a batch of raw tokens in one
+    call, without holding the GIL while they are processed.
+
+    @param context: The context object returned from L{authGSSClientInit}.
+
+    @param messages: An iterable of bytes-like objects, each containing one
+        raw token from the server, in the order they were sent.
+
+    @return: A list with one entry per token: a tuple of (message, conf) where
+        message is a bytes object containing the unwrapped message and conf is
+        C{1} if it was encrypted, C{0} otherwise; or the L{GSSError} instance
+        if that token could not be unwrapped. A failure does not stop the rest
+        of the batch. L{authGSSClientResponseConf} reflects the last token
+        unwrapped successfully.
+    """
+
+
+
+def authGSSClientWrapSizeLimit(context, max_token_size, protect=0):
+    """
+    Get the size of the largest message that wraps into a token of at most
+    max_token_size bytes, for splitting a large payload into chunks.
+
+    @param context: The context object returned from L{authGSSClientInit}.
+
+    @param max_token_size: The largest token, in bytes, the peer accepts.
+
+    @param protect: If C{0}, then just provide integrity protection.
+        If C{1}, then provide confidentiality as well.
+
+    @return: The largest message size in bytes.
+    """
+
+
+
+def authGSSClientWrapIov(context, data, protect=0):
+    """
+    Perform the client side GSSAPI wrap of raw data in place. The message is
+    copied once into the returned token and encrypted there, without holding
+    the GIL, and the token is the same as L{authGSSClientWrapRaw} produces.
+    See L{kerberos_stream} for wrapping a whole stream in chunks.
+
+    @param context: The context object returned from L{authGSSClientInit}.
+
+    @param data: A bytes-like object containing the message to wrap.
+
+    @param protect: If C{0}, then just provide integrity protection.
+        If C{1}, then provide confidentiality as well.
+
+    @return: A bytes object containing the raw token to send to the server.
+    """
+
+
+
+def authGSSClientUnwrapIov(context, data):
+    """
+    Perform the client side GSSAPI unwrap of a raw token in place. The token
+    is copied once and decrypted there, without holding the GIL.
+
+    @param context: The context object returned from L{authGSSClientInit}.
+
+    @param data: A bytes-like object containing the raw token from the server.
+
+    @return: A tuple of (message, conf) where message is a bytes object
+        containing the unwrapped message and conf is C{1} if it was encrypted,
+        C{0} otherwise. L{authGSSClientResponseConf} is updated as well.
+    """
+
+
+
+def authGSSClientExportContext(context):
+    """
+    Serializes an established client context so that another process, such as
+    a sibling worker of a pre-fork server, can carry on wrapping and unwrapping
+    with it. The token holds the context's session keys and sequence numbers,
+    so hand it over only through a private channel such as a pipe, a local
+    socket or shared memory, and import it once.
+
+    GSSAPI deletes the context as it exports it: afterwards this context
+    raises L{GSSError} for every further operation.
+
+    @param context: The context object returned from L{authGSSClientInit}.
+
+    @return: A bytes object containing the serialized context, to pass to
+        L{authGSSClientImportContext}.
+    """
+
+
+
+def authGSSClientImportContext(token):
+    """
+    Recreates a client context from the output of
+    L{authGSSClientExportContext}, in this or another process on the same
+    host. L{authGSSClientUserName} is available straight away.
+
+    @param token: A bytes-like object containing the serialized context.
+
+    @return: A tuple of (result, context) where result is the result code (see
+        above) and context is an opaque value that will need to be passed to
+        subsequent functions.
+    """
+
+
+
 def authGSSServerInit(service):
     """
     Initializes a context for GSSAPI server-side authentication with the given
@@ -353,6 +895,9 @@ def authGSSServerInit(service):
     @param service: A string containing the service principal in the form
         C{"type@fqdn"}. To initialize the context for the purpose of accepting
         delegated credentials, pass the literal string C{"DELEGATE"}.
+        A credential object returned by L{acquireServerCredential} may be
+        passed instead, in which case its credentials are used rather than
+        acquiring new ones.
 
     @return: A tuple of (result, context) where result is the result code (see
         above) and context is an opaque value that will need to be passed to
@@ -387,6 +932,137 @@ def authGSSServerStep(context, challenge):
 
 
 
+def authGSSServerStepRaw(context, token):
+    """
+    Processes a single GSSAPI server-side step like L{authGSSServerStep}, but
+    takes and returns raw tokens rather than base64-encoded strings.
+
+    @param context: The context object returned from L{authGSSServerInit}.
+
+    @param token: A bytes-like object containing the raw client token. It is
+        passed to GSSAPI without being copied.
+
+    @return: A tuple of (result, response) where result is the result code (see
+        above) and response is a bytes object containing the raw token to send
+        back to the client, which may be empty.
+        L{authGSSServerResponse} is not updated.
+    """
+
+
+
+def authGSSServerWrapRaw(context, data, protect=0):
+    """
+    Perform the server side GSSAPI wrap of raw data, once authentication is
+    complete.
+
+    @param context: The context object returned from L{authGSSServerInit}.
+
+    @param data: A bytes-like object containing the message to wrap.
+
+    @param protect: If C{0}, then just provide integrity protection.
+        If C{1}, then provide confidentiality as well.
+
+    @return: A bytes object containing the raw token to send to the client.
+    """
+
+
+
+def authGSSServerUnwrapRaw(context, data):
+    """
+    Perform the server side GSSAPI unwrap of a raw token, once authentication
+    is complete.
+
+    @param context: The context object returned from L{authGSSServerInit}.
+
+    @param data: A bytes-like object containing the raw token from the client.
+
+    @return: A tuple of (message, conf) where message is a bytes object
+        containing the unwrapped message and conf is C{1} if it was encrypted,
+        C{0} otherwise.
+    """
+
+
+
+def authGSSServerWrapSizeLimit(context, max_token_size, protect=0):
+    """
+    Get the size of the largest message that wraps into a token of at most
+    max_token_size bytes, once authentication is complete.
+
+    @param context: The context object returned from L{authGSSServerInit}.
+
+    @param max_token_size: The largest token, in bytes, the peer accepts.
+
+    @param protect: If C{0}, then just provide integrity protection.
+        If C{1}, then provide confidentiality as well.
+
+    @return: The largest message size in bytes.
+    """
+
+
+
+def authGSSServerWrapIov(context, data, protect=0):
+    """
+    Perform the server side GSSAPI wrap of raw data in place, as
+    L{authGSSClientWrapIov} does for the client.
+
+    @param context: The context object returned from L{authGSSServerInit}.
+
+    @param data: A bytes-like object containing the message to wrap.
+
+    @param protect: If C{0}, then just provide integrity protection.
+        If C{1}, then provide confidentiality as well.
+
+    @return: A bytes object containing the raw token to send to the client.
+    """
+
+
+
+def authGSSServerUnwrapIov(context, data):
+    """
+    Perform the server side GSSAPI unwrap of a raw token in place, as
+    L{authGSSClientUnwrapIov} does for the client.
+
+    @param context: The context object returned from L{authGSSServerInit}.
+
+    @param data: A bytes-like object containing the raw token from the client.
+
+    @return: A tuple of (message, conf) where message is a bytes object
+        containing the unwrapped message and conf is C{1} if it was encrypted,
+        C{0} otherwise.
+    """
+
+
+
+def authGSSServerExportContext(context):
+    """
+    Serializes an established server context, as
+    L{authGSSClientExportContext} does for the client. Delegated credentials
+    are not included; store them with L{authGSSServerStoreDelegate} first if
+    they are needed.
+
+    @param context: The context object returned from L{authGSSServerInit}.
+
+    @return: A bytes object containing the serialized context, to pass to
+        L{authGSSServerImportContext}.
+    """
+
+
+
+def authGSSServerImportContext(token):
+    """
+    Recreates a server context from the output of
+    L{authGSSServerExportContext}. L{authGSSServerUserName} and
+    L{authGSSServerTargetName} are available straight away.
+
+    @param token: A bytes-like object containing the serialized context.
+
+    @return: A tuple of (result, context) where result is the result code (see
+        above) and context is an opaque value that will need to be passed to
+        subsequent functions.
+    """
+
+
+
 def authGSSServerResponse(context):
     """
     Get the server response from the last successful GSSAPI server-side step.
@@ -436,14 +1112,73 @@ def authGSSServerTargetName(context):
 
 
 
-def authGSSServerStoreDelegate(context):
+def authGSSServerCacheSession(context, session_id, service=None):
+    """
+    Remember the client authenticated by a completed server context under a
+    session identifier, if the session cache is enabled (see
+    L{enableSessionCache}).
+
+    @param context: The context object returned from L{authGSSServerInit},
+        after a step that completed authentication.
+
+    @param session_id: A str or bytes-like object identifying the session,
+        issued by the server and unguessable by clients.
+
+    @param service: Optional string naming the acceptor's service, such as
+        C{"HTTP@fqdn"}. The session is only found by lookups for the same
+        service, so that servers for different services in one process do
+        not accept each other's sessions.
+
+    @return: C{True} if the session was remembered, C{False} if the cache is
+        disabled or the principal name is too long to remember.
+    """
+
+
+
+def authGSSServerLookupSession(session_id, service=None):
+    """
+    Get the client remembered under a session identifier by
+    L{authGSSServerCacheSession}.
+
+    @param session_id: A str or bytes-like object identifying the session.
+
+    @param service: Optional string naming the acceptor's service, as given
+        to L{authGSSServerCacheSession}.
+
+    @return: The client principal name, or C{None} if the session is unknown
+        or has expired, or the cache is disabled.
+    """
+
+
+
+def authGSSServerForgetSession(session_id, service=None):
+    """
+    Forget a session remembered by L{authGSSServerCacheSession}, for example
+    when the client logs out.
+
+    @param session_id: A str or bytes-like object identifying the session.
+
+    @param service: Optional string naming the acceptor's service, as given
+        to L{authGSSServerCacheSession}.
+    """
+
+
+
+def authGSSServerStoreDelegate(context, cache_type="FILE"):
     """
-    Save the ticket sent to the server in the file C{/tmp/krb5_pyserv_XXXXXX}.
+    Save the ticket sent to the server in a new credential cache.
     This method must only be called after L{authGSSServerStep} returns a
     complete or continue response code.
 
     @param context: The context object returned from L{authGSSClientInit}.
 
+    @param cache_type: Optional string naming the kind of credential cache.
+        C{"FILE"} (the default) writes the file C{/tmp/krb5_pyserv_XXXXXX},
+        which is left in place for the caller to remove. C{"MEMORY"} and
+        C{"KEYRING"} create a cache that never touches the disk and is
+        destroyed when the context is reclaimed, or when the credentials are
+        stored again.
+
     @return: A result code (see above).
     """
 
@@ -454,8 +1189,250 @@ def authGSSServerCacheName(context):
     Get the name of the credential cache created with
     L{authGSSServerStoreDelegate}.
     This method must only be called after L{authGSSServerStoreDelegate}.
+    The name can be passed as the C{ccache} argument of L{authGSSClientInit}
+    to use the delegated credentials onward.
 
     @param context: The context object returned from L{authGSSClientInit}.
 
     @return: A string containing the cache name.
     """
+
+
+
+class GSSClientContext(object):
+    """
+    A GSSAPI client context as an object, an alternative to the context
+    returned by L{authGSSClientInit}. The GSSAPI state is stored in the object
+    itself, so reading attributes is cheaper than calling the equivalent
+    functions. Operations on the context are serialized by a lock held by the
+    object, so one context can be shared by several threads.
+
+    The object can be passed to any function that takes a client context. It
+    can be used in a C{with} statement, which calls L{close} on exit.
+
+    @ivar response: A string containing the base64-encoded response from the
+        last step, wrap or unwrap, or C{None}.
+
+    @ivar username: A string containing the client user name, or C{None}.
+
+    @ivar response_conf: An integer telling whether the last unwrapped message
+        was encrypted.
+
+    @ivar closed: A boolean telling whether L{close} was called.
+    """
+
+    def __init__(self, service, **kwargs):
+        """
+        @param service: A string containing the service principal in the form
+            C{"type@fqdn"}, or a L{Name}.
+
+        All other arguments are the optional keyword arguments of
+        L{authGSSClientInit}. C{delegated} may also be a L{GSSServerContext},
+        which must not be closed while this context uses its credentials.
+        """
+
+
+    def step(self, challenge, **kwargs):
+        """
+        Processes a challenge from the server, as L{authGSSClientStep}.
+
+        @return: A result code (see above).
+        """
+
+
+    def wrap(self, data, user=None, protect=0):
+        """
+        Wraps a message for the server, as L{authGSSClientWrap}.
+
+        @return: A result code (see above).
+        """
+
+
+    def unwrap(self, challenge):
+        """
+        Unwraps a message from the server, as L{authGSSClientUnwrap}.
+
+        @return: A result code (see above).
+        """
+
+
+    def inquire_cred(self):
+        """
+        Looks up the client user name, as L{authGSSClientInquireCred}.
+
+        @return: A result code (see above).
+        """
+
+
+    def close(self):
+        """
+        Releases the GSSAPI context, waiting for any operation in progress on
+        another thread. Further operations raise C{ValueError}. Calling it
+        again does nothing.
+        """
+
+
+
+class GSSServerContext(object):
+    """
+    A GSSAPI server context as an object, an alternative to the context
+    returned by L{authGSSServerInit}, with the same locking and cleanup as
+    L{GSSClientContext}.
+
+    @ivar response: A string containing the base64-encoded response from the
+        last step, or C{None}.
+
+    @ivar username: A string containing the client user name, or C{None}.
+
+    @ivar target_name: A string containing the service principal the client
+        authenticated to, as L{authGSSServerTargetName}.
+
+    @ivar ccache_name: A string containing the name of the credential cache
+        written by L{store_delegate}, or C{None}.
+
+    @ivar has_delegated: A boolean telling whether the client delegated
+        credentials.
+
+    @ivar closed: A boolean telling whether L{close} was called.
+    """
+
+    def __init__(self, service):
+        """
+        @param service: A string containing the service principal, or a
+            credential from L{acquireServerCredential}, as for
+            L{authGSSServerInit}.
+        """
+
+
+    def step(self, challenge):
+        """
+        Processes a challenge from the client, as L{authGSSServerStep}.
+
+        @return: A result code (see above).
+        """
+
+
+    def store_delegate(self, cache_type="FILE"):
+        """
+        Stores delegated credentials, as L{authGSSServerStoreDelegate}.
+
+        @return: A result code (see above).
+        """
+
+
+    def close(self):
+        """
+        Releases the GSSAPI context, waiting for any operation in progress on
+        another thread. Further operations raise C{ValueError}. Calling it
+        again does nothing.
+        """
+
+
+
+class Name(object):
+    """
+    A service principal imported once, to be passed to L{authGSSClientInit}
+    or L{GSSClientContext} in place of the service string by any number of
+    client contexts. It never changes, so it can be shared between threads.
+
+    @ivar service: The service principal, as given.
+    """
+
+    def __init__(self, service):
+        """
+        @param service: A string containing the service principal in the form
+            C{"type@fqdn"}.
+        """
+
+
+
+class Credential(object):
+    """
+    Client credentials acquired once, to be passed as the C{credential}
+    argument of L{authGSSClientInit} or L{GSSClientContext} by any number of
+    client contexts. It never changes, so it can be shared between threads.
+    Service tickets obtained by one context are cached in the credential
+    cache, where the next context finds them. Once the ticket granting ticket
+    expires a new credential must be acquired.
+
+    @ivar principal: The client principal, as given, or C{None}.
+    """
+
+    def __init__(self, principal=None, ccache=None):
+        """
+        @param principal: Optional string containing the client principal in
+            the form C{"user@realm"}. The default credentials are used if
+            neither C{principal} nor C{ccache} is given.
+
+        @param ccache: Optional name of a credential cache to take the
+            credentials from, which takes precedence over C{principal}.
+        """
+
+
+
+class PasswordVerifier(object):
+    """
+    The check done by L{checkPassword}, taken one KDC exchange at a time so
+    that the caller sends the requests and waits for the replies itself,
+    without tying up a thread. The C{kerberos_kdc} module sends them over
+    non-blocking sockets and drives many checks from one thread or an asyncio
+    event loop.
+
+    The password cache of L{enablePasswordCache} is not used.
+
+    IMPORTANT: Like L{checkPassword}, this is vulnerable to KDC spoofing
+    attacks and should only be used for testing.
+
+    The object can be used in a C{with} statement, which calls L{close} on
+    exit.
+
+    @ivar realm: A string containing the realm whose KDC the last request
+        returned by L{step} must be sent to.
+
+    @ivar tcp_only: A boolean telling whether the last request must be sent
+        over TCP, because the KDC said its reply was too large for UDP.
+
+    @ivar closed: A boolean telling whether the check has finished.
+    """
+
+    def __init__(self, user, pswd, service, default_realm):
+        """
+        The arguments are those of L{checkPassword}.
+
+        @raise BasicAuthError: If the names cannot be parsed.
+        """
+
+
+    def step(self, reply=None):
+        """
+        Processes the KDC's reply to the last request and works out the next
+        one. The first call takes no reply.
+
+        @param reply: A bytes-like object containing the reply, without the
+            length prefix used over TCP.
+
+        @return: The next request as bytes, to be sent to a KDC of L{realm},
+            or C{None} once the password is known to be right, which finishes
+            the check.
+
+        @raise BasicAuthError: If the password is wrong or the reply is not
+            valid. This finishes the check.
+
+        @raise ValueError: If the check has finished.
+        """
+
+
+    def unreachable(self):
+        """
+        Finishes the check because no KDC of L{realm} answered.
+
+        @raise BasicAuthError: Always, with the error L{checkPassword} raises
+            when it cannot reach a KDC.
+        """
+
+
+    def close(self):
+        """
+        Abandons the check. Further steps raise C{ValueError}. Calling it
+        again does nothing.
+        """
@@ -0,0 +1,508 @@
+##
+# Copyright (c) 2026 Apple Inc. All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+##
+
+"""
+Password checks that do not hold a thread while the KDC answers, built on
+L{kerberos.PasswordVerifier}.
+
+L{kerberos.checkPassword} blocks the thread that calls it for the whole KDC
+exchange. A L{PasswordCheck} does the same check, but sends the requests
+itself over non-blocking UDP or TCP sockets and is moved along by whatever
+waits on those sockets. L{run} drives any number of checks from one thread
+with L{selectors}, and L{check_password} is a coroutine for asyncio:
+
+    checks = [
+        PasswordCheck(user, pswd, "http/host.example.com", "EXAMPLE.COM")
+        for user, pswd in pairs
+    ]
+    run(checks)
+    results = [check.result() for check in checks]
+
+Each request goes to the KDCs of its realm, as listed in the Kerberos
+configuration or given as C{kdcs}, one at a time. If a KDC refuses the
+request or does not answer within C{kdc_timeout} seconds the next one is
+tried, going round the list up to L{MAX_PASSES} times. The check fails with
+the error L{kerberos.checkPassword} gives for an unreachable realm once that
+runs out, or once C{timeout} seconds have passed since it started. KDCs that
+are only published in DNS SRV records are not found; list them in the
+configuration or pass them in C{kdcs}.
+
+KDC host names are resolved with a blocking lookup, which is then cached for
+L{ADDRESS_TTL} seconds. Turning the password into a key also happens on the
+driving thread, with the GIL released. Both are short next to a KDC round
+trip, but give addresses rather than names to avoid the lookups entirely.
+
+The password cache of L{kerberos.enablePasswordCache} is not used, as
+deriving its key takes as long as asking the KDC.
+
+IMPORTANT: Like L{kerberos.checkPassword}, these checks are vulnerable to
+KDC spoofing, and should only be used for testing.
+"""
+
+import errno
+import selectors
+import socket
+import struct
+import time
+
+import kerberos
+
+__all__ = [
+    "ADDRESS_TTL",
+    "DEFAULT_KDC_TIMEOUT",
+    "DEFAULT_PORT",
+    "DEFAULT_TIMEOUT",
+    "MAX_PASSES",
+    "PasswordCheck",
+    "check_password",
+    "parse_kdc",
+    "run",
+]
+
+DEFAULT_PORT = 88
+
+DEFAULT_TIMEOUT = 30.0
+
+DEFAULT_KDC_TIMEOUT = 1.0
+
+MAX_PASSES = 3
+
+ADDRESS_TTL = 300.0
+
+# Requests larger than this go over TCP, as MIT's udp_preference_limit
+UDP_PREFERENCE_LIMIT = 1465
+
+MAX_REPLY_SIZE = 1 << 20
+
+_LENGTH = struct.Struct(">I")
+
+_TRANSPORTS = {"udp": socket.SOCK_DGRAM, "tcp": socket.SOCK_STREAM}
+
+_addresses = {}
+
+
+
+def parse_kdc(entry):
+    """
+    Parse a KDC as written in the C{kdc} setting of a realm in krb5.conf.
+
+    @param entry: A string of the form C{"host"}, C{"host:port"} or
+        C{"[address]:port"}, optionally preceded by C{"udp/"} or C{"tcp/"}.
+
+    @return: A C{(transport, host, port)} tuple, where transport is
+        C{"udp"}, C{"tcp"} or C{None} if either may be used, or C{None} if
+        the entry uses a transport that is not supported, such as HTTPS.
+    """
+    transport = None
+    if entry.startswith(("udp/", "tcp/")):
+        transport, entry = entry[:3], entry[4:]
+    elif "://" in entry or "/" in entry:
+        return None
+
+    if entry.startswith("["):
+        host, _ignore, rest = entry[1:].partition("]")
+        port = rest[1:] if rest.startswith(":") else ""
+    elif entry.count(":") == 1:
+        host, port = entry.split(":")
+    else:
+        host, port = entry, ""
+
+    return transport, host, int(port) if port else DEFAULT_PORT
+
+
+
+def _resolve(host, port, socktype):
+    key = (host, port, socktype)
+    now = time.monotonic()
+    cached = _addresses.get(key)
+    if cached is not None and cached[0] > now:
+        return cached[1]
+
+    infos = socket.getaddrinfo(host, port, 0, socktype)
+    _addresses[key] = (now + ADDRESS_TTL, infos)
+    return infos
+
+
+
+class PasswordCheck(object):
+    """
+    One password check, moved along by its caller whenever its socket is
+    ready or its deadline passes.
+
+    A driver waits until L{sock} is ready for L{events}, then calls
+    L{handle}, or until L{deadline} passes, then calls L{expire}. The socket
+    changes as the check moves from one KDC to the next, so the driver looks
+    at these again after every call. Once L{done} is true, L{result} gives
+    the outcome.
+
+    @ivar sock: The socket in use, or C{None} once the check is done.
+    @ivar events: The L{selectors} events to wait for on L{sock}.
+    @ivar deadline: The L{time.monotonic} time at which to call L{expire}.
+    @ivar done: Whether the check has finished.
+    """
+
+    def __init__(
+        self, user, pswd, service, default_realm, kdcs=None,
+        timeout=DEFAULT_TIMEOUT, kdc_timeout=DEFAULT_KDC_TIMEOUT
+    ):
+        """
+        Start a check, with the arguments of L{kerberos.checkPassword}.
+
+        @param kdcs: Optional list of KDCs to use for every realm, each a
+            C{(host, port)} tuple or a string as for L{parse_kdc}. If
+            C{None}, the KDCs of each realm are read from the Kerberos
+            configuration.
+
+        @param timeout: The number of seconds after which the whole check
+            gives up.
+
+        @param kdc_timeout: The number of seconds to wait for one KDC before
+            trying the next.
+        """
+        self.sock = None
+        self.events = 0
+        self.deadline = None
+        self.done = False
+        self.kdc_timeout = kdc_timeout
+        self._give_up = time.monotonic() + timeout
+        self._kdcs = None if kdcs is None else [
+            parse_kdc(kdc) if isinstance(kdc, str) else (None,) + tuple(kdc)
+            for kdc in kdcs
+        ]
+        self._outcome = None
+        self._request = None
+        self._targets = []
+        self._attempt = 0
+        self._queue = []
+        self._transport = None
+        self._output = None
+        self._input = None
+
+        try:
+            self._verifier = kerberos.PasswordVerifier(
+                user, pswd, service, default_realm
+            )
+        except kerberos.BasicAuthError as e:
+            self._verifier = None
+            self._finish(e)
+            return
+        self._step(None)
+
+
+    def result(self):
+        """
+        Get the outcome of a finished check.
+
+        @return: C{True} if the password is right.
+
+        @raise BasicAuthError: If it is wrong, or no KDC could be reached.
+        @raise ValueError: If the check has not finished.
+        """
+        if not self.done:
+            raise ValueError("The password check has not finished")
+        if self._outcome is not True:
+            raise self._outcome
+        return True
+
+
+    def close(self):
+        """
+        Abandon the check, if it has not finished.
+        """
+        if not self.done:
+            self._finish(
+                kerberos.BasicAuthError("The password check was abandoned")
+            )
+
+
+    def handle(self, events):
+        """
+        Send or receive whatever L{sock} is ready for.
+
+        @param events: The L{selectors} events that are ready.
+        """
+        if self.done:
+            return
+        try:
+            if self._transport == "udp":
+                self._step(self.sock.recv(65536))
+            elif self._output is not None:
+                self._send_stream()
+            else:
+                self._receive_stream()
+        except (BlockingIOError, InterruptedError):
+            pass
+        except OSError:
+            self._next_kdc()
+
+
+    def expire(self):
+        """
+        Give up on the current KDC, or on the whole check if its timeout has
+        passed.
+        """
+        if not self.done and time.monotonic() >= self.deadline:
+            self._next_kdc()
+
+
+    def _step(self, reply):
+        self._close_socket()
+        try:
+            request = self._verifier.step(reply)
+        except kerberos.BasicAuthError as e:
+            self._finish(e)
+            return
+        if request is None:
+            self._finish(True)
+            return
+
+        self._request = request
+        self._targets = self._realm_targets()
+        self._attempt = 0
+        self._queue = []
+        self._next_kdc()
+
+
+    def _realm_targets(self):
+        kdcs = self._kdcs
+        if kdcs is None:
+            try:
+                entries = kerberos.getRealmKDCs(self._verifier.realm)
+            except kerberos.KrbError:
+                entries = []
+            kdcs = [parse_kdc(entry) for entry in entries]
+        kdcs = [kdc for kdc in kdcs if kdc is not None]
+
+        # As MIT does, try the preferred transport at every KDC first
+        stream = (
+            self._verifier.tcp_only or
+            len(self._request) > UDP_PREFERENCE_LIMIT
+        )
+        preferred, other = ("tcp", "udp") if stream else ("udp", "tcp")
+        targets = [
+            (transport or preferred, host, port)
+            for transport, host, port in kdcs
+            if transport in (None, preferred)
+        ]
+        targets.extend(
+            (other, host, port)
+            for transport, host, port in kdcs
+            if transport is None or transport == other
+        )
+        if self._verifier.tcp_only:
+            targets = [target for target in targets if target[0] == "tcp"]
+        return targets
+
+
+    def _next_kdc(self):
+        self._close_socket()
+        while not self.done:
+            if time.monotonic() >= self._give_up:
+                self._unreachable()
+            elif self._queue:
+                transport, info = self._queue.pop(0)
+                try:
+                    self._connect(transport, info)
+                    return
+                except OSError:
+                    self._close_socket()
+            elif self._attempt < len(self._targets) * MAX_PASSES:
+                transport, host, port = self._targets[
+                    self._attempt % len(self._targets)
+                ]
+                self._attempt += 1
+                try:
+                    infos = _resolve(host, port, _TRANSPORTS[transport])
+                except OSError:
+                    continue
+                self._queue = [(transport, info) for info in infos]
+            else:
+                self._unreachable()
+
+
+    def _connect(self, transport, info):
+        family, socktype, proto, _ignore, address = info
+        self.sock = socket.socket(family, socktype, proto)
+        self.sock.setblocking(False)
+        self._transport = transport
+        self.deadline = min(
+            time.monotonic() + self.kdc_timeout, self._give_up
+        )
+
+        if transport == "udp":
+            self.sock.connect(address)
+            self.sock.send(self._request)
+            self.events = selectors.EVENT_READ
+        else:
+            error = self.sock.connect_ex(address)
+            if error not in (0, errno.EINPROGRESS, errno.EWOULDBLOCK):
+                raise OSError(error, errno.errorcode.get(error, "connect"))
+            self._output = memoryview(
+                _LENGTH.pack(len(self._request)) + self._request
+            )
+            self.events = selectors.EVENT_WRITE
+
+
+    def _send_stream(self):
+        error = self.sock.getsockopt(socket.SOL_SOCKET, socket.SO_ERROR)
+        if error:
+            raise OSError(error, errno.errorcode.get(error, "connect"))
+        sent = self.sock.send(self._output)
+        self._output = self._output[sent:]
+        if not self._output:
+            self._output = None
+            self._input = bytearray()
+            self.events = selectors.EVENT_READ
+
+
+    def _receive_stream(self):
+        data = self.sock.recv(65536)
+        if not data:
+            raise OSError(errno.ECONNRESET, "KDC closed the connection")
+        self._input += data
+        if len(self._input) < _LENGTH.size:
+            return
+
+        length = _LENGTH.unpack_from(self._input)[0]
+        if length > MAX_REPLY_SIZE:
+            raise OSError(errno.EMSGSIZE, "KDC reply too large")
+        if len(self._input) >= _LENGTH.size + length:
+            self._step(bytes(self._input[_LENGTH.size:_LENGTH.size + length]))
+
+
+    def _unreachable(self):
+        try:
+            self._verifier.unreachable()
+        except kerberos.BasicAuthError as e:
+            self._finish(e)
+
+
+    def _close_socket(self):
+        if self.sock is not None:
+            self.sock.close()
+        self.sock = None
+        self.events = 0
+        self._output = None
+        self._input = None
+
+
+    def _finish(self, outcome):
+        self._close_socket()
+        self.deadline = None
+        self.done = True
+        self._outcome = outcome
+        if self._verifier is not None:
+            self._verifier.close()
+
+
+
+def run(checks):
+    """
+    Drive password checks on the calling thread until all have finished.
+
+    @param checks: An iterable of L{PasswordCheck}.
+    """
+    pending = [check for check in checks if not check.done]
+    registered = {}
+    selector = selectors.DefaultSelector()
+
+    try:
+        while pending:
+            # A closed socket's number may already be reused by another check
+            for check in pending:
+                key = registered.get(check)
+                if key is not None and key.fileobj is not check.sock:
+                    selector.unregister(registered.pop(check).fileobj)
+            for check in pending:
+                key = registered.get(check)
+                if key is None:
+                    registered[check] = selector.register(
+                        check.sock, check.events, check
+                    )
+                elif key.events != check.events:
+                    registered[check] = selector.modify(
+                        check.sock, check.events, check
+                    )
+
+            wait = min(check.deadline for check in pending) - time.monotonic()
+            for key, events in selector.select(max(wait, 0)):
+                key.data.handle(events)
+
+            now = time.monotonic()
+            for check in pending:
+                if not check.done and check.deadline <= now:
+                    check.expire()
+
+            for check in pending:
+                if check.done and check in registered:
+                    selector.unregister(registered.pop(check).fileobj)
+            pending = [check for check in pending if not check.done]
+    finally:
+        selector.close()
+
+
+
+async def check_password(
+    user, pswd, service, default_realm, kdcs=None, timeout=DEFAULT_TIMEOUT,
+    kdc_timeout=DEFAULT_KDC_TIMEOUT
+):
+    """
+    Check a password from an asyncio event loop, without a worker thread.
+    The arguments are those of L{PasswordCheck}.
+
+    @return: C{True} if the password is right.
+
+    @raise BasicAuthError: If it is wrong, or no KDC could be reached.
+    """
+    import asyncio
+
+    loop = asyncio.get_running_loop()
+    check = PasswordCheck(
+        user, pswd, service, default_realm, kdcs=kdcs, timeout=timeout,
+        kdc_timeout=kdc_timeout
+    )
+
+    try:
+        while not check.done:
+            waiter = loop.create_future()
+
+            def ready(events, waiter=waiter):
+                if not waiter.done():
+                    waiter.set_result(events)
+
+            fd = check.sock.fileno()
+            if check.events & selectors.EVENT_READ:
+                loop.add_reader(fd, ready, selectors.EVENT_READ)
+            else:
+                loop.add_writer(fd, ready, selectors.EVENT_WRITE)
+            timer = loop.call_later(
+                max(check.deadline - time.monotonic(), 0), ready, 0
+            )
+            try:
+                events = await waiter
+            finally:
+                loop.remove_reader(fd)
+                loop.remove_writer(fd)
+                timer.cancel()
+
+            if events:
+                check.handle(events)
+            else:
+                check.expire()
+    finally:
+        check.close()
+
+    return check.result()
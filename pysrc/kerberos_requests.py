@@ -0,0 +1,305 @@
+##
+# Copyright (c) 2026 Apple Inc. All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+##
+
+"""
+HTTP Negotiate (SPNEGO) authentication for the C{requests} library, built on
+the client side GSSAPI functions of L{kerberos}.
+
+    session = requests.Session()
+    session.auth = NegotiateAuth()
+    response = session.get("https://hostname.example.com/")
+
+The first request to a host goes out without a token. If the host answers
+C{401 Unauthorized} with a C{Negotiate} challenge, the request is sent again
+on the same pooled connection with a token, and the host is remembered.
+Later requests to it carry a token from the start, so they take a single
+round trip. With C{preemptive=True} every request carries a token from the
+start.
+
+The service name of each host is imported once, and a L{kerberos.Credential}
+may be passed to share one set of client credentials between all requests.
+Service tickets are kept in the credential cache by the GSSAPI library, so
+only the first request to a host asks the KDC for one.
+
+The server's mutual authentication token, returned in the
+C{WWW-Authenticate} header of the response, is checked before the response
+is handed back. A response whose token is not valid raises
+L{MutualAuthenticationError}.
+
+A request is sent again after a challenge with the same body. Bodies that
+can only be read once, such as generators or files, should be sent with
+C{preemptive=True} or to a host already remembered.
+"""
+
+import re
+import threading
+
+import requests
+from requests.auth import AuthBase
+from requests.cookies import extract_cookies_to_jar
+from requests.compat import urlparse
+
+import kerberos
+
+__all__ = [
+    "REQUIRED",
+    "OPTIONAL",
+    "DISABLED",
+    "NegotiateAuth",
+    "NegotiateError",
+    "MutualAuthenticationError",
+    "parse_challenge",
+]
+
+REQUIRED = 1
+OPTIONAL = 2
+DISABLED = 3
+
+_CHALLENGE = re.compile(
+    r"(?:^|,)\s*Negotiate(?:\s+([A-Za-z0-9+/=]+))?\s*(?:,|$)", re.IGNORECASE
+)
+
+
+
+class NegotiateError(requests.exceptions.RequestException):
+    """
+    A token for the server could not be created.
+    """
+
+
+
+class MutualAuthenticationError(requests.exceptions.RequestException):
+    """
+    The server did not prove its identity, so its response cannot be trusted.
+    """
+
+
+
+def parse_challenge(header):
+    """
+    Extract the Negotiate token from a C{WWW-Authenticate} header value, which
+    may offer several schemes.
+
+    @param header: The header value as a string, or C{None}.
+
+    @return: The base64-encoded token, C{""} if Negotiate is offered without a
+        token, or C{None} if it is not offered.
+    """
+    if not header:
+        return None
+    match = _CHALLENGE.search(header)
+    if match is None:
+        return None
+    return match.group(1) or ""
+
+
+
+class NegotiateAuth(AuthBase):
+    """
+    Authentication handler for C{requests} using HTTP Negotiate. One handler
+    may be shared by any number of sessions and threads.
+    """
+
+    def __init__(
+        self, service="HTTP", principal=None, credential=None,
+        mutual_authentication=REQUIRED, delegate=False, preemptive=False,
+        hostname_override=None, mech_oid=None
+    ):
+        """
+        @param service: The service type of the server principals, which are
+            named C{"service@hostname"}.
+
+        @param principal: Optional string containing the client principal, as
+            for L{kerberos.authGSSClientInit}.
+
+        @param credential: Optional L{kerberos.Credential} used for every
+            request, in place of C{principal}.
+
+        @param mutual_authentication: L{REQUIRED} to reject successful
+            responses that do not carry a valid mutual authentication token,
+            L{OPTIONAL} to only reject those carrying an invalid one, or
+            L{DISABLED} to not check.
+
+        @param delegate: Whether to delegate the client's credentials to the
+            server.
+
+        @param preemptive: Whether to send a token with the first request to a
+            host, before it has asked for one.
+
+        @param hostname_override: Optional host name to use in the server
+            principal instead of the one in the URL.
+
+        @param mech_oid: Optional GSSAPI mechanism, as for
+            L{kerberos.authGSSClientInit}.
+        """
+        self.service = service
+        self.principal = principal
+        self.credential = credential
+        self.mutual_authentication = mutual_authentication
+        self.preemptive = preemptive
+        self.hostname_override = hostname_override
+        self.mech_oid = mech_oid
+
+        self.gssflags = (
+            kerberos.GSS_C_MUTUAL_FLAG | kerberos.GSS_C_SEQUENCE_FLAG
+        )
+        if delegate:
+            self.gssflags |= kerberos.GSS_C_DELEG_FLAG
+
+        self._lock = threading.Lock()
+        self._names = {}
+        self._negotiate_origins = set()
+
+
+    def __call__(self, request):
+        if self.preemptive or self._requires_negotiate(request.url):
+            try:
+                self._authorize(request)
+            except NegotiateError:
+                # Let the server's challenge retry it, and report the error
+                pass
+        request.register_hook("response", self.handle_response)
+        return request
+
+
+    def handle_response(self, response, **kwargs):
+        """
+        Response hook: answers a Negotiate challenge, or checks the server's
+        mutual authentication token.
+
+        @return: The response to hand back to the caller.
+        """
+        context = getattr(response.request, "negotiate_context", None)
+
+        if response.status_code == 401:
+            token = parse_challenge(response.headers.get("www-authenticate"))
+            if token is not None:
+                self._remember(response.request.url)
+                if context is None:
+                    return self._retry(response, **kwargs)
+
+        if context is not None:
+            self._finish(response, context)
+        return response
+
+
+    def _name(self, url):
+        host = self.hostname_override or urlparse(url).hostname
+        with self._lock:
+            name = self._names.get(host)
+        if name is None:
+            try:
+                name = kerberos.Name("{}@{}".format(self.service, host))
+            except kerberos.GSSError as e:
+                raise NegotiateError(e)
+            with self._lock:
+                name = self._names.setdefault(host, name)
+        return name
+
+
+    def _origin(self, url):
+        parts = urlparse(url)
+        return parts.scheme, parts.hostname, parts.port
+
+
+    def _requires_negotiate(self, url):
+        with self._lock:
+            return self._origin(url) in self._negotiate_origins
+
+
+    def _remember(self, url):
+        with self._lock:
+            self._negotiate_origins.add(self._origin(url))
+
+
+    def _authorize(self, request):
+        """
+        Starts a context for request and adds its first token.
+        """
+        kwargs = {"gssflags": self.gssflags, "credential": self.credential}
+        if self.principal is not None:
+            kwargs["principal"] = self.principal
+        if self.mech_oid is not None:
+            kwargs["mech_oid"] = self.mech_oid
+
+        try:
+            context = kerberos.GSSClientContext(
+                self._name(request.url), **kwargs
+            )
+            context.step("")
+        except kerberos.GSSError as e:
+            raise NegotiateError(e)
+
+        request.headers["Authorization"] = "Negotiate " + context.response
+        request.negotiate_context = context
+
+
+    def _retry(self, response, **kwargs):
+        """
+        Sends the request again with a token, on the same connection.
+        """
+        response.content
+        response.raw.release_conn()
+
+        request = response.request.copy()
+        extract_cookies_to_jar(
+            request._cookies, response.request, response.raw
+        )
+        request.prepare_cookies(request._cookies)
+        self._authorize(request)
+
+        retry = response.connection.send(request, **kwargs)
+        retry.history.append(response)
+        retry.request = request
+
+        self._finish(retry, request.negotiate_context)
+        return retry
+
+
+    def _finish(self, response, context):
+        """
+        Checks the mutual authentication token of a response to a request
+        that carried a token, unless the token was refused.
+        """
+        try:
+            if (
+                response.status_code == 401 or
+                self.mutual_authentication == DISABLED
+            ):
+                return
+
+            token = parse_challenge(response.headers.get("www-authenticate"))
+            if token:
+                try:
+                    result = context.step(token)
+                except kerberos.GSSError as e:
+                    raise MutualAuthenticationError(
+                        "Invalid mutual authentication token: {}".format(e),
+                        response=response,
+                    )
+                if result != kerberos.AUTH_GSS_COMPLETE:
+                    raise MutualAuthenticationError(
+                        "Incomplete mutual authentication", response=response
+                    )
+            elif (
+                self.mutual_authentication == REQUIRED and
+                response.status_code < 400
+            ):
+                raise MutualAuthenticationError(
+                    "The server did not authenticate itself", response=response
+                )
+        finally:
+            context.close()
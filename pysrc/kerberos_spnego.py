@@ -0,0 +1,336 @@
+##
+# Copyright (c) 2026 Apple Inc. All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+##
+
+"""
+SPNEGO (HTTP Negotiate) authentication middleware for WSGI and ASGI
+applications, built on the server side GSSAPI functions of L{kerberos}.
+
+Requests without a valid C{Authorization: Negotiate} header are answered with
+C{401 Unauthorized} and a C{WWW-Authenticate: Negotiate} challenge. For
+authenticated requests the client principal is stored in the WSGI environ or
+ASGI scope under L{PRINCIPAL_KEY} (and, for WSGI, as C{REMOTE_USER}), and the
+server's mutual authentication token is added to the application's response
+as a C{WWW-Authenticate} header.
+
+The acceptor credentials for the service are acquired once, when the
+middleware is created, and shared by every request.
+
+Given a C{session_cookie} name, and with the session cache enabled by
+L{kerberos.enableSessionCache}, the middleware also issues a random session
+cookie after each successful handshake and remembers the client principal
+under it. Later requests carrying the cookie are authenticated by a lookup
+instead of another handshake, until the cache entry expires, which is never
+later than the client's ticket. Sessions are remembered per service, so a
+cookie issued by one middleware is not accepted by another protecting a
+different service in the same process. A request carrying both a token and the
+cookie is authenticated with the token, so that the client gets the mutual
+authentication token it expects.
+"""
+
+import secrets
+
+import kerberos
+
+__all__ = [
+    "PRINCIPAL_KEY",
+    "NegotiateMiddleware",
+    "NegotiateASGIMiddleware",
+    "parse_negotiate",
+]
+
+PRINCIPAL_KEY = "kerberos.principal"
+
+SESSION_COOKIE_ATTRIBUTES = "Path=/; Secure; HttpOnly; SameSite=Lax"
+
+_UNAUTHORIZED_BODY = b"Unauthorized"
+
+
+
+def parse_negotiate(header):
+    """
+    Extract the token from an C{Authorization} header value.
+
+    @param header: The header value as a string, or C{None}.
+
+    @return: The base64-encoded token, or C{None} if the header is missing or
+        does not use the Negotiate scheme.
+    """
+    if not header:
+        return None
+    scheme, _ignore, token = header.strip().partition(" ")
+    if scheme.lower() != "negotiate":
+        return None
+    return token.strip() or None
+
+
+
+def _challenge_value(token=None):
+    return "Negotiate " + token if token else "Negotiate"
+
+
+
+def _parse_cookie(header, name):
+    for pair in header.split(";"):
+        key, _ignore, value = pair.partition("=")
+        if key.strip() == name:
+            return value.strip() or None
+    return None
+
+
+
+class _Acceptor(object):
+    """
+    The shared acceptor credential and the server side of one handshake.
+    """
+
+    def __init__(self, service, session_cookie=None):
+        self.service = service
+        self.credential = kerberos.acquireServerCredential(service)
+        self.session_cookie = session_cookie
+        self.cookie_attributes = SESSION_COOKIE_ATTRIBUTES
+
+
+    def start(self):
+        return kerberos.authGSSServerInit(self.credential)[1]
+
+
+    def lookup_session(self, header):
+        """
+        @param header: The C{Cookie} header value as a string, or C{None}.
+
+        @return: The principal remembered for the session cookie, or C{None}.
+        """
+        if self.session_cookie is None or not header:
+            return None
+        session_id = _parse_cookie(header, self.session_cookie)
+        if session_id is None:
+            return None
+        return kerberos.authGSSServerLookupSession(session_id, self.service)
+
+
+    def finish(self, context, result, session=None):
+        """
+        @param session: The principal of the session cookie sent with the
+            request, if any. No new session is issued for the same principal.
+
+        @return: A tuple of (principal, token, cookie) where principal is
+            C{None} unless the handshake is complete, token is the response
+            token to send to the client, if any, and cookie is the
+            C{Set-Cookie} value for a new session, if one was remembered.
+        """
+        token = kerberos.authGSSServerResponse(context)
+        if result != kerberos.AUTH_GSS_COMPLETE:
+            return None, token, None
+
+        principal = kerberos.authGSSServerUserName(context)
+        cookie = None
+        if self.session_cookie is not None and session != principal:
+            session_id = secrets.token_urlsafe(32)
+            if kerberos.authGSSServerCacheSession(
+                context, session_id, self.service
+            ):
+                cookie = "{}={}; {}".format(
+                    self.session_cookie, session_id, self.cookie_attributes
+                )
+        return principal, token, cookie
+
+
+    def headers(self, token, cookie):
+        """
+        @return: The response headers carrying token and cookie.
+        """
+        headers = []
+        if token:
+            headers.append(("WWW-Authenticate", _challenge_value(token)))
+        if cookie:
+            headers.append(("Set-Cookie", cookie))
+        return headers
+
+
+
+class NegotiateMiddleware(object):
+    """
+    WSGI middleware requiring SPNEGO authentication for every request.
+    """
+
+    def __init__(self, app, service, session_cookie=None):
+        """
+        @param app: The WSGI application to protect.
+
+        @param service: The service principal to accept, in the form
+            C{"HTTP@fqdn"}, as for L{kerberos.acquireServerCredential}.
+
+        @param session_cookie: The name of the session cookie to issue, or
+            C{None} to authenticate every request with a handshake.
+        """
+        self.app = app
+        self.acceptor = _Acceptor(service, session_cookie)
+
+
+    def __call__(self, environ, start_response):
+        token = parse_negotiate(environ.get("HTTP_AUTHORIZATION"))
+        session = self.acceptor.lookup_session(environ.get("HTTP_COOKIE"))
+        if token is None:
+            if session is None:
+                return self.challenge(start_response)
+            environ[PRINCIPAL_KEY] = session
+            environ["REMOTE_USER"] = session
+            return self.app(environ, start_response)
+
+        context = self.acceptor.start()
+        try:
+            try:
+                result = kerberos.authGSSServerStep(context, token)
+            except kerberos.KrbError:
+                return self.challenge(start_response)
+            principal, response, cookie = self.acceptor.finish(
+                context, result, session
+            )
+        finally:
+            kerberos.authGSSServerClean(context)
+
+        if principal is None:
+            return self.challenge(start_response, response)
+
+        environ[PRINCIPAL_KEY] = principal
+        environ["REMOTE_USER"] = principal
+
+        extra_headers = self.acceptor.headers(response, cookie)
+        if not extra_headers:
+            return self.app(environ, start_response)
+
+        def start_response_with_token(status, headers, exc_info=None):
+            return start_response(
+                status, list(headers) + extra_headers, exc_info
+            )
+
+        return self.app(environ, start_response_with_token)
+
+
+    def challenge(self, start_response, token=None):
+        start_response("401 Unauthorized", [
+            ("WWW-Authenticate", _challenge_value(token)),
+            ("Content-Type", "text/plain"),
+            ("Content-Length", str(len(_UNAUTHORIZED_BODY))),
+        ])
+        return [_UNAUTHORIZED_BODY]
+
+
+
+class NegotiateASGIMiddleware(object):
+    """
+    ASGI middleware requiring SPNEGO authentication for every HTTP request and
+    WebSocket connection. Handshakes run on the L{kerberos.aio} worker pool,
+    so they do not block the event loop.
+    """
+
+    def __init__(self, app, service, session_cookie=None):
+        """
+        @param app: The ASGI application to protect.
+
+        @param service: The service principal to accept, in the form
+            C{"HTTP@fqdn"}, as for L{kerberos.acquireServerCredential}.
+
+        @param session_cookie: The name of the session cookie to issue, or
+            C{None} to authenticate every request with a handshake.
+        """
+        import kerberos.aio
+        self.aio = kerberos.aio
+        self.app = app
+        self.acceptor = _Acceptor(service, session_cookie)
+
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] not in ("http", "websocket"):
+            await self.app(scope, receive, send)
+            return
+
+        header = cookie_header = None
+        for name, value in scope.get("headers", ()):
+            name = name.lower()
+            if name == b"authorization":
+                header = value.decode("latin-1")
+            elif name == b"cookie":
+                cookie_header = value.decode("latin-1")
+
+        token = parse_negotiate(header)
+        session = self.acceptor.lookup_session(cookie_header)
+        if token is None and session is not None:
+            scope = dict(scope)
+            scope[PRINCIPAL_KEY] = session
+            await self.app(scope, receive, send)
+            return
+
+        principal = response = cookie = None
+        if token is not None:
+            context = self.acceptor.start()
+            try:
+                result = await self.aio.server_step(context, token)
+            except kerberos.KrbError:
+                result = None
+            # Not in a finally clause: if the step is cancelled it may still be
+            # running on a worker, which frees the context once it is done
+            if result is not None:
+                principal, response, cookie = self.acceptor.finish(
+                    context, result, session
+                )
+            kerberos.authGSSServerClean(context)
+
+        if principal is None:
+            await self.challenge(scope, send, response)
+            return
+
+        scope = dict(scope)
+        scope[PRINCIPAL_KEY] = principal
+
+        extra_headers = [
+            (name.lower().encode("ascii"), value.encode("latin-1"))
+            for name, value in self.acceptor.headers(response, cookie)
+        ]
+        if not extra_headers:
+            await self.app(scope, receive, send)
+            return
+
+        async def send_with_token(message):
+            if message["type"] == "http.response.start":
+                message = dict(message)
+                message["headers"] = (
+                    list(message.get("headers", ())) + extra_headers
+                )
+            await send(message)
+
+        await self.app(scope, receive, send_with_token)
+
+
+    async def challenge(self, scope, send, token=None):
+        if scope["type"] == "websocket":
+            # Closing before accepting makes the server refuse the upgrade
+            await send({"type": "websocket.close", "code": 1008})
+            return
+
+        await send({
+            "type": "http.response.start",
+            "status": 401,
+            "headers": [
+                (b"www-authenticate", _challenge_value(token).encode("ascii")),
+                (b"content-type", b"text/plain"),
+                (
+                    b"content-length",
+                    str(len(_UNAUTHORIZED_BODY)).encode("ascii"),
+                ),
+            ],
+        })
+        await send({"type": "http.response.body", "body": _UNAUTHORIZED_BODY})
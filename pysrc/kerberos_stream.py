@@ -0,0 +1,247 @@
+##
+# Copyright (c) 2026 Apple Inc. All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+##
+
+"""
+Streaming GSSAPI protection of large payloads, built on the in-place wrap and
+unwrap functions of L{kerberos}.
+
+L{wrap_stream} reads a payload from a file-like object or an iterable of
+bytes-like objects in chunks sized with C{authGSSClientWrapSizeLimit}, so
+that every token fits within the peer's limit, and yields one token per
+chunk. L{unwrap_stream} yields the messages back from those tokens. Only one
+chunk is held at a time, so memory use does not grow with the payload.
+
+Tokens do not carry their own length. L{write_frames} and L{read_frames}
+send them over a byte stream, such as a file or C{socket.makefile("rwb")},
+each preceded by its length as four big-endian bytes, as SASL does:
+
+    with open(path, "rb") as source:
+        write_frames(wrap_stream(context, source), connection)
+
+    for message in unwrap_stream(context, read_frames(connection)):
+        destination.write(message)
+
+The context may be a L{kerberos.GSSClientContext} or
+L{kerberos.GSSServerContext}, or a context returned by C{authGSSClientInit}
+or, with C{server=True}, C{authGSSServerInit}, once authentication is
+complete.
+"""
+
+import struct
+
+import kerberos
+
+__all__ = [
+    "DEFAULT_MAX_TOKEN_SIZE",
+    "wrap_stream",
+    "unwrap_stream",
+    "write_frames",
+    "read_frames",
+]
+
+DEFAULT_MAX_TOKEN_SIZE = 65536
+
+_LENGTH = struct.Struct(">I")
+
+
+
+def _functions(context, server):
+    if isinstance(context, kerberos.GSSServerContext):
+        server = True
+    elif isinstance(context, kerberos.GSSClientContext):
+        server = False
+
+    if server:
+        return (
+            kerberos.authGSSServerWrapSizeLimit,
+            kerberos.authGSSServerWrapIov,
+            kerberos.authGSSServerUnwrapIov,
+        )
+    return (
+        kerberos.authGSSClientWrapSizeLimit,
+        kerberos.authGSSClientWrapIov,
+        kerberos.authGSSClientUnwrapIov,
+    )
+
+
+
+def _chunks(source, size):
+    """
+    Yield bytes-like chunks of at most size bytes from source. A chunk may
+    share a buffer with the next one, so it must be used before asking for
+    the next.
+    """
+    readinto = getattr(source, "readinto", None)
+    if readinto is not None:
+        buffer = bytearray(size)
+        view = memoryview(buffer)
+        while True:
+            count = readinto(buffer)
+            if not count:
+                return
+            yield view[:count]
+
+    read = getattr(source, "read", None)
+    if read is not None:
+        while True:
+            chunk = read(size)
+            if not chunk:
+                return
+            yield chunk
+
+    pending = bytearray()
+    for data in source:
+        data = memoryview(data)
+        while len(data):
+            if not pending and len(data) >= size:
+                yield data[:size]
+                data = data[size:]
+                continue
+            needed = size - len(pending)
+            pending += data[:needed]
+            data = data[needed:]
+            if len(pending) == size:
+                yield pending
+                pending = bytearray()
+    if pending:
+        yield pending
+
+
+
+def wrap_stream(
+    context, source, protect=True, max_token_size=DEFAULT_MAX_TOKEN_SIZE,
+    server=False
+):
+    """
+    Wrap a payload in chunks, yielding one token per chunk.
+
+    @param context: The context to wrap with, as described above.
+
+    @param source: A binary file-like object with a C{readinto} or C{read}
+        method, or an iterable of bytes-like objects.
+
+    @param protect: If C{True}, provide confidentiality as well as integrity
+        protection.
+
+    @param max_token_size: The largest token, in bytes, the peer accepts.
+
+    @param server: C{True} if context was returned by C{authGSSServerInit}.
+
+    @return: A generator of bytes objects, each a raw token to deliver in
+        order.
+    """
+    size_limit, wrap, _ignore = _functions(context, server)
+    protect = int(bool(protect))
+
+    chunk_size = size_limit(context, max_token_size, protect)
+    if chunk_size < 1:
+        raise ValueError("max_token_size is too small to carry any data")
+
+    for chunk in _chunks(source, chunk_size):
+        yield wrap(context, chunk, protect)
+
+
+
+def unwrap_stream(context, tokens, protect=True, server=False):
+    """
+    Unwrap the tokens produced by L{wrap_stream}, yielding the messages.
+
+    @param context: The context to unwrap with, as described above.
+
+    @param tokens: An iterable of bytes-like objects, each a raw token, in the
+        order they were wrapped.
+
+    @param protect: If C{True}, raise C{ValueError} for a token that was not
+        encrypted.
+
+    @param server: C{True} if context was returned by C{authGSSServerInit}.
+
+    @return: A generator of bytes objects holding the payload.
+    """
+    unwrap = _functions(context, server)[2]
+
+    for token in tokens:
+        message, conf = unwrap(context, token)
+        if protect and not conf:
+            raise ValueError("Received a token without confidentiality")
+        yield message
+
+
+
+def write_frames(tokens, output):
+    """
+    Write each token to output preceded by its length.
+
+    @param tokens: An iterable of bytes-like objects.
+
+    @param output: A binary file-like object.
+
+    @return: The number of tokens written.
+    """
+    count = 0
+    for token in tokens:
+        output.write(_LENGTH.pack(len(token)))
+        output.write(token)
+        count += 1
+    return count
+
+
+
+def _read_exactly(source, length):
+    data = source.read(length)
+    if len(data) == length:
+        return data
+
+    chunks = [data]
+    remaining = length - len(data)
+    while remaining:
+        data = source.read(remaining)
+        if not data:
+            break
+        chunks.append(data)
+        remaining -= len(data)
+    return b"".join(chunks)
+
+
+
+def read_frames(source, max_token_size=DEFAULT_MAX_TOKEN_SIZE):
+    """
+    Read the tokens written by L{write_frames} until source is exhausted.
+
+    @param source: A binary file-like object.
+
+    @param max_token_size: The largest token, in bytes, to accept. A larger
+        length raises C{ValueError} before anything is allocated for it.
+
+    @return: A generator of bytes objects, each a raw token.
+    """
+    while True:
+        header = _read_exactly(source, _LENGTH.size)
+        if not header:
+            return
+        if len(header) < _LENGTH.size:
+            raise EOFError("Stream ended inside a frame length")
+
+        (length,) = _LENGTH.unpack(header)
+        if length > max_token_size:
+            raise ValueError(
+                "Frame of {} bytes exceeds max_token_size".format(length)
+            )
+
+        token = _read_exactly(source, length)
+        if len(token) < length:
+            raise EOFError("Stream ended inside a frame")
+        yield token
@@ -48,6 +48,7 @@ classifiers = [
     "Operating System :: OS Independent",
     "Programming Language :: Python :: 2",
     "Programming Language :: Python :: 3",
+    "Programming Language :: Python :: Free Threading :: 2 - Beta",
     "Topic :: Software Development :: Libraries :: Python Modules",
     "Topic :: System :: Systems Administration :: Authentication/Directory",
 ]
@@ -78,13 +79,26 @@ setup_requirements = []
 
 install_requirements = []
 
-extras_requirements = {}
+extras_requirements = {
+    # kerberos_requests
+    "requests": ["requests"],
+}
 
-extra_link_args = getoutput("krb5-config --libs gssapi").split()
+# libcrypto provides the hashes used to derive cache keys
+extra_link_args = getoutput("krb5-config --libs gssapi").split() + ["-lcrypto"]
 
 extra_compile_args = getoutput("krb5-config --cflags gssapi").split()
 
 
+#
+# Pure Python modules
+#
+
+package_dir = {"": "pysrc"}
+
+py_modules = ["kerberos_kdc", "kerberos_requests", "kerberos_spnego", "kerberos_stream"]
+
+
 #
 # Set up Extension modules that need to be built
 #
@@ -97,9 +111,19 @@ extensions = [
         sources=[
             "src/base64.c",
             "src/kerberos.c",
+            "src/kerberosaio.c",
             "src/kerberosbasic.c",
+            "src/kerberoscache.c",
+            "src/kerberoscontext.c",
             "src/kerberosgss.c",
+            "src/kerberoshash.c",
+            "src/kerberoskeytab.c",
+            "src/kerberosprofile.c",
             "src/kerberospw.c",
+            "src/kerberossession.c",
+            "src/kerberosstats.c",
+            "src/kerberostypes.c",
+            "src/kerberosworkers.c",
         ],
     ),
 ]
@@ -123,6 +147,8 @@ def doSetup():
         author_email=author_email,
         license=license,
         platforms=platforms,
+        package_dir=package_dir,
+        py_modules=py_modules,
         ext_modules=extensions,
         setup_requires=setup_requirements,
         install_requires=install_requirements,
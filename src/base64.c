@@ -17,23 +17,52 @@
 #include "base64.h"
 
 #include <stdlib.h>
-#include <string.h>
 
 // base64 tables
-static char basis_64[] =
+static const char basis_64[] =
     "ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789+/";
-static signed char index_64[128] =
+
+// Maps every byte to its 6-bit value, or XX if it is not in the alphabet. XX
+// has the top bit set so a whole quad can be validated with a single test.
+#define XX 0xff
+static const unsigned char index_64[256] =
 {
-    -1,-1,-1,-1, -1,-1,-1,-1, -1,-1,-1,-1, -1,-1,-1,-1,
-    -1,-1,-1,-1, -1,-1,-1,-1, -1,-1,-1,-1, -1,-1,-1,-1,
-    -1,-1,-1,-1, -1,-1,-1,-1, -1,-1,-1,62, -1,-1,-1,63,
-    52,53,54,55, 56,57,58,59, 60,61,-1,-1, -1,-1,-1,-1,
-    -1, 0, 1, 2,  3, 4, 5, 6,  7, 8, 9,10, 11,12,13,14,
-    15,16,17,18, 19,20,21,22, 23,24,25,-1, -1,-1,-1,-1,
-    -1,26,27,28, 29,30,31,32, 33,34,35,36, 37,38,39,40,
-    41,42,43,44, 45,46,47,48, 49,50,51,-1, -1,-1,-1,-1
+    XX,XX,XX,XX, XX,XX,XX,XX, XX,XX,XX,XX, XX,XX,XX,XX,
+    XX,XX,XX,XX, XX,XX,XX,XX, XX,XX,XX,XX, XX,XX,XX,XX,
+    XX,XX,XX,XX, XX,XX,XX,XX, XX,XX,XX,62, XX,XX,XX,63,
+    52,53,54,55, 56,57,58,59, 60,61,XX,XX, XX,XX,XX,XX,
+    XX, 0, 1, 2,  3, 4, 5, 6,  7, 8, 9,10, 11,12,13,14,
+    15,16,17,18, 19,20,21,22, 23,24,25,XX, XX,XX,XX,XX,
+    XX,26,27,28, 29,30,31,32, 33,34,35,36, 37,38,39,40,
+    41,42,43,44, 45,46,47,48, 49,50,51,XX, XX,XX,XX,XX,
+    XX,XX,XX,XX, XX,XX,XX,XX, XX,XX,XX,XX, XX,XX,XX,XX,
+    XX,XX,XX,XX, XX,XX,XX,XX, XX,XX,XX,XX, XX,XX,XX,XX,
+    XX,XX,XX,XX, XX,XX,XX,XX, XX,XX,XX,XX, XX,XX,XX,XX,
+    XX,XX,XX,XX, XX,XX,XX,XX, XX,XX,XX,XX, XX,XX,XX,XX,
+    XX,XX,XX,XX, XX,XX,XX,XX, XX,XX,XX,XX, XX,XX,XX,XX,
+    XX,XX,XX,XX, XX,XX,XX,XX, XX,XX,XX,XX, XX,XX,XX,XX,
+    XX,XX,XX,XX, XX,XX,XX,XX, XX,XX,XX,XX, XX,XX,XX,XX,
+    XX,XX,XX,XX, XX,XX,XX,XX, XX,XX,XX,XX, XX,XX,XX,XX
 };
-#define CHAR64(c)  (((c) < 0 || (c) > 127) ? -1 : index_64[(c)])
+#undef XX
+
+// base64_encoded_length    :    size of the encoding of vlen bytes
+//
+// vlen                     :    length of data
+// (result)                 :    number of characters, excluding the NUL
+size_t base64_encoded_length(size_t vlen)
+{
+    return ((vlen + 2) / 3) * 4;
+}
+
+// base64_decoded_length    :    upper bound on the size of a decoding
+//
+// vlen                     :    length of base64 data
+// (result)                 :    maximum number of bytes it decodes to
+size_t base64_decoded_length(size_t vlen)
+{
+    return (vlen / 4) * 3;
+}
 
 // base64_encode    :    base64 encode
 //
@@ -42,7 +71,7 @@ static signed char index_64[128] =
 // (result)         :    new char[] - c-str of result
 char *base64_encode(const unsigned char *value, size_t vlen)
 {
-    char *result = (char *)malloc((vlen * 4) / 3 + 5);
+    char *result = (char *)malloc(base64_encoded_length(vlen) + 1);
     if (result == NULL)
     {
         return NULL;
@@ -50,10 +79,13 @@ char *base64_encode(const unsigned char *value, size_t vlen)
     char *out = result;
     while (vlen >= 3)
     {
-        *out++ = basis_64[value[0] >> 2];
-        *out++ = basis_64[((value[0] << 4) & 0x30) | (value[1] >> 4)];
-        *out++ = basis_64[((value[1] << 2) & 0x3C) | (value[2] >> 6)];
-        *out++ = basis_64[value[2] & 0x3F];
+        unsigned long triple =
+            ((unsigned long)value[0] << 16) | (value[1] << 8) | value[2];
+        out[0] = basis_64[(triple >> 18) & 0x3F];
+        out[1] = basis_64[(triple >> 12) & 0x3F];
+        out[2] = basis_64[(triple >> 6) & 0x3F];
+        out[3] = basis_64[triple & 0x3F];
+        out += 4;
         value += 3;
         vlen -= 3;
     }
@@ -73,61 +105,87 @@ char *base64_encode(const unsigned char *value, size_t vlen)
 
 // base64_decode    :    base64 decode
 //
-// value            :    c-str to decode
+// value            :    base64 data to decode, need not be NUL terminated
+// vlen             :    length of value
+// out              :    buffer of at least base64_decoded_length(vlen) bytes,
+//                       which may be value itself to decode in place
 // rlen             :    length of decoded result
-// (result)         :    new unsigned char[] - decoded result
-unsigned char *base64_decode(const char *value, size_t *rlen)
+// (result)         :    BASE64_OK, or BASE64_INVALID if value is not strictly
+//                       valid padded base64 (the contents of out are then
+//                       undefined)
+int base64_decode(
+    const char *value, size_t vlen, unsigned char *out, size_t *rlen
+)
 {
-    *rlen = 0;
-    int c1, c2, c3, c4;
+    const unsigned char *in = (const unsigned char *)value;
+    unsigned char *start = out;
+    unsigned int c1, c2, c3, c4;
 
-    size_t vlen = strlen(value);
-    unsigned char *result =(unsigned char *)malloc((vlen * 3) / 4 + 1);
-    if (result == NULL)
+    *rlen = 0;
+    if (vlen % 4 != 0)
     {
-        return NULL;
+        return BASE64_INVALID;
+    }
+    if (vlen == 0)
+    {
+        return BASE64_OK;
     }
-    unsigned char *out = result;
 
-    while (1) {
-        if (value[0]==0) {
-            return result;
-        }
-        c1 = value[0];
-        if (CHAR64(c1) == -1) {
-            goto base64_decode_error;;
-        }
-        c2 = value[1];
-        if (CHAR64(c2) == -1) {
-            goto base64_decode_error;;
+    // All quads but the last are full, so the loop needs no padding checks.
+    // Writing three bytes while reading four never overtakes the input, which
+    // is what makes decoding in place safe.
+    const unsigned char *last = in + vlen - 4;
+    while (in < last)
+    {
+        c1 = index_64[in[0]];
+        c2 = index_64[in[1]];
+        c3 = index_64[in[2]];
+        c4 = index_64[in[3]];
+        if ((c1 | c2 | c3 | c4) & 0x80)
+        {
+            return BASE64_INVALID;
         }
-        c3 = value[2];
-        if ((c3 != '=') && (CHAR64(c3) == -1)) {
-            goto base64_decode_error;;
+        out[0] = (unsigned char)((c1 << 2) | (c2 >> 4));
+        out[1] = (unsigned char)((c2 << 4) | (c3 >> 2));
+        out[2] = (unsigned char)((c3 << 6) | c4);
+        out += 3;
+        in += 4;
+    }
+
+    // The last quad may end in "=" or "==".
+    c1 = index_64[in[0]];
+    c2 = index_64[in[1]];
+    if ((c1 | c2) & 0x80)
+    {
+        return BASE64_INVALID;
+    }
+    *out++ = (unsigned char)((c1 << 2) | (c2 >> 4));
+    if (in[2] == '=')
+    {
+        if (in[3] != '=')
+        {
+            return BASE64_INVALID;
         }
-        c4 = value[3];
-        if ((c4 != '=') && (CHAR64(c4) == -1)) {
-            goto base64_decode_error;;
+    }
+    else
+    {
+        c3 = index_64[in[2]];
+        if (c3 & 0x80)
+        {
+            return BASE64_INVALID;
         }
-
-        value += 4;
-        *out++ = (CHAR64(c1) << 2) | (CHAR64(c2) >> 4);
-        *rlen += 1;
-
-        if (c3 != '=') {
-            *out++ = ((CHAR64(c2) << 4) & 0xf0) | (CHAR64(c3) >> 2);
-            *rlen += 1;
-
-            if (c4 != '=') {
-                *out++ = ((CHAR64(c3) << 6) & 0xc0) | CHAR64(c4);
-                *rlen += 1;
+        *out++ = (unsigned char)((c2 << 4) | (c3 >> 2));
+        if (in[3] != '=')
+        {
+            c4 = index_64[in[3]];
+            if (c4 & 0x80)
+            {
+                return BASE64_INVALID;
             }
+            *out++ = (unsigned char)((c3 << 6) | c4);
         }
     }
 
-base64_decode_error:
-    *result = 0;
-    *rlen = 0;
-
-    return result;
+    *rlen = out - start;
+    return BASE64_OK;
 }
@@ -14,7 +14,19 @@
  * limitations under the License.
  **/
 
+#ifndef BASE64_H
+#define BASE64_H
+
 #include <stddef.h>
 
+#define BASE64_OK        0
+#define BASE64_INVALID  -1
+
+size_t base64_encoded_length(size_t vlen);
+size_t base64_decoded_length(size_t vlen);
 char *base64_encode(const unsigned char *value, size_t vlen);
-unsigned char *base64_decode(const char *value, size_t *rlen);
+int base64_decode(
+    const char *value, size_t vlen, unsigned char *out, size_t *rlen
+);
+
+#endif
@@ -19,6 +19,18 @@
 #include "kerberosbasic.h"
 #include "kerberospw.h"
 #include "kerberosgss.h"
+#include "kerberosmodule.h"
+#include "kerberostypes.h"
+#include "kerberoscontext.h"
+#include "kerberosprofile.h"
+#include "kerberoskeytab.h"
+#include "kerberosworkers.h"
+#include "kerberosaio.h"
+#include "kerberoscache.h"
+#include "kerberossession.h"
+#include "kerberosstats.h"
+
+#include <profile.h>
 
 
 /*
@@ -69,10 +81,69 @@ gss_OID_desc krb5_mech_oid = { 9, NULL };
 static align8 spnego_mech_oid_bytes = { { 0x2b, 0x06, 0x01, 0x05, 0x05, 0x02 } };
 gss_OID_desc spnego_mech_oid = { 6, NULL };
 
-PyObject *KrbException_class;
-PyObject *BasicAuthException_class;
-PyObject *PwdChangeException_class;
-PyObject *GssException_class;
+/*
+ * On Python 3.9 and later the module uses multi-phase initialization, so each
+ * interpreter that imports it gets its own module object and exception
+ * classes. The native code raising an exception finds them through the
+ * interpreter's state dict, which keeps the module alive until the
+ * interpreter is finalized. Earlier versions keep a single set.
+ */
+#if PY_VERSION_HEX >= 0x03090000
+    #define MULTI_PHASE_INIT 1
+    #define MODULE_STATE_KEY "kerberos.module"
+#else
+static kerberos_module_state legacy_state;
+#endif
+
+kerberos_module_state* get_module_state(void)
+{
+#ifdef MULTI_PHASE_INIT
+    static kerberos_module_state missing;
+    PyObject *interpreter_dict;
+    PyObject *module = NULL;
+    kerberos_module_state *state = NULL;
+
+    interpreter_dict = PyInterpreterState_GetDict(PyInterpreterState_Get());
+    if (interpreter_dict != NULL) {
+#if PY_VERSION_HEX >= 0x030d0000
+        if (PyDict_GetItemStringRef(
+            interpreter_dict, MODULE_STATE_KEY, &module
+        ) > 0) {
+            state = (kerberos_module_state *)PyModule_GetState(module);
+            // Still referenced by the interpreter's dict
+            Py_DECREF(module);
+        }
+#else
+        module = PyDict_GetItemString(interpreter_dict, MODULE_STATE_KEY);
+        if (module != NULL) {
+            state = (kerberos_module_state *)PyModule_GetState(module);
+        }
+#endif
+    }
+
+    if (state == NULL || state->KrbError == NULL) {
+        // Only while the interpreter is being torn down
+        missing.KrbError = PyExc_RuntimeError;
+        missing.BasicAuthError = PyExc_RuntimeError;
+        missing.PwdChangeError = PyExc_RuntimeError;
+        missing.GSSError = PyExc_RuntimeError;
+        state = &missing;
+    }
+
+    return state;
+#else
+    return &legacy_state;
+#endif
+}
+
+int is_main_interpreter(void)
+{
+#ifdef MULTI_PHASE_INIT
+    return PyInterpreterState_Get() == PyInterpreterState_Main();
+#else
+    return 1;
+#endif
+}
 
 static PyObject *checkPassword(PyObject *self, PyObject *args)
 {
@@ -95,6 +166,254 @@ static PyObject *checkPassword(PyObject *self, PyObject *args)
     }
 }
 
+/*
+ * Like PySequence_Fast, but always returns a new tuple. The strings parsed
+ * from its items then stay alive while the GIL is released, even when obj is
+ * a list that another thread changes meanwhile.
+ */
+static PyObject *sequence_snapshot(PyObject *obj, const char *message)
+{
+    PyObject *seq = PySequence_Tuple(obj);
+
+    if (seq == NULL && PyErr_ExceptionMatches(PyExc_TypeError)) {
+        PyErr_SetString(PyExc_TypeError, message);
+    }
+
+    return seq;
+}
+
+typedef struct {
+    const char        *user;
+    const char        *pswd;
+    const char        *service;
+    const char        *default_realm;
+    basicauth_result  result;
+} password_check;
+
+static void check_password_job(void *jobs, size_t index)
+{
+    password_check *check = &((password_check *)jobs)[index];
+
+    verify_user_krb5pwd(
+        check->user, check->pswd, check->service, check->default_realm,
+        &check->result
+    );
+}
+
+static PyObject *checkPasswords(PyObject *self, PyObject *args, PyObject* keywds)
+{
+    PyObject *pycredentials = NULL;
+    PyObject *seq = NULL;
+    PyObject *pyresult = NULL;
+    password_check *checks = NULL;
+    Py_ssize_t count = 0;
+    Py_ssize_t i;
+    int max_workers = 0;
+    static char *kwlist[] = {"credentials", "max_workers", NULL};
+
+    if (! PyArg_ParseTupleAndKeywords(
+        args, keywds, "O|i", kwlist, &pycredentials, &max_workers
+    )) {
+        return NULL;
+    }
+
+    seq = sequence_snapshot(
+        pycredentials, "Expected an iterable of credential tuples"
+    );
+    if (seq == NULL) {
+        return NULL;
+    }
+    count = PyTuple_GET_SIZE(seq);
+
+    checks = (password_check *) calloc(count ? count : 1, sizeof(password_check));
+    if (checks == NULL) {
+        PyErr_NoMemory();
+        goto end;
+    }
+
+    // The strings stay owned by the items in seq while the workers run
+    for (i = 0; i < count; i++) {
+        PyObject *item = PyTuple_GET_ITEM(seq, i);
+
+        if (! PyTuple_Check(item)) {
+            PyErr_SetString(
+                PyExc_TypeError,
+                "Expected a (user, pswd, service, default_realm) tuple"
+            );
+            goto end;
+        }
+        if (! PyArg_ParseTuple(
+            item, "ssss", &checks[i].user, &checks[i].pswd,
+            &checks[i].service, &checks[i].default_realm
+        )) {
+            goto end;
+        }
+    }
+
+    STATS_BEGIN_ALLOW_THREADS
+    run_worker_jobs(check_password_job, checks, count, max_workers);
+    STATS_END_ALLOW_THREADS
+
+    pyresult = PyList_New(count);
+    if (pyresult == NULL) {
+        goto end;
+    }
+
+    for (i = 0; i < count; i++) {
+        PyObject *item = NULL;
+
+        if (checks[i].result.status == BASICAUTH_OK) {
+            item = Py_True;
+            Py_INCREF(item);
+        } else {
+            PyObject *type, *value, *traceback;
+
+            set_basicauth_result_error(&checks[i].result);
+            PyErr_Fetch(&type, &value, &traceback);
+            PyErr_NormalizeException(&type, &value, &traceback);
+            Py_XDECREF(type);
+            Py_XDECREF(traceback);
+            item = value;
+        }
+
+        if (item == NULL) {
+            Py_CLEAR(pyresult);
+            goto end;
+        }
+        PyList_SET_ITEM(pyresult, i, item);
+    }
+
+end:
+    free(checks);
+    Py_DECREF(seq);
+
+    return pyresult;
+}
+
+typedef struct {
+    const char     *service;
+    gss_cred_id_t  creds;
+    double         elapsed;
+    OM_uint32      maj_stat;
+    OM_uint32      min_stat;
+} service_prewarm;
+
+static void prewarm_job(void *jobs, size_t index)
+{
+    service_prewarm *prewarm = &((service_prewarm *)jobs)[index];
+    double start = cache_now();
+
+    authenticate_gss_prewarm(
+        prewarm->service, prewarm->creds, &prewarm->maj_stat,
+        &prewarm->min_stat
+    );
+    prewarm->elapsed = cache_now() - start;
+}
+
+static PyObject *prewarmServiceTickets(PyObject *self, PyObject *args, PyObject* keywds)
+{
+    PyObject *pyspns = NULL;
+    PyObject *seq = NULL;
+    PyObject *pyresult = NULL;
+    service_prewarm *prewarms = NULL;
+    gss_cred_id_t creds = GSS_C_NO_CREDENTIAL;
+    const char *principal = NULL;
+    Py_ssize_t count = 0;
+    Py_ssize_t i;
+    OM_uint32 min_stat;
+    int max_workers = 0;
+    static char *kwlist[] = {"spns", "principal", "max_workers", NULL};
+
+    if (! PyArg_ParseTupleAndKeywords(
+        args, keywds, "O|zi", kwlist, &pyspns, &principal, &max_workers
+    )) {
+        return NULL;
+    }
+
+    seq = sequence_snapshot(pyspns, "Expected an iterable of service names");
+    if (seq == NULL) {
+        return NULL;
+    }
+    count = PyTuple_GET_SIZE(seq);
+
+    prewarms = (service_prewarm *) calloc(
+        count ? count : 1, sizeof(service_prewarm)
+    );
+    if (prewarms == NULL) {
+        PyErr_NoMemory();
+        goto end;
+    }
+
+    // The strings stay owned by the items in seq while the workers run
+    for (i = 0; i < count; i++) {
+        if (! PyArg_Parse(
+            PyTuple_GET_ITEM(seq, i), "s", &prewarms[i].service
+        )) {
+            goto end;
+        }
+    }
+
+    if (principal && *principal) {
+        if (authenticate_gss_acquire_initiator_creds(
+            principal, &creds
+        ) == AUTH_GSS_ERROR) {
+            goto end;
+        }
+    }
+    for (i = 0; i < count; i++) {
+        prewarms[i].creds = creds;
+    }
+
+    STATS_BEGIN_ALLOW_THREADS
+    run_worker_jobs(prewarm_job, prewarms, count, max_workers);
+    STATS_END_ALLOW_THREADS
+
+    pyresult = PyList_New(count);
+    if (pyresult == NULL) {
+        goto end;
+    }
+
+    for (i = 0; i < count; i++) {
+        PyObject *error = Py_None;
+        PyObject *item = NULL;
+
+        if (GSS_ERROR(prewarms[i].maj_stat)) {
+            PyObject *type, *traceback;
+
+            set_gss_status_error(prewarms[i].maj_stat, prewarms[i].min_stat);
+            PyErr_Fetch(&type, &error, &traceback);
+            PyErr_NormalizeException(&type, &error, &traceback);
+            Py_XDECREF(type);
+            Py_XDECREF(traceback);
+            if (error == NULL) {
+                Py_CLEAR(pyresult);
+                goto end;
+            }
+        } else {
+            Py_INCREF(error);
+        }
+
+        item = Py_BuildValue(
+            "(OdN)", PyTuple_GET_ITEM(seq, i), prewarms[i].elapsed,
+            error
+        );
+        if (item == NULL) {
+            Py_CLEAR(pyresult);
+            goto end;
+        }
+        PyList_SET_ITEM(pyresult, i, item);
+    }
+
+end:
+    if (creds != GSS_C_NO_CREDENTIAL) {
+        gss_release_cred(&min_stat, &creds);
+    }
+    free(prewarms);
+    Py_DECREF(seq);
+
+    return pyresult;
+}
+
 static PyObject *changePassword(PyObject *self, PyObject *args)
 {
     const char *newpswd = NULL;
@@ -136,481 +455,1767 @@ static PyObject *getServerPrincipalDetails(PyObject *self, PyObject *args)
     }
 }
 
-static void
-#if PY_VERSION_HEX >= 0x03020000
-destroy_gss_client(PyObject *obj) {
-    gss_client_state *state = PyCapsule_GetPointer(obj, NULL);
-#else
-destroy_gss_client(void *obj) {
-    gss_client_state *state = (gss_client_state *)obj;
-#endif
-    if (state) {
-        authenticate_gss_client_clean(state);
-        free(state);
+static PyObject *getServerPrincipalDetailsMany(PyObject *self, PyObject *args)
+{
+    PyObject *pairs = NULL;
+
+    if (! PyArg_ParseTuple(args, "O", &pairs)) {
+        return NULL;
     }
+
+    return server_principal_details_many(pairs);
 }
 
-static PyObject* authGSSClientInit(PyObject* self, PyObject* args, PyObject* keywds)
+static PyObject *getKeytabPrincipals(PyObject *self, PyObject *args)
 {
-    const char *service = NULL;
-    const char *principal = NULL;
-    gss_client_state *state = NULL;
-    PyObject *pystate = NULL;
-    gss_server_state *delegatestate = NULL;
-    PyObject *pydelegatestate = NULL;
-    gss_OID mech_oid = GSS_C_NO_OID;
-    PyObject *pymech_oid = NULL;
+    return keytab_principals();
+}
+
+static PyObject *enablePasswordCache(PyObject *self, PyObject *args, PyObject* keywds)
+{
+    Py_ssize_t max_entries = 1024;
+    double ttl = 300;
+    double negative_ttl = 1;
+    double max_negative_ttl = 30;
+    unsigned long work_factor = 512;
     static char *kwlist[] = {
-        "service", "principal", "gssflags", "delegated", "mech_oid", NULL
+        "max_entries", "ttl", "negative_ttl", "max_negative_ttl",
+        "work_factor", NULL
     };
-    long int gss_flags = GSS_C_MUTUAL_FLAG | GSS_C_SEQUENCE_FLAG;
-    int result = 0;
 
     if (! PyArg_ParseTupleAndKeywords(
-        args, keywds, "s|zlOO", kwlist,
-        &service, &principal, &gss_flags, &pydelegatestate, &pymech_oid
+        args, keywds, "|ndddk", kwlist, &max_entries, &ttl, &negative_ttl,
+        &max_negative_ttl, &work_factor
     )) {
         return NULL;
     }
 
-    state = (gss_client_state *) malloc(sizeof(gss_client_state));
-    if (state == NULL)
-    {
-        PyErr_NoMemory();
+    if (max_entries < 1) {
+        PyErr_SetString(PyExc_ValueError, "max_entries must be at least 1");
         return NULL;
     }
-    pystate = PyCObject_FromVoidPtr(state, &destroy_gss_client);
-    if (pystate == NULL) {
-        free(state);
+    if (ttl < 0 || negative_ttl < 0 || max_negative_ttl < negative_ttl) {
+        PyErr_SetString(
+            PyExc_ValueError,
+            "ttl and negative_ttl must not be negative, and max_negative_ttl "
+            "must not be less than negative_ttl"
+        );
         return NULL;
     }
-
-    if (pydelegatestate != NULL && PyCObject_Check(pydelegatestate)) {
-        delegatestate = (gss_server_state*)PyCObject_AsVoidPtr(pydelegatestate);
+    if (work_factor < 2 || (work_factor & (work_factor - 1)) != 0) {
+        PyErr_SetString(
+            PyExc_ValueError, "work_factor must be a power of two above 1"
+        );
+        return NULL;
     }
 
-    if (pymech_oid != NULL && PyCObject_Check(pymech_oid)) {
-        mech_oid = (gss_OID)PyCObject_AsVoidPtr(pymech_oid);
+    if (enable_password_cache(
+        max_entries, ttl, negative_ttl, max_negative_ttl, work_factor
+    ) != 0) {
+        return PyErr_SetFromErrno(PyExc_OSError);
     }
 
-    result = authenticate_gss_client_init(
-        service, principal, gss_flags, delegatestate, mech_oid, state
-    );
+    Py_RETURN_NONE;
+}
 
-    if (result == AUTH_GSS_ERROR) {
-        Py_DECREF(pystate);
-        return NULL;
-    }
+static PyObject *disablePasswordCache(PyObject *self, PyObject *args)
+{
+    disable_password_cache();
 
-    return Py_BuildValue("(iN)", result, pystate);
+    Py_RETURN_NONE;
 }
 
-static PyObject *authGSSClientClean(PyObject *self, PyObject *args)
+static PyObject *clearPasswordCache(PyObject *self, PyObject *args)
 {
-    return Py_BuildValue("i", AUTH_GSS_COMPLETE);
+    clear_password_cache();
+
+    Py_RETURN_NONE;
 }
 
-#if PY_VERSION_HEX >= 0x03020000
-void destruct_channel_bindings(PyObject* o) {
-    struct gss_channel_bindings_struct *channel_bindings = PyCapsule_GetPointer(o, NULL);
-#else
-void destruct_channel_bindings(void* o) {
-    struct gss_channel_bindings_struct *channel_bindings = (struct gss_channel_bindings_struct *)o;
-#endif
+static PyObject *getPasswordCacheStats(PyObject *self, PyObject *args)
+{
+    password_cache_stats stats;
 
-    if (channel_bindings != NULL) {
-        if (channel_bindings->initiator_address.value != NULL) {
-            PyMem_Free(channel_bindings->initiator_address.value);
-        }
+    get_password_cache_stats(&stats);
 
-        if (channel_bindings->acceptor_address.value != NULL) {
-            PyMem_Free(channel_bindings->acceptor_address.value);
-        }
+    return Py_BuildValue(
+        "{s:k,s:k,s:k,s:n}",
+        "hits", stats.hits,
+        "misses", stats.misses,
+        "negative_hits", stats.negative_hits,
+        "entries", (Py_ssize_t)stats.entries
+    );
+}
 
-        if (channel_bindings->application_data.value != NULL) {
-            PyMem_Free(channel_bindings->application_data.value);
-        }
+static PyObject *enableSessionCache(PyObject *self, PyObject *args, PyObject* keywds)
+{
+    Py_ssize_t max_entries = 4096;
+    double ttl = 300;
+    static char *kwlist[] = {"max_entries", "ttl", NULL};
 
-        free(channel_bindings);
+    if (! PyArg_ParseTupleAndKeywords(
+        args, keywds, "|nd", kwlist, &max_entries, &ttl
+    )) {
+        return NULL;
+    }
+
+    if (max_entries < 1) {
+        PyErr_SetString(PyExc_ValueError, "max_entries must be at least 1");
+        return NULL;
     }
+    if (ttl < 0) {
+        PyErr_SetString(PyExc_ValueError, "ttl must not be negative");
+        return NULL;
+    }
+
+    if (enable_session_cache(max_entries, ttl) != 0) {
+        return PyErr_SetFromErrno(PyExc_OSError);
+    }
+
+    Py_RETURN_NONE;
 }
 
-static PyObject *channelBindings(PyObject *self, PyObject *args, PyObject* keywds)
+static PyObject *disableSessionCache(PyObject *self, PyObject *args)
 {
-    int initiator_addrtype = GSS_C_AF_UNSPEC;
-    int acceptor_addrtype = GSS_C_AF_UNSPEC;
+    disable_session_cache();
 
-    const char *encoding = NULL;
-    char *initiator_address = NULL;
-    char *acceptor_address = NULL;
-    char *application_data = NULL;
-    int initiator_length = 0;
-    int acceptor_length = 0;
-    int application_length = 0;
+    Py_RETURN_NONE;
+}
 
-    PyObject *pychan_bindings = NULL;
-    struct gss_channel_bindings_struct *input_chan_bindings;
-    static char *kwlist[] = {"initiator_addrtype", "initiator_address", "acceptor_addrtype",
-        "acceptor_address", "application_data", NULL};
+static PyObject *clearSessionCache(PyObject *self, PyObject *args)
+{
+    clear_session_cache();
 
-    if (!PyArg_ParseTupleAndKeywords(args, keywds, "|iet#iet#et#", kwlist,
-            &initiator_addrtype, &encoding, &initiator_address, &initiator_length,
-            &acceptor_addrtype, &encoding, &acceptor_address, &acceptor_length,
-            &encoding, &application_data, &application_length)) {
-        return NULL;
-    }
+    Py_RETURN_NONE;
+}
 
-    input_chan_bindings = (struct gss_channel_bindings_struct *) malloc(sizeof(struct gss_channel_bindings_struct));
-    pychan_bindings = PyCObject_FromVoidPtr(input_chan_bindings, &destruct_channel_bindings);
+static PyObject *getSessionCacheStats(PyObject *self, PyObject *args)
+{
+    session_cache_stats stats;
+    unsigned long lookups;
+
+    get_session_cache_stats(&stats);
+    lookups = stats.hits + stats.misses;
+
+    return Py_BuildValue(
+        "{s:k,s:k,s:k,s:n,s:d}",
+        "hits", stats.hits,
+        "misses", stats.misses,
+        "stores", stats.stores,
+        "entries", (Py_ssize_t)stats.entries,
+        "hit_rate", lookups ? (double)stats.hits / lookups : 0.0
+    );
+}
 
-    input_chan_bindings->initiator_addrtype = initiator_addrtype;
-    input_chan_bindings->initiator_address.length = initiator_length;
-    input_chan_bindings->initiator_address.value = initiator_address;
+static PyObject *enableStats(PyObject *self, PyObject *args)
+{
+    enable_stats();
 
-    input_chan_bindings->acceptor_addrtype = acceptor_addrtype;
-    input_chan_bindings->acceptor_address.length = acceptor_length;
-    input_chan_bindings->acceptor_address.value = acceptor_address;
+    Py_RETURN_NONE;
+}
 
-    input_chan_bindings->application_data.length = application_length;
-    input_chan_bindings->application_data.value = application_data;
+static PyObject *disableStats(PyObject *self, PyObject *args)
+{
+    disable_stats();
 
-    return Py_BuildValue("N", pychan_bindings);
+    Py_RETURN_NONE;
 }
 
-static PyObject *authGSSClientStep(PyObject *self, PyObject *args, PyObject* keywds)
+static PyObject *resetStats(PyObject *self, PyObject *args)
 {
-    gss_client_state *state = NULL;
-    PyObject *pystate = NULL;
-    char *challenge = NULL;
-    PyObject *pychan_bindings = NULL;
-    struct gss_channel_bindings_struct *channel_bindings;
-    static char *kwlist[] = {"state", "challenge", "channel_bindings", NULL};
-    int result = 0;
+    reset_stats();
 
-    if (! PyArg_ParseTupleAndKeywords(args, keywds, "Os|O", kwlist, &pystate, &challenge, &pychan_bindings)) {
+    Py_RETURN_NONE;
+}
+
+static PyObject *getStats(PyObject *self, PyObject *args)
+{
+    return get_stats();
+}
+
+static PyObject *setTraceCallback(PyObject *self, PyObject *args)
+{
+    PyObject *callback = NULL;
+
+    if (! PyArg_ParseTuple(args, "O", &callback)) {
         return NULL;
     }
 
-    if (! PyCObject_Check(pystate)) {
-        PyErr_SetString(PyExc_TypeError, "Expected a context object");
+    if (! set_trace_callback(callback)) {
         return NULL;
     }
 
-    state = (gss_client_state *)PyCObject_AsVoidPtr(pystate);
+    Py_RETURN_NONE;
+}
 
+static PyObject *reloadConfig(PyObject *self, PyObject *args)
+{
+    reload_krb5_contexts();
+
+    Py_RETURN_NONE;
+}
+
+static PyObject *setConfig(PyObject *self, PyObject *args)
+{
+    PyObject *config = NULL;
+    profile_t profile = NULL;
+    krb5_error_code code;
+
+    if (! PyArg_ParseTuple(args, "O", &config)) {
+        return NULL;
+    }
+
+    if (config != Py_None) {
+        profile = profile_from_dict(config);
+        if (profile == NULL) {
+            return NULL;
+        }
+    }
+
+    // Creating a context to check the configuration may read files
+    Py_BEGIN_ALLOW_THREADS
+    code = set_krb5_profile(profile);
+    Py_END_ALLOW_THREADS
+
+    if (code) {
+        PyErr_SetObject(
+            KrbException_class,
+            Py_BuildValue(
+                "(s:s)", "Invalid Kerberos configuration",
+                krb5_get_err_text(NULL, code)
+            )
+        );
+        return NULL;
+    }
+
+    Py_RETURN_NONE;
+}
+
+static PyObject *getRealmKDCs(PyObject *self, PyObject *args)
+{
+    const char *realm = NULL;
+    char **kdcs = NULL;
+    krb5_error_code code;
+    PyObject *pyresult = NULL;
+    Py_ssize_t i;
+
+    if (! PyArg_ParseTuple(args, "s", &realm)) {
+        return NULL;
+    }
+
+    code = get_realm_kdcs(realm, &kdcs);
+    if (code) {
+        PyErr_SetObject(
+            KrbException_class,
+            Py_BuildValue(
+                "(s:s)", "Cannot read the KDCs of the realm",
+                krb5_get_err_text(NULL, code)
+            )
+        );
+        return NULL;
+    }
+
+    pyresult = PyList_New(0);
+    for (i = 0; pyresult != NULL && kdcs[i] != NULL; i++) {
+        PyObject *kdc = Py_BuildValue("s", kdcs[i]);
+
+        if (kdc == NULL || PyList_Append(pyresult, kdc) < 0) {
+            Py_CLEAR(pyresult);
+        }
+        Py_XDECREF(kdc);
+    }
+    profile_free_list(kdcs);
+
+    return pyresult;
+}
+
+static void
+#if PY_VERSION_HEX >= 0x03020000
+destroy_gss_client(PyObject *obj) {
+    gss_client_state *state = PyCapsule_GetPointer(obj, NULL);
+#else
+destroy_gss_client(void *obj) {
+    gss_client_state *state = (gss_client_state *)obj;
+#endif
+    if (state) {
+        authenticate_gss_client_clean(state);
+        free(state);
+    }
+}
+
+/*
+ * Returns the state behind a client context, either a capsule returned by
+ * authGSSClientInit or a GSSClientContext, or NULL with an exception set.
+ */
+static gss_client_state *get_client_state(PyObject *pystate)
+{
+    if (GSSClientContext_Check(pystate)) {
+        return &((gss_client_object *)pystate)->state;
+    }
+
+    if (! PyCObject_Check(pystate)) {
+        PyErr_SetString(PyExc_TypeError, "Expected a context object");
+        return NULL;
+    }
+
+    return (gss_client_state *)PyCObject_AsVoidPtr(pystate);
+}
+
+/*
+ * Returns the state behind a server context, either a capsule returned by
+ * authGSSServerInit or a GSSServerContext, or NULL with an exception set.
+ */
+static gss_server_state *get_server_state(PyObject *pystate)
+{
+    if (GSSServerContext_Check(pystate)) {
+        return &((gss_server_object *)pystate)->state;
+    }
+
+    if (! PyCObject_Check(pystate)) {
+        PyErr_SetString(PyExc_TypeError, "Expected a context object");
+        return NULL;
+    }
+
+    return (gss_server_state *)PyCObject_AsVoidPtr(pystate);
+}
+
+static PyObject* authGSSClientInit(PyObject* self, PyObject* args, PyObject* keywds)
+{
+    const char *service = NULL;
+    PyObject *pyservice = NULL;
+    gss_shared_cred *target = NULL;
+    const char *principal = NULL;
+    gss_shared_cred *credential = NULL;
+    PyObject *pycredential = NULL;
+    const char *ccache = NULL;
+    gss_client_state *state = NULL;
+    PyObject *pystate = NULL;
+    gss_server_state *delegatestate = NULL;
+    PyObject *pydelegatestate = NULL;
+    gss_OID mech_oid = GSS_C_NO_OID;
+    PyObject *pymech_oid = NULL;
+    static char *kwlist[] = {
+        "service", "principal", "gssflags", "delegated", "mech_oid",
+        "ccache", "credential", NULL
+    };
+    long int gss_flags = GSS_C_MUTUAL_FLAG | GSS_C_SEQUENCE_FLAG;
+    int result = 0;
+
+    if (! PyArg_ParseTupleAndKeywords(
+        args, keywds, "O|zlOOzO", kwlist,
+        &pyservice, &principal, &gss_flags, &pydelegatestate, &pymech_oid,
+        &ccache, &pycredential
+    )) {
+        return NULL;
+    }
+
+    if (! get_client_handles(
+        pyservice, pycredential, &service, &target, &credential
+    )) {
+        return NULL;
+    }
+
+    state = (gss_client_state *) malloc(sizeof(gss_client_state));
+    if (state == NULL)
+    {
+        PyErr_NoMemory();
+        return NULL;
+    }
+    pystate = PyCObject_FromVoidPtr(state, &destroy_gss_client);
+    if (pystate == NULL) {
+        free(state);
+        return NULL;
+    }
+
+    if (pydelegatestate != NULL && GSSServerContext_Check(pydelegatestate)) {
+        delegatestate = &((gss_server_object *)pydelegatestate)->state;
+    } else if (pydelegatestate != NULL && PyCObject_Check(pydelegatestate)) {
+        delegatestate = (gss_server_state*)PyCObject_AsVoidPtr(pydelegatestate);
+    }
+
+    if (pymech_oid != NULL && PyCObject_Check(pymech_oid)) {
+        mech_oid = (gss_OID)PyCObject_AsVoidPtr(pymech_oid);
+    }
+
+    result = authenticate_gss_client_init(
+        service, target, principal, credential, ccache, gss_flags,
+        delegatestate, mech_oid, state
+    );
+
+    if (result == AUTH_GSS_ERROR) {
+        Py_DECREF(pystate);
+        return NULL;
+    }
+
+    return Py_BuildValue("(iN)", result, pystate);
+}
+
+static PyObject *authGSSClientClean(PyObject *self, PyObject *args)
+{
+    return Py_BuildValue("i", AUTH_GSS_COMPLETE);
+}
+
+#if PY_VERSION_HEX >= 0x03020000
+void destruct_channel_bindings(PyObject* o) {
+    struct gss_channel_bindings_struct *channel_bindings = PyCapsule_GetPointer(o, NULL);
+#else
+void destruct_channel_bindings(void* o) {
+    struct gss_channel_bindings_struct *channel_bindings = (struct gss_channel_bindings_struct *)o;
+#endif
+
+    if (channel_bindings != NULL) {
+        if (channel_bindings->initiator_address.value != NULL) {
+            PyMem_Free(channel_bindings->initiator_address.value);
+        }
+
+        if (channel_bindings->acceptor_address.value != NULL) {
+            PyMem_Free(channel_bindings->acceptor_address.value);
+        }
+
+        if (channel_bindings->application_data.value != NULL) {
+            PyMem_Free(channel_bindings->application_data.value);
+        }
+
+        free(channel_bindings);
+    }
+}
+
+static PyObject *channelBindings(PyObject *self, PyObject *args, PyObject* keywds)
+{
+    int initiator_addrtype = GSS_C_AF_UNSPEC;
+    int acceptor_addrtype = GSS_C_AF_UNSPEC;
+
+    const char *encoding = NULL;
+    char *initiator_address = NULL;
+    char *acceptor_address = NULL;
+    char *application_data = NULL;
+    int initiator_length = 0;
+    int acceptor_length = 0;
+    int application_length = 0;
+
+    PyObject *pychan_bindings = NULL;
+    struct gss_channel_bindings_struct *input_chan_bindings;
+    static char *kwlist[] = {"initiator_addrtype", "initiator_address", "acceptor_addrtype",
+        "acceptor_address", "application_data", NULL};
+
+    if (!PyArg_ParseTupleAndKeywords(args, keywds, "|iet#iet#et#", kwlist,
+            &initiator_addrtype, &encoding, &initiator_address, &initiator_length,
+            &acceptor_addrtype, &encoding, &acceptor_address, &acceptor_length,
+            &encoding, &application_data, &application_length)) {
+        return NULL;
+    }
+
+    input_chan_bindings = (struct gss_channel_bindings_struct *) malloc(sizeof(struct gss_channel_bindings_struct));
+    pychan_bindings = PyCObject_FromVoidPtr(input_chan_bindings, &destruct_channel_bindings);
+
+    input_chan_bindings->initiator_addrtype = initiator_addrtype;
+    input_chan_bindings->initiator_address.length = initiator_length;
+    input_chan_bindings->initiator_address.value = initiator_address;
+
+    input_chan_bindings->acceptor_addrtype = acceptor_addrtype;
+    input_chan_bindings->acceptor_address.length = acceptor_length;
+    input_chan_bindings->acceptor_address.value = acceptor_address;
+
+    input_chan_bindings->application_data.length = application_length;
+    input_chan_bindings->application_data.value = application_data;
+
+    return Py_BuildValue("N", pychan_bindings);
+}
+
+static PyObject *authGSSClientStep(PyObject *self, PyObject *args, PyObject* keywds)
+{
+    gss_client_state *state = NULL;
+    PyObject *pystate = NULL;
+    char *challenge = NULL;
+    PyObject *pychan_bindings = NULL;
+    struct gss_channel_bindings_struct *channel_bindings;
+    static char *kwlist[] = {"state", "challenge", "channel_bindings", NULL};
+    int result = 0;
+
+    if (! PyArg_ParseTupleAndKeywords(args, keywds, "Os|O", kwlist, &pystate, &challenge, &pychan_bindings)) {
+        return NULL;
+    }
+
+    state = get_client_state(pystate);
+
+    if (state == NULL) {
+        return NULL;
+    }
+
+    if (pychan_bindings == NULL) {
+        channel_bindings = GSS_C_NO_CHANNEL_BINDINGS;
+    } else {
+        if (!PyCObject_Check(pychan_bindings)) {
+            PyErr_SetString(PyExc_TypeError, "Expected a gss_channel_bindings_struct object");
+            return NULL;
+        }
+        channel_bindings = (struct gss_channel_bindings_struct *)PyCObject_AsVoidPtr(pychan_bindings);
+    }
+
+    if (! lock_context(pystate)) {
+        return NULL;
+    }
+    result = authenticate_gss_client_step(state, challenge, channel_bindings);
+    unlock_context(pystate);
+
+    if (result == AUTH_GSS_ERROR) {
+        return NULL;
+    }
+
+    return Py_BuildValue("i", result);
+}
+
+/*
+ * Turns a raw token produced by GSSAPI into a bytes object and releases the
+ * GSSAPI buffer.
+ */
+static PyObject *token_to_bytes(gss_buffer_t token)
+{
+    OM_uint32 min_stat;
+    PyObject *pytoken = PyBytes_FromStringAndSize(
+        (const char *)token->value, token->length
+    );
+
+    if (token->value) {
+        gss_release_buffer(&min_stat, token);
+    }
+
+    return pytoken;
+}
+
+/*
+ * Points token at the contents of a bytes-like object without copying them.
+ * The buffer must be released with PyBuffer_Release once token is unused.
+ */
+static int token_from_buffer(PyObject *obj, Py_buffer *view, gss_buffer_t token)
+{
+    if (PyObject_GetBuffer(obj, view, PyBUF_SIMPLE) != 0) {
+        return 0;
+    }
+
+    token->value = view->buf;
+    token->length = view->len;
+
+    return 1;
+}
+
+static PyObject *authGSSClientStepRaw(PyObject *self, PyObject *args, PyObject* keywds)
+{
+    gss_client_state *state = NULL;
+    PyObject *pystate = NULL;
+    PyObject *pytoken = Py_None;
+    PyObject *pychan_bindings = NULL;
+    struct gss_channel_bindings_struct *channel_bindings;
+    static char *kwlist[] = {"state", "token", "channel_bindings", NULL};
+    Py_buffer view;
+    gss_buffer_desc input_token = GSS_C_EMPTY_BUFFER;
+    gss_buffer_desc output_token = GSS_C_EMPTY_BUFFER;
+    int result = 0;
+
+    if (! PyArg_ParseTupleAndKeywords(args, keywds, "O|OO", kwlist, &pystate, &pytoken, &pychan_bindings)) {
+        return NULL;
+    }
+
+    state = get_client_state(pystate);
+
+    if (state == NULL) {
+        return NULL;
+    }
+
+    if (pychan_bindings == NULL) {
+        channel_bindings = GSS_C_NO_CHANNEL_BINDINGS;
+    } else {
+        if (!PyCObject_Check(pychan_bindings)) {
+            PyErr_SetString(PyExc_TypeError, "Expected a gss_channel_bindings_struct object");
+            return NULL;
+        }
+        channel_bindings = (struct gss_channel_bindings_struct *)PyCObject_AsVoidPtr(pychan_bindings);
+    }
+
+    if (pytoken != Py_None && ! token_from_buffer(pytoken, &view, &input_token)) {
+        return NULL;
+    }
+
+    if (! lock_context(pystate)) {
+        if (pytoken != Py_None) {
+            PyBuffer_Release(&view);
+        }
+        return NULL;
+    }
+    result = authenticate_gss_client_step_token(
+        state, &input_token, channel_bindings, &output_token
+    );
+    unlock_context(pystate);
+
+    if (pytoken != Py_None) {
+        PyBuffer_Release(&view);
+    }
+
+    if (result == AUTH_GSS_ERROR) {
+        return NULL;
+    }
+
+    return Py_BuildValue("(iN)", result, token_to_bytes(&output_token));
+}
+
+static PyObject *authGSSClientResponseConf(PyObject *self, PyObject *args)
+{
+    gss_client_state *state = NULL;
+    PyObject *pystate = NULL;
+
+    if (! PyArg_ParseTuple(args, "O", &pystate)) {
+        return NULL;
+    }
+
+    state = get_client_state(pystate);
+
+    if (state == NULL) {
+        return NULL;
+    }
+
+    return Py_BuildValue("i", state->responseConf);
+}
+
+static PyObject *authGSSServerHasDelegated(PyObject *self, PyObject *args)
+{
+    gss_server_state *state = NULL;
+    PyObject *pystate = NULL;
+
+    if (! PyArg_ParseTuple(args, "O", &pystate)) {
+        return NULL;
+    }
+
+    state = get_server_state(pystate);
+
+    if (state == NULL) {
+        return NULL;
+    }
+
+    return PyBool_FromLong(authenticate_gss_server_has_delegated(state));
+}
+
+static PyObject *authGSSClientResponse(PyObject *self, PyObject *args)
+{
+    gss_client_state *state = NULL;
+    PyObject *pystate = NULL;
+
+    if (! PyArg_ParseTuple(args, "O", &pystate)) {
+        return NULL;
+    }
+
+    state = get_client_state(pystate);
+
+    if (state == NULL) {
+        return NULL;
+    }
+
+    return client_string(pystate, state, authenticate_gss_client_response);
+}
+
+static PyObject *authGSSClientUserName(PyObject *self, PyObject *args)
+{
+    gss_client_state *state = NULL;
+    PyObject *pystate = NULL;
+
+    if (! PyArg_ParseTuple(args, "O", &pystate)) {
+        return NULL;
+    }
+
+    state = get_client_state(pystate);
+
+    if (state == NULL) {
+        return NULL;
+    }
+
+    return client_string(pystate, state, authenticate_gss_client_username);
+}
+
+static PyObject *authGSSClientUnwrap(PyObject *self, PyObject *args)
+{
+	gss_client_state *state = NULL;
+	PyObject *pystate = NULL;
+	char *challenge = NULL;
+	int result = 0;
+
+	if (! PyArg_ParseTuple(args, "Os", &pystate, &challenge)) {
+		return NULL;
+    }
+
+	state = get_client_state(pystate);
+
+	if (state == NULL) {
+		return NULL;
+    }
+
+	if (! lock_context(pystate)) {
+		return NULL;
+	}
+	result = authenticate_gss_client_unwrap(state, challenge);
+	unlock_context(pystate);
+
+	if (result == AUTH_GSS_ERROR) {
+		return NULL;
+    }
+
+	return Py_BuildValue("i", result);
+}
+
+static PyObject *authGSSClientWrap(PyObject *self, PyObject *args)
+{
+	gss_client_state *state = NULL;
+	PyObject *pystate = NULL;
+	char *challenge = NULL;
+	char *user = NULL;
+	int protect = 0;
+	int result = 0;
+
+	if (! PyArg_ParseTuple(
+        args, "Os|zi", &pystate, &challenge, &user, &protect
+    )) {
+		return NULL;
+    }
+
+	state = get_client_state(pystate);
+
+	if (state == NULL) {
+		return NULL;
+    }
+
+	if (! lock_context(pystate)) {
+		return NULL;
+	}
+	result = authenticate_gss_client_wrap(state, challenge, user, protect);
+	unlock_context(pystate);
+
+	if (result == AUTH_GSS_ERROR) {
+		return NULL;
+    }
+
+	return Py_BuildValue("i", result);
+}
+
+static PyObject *authGSSClientUnwrapRaw(PyObject *self, PyObject *args)
+{
+    gss_client_state *state = NULL;
+    PyObject *pystate = NULL;
+    PyObject *pydata = NULL;
+    Py_buffer view;
+    gss_buffer_desc input_token = GSS_C_EMPTY_BUFFER;
+    gss_buffer_desc output_token = GSS_C_EMPTY_BUFFER;
+    int conf = 0;
+    int result = 0;
+
+    if (! PyArg_ParseTuple(args, "OO", &pystate, &pydata)) {
+        return NULL;
+    }
+
+    state = get_client_state(pystate);
+
+    if (state == NULL) {
+        return NULL;
+    }
+
+    if (! token_from_buffer(pydata, &view, &input_token)) {
+        return NULL;
+    }
+
+    if (! lock_context(pystate)) {
+        PyBuffer_Release(&view);
+        return NULL;
+    }
+    result = authenticate_gss_unwrap_token(
+        state->context, &input_token, &output_token, &conf
+    );
+    unlock_context(pystate);
+
+    PyBuffer_Release(&view);
+
+    if (result == AUTH_GSS_ERROR) {
+        return NULL;
+    }
+
+    state->responseConf = conf;
+
+    return token_to_bytes(&output_token);
+}
+
+static PyObject *authGSSClientWrapRaw(PyObject *self, PyObject *args)
+{
+    gss_client_state *state = NULL;
+    PyObject *pystate = NULL;
+    PyObject *pydata = NULL;
+    Py_buffer view;
+    gss_buffer_desc input_token = GSS_C_EMPTY_BUFFER;
+    gss_buffer_desc output_token = GSS_C_EMPTY_BUFFER;
+    int protect = 0;
+    int result = 0;
+
+    if (! PyArg_ParseTuple(args, "OO|i", &pystate, &pydata, &protect)) {
+        return NULL;
+    }
+
+    state = get_client_state(pystate);
+
+    if (state == NULL) {
+        return NULL;
+    }
+
+    if (! token_from_buffer(pydata, &view, &input_token)) {
+        return NULL;
+    }
+
+    if (! lock_context(pystate)) {
+        PyBuffer_Release(&view);
+        return NULL;
+    }
+    result = authenticate_gss_wrap_token(
+        state->context, &input_token, protect, &output_token
+    );
+    unlock_context(pystate);
+
+    PyBuffer_Release(&view);
+
+    if (result == AUTH_GSS_ERROR) {
+        return NULL;
+    }
+
+    return token_to_bytes(&output_token);
+}
+
+/*
+ * Wraps or unwraps every bytes-like object in pymessages on the client
+ * context, releasing the GIL once for the whole batch. Returns a list holding,
+ * for each message, the wrapped bytes (or a (bytes, conf) tuple when
+ * unwrapping), or the GSSError instance if that message failed.
+ */
+static PyObject *process_client_messages(
+    PyObject *pystate, gss_client_state *state, PyObject *pymessages,
+    int protect, int unwrap
+)
+{
+    PyObject *seq = NULL;
+    PyObject *pyresult = NULL;
+    gss_message *messages = NULL;
+    Py_buffer *views = NULL;
+    Py_ssize_t count = 0;
+    Py_ssize_t acquired = 0;
+    Py_ssize_t i;
+
+    seq = PySequence_Fast(pymessages, "Expected an iterable of messages");
+    if (seq == NULL) {
+        return NULL;
+    }
+    count = PySequence_Fast_GET_SIZE(seq);
+
+    messages = (gss_message *) calloc(count ? count : 1, sizeof(gss_message));
+    views = (Py_buffer *) calloc(count ? count : 1, sizeof(Py_buffer));
+    if (messages == NULL || views == NULL) {
+        PyErr_NoMemory();
+        goto end;
+    }
+
+    // The buffers stay locked by views while the GIL is released
+    for (acquired = 0; acquired < count; acquired++) {
+        if (! token_from_buffer(
+            PySequence_Fast_GET_ITEM(seq, acquired), &views[acquired],
+            &messages[acquired].input
+        )) {
+            goto end;
+        }
+    }
+
+    if (! lock_context(pystate)) {
+        goto end;
+    }
+    STATS_BEGIN_ALLOW_THREADS
+    if (unwrap) {
+        authenticate_gss_unwrap_many(state->context, messages, count);
+    } else {
+        authenticate_gss_wrap_many(state->context, messages, count, protect);
+    }
+    STATS_END_ALLOW_THREADS
+    unlock_context(pystate);
+
+    pyresult = PyList_New(count);
+    if (pyresult == NULL) {
+        goto end;
+    }
+
+    for (i = 0; i < count; i++) {
+        gss_message *message = &messages[i];
+        PyObject *item = NULL;
+
+        if (message->maj_stat == GSS_S_COMPLETE) {
+            if (unwrap) {
+                state->responseConf = message->conf;
+                item = Py_BuildValue(
+                    "(Ni)", token_to_bytes(&message->output), message->conf
+                );
+            } else {
+                item = token_to_bytes(&message->output);
+            }
+        } else {
+            PyObject *type, *value, *traceback;
+
+            set_gss_status_error(message->maj_stat, message->min_stat);
+            PyErr_Fetch(&type, &value, &traceback);
+            PyErr_NormalizeException(&type, &value, &traceback);
+            Py_XDECREF(type);
+            Py_XDECREF(traceback);
+            item = value;
+        }
+
+        if (item == NULL) {
+            Py_CLEAR(pyresult);
+            goto end;
+        }
+        PyList_SET_ITEM(pyresult, i, item);
+    }
+
+end:
+    if (messages != NULL) {
+        OM_uint32 min_stat;
+
+        // Only outputs not already handed to token_to_bytes remain
+        for (i = 0; i < count; i++) {
+            if (messages[i].output.value) {
+                gss_release_buffer(&min_stat, &messages[i].output);
+            }
+        }
+    }
+    for (i = 0; i < acquired; i++) {
+        PyBuffer_Release(&views[i]);
+    }
+    free(views);
+    free(messages);
+    Py_DECREF(seq);
+
+    return pyresult;
+}
+
+static PyObject *authGSSClientWrapMany(PyObject *self, PyObject *args)
+{
+    gss_client_state *state = NULL;
+    PyObject *pystate = NULL;
+    PyObject *pymessages = NULL;
+    int protect = 0;
+
+    if (! PyArg_ParseTuple(args, "OO|i", &pystate, &pymessages, &protect)) {
+        return NULL;
+    }
+
+    state = get_client_state(pystate);
+
+    if (state == NULL) {
+        return NULL;
+    }
+
+    return process_client_messages(pystate, state, pymessages, protect, 0);
+}
+
+static PyObject *authGSSClientUnwrapMany(PyObject *self, PyObject *args)
+{
+    gss_client_state *state = NULL;
+    PyObject *pystate = NULL;
+    PyObject *pymessages = NULL;
+
+    if (! PyArg_ParseTuple(args, "OO", &pystate, &pymessages)) {
+        return NULL;
+    }
+
+    state = get_client_state(pystate);
+
+    if (state == NULL) {
+        return NULL;
+    }
+
+    return process_client_messages(pystate, state, pymessages, 0, 1);
+}
+
+/*
+ * Parses a max_token_size argument, which must fit a GSS-API length.
+ */
+static int max_token_size_from_ssize(Py_ssize_t max_token_size, OM_uint32 *out)
+{
+    if (max_token_size < 1 || (size_t) max_token_size > 0xffffffffUL) {
+        PyErr_SetString(
+            PyExc_ValueError, "max_token_size must be between 1 and 2**32 - 1"
+        );
+        return 0;
+    }
+
+    *out = (OM_uint32) max_token_size;
+
+    return 1;
+}
+
+/*
+ * Returns the largest message that wraps into a token of at most max_output
+ * bytes on *context.
+ */
+static PyObject *wrap_size_limit(
+    PyObject *pystate, gss_ctx_id_t *context, OM_uint32 max_output,
+    int protect
+)
+{
+    OM_uint32 max_input = 0;
+    int result = 0;
+
+    if (! lock_context(pystate)) {
+        return NULL;
+    }
+    result = authenticate_gss_wrap_size_limit(
+        *context, protect, max_output, &max_input
+    );
+    unlock_context(pystate);
+
+    if (result == AUTH_GSS_ERROR) {
+        return NULL;
+    }
+
+    return Py_BuildValue("k", (unsigned long) max_input);
+}
+
+/*
+ * Wraps the bytes-like pydata on *context into a single new bytes object,
+ * encrypting in place so the message is copied only once. The GIL is
+ * released while the message is copied and wrapped.
+ */
+static PyObject *wrap_frame(
+    PyObject *pystate, gss_ctx_id_t *context, PyObject *pydata, int protect
+)
+{
+    gss_iov_buffer_desc iov[GSS_FRAME_BUFFERS];
+    PyObject *pyframe = NULL;
+    Py_buffer view;
+    OM_uint32 maj_stat = 0;
+    OM_uint32 min_stat = 0;
+    size_t length = 0;
+    char *position;
+    int i;
+
+    if (PyObject_GetBuffer(pydata, &view, PyBUF_SIMPLE) != 0) {
+        return NULL;
+    }
+
+    if (! lock_context(pystate)) {
+        PyBuffer_Release(&view);
+        return NULL;
+    }
+
+    if (authenticate_gss_wrap_iov_length(
+        *context, protect, view.len, iov
+    ) == AUTH_GSS_ERROR) {
+        goto end;
+    }
+
+    for (i = 0; i < GSS_FRAME_BUFFERS; i++) {
+        length += iov[i].buffer.length;
+    }
+
+    pyframe = PyBytes_FromStringAndSize(NULL, length);
+    if (pyframe == NULL) {
+        goto end;
+    }
+
+    position = PyBytes_AS_STRING(pyframe);
+    for (i = 0; i < GSS_FRAME_BUFFERS; i++) {
+        iov[i].buffer.value = position;
+        position += iov[i].buffer.length;
+    }
+
+    STATS_BEGIN_ALLOW_THREADS
+    memcpy(iov[GSS_FRAME_DATA].buffer.value, view.buf, view.len);
+    authenticate_gss_wrap_iov(*context, protect, iov, &maj_stat, &min_stat);
+    STATS_END_ALLOW_THREADS
+
+    if (GSS_ERROR(maj_stat)) {
+        set_gss_status_error(maj_stat, min_stat);
+        Py_CLEAR(pyframe);
+    }
+
+end:
+    unlock_context(pystate);
+    PyBuffer_Release(&view);
+
+    return pyframe;
+}
+
+/*
+ * Unwraps the token pydata on *context into a new bytes object, decrypting
+ * in place so the token is copied only once. Sets conf to whether the
+ * message was encrypted. The GIL is released while the token is copied and
+ * unwrapped.
+ */
+static PyObject *unwrap_frame(
+    PyObject *pystate, gss_ctx_id_t *context, PyObject *pydata, int *conf
+)
+{
+    PyObject *pymessage = NULL;
+    Py_buffer view;
+    gss_buffer_desc stream = GSS_C_EMPTY_BUFFER;
+    gss_buffer_desc data = GSS_C_EMPTY_BUFFER;
+    int data_allocated = 0;
+    OM_uint32 maj_stat = 0;
+    OM_uint32 min_stat = 0;
+
+    if (PyObject_GetBuffer(pydata, &view, PyBUF_SIMPLE) != 0) {
+        return NULL;
+    }
+
+    pymessage = PyBytes_FromStringAndSize(NULL, view.len);
+    if (pymessage == NULL) {
+        PyBuffer_Release(&view);
+        return NULL;
+    }
+    stream.value = PyBytes_AS_STRING(pymessage);
+    stream.length = view.len;
+
+    if (! lock_context(pystate)) {
+        Py_DECREF(pymessage);
+        PyBuffer_Release(&view);
+        return NULL;
+    }
+    STATS_BEGIN_ALLOW_THREADS
+    memcpy(stream.value, view.buf, view.len);
+    authenticate_gss_unwrap_iov(
+        *context, &stream, &data, &data_allocated, conf, &maj_stat, &min_stat
+    );
+    if (! GSS_ERROR(maj_stat)) {
+        // The message is never longer than the token that carried it
+        if (data.length) {
+            memmove(stream.value, data.value, data.length);
+        }
+        if (data_allocated) {
+            OM_uint32 ignored;
+            gss_release_buffer(&ignored, &data);
+        }
+    }
+    STATS_END_ALLOW_THREADS
+    unlock_context(pystate);
+
+    PyBuffer_Release(&view);
+
+    if (GSS_ERROR(maj_stat)) {
+        set_gss_status_error(maj_stat, min_stat);
+        Py_DECREF(pymessage);
+        return NULL;
+    }
+
+    if (_PyBytes_Resize(&pymessage, data.length) != 0) {
+        return NULL;
+    }
+
+    return pymessage;
+}
+
+static PyObject *authGSSClientWrapSizeLimit(PyObject *self, PyObject *args)
+{
+    gss_client_state *state = NULL;
+    PyObject *pystate = NULL;
+    Py_ssize_t max_token_size = 0;
+    OM_uint32 max_output = 0;
+    int protect = 0;
+
+    if (! PyArg_ParseTuple(
+        args, "On|i", &pystate, &max_token_size, &protect
+    )) {
+        return NULL;
+    }
+
+    state = get_client_state(pystate);
+
+    if (state == NULL) {
+        return NULL;
+    }
+
+    if (! max_token_size_from_ssize(max_token_size, &max_output)) {
+        return NULL;
+    }
+
+    return wrap_size_limit(pystate, &state->context, max_output, protect);
+}
+
+static PyObject *authGSSClientWrapIov(PyObject *self, PyObject *args)
+{
+    gss_client_state *state = NULL;
+    PyObject *pystate = NULL;
+    PyObject *pydata = NULL;
+    int protect = 0;
+
+    if (! PyArg_ParseTuple(args, "OO|i", &pystate, &pydata, &protect)) {
+        return NULL;
+    }
+
+    state = get_client_state(pystate);
+
+    if (state == NULL) {
+        return NULL;
+    }
+
+    return wrap_frame(pystate, &state->context, pydata, protect);
+}
+
+static PyObject *authGSSClientUnwrapIov(PyObject *self, PyObject *args)
+{
+    gss_client_state *state = NULL;
+    PyObject *pystate = NULL;
+    PyObject *pydata = NULL;
+    PyObject *pymessage = NULL;
+    int conf = 0;
+
+    if (! PyArg_ParseTuple(args, "OO", &pystate, &pydata)) {
+        return NULL;
+    }
+
+    state = get_client_state(pystate);
+
+    if (state == NULL) {
+        return NULL;
+    }
+
+    pymessage = unwrap_frame(pystate, &state->context, pydata, &conf);
+    if (pymessage == NULL) {
+        return NULL;
+    }
+
+    state->responseConf = conf;
+
+    return Py_BuildValue("(Ni)", pymessage, conf);
+}
+
+static PyObject *authGSSClientExportContext(PyObject *self, PyObject *args)
+{
+    gss_client_state *state = NULL;
+    PyObject *pystate = NULL;
+    gss_buffer_desc token = GSS_C_EMPTY_BUFFER;
+    int result = 0;
+
+    if (! PyArg_ParseTuple(args, "O", &pystate)) {
+        return NULL;
+    }
+
+    state = get_client_state(pystate);
+
+    if (state == NULL) {
+        return NULL;
+    }
+
+    if (! lock_context(pystate)) {
+        return NULL;
+    }
+    result = authenticate_gss_client_export(state, &token);
+    unlock_context(pystate);
+
+    if (result == AUTH_GSS_ERROR) {
+        return NULL;
+    }
+
+    return token_to_bytes(&token);
+}
+
+static PyObject *authGSSClientImportContext(PyObject *self, PyObject *args)
+{
+    gss_client_state *state = NULL;
+    PyObject *pystate = NULL;
+    PyObject *pytoken = NULL;
+    Py_buffer view;
+    gss_buffer_desc token = GSS_C_EMPTY_BUFFER;
+    int result = 0;
+
+    if (! PyArg_ParseTuple(args, "O", &pytoken)) {
+        return NULL;
+    }
+
+    if (! token_from_buffer(pytoken, &view, &token)) {
+        return NULL;
+    }
+
+    state = (gss_client_state *) malloc(sizeof(gss_client_state));
+    if (state == NULL)
+    {
+        PyBuffer_Release(&view);
+        PyErr_NoMemory();
+        return NULL;
+    }
+    pystate = PyCObject_FromVoidPtr(state, &destroy_gss_client);
+    if (pystate == NULL) {
+        PyBuffer_Release(&view);
+        free(state);
+        return NULL;
+    }
+
+    result = authenticate_gss_client_import(&token, state);
+    PyBuffer_Release(&view);
+
+    if (result == AUTH_GSS_ERROR) {
+        Py_DECREF(pystate);
+        return NULL;
+    }
+
+    return Py_BuildValue("(iN)", result, pystate);
+}
+
+static PyObject *authGSSClientInquireCred(PyObject *self, PyObject *args)
+{
+    gss_client_state *state = NULL;
+    PyObject *pystate = NULL;
+    int result = 0;
+    if (!PyArg_ParseTuple(args, "O", &pystate)) {
+        return NULL;
+    }
+
+    state = get_client_state(pystate);
     if (state == NULL) {
         return NULL;
     }
 
-    if (pychan_bindings == NULL) {
-        channel_bindings = GSS_C_NO_CHANNEL_BINDINGS;
-    } else {
-        if (!PyCObject_Check(pychan_bindings)) {
-            PyErr_SetString(PyExc_TypeError, "Expected a gss_channel_bindings_struct object");
-            return NULL;
-        }
-        channel_bindings = (struct gss_channel_bindings_struct *)PyCObject_AsVoidPtr(pychan_bindings);
+    if (! lock_context(pystate)) {
+        return NULL;
+    }
+    result = authenticate_gss_client_inquire_cred(state);
+    unlock_context(pystate);
+    if (result == AUTH_GSS_ERROR) {
+        return NULL;
+    }
+
+    return Py_BuildValue("i", result);
+}
+
+static void
+#if PY_VERSION_HEX >= 0x03020000
+destroy_gss_server(PyObject *obj) {
+    gss_server_state *state = PyCapsule_GetPointer(obj, NULL);
+#else
+destroy_gss_server(void *obj) {
+    gss_server_state *state = (gss_server_state *)obj;
+#endif
+    if (state) {
+        authenticate_gss_server_clean(state);
+        free(state);
+    }
+}
+
+static void
+#if PY_VERSION_HEX >= 0x03020000
+destroy_server_credential(PyObject *obj) {
+    gss_server_credential *credential = PyCapsule_GetPointer(
+        obj, SERVER_CREDENTIAL_CAPSULE
+    );
+#else
+destroy_server_credential(void *obj, void *desc) {
+    gss_server_credential *credential = (gss_server_credential *)obj;
+#endif
+    if (credential) {
+        free_server_credential(credential);
     }
+}
 
-    result = authenticate_gss_client_step(state, challenge, channel_bindings);
+static PyObject *acquireServerCredential(PyObject *self, PyObject *args)
+{
+    const char *service = NULL;
+    gss_server_credential *credential = NULL;
+    PyObject *pycredential = NULL;
 
-    if (result == AUTH_GSS_ERROR) {
+    if (! PyArg_ParseTuple(args, "s", &service)) {
         return NULL;
     }
 
-    return Py_BuildValue("i", result);
+    credential = acquire_server_credential(service);
+    if (credential == NULL) {
+        return NULL;
+    }
+
+#if PY_VERSION_HEX >= 0x03020000
+    pycredential = PyCapsule_New(
+        credential, SERVER_CREDENTIAL_CAPSULE, &destroy_server_credential
+    );
+#else
+    pycredential = PyCObject_FromVoidPtrAndDesc(
+        credential, (void *)server_credential_desc, &destroy_server_credential
+    );
+#endif
+    if (pycredential == NULL) {
+        free_server_credential(credential);
+        return NULL;
+    }
+
+    return pycredential;
 }
 
-static PyObject *authGSSClientResponseConf(PyObject *self, PyObject *args)
+static PyObject *authGSSServerInit(PyObject *self, PyObject *args)
 {
-    gss_client_state *state = NULL;
+    const char *service = NULL;
+    PyObject *pyservice = NULL;
+    gss_server_credential *credential = NULL;
+    gss_server_state *state = NULL;
     PyObject *pystate = NULL;
+    int result = 0;
 
-    if (! PyArg_ParseTuple(args, "O", &pystate)) {
+    if (! PyArg_ParseTuple(args, "O", &pyservice)) {
         return NULL;
     }
 
-    if (! PyCObject_Check(pystate)) {
-        PyErr_SetString(PyExc_TypeError, "Expected a context object");
+    if (! get_server_service(pyservice, &service, &credential)) {
+        return NULL;
+    }
+
+    state = (gss_server_state *) malloc(sizeof(gss_server_state));
+    if (state == NULL)
+    {
+        PyErr_NoMemory();
+        return NULL;
+    }
+    pystate = PyCObject_FromVoidPtr(state, &destroy_gss_server);
+    if (pystate == NULL) {
+        free(state);
         return NULL;
     }
 
-    state = (gss_client_state *)PyCObject_AsVoidPtr(pystate);
+    result = authenticate_gss_server_init(service, credential, state);
 
-    if (state == NULL) {
+    if (result == AUTH_GSS_ERROR) {
+        Py_DECREF(pystate);
         return NULL;
     }
 
-    return Py_BuildValue("i", state->responseConf);
+    return Py_BuildValue("(iN)", result, pystate);
 }
 
-static PyObject *authGSSServerHasDelegated(PyObject *self, PyObject *args)
+static PyObject *authGSSServerClean(PyObject *self, PyObject *args)
+{
+    return Py_BuildValue("i", AUTH_GSS_COMPLETE);
+}
+
+static PyObject *authGSSServerStep(PyObject *self, PyObject *args)
 {
     gss_server_state *state = NULL;
     PyObject *pystate = NULL;
+    char *challenge = NULL;
+    int result = 0;
 
-    if (! PyArg_ParseTuple(args, "O", &pystate)) {
+    if (! PyArg_ParseTuple(args, "Os", &pystate, &challenge)) {
         return NULL;
     }
 
-    if (! PyCObject_Check(pystate)) {
-        PyErr_SetString(PyExc_TypeError, "Expected a context object");
+    state = get_server_state(pystate);
+
+    if (state == NULL) {
         return NULL;
     }
 
-    state = (gss_server_state *)PyCObject_AsVoidPtr(pystate);
+    if (! lock_context(pystate)) {
+        return NULL;
+    }
+    result = authenticate_gss_server_step(state, challenge);
+    unlock_context(pystate);
 
-    if (state == NULL) {
+    if (result == AUTH_GSS_ERROR) {
         return NULL;
     }
 
-    return PyBool_FromLong(authenticate_gss_server_has_delegated(state));
+    return Py_BuildValue("i", result);
 }
 
-static PyObject *authGSSClientResponse(PyObject *self, PyObject *args)
+static PyObject *authGSSServerStepRaw(PyObject *self, PyObject *args)
 {
-    gss_client_state *state = NULL;
+    gss_server_state *state = NULL;
     PyObject *pystate = NULL;
+    PyObject *pytoken = NULL;
+    Py_buffer view;
+    gss_buffer_desc input_token = GSS_C_EMPTY_BUFFER;
+    gss_buffer_desc output_token = GSS_C_EMPTY_BUFFER;
+    int result = 0;
 
-    if (! PyArg_ParseTuple(args, "O", &pystate)) {
+    if (! PyArg_ParseTuple(args, "OO", &pystate, &pytoken)) {
         return NULL;
     }
 
-    if (! PyCObject_Check(pystate)) {
-        PyErr_SetString(PyExc_TypeError, "Expected a context object");
+    state = get_server_state(pystate);
+
+    if (state == NULL) {
         return NULL;
     }
 
-    state = (gss_client_state *)PyCObject_AsVoidPtr(pystate);
+    if (! token_from_buffer(pytoken, &view, &input_token)) {
+        return NULL;
+    }
 
-    if (state == NULL) {
+    if (! lock_context(pystate)) {
+        PyBuffer_Release(&view);
+        return NULL;
+    }
+    result = authenticate_gss_server_step_token(
+        state, &input_token, &output_token
+    );
+    unlock_context(pystate);
+
+    PyBuffer_Release(&view);
+
+    if (result == AUTH_GSS_ERROR) {
         return NULL;
     }
 
-    return Py_BuildValue("s", state->response);
+    return Py_BuildValue("(iN)", result, token_to_bytes(&output_token));
 }
 
-static PyObject *authGSSClientUserName(PyObject *self, PyObject *args)
+static PyObject *authGSSServerWrapRaw(PyObject *self, PyObject *args)
 {
-    gss_client_state *state = NULL;
+    gss_server_state *state = NULL;
     PyObject *pystate = NULL;
+    PyObject *pydata = NULL;
+    Py_buffer view;
+    gss_buffer_desc input_token = GSS_C_EMPTY_BUFFER;
+    gss_buffer_desc output_token = GSS_C_EMPTY_BUFFER;
+    int protect = 0;
+    int result = 0;
 
-    if (! PyArg_ParseTuple(args, "O", &pystate)) {
+    if (! PyArg_ParseTuple(args, "OO|i", &pystate, &pydata, &protect)) {
         return NULL;
     }
 
-    if (! PyCObject_Check(pystate)) {
-        PyErr_SetString(PyExc_TypeError, "Expected a context object");
+    state = get_server_state(pystate);
+
+    if (state == NULL) {
         return NULL;
     }
 
-    state = (gss_client_state *)PyCObject_AsVoidPtr(pystate);
+    if (! token_from_buffer(pydata, &view, &input_token)) {
+        return NULL;
+    }
 
-    if (state == NULL) {
+    if (! lock_context(pystate)) {
+        PyBuffer_Release(&view);
+        return NULL;
+    }
+    result = authenticate_gss_wrap_token(
+        state->context, &input_token, protect, &output_token
+    );
+    unlock_context(pystate);
+
+    PyBuffer_Release(&view);
+
+    if (result == AUTH_GSS_ERROR) {
         return NULL;
     }
 
-    return Py_BuildValue("s", state->username);
+    return token_to_bytes(&output_token);
 }
 
-static PyObject *authGSSClientUnwrap(PyObject *self, PyObject *args)
+static PyObject *authGSSServerUnwrapRaw(PyObject *self, PyObject *args)
 {
-	gss_client_state *state = NULL;
-	PyObject *pystate = NULL;
-	char *challenge = NULL;
-	int result = 0;
+    gss_server_state *state = NULL;
+    PyObject *pystate = NULL;
+    PyObject *pydata = NULL;
+    Py_buffer view;
+    gss_buffer_desc input_token = GSS_C_EMPTY_BUFFER;
+    gss_buffer_desc output_token = GSS_C_EMPTY_BUFFER;
+    int conf = 0;
+    int result = 0;
 
-	if (! PyArg_ParseTuple(args, "Os", &pystate, &challenge)) {
-		return NULL;
+    if (! PyArg_ParseTuple(args, "OO", &pystate, &pydata)) {
+        return NULL;
     }
 
-	if (! PyCObject_Check(pystate)) {
-		PyErr_SetString(PyExc_TypeError, "Expected a context object");
-		return NULL;
-	}
+    state = get_server_state(pystate);
 
-	state = (gss_client_state *)PyCObject_AsVoidPtr(pystate);
+    if (state == NULL) {
+        return NULL;
+    }
 
-	if (state == NULL) {
-		return NULL;
+    if (! token_from_buffer(pydata, &view, &input_token)) {
+        return NULL;
     }
 
-	result = authenticate_gss_client_unwrap(state, challenge);
+    if (! lock_context(pystate)) {
+        PyBuffer_Release(&view);
+        return NULL;
+    }
+    result = authenticate_gss_unwrap_token(
+        state->context, &input_token, &output_token, &conf
+    );
+    unlock_context(pystate);
 
-	if (result == AUTH_GSS_ERROR) {
-		return NULL;
+    PyBuffer_Release(&view);
+
+    if (result == AUTH_GSS_ERROR) {
+        return NULL;
     }
 
-	return Py_BuildValue("i", result);
+    return Py_BuildValue("(Ni)", token_to_bytes(&output_token), conf);
 }
 
-static PyObject *authGSSClientWrap(PyObject *self, PyObject *args)
+static PyObject *authGSSServerWrapSizeLimit(PyObject *self, PyObject *args)
 {
-	gss_client_state *state = NULL;
-	PyObject *pystate = NULL;
-	char *challenge = NULL;
-	char *user = NULL;
-	int protect = 0;
-	int result = 0;
+    gss_server_state *state = NULL;
+    PyObject *pystate = NULL;
+    Py_ssize_t max_token_size = 0;
+    OM_uint32 max_output = 0;
+    int protect = 0;
 
-	if (! PyArg_ParseTuple(
-        args, "Os|zi", &pystate, &challenge, &user, &protect
+    if (! PyArg_ParseTuple(
+        args, "On|i", &pystate, &max_token_size, &protect
     )) {
-		return NULL;
+        return NULL;
     }
 
-	if (! PyCObject_Check(pystate)) {
-		PyErr_SetString(PyExc_TypeError, "Expected a context object");
-		return NULL;
-	}
+    state = get_server_state(pystate);
 
-	state = (gss_client_state *)PyCObject_AsVoidPtr(pystate);
-
-	if (state == NULL) {
-		return NULL;
+    if (state == NULL) {
+        return NULL;
     }
 
-	result = authenticate_gss_client_wrap(state, challenge, user, protect);
-
-	if (result == AUTH_GSS_ERROR) {
-		return NULL;
+    if (! max_token_size_from_ssize(max_token_size, &max_output)) {
+        return NULL;
     }
 
-	return Py_BuildValue("i", result);
+    return wrap_size_limit(pystate, &state->context, max_output, protect);
 }
 
-static PyObject *authGSSClientInquireCred(PyObject *self, PyObject *args)
+static PyObject *authGSSServerWrapIov(PyObject *self, PyObject *args)
 {
-    gss_client_state *state = NULL;
+    gss_server_state *state = NULL;
     PyObject *pystate = NULL;
-    int result = 0;
-    if (!PyArg_ParseTuple(args, "O", &pystate)) {
-        return NULL;
-    }
+    PyObject *pydata = NULL;
+    int protect = 0;
 
-    if (!PyCObject_Check(pystate)) {
-        PyErr_SetString(PyExc_TypeError, "Expected a context object");
+    if (! PyArg_ParseTuple(args, "OO|i", &pystate, &pydata, &protect)) {
         return NULL;
     }
 
-    state = (gss_client_state *)PyCObject_AsVoidPtr(pystate);
+    state = get_server_state(pystate);
+
     if (state == NULL) {
         return NULL;
     }
 
-    result = authenticate_gss_client_inquire_cred(state);
-    if (result == AUTH_GSS_ERROR) {
+    return wrap_frame(pystate, &state->context, pydata, protect);
+}
+
+static PyObject *authGSSServerUnwrapIov(PyObject *self, PyObject *args)
+{
+    gss_server_state *state = NULL;
+    PyObject *pystate = NULL;
+    PyObject *pydata = NULL;
+    PyObject *pymessage = NULL;
+    int conf = 0;
+
+    if (! PyArg_ParseTuple(args, "OO", &pystate, &pydata)) {
         return NULL;
     }
 
-    return Py_BuildValue("i", result);
-}
+    state = get_server_state(pystate);
 
-static void
-#if PY_VERSION_HEX >= 0x03020000
-destroy_gss_server(PyObject *obj) {
-    gss_server_state *state = PyCapsule_GetPointer(obj, NULL);
-#else
-destroy_gss_server(void *obj) {
-    gss_server_state *state = (gss_server_state *)obj;
-#endif
-    if (state) {
-        authenticate_gss_server_clean(state);
-        free(state);
+    if (state == NULL) {
+        return NULL;
+    }
+
+    pymessage = unwrap_frame(pystate, &state->context, pydata, &conf);
+    if (pymessage == NULL) {
+        return NULL;
     }
+
+    return Py_BuildValue("(Ni)", pymessage, conf);
 }
 
-static PyObject *authGSSServerInit(PyObject *self, PyObject *args)
+static PyObject *authGSSServerExportContext(PyObject *self, PyObject *args)
 {
-    const char *service = NULL;
     gss_server_state *state = NULL;
     PyObject *pystate = NULL;
+    gss_buffer_desc token = GSS_C_EMPTY_BUFFER;
     int result = 0;
 
-    if (! PyArg_ParseTuple(args, "s", &service)) {
+    if (! PyArg_ParseTuple(args, "O", &pystate)) {
         return NULL;
     }
 
-    state = (gss_server_state *) malloc(sizeof(gss_server_state));
-    if (state == NULL)
-    {
-        PyErr_NoMemory();
+    state = get_server_state(pystate);
+
+    if (state == NULL) {
         return NULL;
     }
-    pystate = PyCObject_FromVoidPtr(state, &destroy_gss_server);
-    if (pystate == NULL) {
-        free(state);
+
+    if (! lock_context(pystate)) {
         return NULL;
     }
-
-    result = authenticate_gss_server_init(service, state);
+    result = authenticate_gss_server_export(state, &token);
+    unlock_context(pystate);
 
     if (result == AUTH_GSS_ERROR) {
-        Py_DECREF(pystate);
         return NULL;
     }
 
-    return Py_BuildValue("(iN)", result, pystate);
-}
-
-static PyObject *authGSSServerClean(PyObject *self, PyObject *args)
-{
-    return Py_BuildValue("i", AUTH_GSS_COMPLETE);
+    return token_to_bytes(&token);
 }
 
-static PyObject *authGSSServerStep(PyObject *self, PyObject *args)
+static PyObject *authGSSServerImportContext(PyObject *self, PyObject *args)
 {
     gss_server_state *state = NULL;
     PyObject *pystate = NULL;
-    char *challenge = NULL;
+    PyObject *pytoken = NULL;
+    Py_buffer view;
+    gss_buffer_desc token = GSS_C_EMPTY_BUFFER;
     int result = 0;
 
-    if (! PyArg_ParseTuple(args, "Os", &pystate, &challenge)) {
+    if (! PyArg_ParseTuple(args, "O", &pytoken)) {
         return NULL;
     }
 
-    if (! PyCObject_Check(pystate)) {
-        PyErr_SetString(PyExc_TypeError, "Expected a context object");
+    if (! token_from_buffer(pytoken, &view, &token)) {
         return NULL;
     }
 
-    state = (gss_server_state *)PyCObject_AsVoidPtr(pystate);
-
-    if (state == NULL) {
+    state = (gss_server_state *) malloc(sizeof(gss_server_state));
+    if (state == NULL)
+    {
+        PyBuffer_Release(&view);
+        PyErr_NoMemory();
+        return NULL;
+    }
+    pystate = PyCObject_FromVoidPtr(state, &destroy_gss_server);
+    if (pystate == NULL) {
+        PyBuffer_Release(&view);
+        free(state);
         return NULL;
     }
 
-    result = authenticate_gss_server_step(state, challenge);
+    result = authenticate_gss_server_import(&token, state);
+    PyBuffer_Release(&view);
 
     if (result == AUTH_GSS_ERROR) {
+        Py_DECREF(pystate);
         return NULL;
     }
 
-    return Py_BuildValue("i", result);
+    return Py_BuildValue("(iN)", result, pystate);
 }
 
-static PyObject *authGSSServerStoreDelegate(PyObject *self, PyObject *args)
-{
+static PyObject *authGSSServerStoreDelegate(
+    PyObject *self, PyObject *args, PyObject *keywds
+) {
     gss_server_state *state = NULL;
     PyObject *pystate = NULL;
+    const char *cache_type = "FILE";
+    static char *kwlist[] = {"context", "cache_type", NULL};
     int result = 0;
 
-    if (! PyArg_ParseTuple(args, "O", &pystate)) {
-        return NULL;
-    }
-
-    if (! PyCObject_Check(pystate)) {
-        PyErr_SetString(PyExc_TypeError, "Expected a context object");
+    if (! PyArg_ParseTupleAndKeywords(
+        args, keywds, "O|s", kwlist, &pystate, &cache_type
+    )) {
         return NULL;
     }
 
-    state = (gss_server_state *)PyCObject_AsVoidPtr(pystate);
+    state = get_server_state(pystate);
 
     if (state == NULL) {
         return NULL;
     }
 
-    result = authenticate_gss_server_store_delegate(state);
+    if (! lock_context(pystate)) {
+        return NULL;
+    }
+    result = authenticate_gss_server_store_delegate(state, cache_type);
+    unlock_context(pystate);
 
     if (result == AUTH_GSS_ERROR) {
         return NULL;
@@ -628,18 +2233,13 @@ static PyObject *authGSSServerResponse(PyObject *self, PyObject *args)
         return NULL;
     }
 
-    if (! PyCObject_Check(pystate)) {
-        PyErr_SetString(PyExc_TypeError, "Expected a context object");
-        return NULL;
-    }
-
-    state = (gss_server_state *)PyCObject_AsVoidPtr(pystate);
+    state = get_server_state(pystate);
 
     if (state == NULL) {
         return NULL;
     }
 
-    return Py_BuildValue("s", state->response);
+    return server_string(pystate, state, authenticate_gss_server_response);
 }
 
 static PyObject *authGSSServerUserName(PyObject *self, PyObject *args)
@@ -651,18 +2251,13 @@ static PyObject *authGSSServerUserName(PyObject *self, PyObject *args)
         return NULL;
     }
     
-    if (! PyCObject_Check(pystate)) {
-        PyErr_SetString(PyExc_TypeError, "Expected a context object");
-        return NULL;
-    }
-    
-    state = (gss_server_state *)PyCObject_AsVoidPtr(pystate);
+    state = get_server_state(pystate);
 
     if (state == NULL) {
         return NULL;
     }
     
-    return Py_BuildValue("s", state->username);
+    return server_string(pystate, state, authenticate_gss_server_username);
 }
 
 static PyObject *authGSSServerCacheName(PyObject *self, PyObject *args)
@@ -674,18 +2269,13 @@ static PyObject *authGSSServerCacheName(PyObject *self, PyObject *args)
         return NULL;
     }
     
-    if (! PyCObject_Check(pystate)) {
-        PyErr_SetString(PyExc_TypeError, "Expected a context object");
-        return NULL;
-    }
-    
-    state = (gss_server_state *)PyCObject_AsVoidPtr(pystate);
+    state = get_server_state(pystate);
 
     if (state == NULL) {
         return NULL;
     }
 
-    return Py_BuildValue("s", state->ccname);
+    return context_string(pystate, &state->ccname);
 }
 
 static PyObject *authGSSServerTargetName(PyObject *self, PyObject *args)
@@ -697,18 +2287,172 @@ static PyObject *authGSSServerTargetName(PyObject *self, PyObject *args)
         return NULL;
     }
     
-    if (! PyCObject_Check(pystate)) {
-        PyErr_SetString(PyExc_TypeError, "Expected a context object");
+    state = get_server_state(pystate);
+
+    if (state == NULL) {
         return NULL;
     }
     
-    state = (gss_server_state *)PyCObject_AsVoidPtr(pystate);
+    return server_string(
+        pystate, state, authenticate_gss_server_target_name
+    );
+}
+
+/*
+ * Gets a session identifier, given as a str (encoded as UTF-8) or a
+ * bytes-like object, as a new reference to a bytes-like object.
+ */
+static PyObject *session_id_bytes(PyObject *pysession_id)
+{
+    if (PyUnicode_Check(pysession_id)) {
+        return PyUnicode_AsUTF8String(pysession_id);
+    }
+
+    Py_INCREF(pysession_id);
+    return pysession_id;
+}
+
+static PyObject *authGSSServerCacheSession(
+    PyObject *self, PyObject *args, PyObject *keywds
+) {
+    gss_server_state *state = NULL;
+    PyObject *pystate = NULL;
+    PyObject *pysession_id = NULL;
+    PyObject *pyresult = NULL;
+    Py_buffer view;
+    gss_buffer_desc session_id = GSS_C_EMPTY_BUFFER;
+    const char *service = NULL;
+    const char *username = NULL;
+    int result = 0;
+    static char *kwlist[] = {"context", "session_id", "service", NULL};
+
+    if (! PyArg_ParseTupleAndKeywords(
+        args, keywds, "OO|z", kwlist, &pystate, &pysession_id, &service
+    )) {
+        return NULL;
+    }
+
+    state = get_server_state(pystate);
 
     if (state == NULL) {
         return NULL;
     }
-    
-    return Py_BuildValue("s", state->targetname);
+
+    pysession_id = session_id_bytes(pysession_id);
+    if (pysession_id == NULL) {
+        return NULL;
+    }
+    if (! token_from_buffer(pysession_id, &view, &session_id)) {
+        Py_DECREF(pysession_id);
+        return NULL;
+    }
+
+    if (! lock_context(pystate)) {
+        goto end;
+    }
+    if (authenticate_gss_server_username(state, &username) == AUTH_GSS_ERROR) {
+        goto unlock;
+    }
+    if (username == NULL) {
+        PyErr_SetString(
+            PyExc_ValueError, "The context has not authenticated a client"
+        );
+    } else {
+        // The entry must not outlive the ticket that authenticated the client
+        result = session_cache_put(
+            service, session_id.value, session_id.length, username,
+            (double) state->lifetime
+        );
+        if (result < 0) {
+            PyErr_NoMemory();
+        } else {
+            pyresult = PyBool_FromLong(result);
+        }
+    }
+
+unlock:
+    unlock_context(pystate);
+
+end:
+    PyBuffer_Release(&view);
+    Py_DECREF(pysession_id);
+
+    return pyresult;
+}
+
+static PyObject *authGSSServerLookupSession(
+    PyObject *self, PyObject *args, PyObject *keywds
+) {
+    PyObject *pysession_id = NULL;
+    Py_buffer view;
+    gss_buffer_desc session_id = GSS_C_EMPTY_BUFFER;
+    const char *service = NULL;
+    char username[SESSION_NAME_SIZE];
+    int result = 0;
+    static char *kwlist[] = {"session_id", "service", NULL};
+
+    if (! PyArg_ParseTupleAndKeywords(
+        args, keywds, "O|z", kwlist, &pysession_id, &service
+    )) {
+        return NULL;
+    }
+
+    pysession_id = session_id_bytes(pysession_id);
+    if (pysession_id == NULL) {
+        return NULL;
+    }
+    if (! token_from_buffer(pysession_id, &view, &session_id)) {
+        Py_DECREF(pysession_id);
+        return NULL;
+    }
+
+    result = session_cache_get(
+        service, session_id.value, session_id.length, username
+    );
+
+    PyBuffer_Release(&view);
+    Py_DECREF(pysession_id);
+
+    if (result < 0) {
+        return PyErr_NoMemory();
+    }
+    if (result == 0) {
+        Py_RETURN_NONE;
+    }
+
+    return Py_BuildValue("s", username);
+}
+
+static PyObject *authGSSServerForgetSession(
+    PyObject *self, PyObject *args, PyObject *keywds
+) {
+    PyObject *pysession_id = NULL;
+    Py_buffer view;
+    gss_buffer_desc session_id = GSS_C_EMPTY_BUFFER;
+    const char *service = NULL;
+    static char *kwlist[] = {"session_id", "service", NULL};
+
+    if (! PyArg_ParseTupleAndKeywords(
+        args, keywds, "O|z", kwlist, &pysession_id, &service
+    )) {
+        return NULL;
+    }
+
+    pysession_id = session_id_bytes(pysession_id);
+    if (pysession_id == NULL) {
+        return NULL;
+    }
+    if (! token_from_buffer(pysession_id, &view, &session_id)) {
+        Py_DECREF(pysession_id);
+        return NULL;
+    }
+
+    session_cache_remove(service, session_id.value, session_id.length);
+
+    PyBuffer_Release(&view);
+    Py_DECREF(pysession_id);
+
+    Py_RETURN_NONE;
 }
 
 static PyMethodDef KerberosMethods[] = {
@@ -717,6 +2461,81 @@ static PyMethodDef KerberosMethods[] = {
         checkPassword, METH_VARARGS,
         "Check the supplied user/password against Kerberos KDC."
     },
+    {
+        "checkPasswords",
+        (PyCFunction)checkPasswords, METH_VARARGS | METH_KEYWORDS,
+        "Check many user/password pairs against Kerberos KDC in parallel."
+    },
+    {
+        "prewarmServiceTickets",
+        (PyCFunction)prewarmServiceTickets, METH_VARARGS | METH_KEYWORDS,
+        "Get service tickets for many services into the credential cache in parallel."
+    },
+    {
+        "enablePasswordCache",
+        (PyCFunction)enablePasswordCache, METH_VARARGS | METH_KEYWORDS,
+        "Start caching the outcome of password checks."
+    },
+    {
+        "disablePasswordCache",
+        disablePasswordCache, METH_NOARGS,
+        "Stop caching the outcome of password checks."
+    },
+    {
+        "clearPasswordCache",
+        clearPasswordCache, METH_NOARGS,
+        "Discard all cached password check outcomes."
+    },
+    {
+        "getPasswordCacheStats",
+        getPasswordCacheStats, METH_NOARGS,
+        "Return password cache counters."
+    },
+    {
+        "enableSessionCache",
+        (PyCFunction)enableSessionCache, METH_VARARGS | METH_KEYWORDS,
+        "Remember authenticated sessions on the acceptor."
+    },
+    {
+        "disableSessionCache",
+        disableSessionCache, METH_NOARGS,
+        "Stop remembering authenticated sessions."
+    },
+    {
+        "clearSessionCache",
+        clearSessionCache, METH_NOARGS,
+        "Forget every remembered session."
+    },
+    {
+        "getSessionCacheStats",
+        getSessionCacheStats, METH_NOARGS,
+        "Get the session cache counters."
+    },
+    {
+        "enableStats",
+        enableStats, METH_NOARGS,
+        "Start counting and timing Kerberos library calls."
+    },
+    {
+        "disableStats",
+        disableStats, METH_NOARGS,
+        "Stop counting and timing Kerberos library calls."
+    },
+    {
+        "resetStats",
+        resetStats, METH_NOARGS,
+        "Zero the library call counters."
+    },
+    {
+        "getStats",
+        getStats, METH_NOARGS,
+        "Return the library call counters and latency histograms."
+    },
+    {
+        "setTraceCallback",
+        setTraceCallback, METH_VARARGS,
+        "Set a callable to be told about every Kerberos library call."
+    },
     {
         "changePassword",
         changePassword, METH_VARARGS,
@@ -727,6 +2546,31 @@ static PyMethodDef KerberosMethods[] = {
         getServerPrincipalDetails, METH_VARARGS,
         "Return the service principal for a given service and hostname."
     },
+    {
+        "getServerPrincipalDetailsMany",
+        getServerPrincipalDetailsMany, METH_VARARGS,
+        "Return the service principals for many (service, hostname) pairs."
+    },
+    {
+        "getKeytabPrincipals",
+        getKeytabPrincipals, METH_NOARGS,
+        "Return (principal, kvno, enctype) for every entry in the keytab."
+    },
+    {
+        "reloadConfig",
+        reloadConfig, METH_NOARGS,
+        "Discard cached Kerberos contexts so the configuration is re-read."
+    },
+    {
+        "setConfig",
+        setConfig, METH_VARARGS,
+        "Use a Kerberos configuration given as a dict instead of krb5.conf."
+    },
+    {
+        "getRealmKDCs",
+        getRealmKDCs, METH_VARARGS,
+        "List the KDCs configured for a realm."
+    },
     {
         "authGSSClientInit",
         (PyCFunction)authGSSClientInit, METH_VARARGS | METH_KEYWORDS,
@@ -747,6 +2591,11 @@ static PyMethodDef KerberosMethods[] = {
         (PyCFunction)authGSSClientStep, METH_VARARGS | METH_KEYWORDS,
         "Do a client-side GSSAPI step."
     },
+    {
+        "authGSSClientStepRaw",
+        (PyCFunction)authGSSClientStepRaw, METH_VARARGS | METH_KEYWORDS,
+        "Do a client-side GSSAPI step with raw tokens."
+    },
     {
         "authGSSClientResponse",
         authGSSClientResponse, METH_VARARGS,
@@ -766,6 +2615,11 @@ static PyMethodDef KerberosMethods[] = {
         authGSSClientUserName, METH_VARARGS,
         "Get the user name from the last client-side GSSAPI step."
     },
+    {
+        "acquireServerCredential",
+        acquireServerCredential, METH_VARARGS,
+        "Acquire acceptor credentials that many server contexts can share."
+    },
     {
         "authGSSServerInit",
         authGSSServerInit, METH_VARARGS,
@@ -781,6 +2635,51 @@ static PyMethodDef KerberosMethods[] = {
         authGSSClientUnwrap, METH_VARARGS,
         "Do a GSSAPI unwrap."
     },
+    {
+        "authGSSClientWrapRaw",
+        authGSSClientWrapRaw, METH_VARARGS,
+        "Do a GSSAPI wrap of raw data."
+    },
+    {
+        "authGSSClientUnwrapRaw",
+        authGSSClientUnwrapRaw, METH_VARARGS,
+        "Do a GSSAPI unwrap of a raw token."
+    },
+    {
+        "authGSSClientWrapMany",
+        authGSSClientWrapMany, METH_VARARGS,
+        "Do a GSSAPI wrap of a batch of messages."
+    },
+    {
+        "authGSSClientUnwrapMany",
+        authGSSClientUnwrapMany, METH_VARARGS,
+        "Do a GSSAPI unwrap of a batch of messages."
+    },
+    {
+        "authGSSClientWrapSizeLimit",
+        authGSSClientWrapSizeLimit, METH_VARARGS,
+        "Get the largest message that wraps into a token of a given size."
+    },
+    {
+        "authGSSClientWrapIov",
+        authGSSClientWrapIov, METH_VARARGS,
+        "Do a GSSAPI wrap of raw data in place."
+    },
+    {
+        "authGSSClientUnwrapIov",
+        authGSSClientUnwrapIov, METH_VARARGS,
+        "Do a GSSAPI unwrap of a raw token in place."
+    },
+    {
+        "authGSSClientExportContext",
+        authGSSClientExportContext, METH_VARARGS,
+        "Serialise an established client context for another process."
+    },
+    {
+        "authGSSClientImportContext",
+        authGSSClientImportContext, METH_VARARGS,
+        "Recreate a client context from authGSSClientExportContext."
+    },
     {
         "authGSSClientInquireCred", authGSSClientInquireCred, METH_VARARGS,
         "Get the current user name, if any."
@@ -795,6 +2694,46 @@ static PyMethodDef KerberosMethods[] = {
         authGSSServerStep, METH_VARARGS,
         "Do a server-side GSSAPI step."
     },
+    {
+        "authGSSServerStepRaw",
+        authGSSServerStepRaw, METH_VARARGS,
+        "Do a server-side GSSAPI step with raw tokens."
+    },
+    {
+        "authGSSServerWrapRaw",
+        authGSSServerWrapRaw, METH_VARARGS,
+        "Do a server-side GSSAPI wrap of raw data."
+    },
+    {
+        "authGSSServerUnwrapRaw",
+        authGSSServerUnwrapRaw, METH_VARARGS,
+        "Do a server-side GSSAPI unwrap of a raw token."
+    },
+    {
+        "authGSSServerWrapSizeLimit",
+        authGSSServerWrapSizeLimit, METH_VARARGS,
+        "Get the largest message that wraps into a token of a given size."
+    },
+    {
+        "authGSSServerWrapIov",
+        authGSSServerWrapIov, METH_VARARGS,
+        "Do a server-side GSSAPI wrap of raw data in place."
+    },
+    {
+        "authGSSServerUnwrapIov",
+        authGSSServerUnwrapIov, METH_VARARGS,
+        "Do a server-side GSSAPI unwrap of a raw token in place."
+    },
+    {
+        "authGSSServerExportContext",
+        authGSSServerExportContext, METH_VARARGS,
+        "Serialise an established server context for another process."
+    },
+    {
+        "authGSSServerImportContext",
+        authGSSServerImportContext, METH_VARARGS,
+        "Recreate a server context from authGSSServerExportContext."
+    },
     {
         "authGSSServerHasDelegated",
         authGSSServerHasDelegated, METH_VARARGS,
@@ -802,7 +2741,7 @@ static PyMethodDef KerberosMethods[] = {
     },
     {
         "authGSSServerStoreDelegate",
-        authGSSServerStoreDelegate, METH_VARARGS,
+        (PyCFunction)authGSSServerStoreDelegate, METH_VARARGS | METH_KEYWORDS,
         "Store the delegated Credentials."
     },
     {
@@ -820,6 +2759,21 @@ static PyMethodDef KerberosMethods[] = {
         authGSSServerCacheName, METH_VARARGS,
         "Get the location of the cache where delegated credentials are stored."
     },
+    {
+        "authGSSServerCacheSession",
+        (PyCFunction)authGSSServerCacheSession, METH_VARARGS | METH_KEYWORDS,
+        "Remember the client authenticated by a context under a session ID."
+    },
+    {
+        "authGSSServerLookupSession",
+        (PyCFunction)authGSSServerLookupSession, METH_VARARGS | METH_KEYWORDS,
+        "Get the client remembered under a session ID."
+    },
+    {
+        "authGSSServerForgetSession",
+        (PyCFunction)authGSSServerForgetSession, METH_VARARGS | METH_KEYWORDS,
+        "Forget a remembered session."
+    },
     {
         "authGSSServerTargetName",
         authGSSServerTargetName, METH_VARARGS,
@@ -828,58 +2782,68 @@ static PyMethodDef KerberosMethods[] = {
     {NULL, NULL, 0, NULL}        /* Sentinel */
 };
 
-MOD_INIT(kerberos)
+/*
+ * Fills in a new module object. Called once per interpreter that imports the
+ * module.
+ */
+static int kerberos_exec(PyObject *m)
 {
-    PyObject *m,*d;
-
-    MOD_DEF(m, "kerberos", NULL, KerberosMethods);
-
-    if (m == NULL) {
-        return MOD_ERROR_VAL;
-    }
+    PyObject *d;
+#ifdef MULTI_PHASE_INIT
+    kerberos_module_state *state = PyModule_GetState(m);
+    PyObject *interpreter_dict;
+#else
+    kerberos_module_state *state = &legacy_state;
+#endif
 
     d = PyModule_GetDict(m);
 
     /* create the base exception class */
-    if (! (KrbException_class = PyErr_NewException(
+    if (! (state->KrbError = PyErr_NewException(
         "kerberos.KrbError", NULL, NULL
     ))) {
         goto error;
     }
 
-    PyDict_SetItemString(d, "KrbError", KrbException_class);
-    Py_INCREF(KrbException_class);
+    PyDict_SetItemString(d, "KrbError", state->KrbError);
 
     /* ...and the derived exceptions */
-    if (! (BasicAuthException_class = PyErr_NewException(
-        "kerberos.BasicAuthError", KrbException_class, NULL
+    if (! (state->BasicAuthError = PyErr_NewException(
+        "kerberos.BasicAuthError", state->KrbError, NULL
     ))) {
         goto error;
     }
 
-    Py_INCREF(BasicAuthException_class);
-    PyDict_SetItemString(d, "BasicAuthError", BasicAuthException_class);
+    PyDict_SetItemString(d, "BasicAuthError", state->BasicAuthError);
 
-    if (! (PwdChangeException_class = PyErr_NewException(
-        "kerberos.PwdChangeError", KrbException_class, NULL
+    if (! (state->PwdChangeError = PyErr_NewException(
+        "kerberos.PwdChangeError", state->KrbError, NULL
     ))) {
         goto error;
     }
 
-    Py_INCREF(PwdChangeException_class);
-    PyDict_SetItemString(d, "PwdChangeError", PwdChangeException_class);
+    PyDict_SetItemString(d, "PwdChangeError", state->PwdChangeError);
 
-    if (! (GssException_class = PyErr_NewException(
-        "kerberos.GSSError", KrbException_class, NULL
+    if (! (state->GSSError = PyErr_NewException(
+        "kerberos.GSSError", state->KrbError, NULL
     ))) {
         goto error;
     }
 
-    Py_INCREF(GssException_class);
     PyDict_SetItemString(
-        d, "GSSError", GssException_class
+        d, "GSSError", state->GSSError
     );
 
+#ifdef MULTI_PHASE_INIT
+    interpreter_dict = PyInterpreterState_GetDict(PyInterpreterState_Get());
+    if (
+        interpreter_dict == NULL ||
+        PyDict_SetItemString(interpreter_dict, MODULE_STATE_KEY, m) != 0
+    ) {
+        goto error;
+    }
+#endif
+
     PyDict_SetItemString(
         d, "AUTH_GSS_COMPLETE", PyInt_FromLong(AUTH_GSS_COMPLETE)
     );
@@ -925,11 +2889,117 @@ MOD_INIT(kerberos)
         d, "GSS_MECH_OID_SPNEGO", PyCObject_FromVoidPtr(&spnego_mech_oid, NULL)
     );
 
+    if (add_types(m) < 0) {
+        goto error;
+    }
+
+#if PY_VERSION_HEX >= 0x03070000
+    // The worker pool calls back into the interpreter that started it
+    if (is_main_interpreter()) {
+        PyObject *aio = create_aio_module(m);
+
+        if (aio == NULL) {
+            goto error;
+        }
+        PyDict_SetItemString(d, "aio", aio);
+        Py_DECREF(aio);
+    }
+#endif
+
 error:
     if (PyErr_Occurred()) {
          PyErr_SetString(PyExc_ImportError, "kerberos: init failed");
+        return -1;
+    }
+
+    return 0;
+}
+
+#ifdef MULTI_PHASE_INIT
+
+static int kerberos_traverse(PyObject *m, visitproc visit, void *arg)
+{
+    kerberos_module_state *state = PyModule_GetState(m);
+
+    Py_VISIT(state->KrbError);
+    Py_VISIT(state->BasicAuthError);
+    Py_VISIT(state->PwdChangeError);
+    Py_VISIT(state->GSSError);
+
+    return 0;
+}
+
+static int kerberos_clear(PyObject *m)
+{
+    kerberos_module_state *state = PyModule_GetState(m);
+
+    Py_CLEAR(state->KrbError);
+    Py_CLEAR(state->BasicAuthError);
+    Py_CLEAR(state->PwdChangeError);
+    Py_CLEAR(state->GSSError);
+
+    return 0;
+}
+
+static void kerberos_free(void *m)
+{
+    kerberos_clear((PyObject *)m);
+}
+
+/*
+ * The module keeps no Python objects outside its state, apart from the
+ * context types, which are never changed once ready, and the trace callback
+ * and kerberos.aio, which are confined to the main interpreter. Its own
+ * shared data is guarded by native locks, so it needs the GIL neither to
+ * protect itself nor to run in several interpreters.
+ */
+static PyModuleDef_Slot kerberos_slots[] = {
+    {Py_mod_exec, (void *)kerberos_exec},
+#if PY_VERSION_HEX >= 0x030c0000
+    {
+        Py_mod_multiple_interpreters,
+        Py_MOD_MULTIPLE_INTERPRETERS_SUPPORTED
+    },
+#endif
+#if PY_VERSION_HEX >= 0x030d0000
+    {Py_mod_gil, Py_MOD_GIL_NOT_USED},
+#endif
+    {0, NULL}
+};
+
+static struct PyModuleDef kerberos_module = {
+    PyModuleDef_HEAD_INIT,
+    .m_name = "kerberos",
+    .m_size = sizeof(kerberos_module_state),
+    .m_methods = KerberosMethods,
+    .m_slots = kerberos_slots,
+    .m_traverse = kerberos_traverse,
+    .m_clear = kerberos_clear,
+    .m_free = kerberos_free,
+};
+
+PyMODINIT_FUNC PyInit_kerberos(void)
+{
+    return PyModuleDef_Init(&kerberos_module);
+}
+
+#else
+
+MOD_INIT(kerberos)
+{
+    PyObject *m;
+
+    MOD_DEF(m, "kerberos", NULL, KerberosMethods);
+
+    if (m == NULL) {
+        return MOD_ERROR_VAL;
+    }
+
+    if (kerberos_exec(m) < 0) {
         return MOD_ERROR_VAL;
     }
 
     return MOD_SUCCESS_VAL(m);
 }
+
+#endif
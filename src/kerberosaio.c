@@ -0,0 +1,496 @@
+/**
+ * Copyright (c) 2026 Apple Inc. All rights reserved.
+ *
+ * Licensed under the Apache License, Version 2.0 (the "License");
+ * you may not use this file except in compliance with the License.
+ * You may obtain a copy of the License at
+ *
+ *     http://www.apache.org/licenses/LICENSE-2.0
+ *
+ * Unless required by applicable law or agreed to in writing, software
+ * distributed under the License is distributed on an "AS IS" BASIS,
+ * WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+ * See the License for the specific language governing permissions and
+ * limitations under the License.
+ **/
+
+#include <Python.h>
+
+#include "kerberosaio.h"
+#include "kerberosworkers.h"
+
+#if PY_VERSION_HEX >= 0x03070000
+
+#include <pthread.h>
+
+/*
+ * Awaitable versions of the blocking calls, run on a bounded pool of native
+ * threads. A worker takes the GIL only to start a call and to hand its
+ * outcome back; the calls themselves release the GIL around the Kerberos
+ * library, so the event loop keeps running while the KDC is contacted. The
+ * outcome is delivered with loop.call_soon_threadsafe, so the future is only
+ * ever touched from its own loop.
+ */
+
+typedef struct aio_job {
+    struct aio_job  *next;
+    PyObject        *func;
+    PyObject        *args;
+    PyObject        *kwargs;
+    PyObject        *loop;
+    PyObject        *future;
+} aio_job;
+
+static pthread_mutex_t pool_lock = PTHREAD_MUTEX_INITIALIZER;
+static pthread_cond_t pool_cond = PTHREAD_COND_INITIALIZER;
+static aio_job *queue_head = NULL;
+static aio_job *queue_tail = NULL;
+static int queued_jobs = 0;
+static int max_workers = 0;
+static int running_workers = 0;
+static int idle_workers = 0;
+static int shutting_down = 0;
+
+static PyObject *asyncio_module = NULL;
+static PyObject *complete_func = NULL;
+static PyObject *client_step_func = NULL;
+static PyObject *server_step_func = NULL;
+static PyObject *check_password_func = NULL;
+
+static PyObject *call_method(PyObject *obj, const char *name, PyObject *arg)
+{
+    PyObject *method = PyObject_GetAttrString(obj, name);
+    PyObject *result = NULL;
+
+    if (method != NULL) {
+        result = PyObject_CallFunctionObjArgs(method, arg, NULL);
+        Py_DECREF(method);
+    }
+
+    return result;
+}
+
+static void free_job(aio_job *job)
+{
+    Py_XDECREF(job->func);
+    Py_XDECREF(job->args);
+    Py_XDECREF(job->kwargs);
+    Py_XDECREF(job->loop);
+    Py_XDECREF(job->future);
+    free(job);
+}
+
+static void run_job(aio_job *job)
+{
+    PyGILState_STATE gstate = PyGILState_Ensure();
+    PyObject *result = NULL;
+    PyObject *exception = NULL;
+    PyObject *done = NULL;
+    PyObject *scheduled = NULL;
+
+    // Skip calls whose future was cancelled, or timed out, while queued
+    done = PyObject_CallMethod(job->future, "done", NULL);
+    if (done == NULL) {
+        PyErr_Clear();
+    } else if (PyObject_IsTrue(done)) {
+        goto end;
+    }
+
+    result = PyObject_Call(job->func, job->args, job->kwargs);
+    if (result == NULL) {
+        PyObject *type, *traceback;
+
+        PyErr_Fetch(&type, &exception, &traceback);
+        PyErr_NormalizeException(&type, &exception, &traceback);
+        if (traceback != NULL) {
+            PyException_SetTraceback(exception, traceback);
+        }
+        Py_XDECREF(type);
+        Py_XDECREF(traceback);
+    }
+
+    scheduled = PyObject_CallMethod(
+        job->loop, "call_soon_threadsafe", "OOOO", complete_func, job->future,
+        result ? result : Py_None, exception ? exception : Py_None
+    );
+    if (scheduled == NULL) {
+        // The loop has been closed, so nobody is waiting for the outcome
+        PyErr_Clear();
+    }
+
+end:
+    Py_XDECREF(done);
+    Py_XDECREF(result);
+    Py_XDECREF(exception);
+    Py_XDECREF(scheduled);
+    free_job(job);
+    PyGILState_Release(gstate);
+}
+
+static void *aio_worker(void *arg)
+{
+    aio_job *job;
+
+    pthread_mutex_lock(&pool_lock);
+    for (;;) {
+        while (queue_head == NULL && ! shutting_down) {
+            idle_workers++;
+            pthread_cond_wait(&pool_cond, &pool_lock);
+            idle_workers--;
+        }
+        if (shutting_down) {
+            break;
+        }
+
+        job = queue_head;
+        queue_head = job->next;
+        if (queue_head == NULL) {
+            queue_tail = NULL;
+        }
+        queued_jobs--;
+
+        pthread_mutex_unlock(&pool_lock);
+        run_job(job);
+        pthread_mutex_lock(&pool_lock);
+    }
+    running_workers--;
+    pthread_cond_broadcast(&pool_cond);
+    pthread_mutex_unlock(&pool_lock);
+
+    return NULL;
+}
+
+/*
+ * Queues job, starting another worker if every running one is busy and the
+ * pool is below its limit. Must be called with the GIL held.
+ */
+static int queue_job(aio_job *job)
+{
+    pthread_t thread;
+    pthread_attr_t attr;
+    int started = 1;
+
+    pthread_mutex_lock(&pool_lock);
+    if (shutting_down) {
+        pthread_mutex_unlock(&pool_lock);
+        PyErr_SetString(
+            PyExc_RuntimeError, "Cannot schedule new calls after shutdown"
+        );
+        return 0;
+    }
+
+    job->next = NULL;
+    if (queue_tail != NULL) {
+        queue_tail->next = job;
+    } else {
+        queue_head = job;
+    }
+    queue_tail = job;
+    queued_jobs++;
+
+    if (max_workers <= 0) {
+        max_workers = default_worker_count();
+    }
+    if (queued_jobs > idle_workers && running_workers < max_workers) {
+        pthread_attr_init(&attr);
+        pthread_attr_setdetachstate(&attr, PTHREAD_CREATE_DETACHED);
+        if (pthread_create(&thread, &attr, aio_worker, NULL) == 0) {
+            running_workers++;
+        } else {
+            started = 0;
+        }
+        pthread_attr_destroy(&attr);
+    }
+
+    if (! started && running_workers == 0) {
+        // Nothing would ever run the job, so take it back
+        queue_head = queue_tail = NULL;
+        queued_jobs = 0;
+        pthread_mutex_unlock(&pool_lock);
+        PyErr_SetString(PyExc_RuntimeError, "Cannot start worker thread");
+        return 0;
+    }
+
+    pthread_cond_signal(&pool_cond);
+    pthread_mutex_unlock(&pool_lock);
+
+    return 1;
+}
+
+/*
+ * Runs func(*args, **kwargs) on the pool and returns an awaitable for its
+ * outcome. A "timeout" keyword argument is taken out of kwargs and applied
+ * with asyncio.wait_for.
+ */
+static PyObject *submit(PyObject *func, PyObject *args, PyObject *kwargs)
+{
+    PyObject *timeout = NULL;
+    PyObject *loop = NULL;
+    PyObject *future = NULL;
+    PyObject *result = NULL;
+    aio_job *job = NULL;
+
+    if (asyncio_module == NULL) {
+        asyncio_module = PyImport_ImportModule("asyncio");
+        if (asyncio_module == NULL) {
+            return NULL;
+        }
+    }
+
+    if (kwargs != NULL) {
+        kwargs = PyDict_Copy(kwargs);
+        if (kwargs == NULL) {
+            return NULL;
+        }
+        timeout = PyDict_GetItemString(kwargs, "timeout");
+        if (timeout != NULL) {
+            Py_INCREF(timeout);
+            PyDict_DelItemString(kwargs, "timeout");
+        }
+    }
+
+    loop = PyObject_CallMethod(asyncio_module, "get_running_loop", NULL);
+    if (loop == NULL) {
+        goto end;
+    }
+
+    future = PyObject_CallMethod(loop, "create_future", NULL);
+    if (future == NULL) {
+        goto end;
+    }
+
+    job = (aio_job *) calloc(1, sizeof(aio_job));
+    if (job == NULL) {
+        PyErr_NoMemory();
+        goto end;
+    }
+    Py_INCREF(func);
+    job->func = func;
+    Py_INCREF(args);
+    job->args = args;
+    Py_XINCREF(kwargs);
+    job->kwargs = kwargs;
+    Py_INCREF(loop);
+    job->loop = loop;
+    Py_INCREF(future);
+    job->future = future;
+
+    if (! queue_job(job)) {
+        free_job(job);
+        goto end;
+    }
+
+    if (timeout != NULL && timeout != Py_None) {
+        result = PyObject_CallMethod(
+            asyncio_module, "wait_for", "OO", future, timeout
+        );
+    } else {
+        Py_INCREF(future);
+        result = future;
+    }
+
+end:
+    Py_XDECREF(timeout);
+    Py_XDECREF(kwargs);
+    Py_XDECREF(loop);
+    Py_XDECREF(future);
+
+    return result;
+}
+
+static PyObject *client_step(PyObject *self, PyObject *args, PyObject *kwargs)
+{
+    return submit(client_step_func, args, kwargs);
+}
+
+static PyObject *server_step(PyObject *self, PyObject *args, PyObject *kwargs)
+{
+    return submit(server_step_func, args, kwargs);
+}
+
+static PyObject *check_password(PyObject *self, PyObject *args, PyObject *kwargs)
+{
+    return submit(check_password_func, args, kwargs);
+}
+
+static PyObject *set_max_workers(PyObject *self, PyObject *args)
+{
+    int count = 0;
+
+    if (! PyArg_ParseTuple(args, "i", &count)) {
+        return NULL;
+    }
+
+    if (count < 1) {
+        PyErr_SetString(PyExc_ValueError, "max_workers must be at least 1");
+        return NULL;
+    }
+
+    // Running workers above a lowered limit finish naturally at shutdown
+    pthread_mutex_lock(&pool_lock);
+    max_workers = count;
+    pthread_mutex_unlock(&pool_lock);
+
+    Py_RETURN_NONE;
+}
+
+/*
+ * Called on the event loop to hand a call's outcome to its future, unless
+ * the future was cancelled in the meantime.
+ */
+static PyObject *complete(PyObject *self, PyObject *args)
+{
+    PyObject *future = NULL;
+    PyObject *result = NULL;
+    PyObject *exception = NULL;
+    PyObject *done = NULL;
+    PyObject *ret = NULL;
+
+    if (! PyArg_ParseTuple(args, "OOO", &future, &result, &exception)) {
+        return NULL;
+    }
+
+    done = PyObject_CallMethod(future, "done", NULL);
+    if (done == NULL) {
+        return NULL;
+    }
+    if (PyObject_IsTrue(done)) {
+        Py_DECREF(done);
+        Py_RETURN_NONE;
+    }
+    Py_DECREF(done);
+
+    // Not PyObject_CallMethod, which would unpack a tuple result
+    if (exception != Py_None) {
+        ret = call_method(future, "set_exception", exception);
+    } else {
+        ret = call_method(future, "set_result", result);
+    }
+
+    return ret;
+}
+
+/*
+ * Stops the workers at interpreter exit, before the GIL they need goes away.
+ * Calls that have not started are dropped.
+ */
+static PyObject *shutdown(PyObject *self, PyObject *args)
+{
+    aio_job *job;
+
+    Py_BEGIN_ALLOW_THREADS
+    pthread_mutex_lock(&pool_lock);
+    shutting_down = 1;
+    pthread_cond_broadcast(&pool_cond);
+    while (running_workers > 0) {
+        pthread_cond_wait(&pool_cond, &pool_lock);
+    }
+    job = queue_head;
+    queue_head = queue_tail = NULL;
+    queued_jobs = 0;
+    pthread_mutex_unlock(&pool_lock);
+    Py_END_ALLOW_THREADS
+
+    while (job != NULL) {
+        aio_job *next = job->next;
+        free_job(job);
+        job = next;
+    }
+
+    Py_RETURN_NONE;
+}
+
+static PyMethodDef AioMethods[] = {
+    {
+        "client_step",
+        (PyCFunction)client_step, METH_VARARGS | METH_KEYWORDS,
+        "Awaitable authGSSClientStep."
+    },
+    {
+        "server_step",
+        (PyCFunction)server_step, METH_VARARGS | METH_KEYWORDS,
+        "Awaitable authGSSServerStep."
+    },
+    {
+        "check_password",
+        (PyCFunction)check_password, METH_VARARGS | METH_KEYWORDS,
+        "Awaitable checkPassword."
+    },
+    {
+        "set_max_workers",
+        set_max_workers, METH_VARARGS,
+        "Set the maximum number of worker threads."
+    },
+    {
+        "_complete",
+        complete, METH_VARARGS,
+        "Deliver a call's outcome to its future."
+    },
+    {
+        "_shutdown",
+        shutdown, METH_NOARGS,
+        "Stop the worker threads."
+    },
+    {NULL, NULL, 0, NULL}
+};
+
+static struct PyModuleDef aiomoduledef = {
+    PyModuleDef_HEAD_INIT, "kerberos.aio", NULL, -1, AioMethods,
+};
+
+PyObject *create_aio_module(PyObject *parent)
+{
+    PyObject *m = NULL;
+    PyObject *modules = NULL;
+    PyObject *atexit_module = NULL;
+    PyObject *registered = NULL;
+
+    m = PyModule_Create(&aiomoduledef);
+    if (m == NULL) {
+        return NULL;
+    }
+#ifdef Py_GIL_DISABLED
+    // Created by hand rather than imported, so declared here instead
+    PyUnstable_Module_SetGIL(m, Py_MOD_GIL_NOT_USED);
+#endif
+
+    if (! (complete_func = PyObject_GetAttrString(m, "_complete")) ||
+        ! (client_step_func = PyObject_GetAttrString(
+            parent, "authGSSClientStep"
+        )) ||
+        ! (server_step_func = PyObject_GetAttrString(
+            parent, "authGSSServerStep"
+        )) ||
+        ! (check_password_func = PyObject_GetAttrString(
+            parent, "checkPassword"
+        ))) {
+        goto error;
+    }
+
+    // Make "import kerberos.aio" work even though kerberos is not a package
+    modules = PyImport_GetModuleDict();
+    if (PyDict_SetItemString(modules, "kerberos.aio", m) != 0) {
+        goto error;
+    }
+
+    atexit_module = PyImport_ImportModule("atexit");
+    if (atexit_module == NULL) {
+        goto error;
+    }
+    registered = PyObject_CallMethod(
+        atexit_module, "register", "N", PyObject_GetAttrString(m, "_shutdown")
+    );
+    Py_DECREF(atexit_module);
+    if (registered == NULL) {
+        goto error;
+    }
+    Py_DECREF(registered);
+
+    return m;
+
+error:
+    Py_DECREF(m);
+    return NULL;
+}
+
+#endif
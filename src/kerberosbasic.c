@@ -16,57 +16,329 @@
 
 #include <Python.h>
 #include "kerberosbasic.h"
+#include "kerberoscache.h"
+#include "kerberoscontext.h"
+#include "kerberosmodule.h"
+#include "kerberoshash.h"
+#include "kerberosstats.h"
 
+#include <profile.h>
+
+#include <errno.h>
+#include <pthread.h>
 #include <stdio.h>
 #include <stdlib.h>
 #include <string.h>
 
 #undef PRINTFS
 
-extern PyObject *BasicAuthException_class;
-static void set_basicauth_error(krb5_context context, krb5_error_code code);
-
 static krb5_error_code verify_krb5_user(
     krb5_context context, krb5_principal principal, const char *password,
     krb5_principal server
 );
 
-int authenticate_user_krb5pwd(
+/*
+ * Optional cache of password check outcomes, keyed by a salted scrypt digest
+ * of the credentials so that neither passwords nor fast-to-test hashes of
+ * them are kept in memory. Successful checks are remembered for ttl seconds.
+ * Rejected credentials are remembered too, and repeats are refused without
+ * asking the KDC for a blocking period that starts at negative_ttl and
+ * doubles with each further failure up to max_negative_ttl.
+ */
+typedef struct {
+    int              status;
+    krb5_error_code  code;
+    unsigned int     failures;
+    double           blocked_until;
+} password_cache_value;
+
+typedef struct {
+    int              enabled;
+    double           ttl;
+    double           negative_ttl;
+    double           max_negative_ttl;
+    unsigned long    work_factor;
+    unsigned char    salt[16];
+} password_cache_settings;
+
+static pthread_once_t password_cache_once = PTHREAD_ONCE_INIT;
+static pthread_mutex_t password_cache_lock = PTHREAD_MUTEX_INITIALIZER;
+static ttl_cache password_cache;
+static password_cache_settings cache_settings;
+static password_cache_stats cache_stats;
+
+static void init_password_cache(void)
+{
+    ttl_cache_init(&password_cache, sizeof(password_cache_value), NULL);
+}
+
+/*
+ * Sets up or reconfigures the cache, discarding anything already cached.
+ * Returns 0, or -1 with errno set if the salt or table cannot be created.
+ */
+int enable_password_cache(
+    size_t max_entries, double ttl, double negative_ttl,
+    double max_negative_ttl, unsigned long work_factor
+) {
+    unsigned char salt[sizeof(cache_settings.salt)];
+
+    pthread_once(&password_cache_once, init_password_cache);
+
+    // A fresh salt per configuration keeps digests useless outside it
+    if (cache_random_salt(salt, sizeof(salt)) != 0) {
+        return -1;
+    }
+
+    if (ttl_cache_resize(&password_cache, max_entries) != 0) {
+        return -1;
+    }
+
+    pthread_mutex_lock(&password_cache_lock);
+    cache_settings.enabled = 1;
+    cache_settings.ttl = ttl;
+    cache_settings.negative_ttl = negative_ttl;
+    cache_settings.max_negative_ttl = max_negative_ttl;
+    cache_settings.work_factor = work_factor;
+    memcpy(cache_settings.salt, salt, sizeof(salt));
+    pthread_mutex_unlock(&password_cache_lock);
+
+    return 0;
+}
+
+void disable_password_cache(void)
+{
+    pthread_once(&password_cache_once, init_password_cache);
+
+    pthread_mutex_lock(&password_cache_lock);
+    cache_settings.enabled = 0;
+    pthread_mutex_unlock(&password_cache_lock);
+
+    ttl_cache_resize(&password_cache, 0);
+}
+
+void clear_password_cache(void)
+{
+    pthread_once(&password_cache_once, init_password_cache);
+    ttl_cache_clear(&password_cache);
+}
+
+void get_password_cache_stats(password_cache_stats *stats)
+{
+    pthread_once(&password_cache_once, init_password_cache);
+
+    pthread_mutex_lock(&password_cache_lock);
+    *stats = cache_stats;
+    pthread_mutex_unlock(&password_cache_lock);
+
+    stats->entries = ttl_cache_count(&password_cache);
+}
+
+static void count_lookup(unsigned long *counter)
+{
+    pthread_mutex_lock(&password_cache_lock);
+    (*counter)++;
+    pthread_mutex_unlock(&password_cache_lock);
+}
+
+/*
+ * Derives the cache key for a set of credentials. The strings cannot contain
+ * NUL, so joining them with NUL separators is unambiguous.
+ */
+static int password_cache_key(
+    const password_cache_settings *settings, const char *user,
+    const char *pswd, const char *service, const char *default_realm,
+    unsigned char *key
+) {
+    const char *parts[4];
+    size_t lengths[4];
+    size_t total = 0;
+    char *joined, *p;
+    int i, ret;
+
+    parts[0] = user;
+    parts[1] = pswd;
+    parts[2] = service;
+    parts[3] = default_realm;
+    for (i = 0; i < 4; i++) {
+        lengths[i] = strlen(parts[i]);
+        total += lengths[i] + 1;
+    }
+
+    joined = (char *)malloc(total);
+    if (joined == NULL) {
+        return -1;
+    }
+    for (i = 0, p = joined; i < 4; i++) {
+        memcpy(p, parts[i], lengths[i] + 1);
+        p += lengths[i] + 1;
+    }
+
+    ret = scrypt(
+        joined, total, settings->salt, sizeof(settings->salt),
+        settings->work_factor, 8, 1, key, CACHE_KEY_SIZE
+    );
+
+    memset(joined, 0, total);
+    free(joined);
+
+    return ret;
+}
+
+/*
+ * Only outcomes that say the credentials themselves are bad are worth
+ * remembering; anything else, such as an unreachable KDC, may clear up on
+ * the next attempt.
+ */
+static int is_credential_error(krb5_error_code code)
+{
+    switch (code) {
+        case KRB5KDC_ERR_PREAUTH_FAILED:
+        case KRB5KRB_AP_ERR_BAD_INTEGRITY:
+        case KRB5KDC_ERR_C_PRINCIPAL_UNKNOWN:
+        case KRB5KDC_ERR_CLIENT_REVOKED:
+        case KRB5KDC_ERR_KEY_EXP:
+            return 1;
+        default:
+            return 0;
+    }
+}
+
+static void verify_uncached(
     const char *user, const char *pswd, const char *service,
-    const char *default_realm
+    const char *default_realm, basicauth_result *result
+);
+
+/*
+ * Does the actual password check. No Python API is used here so this can be
+ * called with the GIL released, including from checkPasswords worker threads.
+ * The outcome is reported in result and turned into an exception by
+ * set_basicauth_result_error once the GIL is held again.
+ */
+void verify_user_krb5pwd(
+    const char *user, const char *pswd, const char *service,
+    const char *default_realm, basicauth_result *result
+) {
+    password_cache_settings settings;
+    password_cache_value cached;
+    unsigned char key[CACHE_KEY_SIZE];
+    int found;
+
+    pthread_once(&password_cache_once, init_password_cache);
+
+    pthread_mutex_lock(&password_cache_lock);
+    settings = cache_settings;
+    pthread_mutex_unlock(&password_cache_lock);
+
+    if (! settings.enabled || password_cache_key(
+        &settings, user, pswd, service, default_realm, key
+    ) != 0) {
+        verify_uncached(user, pswd, service, default_realm, result);
+        return;
+    }
+
+    found = ttl_cache_get(&password_cache, key, &cached);
+    if (found && cached.status == BASICAUTH_OK) {
+        count_lookup(&cache_stats.hits);
+        result->status = BASICAUTH_OK;
+        result->code = 0;
+        return;
+    }
+    if (found && cached.blocked_until > cache_now()) {
+        count_lookup(&cache_stats.negative_hits);
+        result->status = cached.status;
+        result->code = cached.code;
+        return;
+    }
+    count_lookup(&cache_stats.misses);
+
+    verify_uncached(user, pswd, service, default_realm, result);
+
+    if (result->status == BASICAUTH_OK) {
+        cached.status = BASICAUTH_OK;
+        cached.code = 0;
+        cached.failures = 0;
+        cached.blocked_until = 0;
+        ttl_cache_put(&password_cache, key, &cached, settings.ttl);
+    } else if (
+        result->status == BASICAUTH_KRB5_ERROR &&
+        is_credential_error(result->code)
+    ) {
+        double block = settings.negative_ttl;
+        unsigned int failures = found ? cached.failures + 1 : 1;
+        unsigned int i;
+
+        for (i = 1; i < failures && block < settings.max_negative_ttl; i++) {
+            block *= 2;
+        }
+        if (block > settings.max_negative_ttl) {
+            block = settings.max_negative_ttl;
+        }
+
+        cached.status = result->status;
+        cached.code = result->code;
+        cached.failures = failures;
+        cached.blocked_until = cache_now() + block;
+        // Remember the failure count for a while after the block ends
+        ttl_cache_put(
+            &password_cache, key, &cached, block + settings.max_negative_ttl
+        );
+    }
+}
+
+/*
+ * Parses the client principal, adding default_realm if user has no realm.
+ */
+static krb5_error_code parse_client(
+    krb5_context kcontext, const char *user, const char *default_realm,
+    krb5_principal *client
+) {
+    krb5_error_code code;
+    char            *name;
+
+    name = (char *)malloc(256);
+    if (name == NULL) {
+        return ENOMEM;
+    }
+    if (strchr(user, '@') == NULL) {
+        snprintf(name, 256, "%s@%s", user, default_realm);
+    } else {
+        snprintf(name, 256, "%s", user);
+    }
+
+    code = krb5_parse_name(kcontext, name, client);
+    free(name);
+
+    return code;
+}
+
+static void verify_uncached(
+    const char *user, const char *pswd, const char *service,
+    const char *default_realm, basicauth_result *result
 ) {
     krb5_context    kcontext = NULL;
     krb5_error_code code;
     krb5_principal  client = NULL;
     krb5_principal  server = NULL;
-    int             ret = 0;
     char            *name = NULL;
-    char            *p = NULL;
 
-    code = krb5_init_context(&kcontext);
+    result->status = BASICAUTH_KRB5_ERROR;
+    result->code = 0;
+
+    code = acquire_krb5_context(&kcontext);
     if (code)
     {
-        PyErr_SetObject(
-            BasicAuthException_class,
-            Py_BuildValue(
-                "((s:i))", "Cannot initialize Kerberos5 context", code
-            )
-        );
-        return 0;
+        result->status = BASICAUTH_CONTEXT_ERROR;
+        result->code = code;
+        return;
     }
 
-    ret = krb5_parse_name (kcontext, service, &server);
-
-    if (ret) {
-        set_basicauth_error(kcontext, ret);
-        ret = 0;
+    code = krb5_parse_name (kcontext, service, &server);
+    if (code) {
         goto end;
     }
 
     code = krb5_unparse_name(kcontext, server, &name);
     if (code) {
-        set_basicauth_error(kcontext, code);
-        ret = 0;
         goto end;
     }
 #ifdef PRINTFS
@@ -75,55 +347,283 @@ int authenticate_user_krb5pwd(
     free(name);
     name = NULL;
 
-    name = (char *)malloc(256);
-    if (name == NULL)
-    {
-        PyErr_NoMemory();
-        ret = 0;
-        goto end;
+    code = parse_client(kcontext, user, default_realm, &client);
+    if (code == ENOMEM) {
+        result->status = BASICAUTH_NO_MEMORY;
     }
-    p = strchr(user, '@');
-    if (p == NULL) {
-        snprintf(name, 256, "%s@%s", user, default_realm);
-    } else {
-        snprintf(name, 256, "%s", user);
-    }
-
-    code = krb5_parse_name(kcontext, name, &client);
     if (code) {
-        set_basicauth_error(kcontext, code);
-        ret = 0;
         goto end;
     }
 
     code = verify_krb5_user(kcontext, client, pswd, server);
-
     if (code) {
-        ret = 0;
         goto end;
     }
 
-    ret = 1;
+    result->status = BASICAUTH_OK;
 
 end:
 #ifdef PRINTFS
     printf(
         "kerb_authenticate_user_krb5pwd ret=%d user=%s authtype=%s\n",
-        ret, user, "Basic"
+        result->status == BASICAUTH_OK, user, "Basic"
     );
 #endif
-    if (name) {
-        free(name);
-    }
+    result->code = code;
     if (client) {
         krb5_free_principal(kcontext, client);
     }
     if (server) {
         krb5_free_principal(kcontext, server);
     }
-    krb5_free_context(kcontext);
+}
 
-    return ret;
+void set_basicauth_result_error(const basicauth_result *result)
+{
+    PyObject *args = NULL;
+
+    switch (result->status) {
+        case BASICAUTH_OK:
+            return;
+        case BASICAUTH_NO_MEMORY:
+            PyErr_NoMemory();
+            return;
+        case BASICAUTH_CONTEXT_ERROR:
+            args = Py_BuildValue(
+                "((s:i))", "Cannot initialize Kerberos5 context", result->code
+            );
+            break;
+        default:
+            args = Py_BuildValue(
+                "(s:i)", krb5_get_err_text(NULL, result->code), result->code
+            );
+            break;
+    }
+
+    if (args != NULL) {
+        PyErr_SetObject(BasicAuthException_class, args);
+        Py_DECREF(args);
+    }
+}
+
+int authenticate_user_krb5pwd(
+    const char *user, const char *pswd, const char *service,
+    const char *default_realm
+) {
+    basicauth_result result;
+
+    // The KDC round trip can take a while, let other threads run meanwhile
+    STATS_BEGIN_ALLOW_THREADS
+    verify_user_krb5pwd(user, pswd, service, default_realm, &result);
+    STATS_END_ALLOW_THREADS
+
+    if (result.status != BASICAUTH_OK) {
+        set_basicauth_result_error(&result);
+        return 0;
+    }
+
+    return 1;
+}
+
+/*
+ * Starts a password check that the caller drives with password_step_next.
+ * The password cache is not consulted: deriving its key takes as long as a
+ * KDC round trip, which an event loop calling this cannot afford. On failure
+ * result says why and step needs no cleaning.
+ */
+void password_step_init(
+    const char *user, const char *pswd, const char *service,
+    const char *default_realm, password_step *step, basicauth_result *result
+) {
+    krb5_error_code code;
+    krb5_principal  client = NULL;
+    krb5_principal  server = NULL;
+
+    memset(step, 0, sizeof(password_step));
+    result->status = BASICAUTH_KRB5_ERROR;
+    result->code = 0;
+
+    code = new_krb5_context(&step->context);
+    if (code) {
+        step->context = NULL;
+        result->status = BASICAUTH_CONTEXT_ERROR;
+        result->code = code;
+        return;
+    }
+
+    // The service is only checked, as checkPassword does
+    code = krb5_parse_name(step->context, service, &server);
+    if (code) {
+        goto end;
+    }
+    krb5_free_principal(step->context, server);
+
+    code = parse_client(step->context, user, default_realm, &client);
+    if (code == ENOMEM) {
+        result->status = BASICAUTH_NO_MEMORY;
+    }
+    if (code) {
+        goto end;
+    }
+
+    code = krb5_init_creds_init(
+        step->context, client, NULL, NULL, 0, NULL, &step->icc
+    );
+    if (code) {
+        step->icc = NULL;
+        goto end;
+    }
+
+    code = krb5_init_creds_set_password(step->context, step->icc, pswd);
+    if (code) {
+        goto end;
+    }
+
+    step->stat_start = STATS_START();
+    result->status = BASICAUTH_OK;
+
+end:
+    result->code = code;
+    if (client) {
+        krb5_free_principal(step->context, client);
+    }
+    if (result->status != BASICAUTH_OK) {
+        password_step_clean(step);
+    }
+}
+
+static void finish_password_step(
+    password_step *step, krb5_error_code code, basicauth_result *result
+) {
+    STATS_END(STAT_GET_INIT_CREDS_PASSWORD, step->stat_start, code != 0);
+    step->stat_start = 0.0;
+
+    result->status = code ? BASICAUTH_KRB5_ERROR : BASICAUTH_OK;
+    result->code = code;
+}
+
+/*
+ * Takes the KDC's reply to the last request, or nothing on the first call,
+ * and works out what to do next. Returns PASSWORD_STEP_CONTINUE with the
+ * next request in request, to be freed with krb5_free_data_contents and sent
+ * to a KDC of step->realm; PASSWORD_STEP_COMPLETE once the password is
+ * known to be right; or PASSWORD_STEP_ERROR with result saying why. Uses no
+ * Python API, so may be called with the GIL released.
+ */
+int password_step_next(
+    password_step *step, const char *reply, size_t reply_length,
+    krb5_data *request, basicauth_result *result
+) {
+    krb5_error_code code;
+    krb5_data       in;
+    krb5_data       realm;
+    unsigned int    flags = 0;
+
+    memset(request, 0, sizeof(krb5_data));
+    memset(&realm, 0, sizeof(krb5_data));
+    in.magic = 0;
+    in.length = (unsigned int)reply_length;
+    in.data = (char *)reply;
+
+    code = krb5_init_creds_step(
+        step->context, step->icc, &in, request, &realm, &flags
+    );
+
+    // The request comes back unchanged, to be sent again over TCP
+    if (code == KRB5KRB_ERR_RESPONSE_TOO_BIG && ! step->tcp_only) {
+        step->tcp_only = 1;
+        code = 0;
+        flags |= KRB5_INIT_CREDS_STEP_FLAG_CONTINUE;
+    }
+
+    if (code || ! (flags & KRB5_INIT_CREDS_STEP_FLAG_CONTINUE)) {
+        krb5_free_data_contents(step->context, request);
+        krb5_free_data_contents(step->context, &realm);
+        finish_password_step(step, code, result);
+        return code ? PASSWORD_STEP_ERROR : PASSWORD_STEP_COMPLETE;
+    }
+
+    free(step->realm);
+    step->realm = (char *)malloc(realm.length + 1);
+    if (step->realm != NULL) {
+        memcpy(step->realm, realm.data, realm.length);
+        step->realm[realm.length] = '\0';
+    }
+    krb5_free_data_contents(step->context, &realm);
+    if (step->realm == NULL) {
+        krb5_free_data_contents(step->context, request);
+        finish_password_step(step, ENOMEM, result);
+        result->status = BASICAUTH_NO_MEMORY;
+        return PASSWORD_STEP_ERROR;
+    }
+
+    result->status = BASICAUTH_OK;
+    result->code = 0;
+
+    return PASSWORD_STEP_CONTINUE;
+}
+
+/*
+ * Ends a check because no KDC of the realm answered, with the error
+ * checkPassword gives in that case.
+ */
+void password_step_unreachable(
+    password_step *step, basicauth_result *result
+) {
+    finish_password_step(step, KRB5_KDC_UNREACH, result);
+}
+
+void password_step_clean(password_step *step)
+{
+    if (step->icc) {
+        krb5_init_creds_free(step->context, step->icc);
+        step->icc = NULL;
+    }
+    if (step->context) {
+        krb5_free_context(step->context);
+        step->context = NULL;
+    }
+    free(step->realm);
+    step->realm = NULL;
+}
+
+/*
+ * Looks up the KDCs listed for realm in the Kerberos configuration. Returns
+ * 0 with a NULL terminated list to be freed with profile_free_list, which is
+ * empty if none are listed, or an error code.
+ */
+krb5_error_code get_realm_kdcs(const char *realm, char ***kdcs)
+{
+    krb5_context    kcontext = NULL;
+    krb5_error_code code;
+    profile_t       profile = NULL;
+    const char      *names[4];
+
+    *kdcs = NULL;
+
+    code = acquire_krb5_context(&kcontext);
+    if (code) {
+        return code;
+    }
+
+    code = krb5_get_profile(kcontext, &profile);
+    if (code) {
+        return code;
+    }
+
+    names[0] = "realms";
+    names[1] = realm;
+    names[2] = "kdc";
+    names[3] = NULL;
+    code = profile_get_values(profile, names, kdcs);
+    profile_release(profile);
+
+    if (code == PROF_NO_RELATION || code == PROF_NO_SECTION) {
+        *kdcs = (char **)calloc(1, sizeof(char *));
+        code = *kdcs ? 0 : ENOMEM;
+    }
+
+    return code;
 }
 
 /* Inspired by krb5_verify_user from Heimdal */
@@ -135,6 +635,7 @@ static krb5_error_code verify_krb5_user(
     krb5_get_init_creds_opt gic_options;
     krb5_error_code ret;
     char *name = NULL;
+    double stat_start;
 
     memset(&creds, 0, sizeof(creds));
 
@@ -147,25 +648,14 @@ static krb5_error_code verify_krb5_user(
     }
 
     krb5_get_init_creds_opt_init(&gic_options);
+    stat_start = STATS_START();
     ret = krb5_get_init_creds_password(
         context, &creds, principal, (char *)password,
         NULL, NULL, 0, NULL, &gic_options
     );
-    if (ret) {
-        set_basicauth_error(context, ret);
-        goto end;
-    }
+    STATS_END(STAT_GET_INIT_CREDS_PASSWORD, stat_start, ret != 0);
 
-end:
     krb5_free_cred_contents(context, &creds);
 
     return ret;
 }
-
-static void set_basicauth_error(krb5_context context, krb5_error_code code)
-{
-    PyErr_SetObject(
-        BasicAuthException_class,
-        Py_BuildValue("(s:i)", krb5_get_err_text(context, code), code)
-    );
-}
@@ -20,6 +20,68 @@
 
 #define krb5_get_err_text(context,code) error_message(code)
 
+#define BASICAUTH_OK                0
+#define BASICAUTH_CONTEXT_ERROR     1
+#define BASICAUTH_NO_MEMORY         2
+#define BASICAUTH_KRB5_ERROR        3
+
+typedef struct {
+    int              status;
+    krb5_error_code  code;
+} basicauth_result;
+
+/*
+ * A password check driven one KDC exchange at a time. The caller sends each
+ * request to a KDC of realm, over TCP if tcp_only is set, and passes back the
+ * reply, so no thread waits on the network.
+ */
+typedef struct {
+    krb5_context             context;
+    krb5_init_creds_context  icc;
+    char*                    realm;
+    int                      tcp_only;
+    double                   stat_start;
+} password_step;
+
+#define PASSWORD_STEP_ERROR     -1
+#define PASSWORD_STEP_COMPLETE   0
+#define PASSWORD_STEP_CONTINUE   1
+
+typedef struct {
+    unsigned long    hits;
+    unsigned long    misses;
+    unsigned long    negative_hits;
+    size_t           entries;
+} password_cache_stats;
+
+int enable_password_cache(
+    size_t max_entries, double ttl, double negative_ttl,
+    double max_negative_ttl, unsigned long work_factor
+);
+void disable_password_cache(void);
+void clear_password_cache(void);
+void get_password_cache_stats(password_cache_stats *stats);
+
+void verify_user_krb5pwd(
+    const char *user, const char *pswd, const char *service,
+    const char *default_realm, basicauth_result *result
+);
+void set_basicauth_result_error(const basicauth_result *result);
+
+void password_step_init(
+    const char *user, const char *pswd, const char *service,
+    const char *default_realm, password_step *step, basicauth_result *result
+);
+int password_step_next(
+    password_step *step, const char *reply, size_t reply_length,
+    krb5_data *request, basicauth_result *result
+);
+void password_step_unreachable(
+    password_step *step, basicauth_result *result
+);
+void password_step_clean(password_step *step);
+krb5_error_code get_realm_kdcs(const char *realm, char ***kdcs);
+
 int authenticate_user_krb5pwd(
     const char *user, const char *pswd, const char *service,
     const char *default_realm
@@ -0,0 +1,295 @@
+/**
+ * Copyright (c) 2026 Apple Inc. All rights reserved.
+ *
+ * Licensed under the Apache License, Version 2.0 (the "License");
+ * you may not use this file except in compliance with the License.
+ * You may obtain a copy of the License at
+ *
+ *     http://www.apache.org/licenses/LICENSE-2.0
+ *
+ * Unless required by applicable law or agreed to in writing, software
+ * distributed under the License is distributed on an "AS IS" BASIS,
+ * WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+ * See the License for the specific language governing permissions and
+ * limitations under the License.
+ **/
+
+#include "kerberoscache.h"
+
+#include <errno.h>
+#include <fcntl.h>
+#include <stdlib.h>
+#include <string.h>
+#include <time.h>
+#include <unistd.h>
+
+double cache_now(void)
+{
+    struct timespec now;
+
+    clock_gettime(CLOCK_MONOTONIC, &now);
+    return now.tv_sec + now.tv_nsec / 1e9;
+}
+
+/*
+ * Fills salt with len bytes from /dev/urandom, for the caches to key their
+ * digests with. Returns 0, or -1 with errno set.
+ */
+int cache_random_salt(unsigned char *salt, size_t len)
+{
+    size_t got = 0;
+    ssize_t n;
+    int saved_errno;
+    int fd;
+
+    fd = open("/dev/urandom", O_RDONLY);
+    if (fd < 0) {
+        return -1;
+    }
+    while (got < len) {
+        n = read(fd, salt + got, len - got);
+        if (n < 0 && errno == EINTR) {
+            continue;
+        }
+        if (n <= 0) {
+            // A short read at the end of the file leaves errno untouched
+            saved_errno = (n == 0) ? EIO : errno;
+            close(fd);
+            errno = saved_errno;
+            return -1;
+        }
+        got += (size_t)n;
+    }
+    close(fd);
+
+    return 0;
+}
+
+/*
+ * Keys are already uniformly distributed digests, so their leading bytes
+ * serve as the hash.
+ */
+static size_t bucket_index(ttl_cache *cache, const unsigned char *key)
+{
+    size_t hash;
+
+    memcpy(&hash, key, sizeof(hash));
+    return hash & (cache->bucket_count - 1);
+}
+
+static cache_entry **find_slot(ttl_cache *cache, const unsigned char *key)
+{
+    cache_entry **slot = &cache->buckets[bucket_index(cache, key)];
+
+    while (*slot != NULL && memcmp((*slot)->key, key, CACHE_KEY_SIZE) != 0) {
+        slot = &(*slot)->chain;
+    }
+    return slot;
+}
+
+static void unlink_lru(ttl_cache *cache, cache_entry *entry)
+{
+    if (entry->newer != NULL) {
+        entry->newer->older = entry->older;
+    } else {
+        cache->newest = entry->older;
+    }
+    if (entry->older != NULL) {
+        entry->older->newer = entry->newer;
+    } else {
+        cache->oldest = entry->newer;
+    }
+    entry->newer = entry->older = NULL;
+}
+
+static void link_newest(ttl_cache *cache, cache_entry *entry)
+{
+    entry->newer = NULL;
+    entry->older = cache->newest;
+    if (cache->newest != NULL) {
+        cache->newest->newer = entry;
+    } else {
+        cache->oldest = entry;
+    }
+    cache->newest = entry;
+}
+
+static void free_entry(ttl_cache *cache, cache_entry *entry)
+{
+    if (cache->free_value != NULL) {
+        cache->free_value(entry->value);
+    }
+    free(entry);
+}
+
+/*
+ * Removes the entry held in slot from both the bucket chain and the LRU list.
+ */
+static void drop_entry(ttl_cache *cache, cache_entry **slot)
+{
+    cache_entry *entry = *slot;
+
+    *slot = entry->chain;
+    unlink_lru(cache, entry);
+    cache->count--;
+    free_entry(cache, entry);
+}
+
+static void clear_locked(ttl_cache *cache)
+{
+    cache_entry *entry = cache->newest;
+
+    while (entry != NULL) {
+        cache_entry *older = entry->older;
+        free_entry(cache, entry);
+        entry = older;
+    }
+    if (cache->buckets != NULL) {
+        memset(cache->buckets, 0, cache->bucket_count * sizeof(cache_entry *));
+    }
+    cache->newest = cache->oldest = NULL;
+    cache->count = 0;
+}
+
+void ttl_cache_init(
+    ttl_cache *cache, size_t value_size, void (*free_value)(void *value)
+) {
+    memset(cache, 0, sizeof(*cache));
+    pthread_mutex_init(&cache->lock, NULL);
+    cache->value_size = value_size;
+    cache->free_value = free_value;
+}
+
+/*
+ * Empties the cache and sets the number of entries it may hold. Zero frees
+ * the table entirely, after which lookups always miss and stores are
+ * ignored.
+ */
+int ttl_cache_resize(ttl_cache *cache, size_t max_entries)
+{
+    cache_entry **buckets = NULL;
+    size_t bucket_count = 1;
+
+    if (max_entries > 0) {
+        while (bucket_count < max_entries) {
+            bucket_count <<= 1;
+        }
+        buckets = (cache_entry **)calloc(bucket_count, sizeof(cache_entry *));
+        if (buckets == NULL) {
+            return -1;
+        }
+    }
+
+    pthread_mutex_lock(&cache->lock);
+    clear_locked(cache);
+    free(cache->buckets);
+    cache->buckets = buckets;
+    cache->bucket_count = buckets ? bucket_count : 0;
+    cache->max_entries = max_entries;
+    pthread_mutex_unlock(&cache->lock);
+
+    return 0;
+}
+
+/*
+ * Copies the value stored for key into value and marks it most recently
+ * used. Returns 0 if there is no live entry for key.
+ */
+int ttl_cache_get(ttl_cache *cache, const unsigned char *key, void *value)
+{
+    cache_entry **slot;
+    int found = 0;
+
+    pthread_mutex_lock(&cache->lock);
+    if (cache->buckets != NULL) {
+        slot = find_slot(cache, key);
+        if (*slot != NULL) {
+            if ((*slot)->expires <= cache_now()) {
+                drop_entry(cache, slot);
+            } else {
+                memcpy(value, (*slot)->value, cache->value_size);
+                unlink_lru(cache, *slot);
+                link_newest(cache, *slot);
+                found = 1;
+            }
+        }
+    }
+    pthread_mutex_unlock(&cache->lock);
+
+    return found;
+}
+
+/*
+ * Stores a copy of value for key, replacing any existing entry, to expire
+ * after ttl seconds. Evicts the least recently used entry if the cache is
+ * full. Returns -1 if memory cannot be allocated.
+ */
+int ttl_cache_put(
+    ttl_cache *cache, const unsigned char *key, const void *value, double ttl
+) {
+    cache_entry *entry;
+    cache_entry **slot;
+
+    entry = (cache_entry *)malloc(sizeof(cache_entry) + cache->value_size);
+    if (entry == NULL) {
+        return -1;
+    }
+    memcpy(entry->key, key, CACHE_KEY_SIZE);
+    memcpy(entry->value, value, cache->value_size);
+    entry->expires = cache_now() + ttl;
+
+    pthread_mutex_lock(&cache->lock);
+    if (cache->buckets == NULL) {
+        pthread_mutex_unlock(&cache->lock);
+        free_entry(cache, entry);
+        return 0;
+    }
+
+    slot = find_slot(cache, key);
+    if (*slot != NULL) {
+        drop_entry(cache, slot);
+    } else if (cache->count >= cache->max_entries) {
+        drop_entry(cache, find_slot(cache, cache->oldest->key));
+        slot = find_slot(cache, key);
+    }
+
+    entry->chain = *slot;
+    *slot = entry;
+    link_newest(cache, entry);
+    cache->count++;
+    pthread_mutex_unlock(&cache->lock);
+
+    return 0;
+}
+
+void ttl_cache_remove(ttl_cache *cache, const unsigned char *key)
+{
+    cache_entry **slot;
+
+    pthread_mutex_lock(&cache->lock);
+    if (cache->buckets != NULL) {
+        slot = find_slot(cache, key);
+        if (*slot != NULL) {
+            drop_entry(cache, slot);
+        }
+    }
+    pthread_mutex_unlock(&cache->lock);
+}
+
+void ttl_cache_clear(ttl_cache *cache)
+{
+    pthread_mutex_lock(&cache->lock);
+    clear_locked(cache);
+    pthread_mutex_unlock(&cache->lock);
+}
+
+size_t ttl_cache_count(ttl_cache *cache)
+{
+    size_t count;
+
+    pthread_mutex_lock(&cache->lock);
+    count = cache->count;
+    pthread_mutex_unlock(&cache->lock);
+
+    return count;
+}
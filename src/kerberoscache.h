@@ -0,0 +1,66 @@
+/**
+ * Copyright (c) 2026 Apple Inc. All rights reserved.
+ *
+ * Licensed under the Apache License, Version 2.0 (the "License");
+ * you may not use this file except in compliance with the License.
+ * You may obtain a copy of the License at
+ *
+ *     http://www.apache.org/licenses/LICENSE-2.0
+ *
+ * Unless required by applicable law or agreed to in writing, software
+ * distributed under the License is distributed on an "AS IS" BASIS,
+ * WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+ * See the License for the specific language governing permissions and
+ * limitations under the License.
+ **/
+
+#ifndef KERBEROSCACHE_H
+#define KERBEROSCACHE_H
+
+#include <pthread.h>
+#include <stddef.h>
+
+#define CACHE_KEY_SIZE 32
+
+typedef struct cache_entry {
+    struct cache_entry  *chain;
+    struct cache_entry  *newer;
+    struct cache_entry  *older;
+    double              expires;
+    unsigned char       key[CACHE_KEY_SIZE];
+    unsigned char       value[1];
+} cache_entry;
+
+/*
+ * A bounded map from fixed size keys to fixed size values, where entries
+ * expire after a per-entry time to live and the least recently used entry is
+ * evicted when the map is full. All operations take the cache's own lock, so
+ * it may be used from any thread without the GIL.
+ */
+typedef struct {
+    pthread_mutex_t  lock;
+    cache_entry      **buckets;
+    size_t           bucket_count;
+    size_t           count;
+    size_t           max_entries;
+    size_t           value_size;
+    void             (*free_value)(void *value);
+    cache_entry      *newest;
+    cache_entry      *oldest;
+} ttl_cache;
+
+double cache_now(void);
+int cache_random_salt(unsigned char *salt, size_t len);
+void ttl_cache_init(
+    ttl_cache *cache, size_t value_size, void (*free_value)(void *value)
+);
+int ttl_cache_resize(ttl_cache *cache, size_t max_entries);
+int ttl_cache_get(ttl_cache *cache, const unsigned char *key, void *value);
+int ttl_cache_put(
+    ttl_cache *cache, const unsigned char *key, const void *value, double ttl
+);
+void ttl_cache_remove(ttl_cache *cache, const unsigned char *key);
+void ttl_cache_clear(ttl_cache *cache);
+size_t ttl_cache_count(ttl_cache *cache);
+
+#endif
@@ -0,0 +1,203 @@
+/**
+ * Copyright (c) 2026 Apple Inc. All rights reserved.
+ *
+ * Licensed under the Apache License, Version 2.0 (the "License");
+ * you may not use this file except in compliance with the License.
+ * You may obtain a copy of the License at
+ *
+ *     http://www.apache.org/licenses/LICENSE-2.0
+ *
+ * Unless required by applicable law or agreed to in writing, software
+ * distributed under the License is distributed on an "AS IS" BASIS,
+ * WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+ * See the License for the specific language governing permissions and
+ * limitations under the License.
+ **/
+
+#include "kerberoscontext.h"
+
+#include <errno.h>
+#include <pthread.h>
+#include <stdlib.h>
+
+/*
+ * krb5_init_context parses krb5.conf and sets up the library every time it is
+ * called, so each thread keeps one context around and reuses it. A krb5
+ * context must not be used by two threads at once, which a per-thread context
+ * guarantees without any locking on the hot path.
+ *
+ * reload_krb5_contexts bumps a generation counter; every thread notices the
+ * change the next time it asks for its context and replaces it. Contexts are
+ * only ever freed by the thread that owns them (or when it exits).
+ */
+
+typedef struct {
+    krb5_context   context;
+    unsigned long  generation;
+} thread_context;
+
+static pthread_key_t context_key;
+static pthread_once_t context_key_once = PTHREAD_ONCE_INIT;
+static int context_key_error = 0;
+static pthread_mutex_t generation_lock = PTHREAD_MUTEX_INITIALIZER;
+static unsigned long generation = 0;
+
+/*
+ * The configuration set with set_krb5_profile, or NULL to read the usual
+ * files. Guarded by generation_lock.
+ */
+static profile_t configured_profile = NULL;
+
+static void free_thread_context(void *value)
+{
+    thread_context *slot = (thread_context *)value;
+
+    if (slot) {
+        if (slot->context) {
+            krb5_free_context(slot->context);
+        }
+        free(slot);
+    }
+}
+
+static void create_context_key(void)
+{
+    context_key_error = pthread_key_create(&context_key, free_thread_context);
+}
+
+static unsigned long current_generation(void)
+{
+    unsigned long value;
+
+    pthread_mutex_lock(&generation_lock);
+    value = generation;
+    pthread_mutex_unlock(&generation_lock);
+
+    return value;
+}
+
+/*
+ * Returns the calling thread's krb5 context, creating it if needed. The
+ * context stays owned by the cache: callers must not free it.
+ */
+krb5_error_code acquire_krb5_context(krb5_context *context)
+{
+    thread_context *slot;
+    unsigned long wanted;
+    krb5_error_code code;
+
+    *context = NULL;
+
+    pthread_once(&context_key_once, create_context_key);
+    if (context_key_error) {
+        return context_key_error;
+    }
+
+    slot = (thread_context *)pthread_getspecific(context_key);
+    if (slot == NULL) {
+        slot = (thread_context *)calloc(1, sizeof(thread_context));
+        if (slot == NULL) {
+            return ENOMEM;
+        }
+        if ((code = pthread_setspecific(context_key, slot))) {
+            free(slot);
+            return code;
+        }
+    }
+
+    wanted = current_generation();
+    if (slot->context != NULL && slot->generation != wanted) {
+        krb5_free_context(slot->context);
+        slot->context = NULL;
+    }
+
+    if (slot->context == NULL) {
+        code = new_krb5_context(&slot->context);
+        if (code) {
+            slot->context = NULL;
+            return code;
+        }
+        slot->generation = wanted;
+    }
+
+    *context = slot->context;
+
+    return 0;
+}
+
+/*
+ * Creates a context owned by the caller, for work that may move between
+ * threads and so cannot use a per-thread one. Free it with krb5_free_context.
+ */
+krb5_error_code new_krb5_context(krb5_context *context)
+{
+    profile_t profile = NULL;
+    krb5_error_code code = 0;
+
+    pthread_mutex_lock(&generation_lock);
+    if (configured_profile != NULL) {
+        code = profile_copy(configured_profile, &profile);
+    }
+    pthread_mutex_unlock(&generation_lock);
+
+    if (code) {
+        return code;
+    }
+    if (profile == NULL) {
+        return krb5_init_context(context);
+    }
+
+    // The context takes its own copy of the profile
+    code = krb5_init_context_profile(profile, 0, context);
+    profile_release(profile);
+
+    return code;
+}
+
+/*
+ * Makes every thread re-read the Kerberos configuration the next time it
+ * needs a context.
+ */
+void reload_krb5_contexts(void)
+{
+    pthread_mutex_lock(&generation_lock);
+    generation++;
+    pthread_mutex_unlock(&generation_lock);
+}
+
+/*
+ * Makes every context created from now on use profile instead of the
+ * configuration files, or the files again if profile is NULL, once a
+ * context has been created from it successfully. Takes ownership of profile
+ * either way. Contexts already cached are replaced, as by
+ * reload_krb5_contexts.
+ */
+krb5_error_code set_krb5_profile(profile_t profile)
+{
+    krb5_context context = NULL;
+    krb5_error_code code;
+    profile_t previous;
+
+    code = profile ?
+        krb5_init_context_profile(profile, 0, &context) :
+        krb5_init_context(&context);
+    if (code) {
+        if (profile) {
+            profile_release(profile);
+        }
+        return code;
+    }
+    krb5_free_context(context);
+
+    pthread_mutex_lock(&generation_lock);
+    previous = configured_profile;
+    configured_profile = profile;
+    generation++;
+    pthread_mutex_unlock(&generation_lock);
+
+    if (previous) {
+        profile_release(previous);
+    }
+
+    return 0;
+}
@@ -16,6 +16,9 @@
 
 #include <Python.h>
 #include "kerberosgss.h"
+#include "kerberoscontext.h"
+#include "kerberosmodule.h"
+#include "kerberosstats.h"
 
 #include "base64.h"
 
@@ -23,182 +26,332 @@
 #include <stdlib.h>
 #include <string.h>
 #include <arpa/inet.h>
+#include <pthread.h>
+#include <time.h>
 
 static void set_gss_error(OM_uint32 err_maj, OM_uint32 err_min);
+static int copy_display_name(gss_name_t name, char **out);
+static int import_ccache_creds(const char* ccname, gss_cred_id_t* creds);
+static void release_delegated_ccache(gss_server_state *state);
+static int create_unique_krb5_ccache(
+    gss_server_state *state, krb5_context kcontext, krb5_principal princ,
+    const char *cache_type, krb5_ccache *ccache
+);
 
 int create_krb5_ccache(
     gss_server_state *state, krb5_context kcontext, krb5_principal princ,
-    krb5_ccache *ccache
+    const char *cache_type, krb5_ccache *ccache
 );
 
-extern PyObject *GssException_class;
-extern PyObject *KrbException_class;
-
-char* server_principal_details(const char* service, const char* hostname)
+/*
+ * Decodes a base64 challenge into a newly allocated token, which the caller
+ * must free. Malformed input raises KrbError rather than being passed on to
+ * GSSAPI.
+ */
+static int decode_challenge(const char* challenge, gss_buffer_t token)
 {
-    char match[1024];
-    size_t match_len = 0;
-    char* result = NULL;
-    
-    int code;
-    krb5_context kcontext;
-    krb5_keytab kt = NULL;
-    krb5_kt_cursor cursor = NULL;
-    krb5_keytab_entry entry;
-    char* pname = NULL;
-    
-    // Generate the principal prefix we want to match
-    snprintf(match, 1024, "%s/%s@", service, hostname);
-    match_len = strlen(match);
-    
-    code = krb5_init_context(&kcontext);
-    if (code) {
-        PyErr_SetObject(
-            KrbException_class,
-            Py_BuildValue(
-                "((s:i))", "Cannot initialize Kerberos5 context", code
-            )
-        );
-        return NULL;
-    }
-    
-    if ((code = krb5_kt_default(kcontext, &kt))) {
-        PyErr_SetObject(
-            KrbException_class,
-            Py_BuildValue("((s:i))", "Cannot get default keytab", code)
-        );
-        goto end;
+    size_t len = strlen(challenge);
+    size_t rlen;
+    unsigned char *decoded;
+
+    decoded = malloc(base64_decoded_length(len) + 1);
+    if (decoded == NULL) {
+        PyErr_NoMemory();
+        return AUTH_GSS_ERROR;
     }
-    
-    if ((code = krb5_kt_start_seq_get(kcontext, kt, &cursor))) {
+    if (base64_decode(challenge, len, decoded, &rlen) != BASE64_OK) {
+        free(decoded);
         PyErr_SetObject(
             KrbException_class,
-            Py_BuildValue(
-                "((s:i))", "Cannot get sequence cursor from keytab", code
-            )
+            Py_BuildValue("(s)", "Challenge is not valid base64")
         );
-        goto end;
+        return AUTH_GSS_ERROR;
     }
-    
-    while ((code = krb5_kt_next_entry(kcontext, kt, &entry, &cursor)) == 0) {
-        if ((code = krb5_unparse_name(kcontext, entry.principal, &pname))) {
-            PyErr_SetObject(
-                KrbException_class,
-                Py_BuildValue(
-                    "((s:i))", "Cannot parse principal name from keytab", code
-                )
-            );
-            goto end;
-        }
-        
-        if (strncmp(pname, match, match_len) == 0) {
-            result = malloc(strlen(pname) + 1);
-            if (result == NULL) {
-                PyErr_NoMemory();
-                goto end;
-            }
-            strcpy(result, pname);
-            krb5_free_unparsed_name(kcontext, pname);
-            krb5_free_keytab_entry_contents(kcontext, &entry);
-            break;
-        }
-        
-        krb5_free_unparsed_name(kcontext, pname);
-        krb5_free_keytab_entry_contents(kcontext, &entry);
+    token->value = decoded;
+    token->length = rlen;
+    return AUTH_GSS_COMPLETE;
+}
+
+/*
+ * A response is kept as the raw token GSSAPI returned, and base64 encoded
+ * only when it is first asked for. Callers that send the raw token, or only
+ * check the result, never pay for the encoding.
+ */
+static void clear_response(char **response, gss_buffer_t token)
+{
+    OM_uint32 min_stat;
+
+    if (*response != NULL) {
+        free(*response);
+        *response = NULL;
     }
-    
-    if (result == NULL) {
-        PyErr_SetObject(
-            KrbException_class,
-            Py_BuildValue("((s:i))", "Principal not found in keytab", -1)
-        );
+    if (token->value != NULL) {
+        gss_release_buffer(&min_stat, token);
     }
-    
-end:
-    if (cursor) {
-        krb5_kt_end_seq_get(kcontext, kt, &cursor);
+    token->length = 0;
+    token->value = NULL;
+}
+
+static void keep_response(gss_buffer_t token, gss_buffer_t output_token)
+{
+    if (output_token->length) {
+        *token = *output_token;
+        output_token->length = 0;
+        output_token->value = NULL;
     }
-    if (kt) {
-        krb5_kt_close(kcontext, kt);
+}
+
+static int encode_response(char **response, gss_buffer_t token)
+{
+    OM_uint32 min_stat;
+
+    if (*response == NULL && token->length) {
+        *response = base64_encode(
+            (const unsigned char *)token->value, token->length
+        );
+        if (*response == NULL) {
+            PyErr_NoMemory();
+            return AUTH_GSS_ERROR;
+        }
+        gss_release_buffer(&min_stat, token);
     }
-    krb5_free_context(kcontext);
-    
-    return result;
+    return AUTH_GSS_COMPLETE;
 }
 
+/*
+ * Initializes a client state for service. A target name from
+ * import_target_name may be given in place of service, and a credential from
+ * acquire_client_credential in place of principal and ccache; the state then
+ * holds a reference on them rather than importing and acquiring its own.
+ */
 int authenticate_gss_client_init(
-    const char* service, const char* principal, long int gss_flags,
+    const char* service, gss_shared_cred* target, const char* principal,
+    gss_shared_cred* credential, const char* ccache, long int gss_flags,
     gss_server_state* delegatestate, gss_OID mech_oid, gss_client_state* state
 )
 {
     OM_uint32 maj_stat;
     OM_uint32 min_stat;
     gss_buffer_desc name_token = GSS_C_EMPTY_BUFFER;
-    gss_buffer_desc principal_token = GSS_C_EMPTY_BUFFER;
     int ret = AUTH_GSS_COMPLETE;
     
     state->server_name = GSS_C_NO_NAME;
+    state->shared_name = NULL;
     state->mech_oid = mech_oid;
     state->context = GSS_C_NO_CONTEXT;
     state->gss_flags = gss_flags;
     state->client_creds = GSS_C_NO_CREDENTIAL;
+    state->shared_creds = NULL;
+    state->owns_creds = 0;
+    state->established = 0;
     state->username = NULL;
     state->response = NULL;
-    
-    // Import server name first
-    name_token.length = strlen(service);
-    name_token.value = (char *)service;
-    
-    maj_stat = gss_import_name(
-        &min_stat, &name_token, gss_krb5_nt_service_name, &state->server_name
-    );
-    
-    if (GSS_ERROR(maj_stat)) {
-        set_gss_error(maj_stat, min_stat);
+    state->response_token.length = 0;
+    state->response_token.value = NULL;
+
+    if (
+        credential != NULL &&
+        ((principal && *principal) || (ccache && *ccache) || delegatestate)
+    ) {
+        PyErr_SetString(
+            PyExc_ValueError,
+            "credential cannot be combined with principal, ccache or delegated"
+        );
         ret = AUTH_GSS_ERROR;
         goto end;
     }
-    // Use the delegate credentials if they exist
-    if (delegatestate && delegatestate->client_creds != GSS_C_NO_CREDENTIAL) {
-        state->client_creds = delegatestate->client_creds;
-    }
-    // If available use the principal to extract its associated credentials
-    else if (principal && *principal) {
-        gss_name_t name;
-        principal_token.length = strlen(principal);
-        principal_token.value = (char *)principal;
+    
+    // Import server name first, unless it was imported once for many contexts
+    if (target != NULL) {
+        hold_shared_cred(target);
+        state->shared_name = target;
+        state->server_name = target->name;
+    } else {
+        name_token.length = strlen(service);
+        name_token.value = (char *)service;
 
         maj_stat = gss_import_name(
-            &min_stat, &principal_token, GSS_C_NT_USER_NAME, &name
+            &min_stat, &name_token, gss_krb5_nt_service_name,
+            &state->server_name
         );
-        if (GSS_ERROR(maj_stat)) {
-            set_gss_error(maj_stat, min_stat);
-            ret = AUTH_GSS_ERROR;
-    	    goto end;
-        }
 
-        maj_stat = gss_acquire_cred(
-            &min_stat, name, GSS_C_INDEFINITE, GSS_C_NO_OID_SET,
-            GSS_C_INITIATE, &state->client_creds, NULL, NULL
-        );
-        if (GSS_ERROR(maj_stat)) {
-            set_gss_error(maj_stat, min_stat);
-            ret = AUTH_GSS_ERROR;
-            goto end;
-        }
-
-        maj_stat = gss_release_name(&min_stat, &name);
         if (GSS_ERROR(maj_stat)) {
             set_gss_error(maj_stat, min_stat);
             ret = AUTH_GSS_ERROR;
             goto end;
         }
     }
+    // Use credentials acquired once for many contexts
+    if (credential != NULL) {
+        hold_shared_cred(credential);
+        state->shared_creds = credential;
+        state->client_creds = credential->creds;
+    }
+    // Use the delegate credentials if they exist
+    else if (delegatestate && delegatestate->client_creds != GSS_C_NO_CREDENTIAL) {
+        state->client_creds = delegatestate->client_creds;
+    }
+    // Use the credentials in a given cache, e.g. one holding stored
+    // delegated credentials
+    else if (ccache && *ccache) {
+        ret = import_ccache_creds(ccache, &state->client_creds);
+        state->owns_creds = (ret != AUTH_GSS_ERROR);
+    }
+    // If available use the principal to extract its associated credentials
+    else if (principal && *principal) {
+        ret = authenticate_gss_acquire_initiator_creds(
+            principal, &state->client_creds
+        );
+        state->owns_creds = (ret != AUTH_GSS_ERROR);
+    }
 
 end:
     return ret;
 }
 
+/*
+ * Acquires initiator credentials from the named credential cache, which the
+ * caller must release with gss_release_cred.
+ */
+static int import_ccache_creds(const char* ccname, gss_cred_id_t* creds)
+{
+    OM_uint32 maj_stat;
+    OM_uint32 min_stat;
+    krb5_context context;
+    krb5_ccache ccache = NULL;
+    krb5_error_code problem;
+
+    problem = acquire_krb5_context(&context);
+    if (problem) {
+        PyErr_SetObject(
+            KrbException_class,
+            Py_BuildValue("(s)", "Cannot initialize krb5 context")
+        );
+        return AUTH_GSS_ERROR;
+    }
+
+    problem = krb5_cc_resolve(context, ccname, &ccache);
+    if (problem) {
+        PyErr_SetObject(
+            KrbException_class,
+            Py_BuildValue(
+                "(s:s)", "Error resolving the credential cache",
+                krb5_get_err_text(context, problem)
+            )
+        );
+        return AUTH_GSS_ERROR;
+    }
+
+    maj_stat = gss_krb5_import_cred(&min_stat, ccache, NULL, NULL, creds);
+    krb5_cc_close(context, ccache);
+    if (GSS_ERROR(maj_stat)) {
+        set_gss_error(maj_stat, min_stat);
+        return AUTH_GSS_ERROR;
+    }
+
+    return AUTH_GSS_COMPLETE;
+}
+
+/*
+ * Acquires the initiator credentials of principal, which the caller must
+ * release with gss_release_cred.
+ */
+int authenticate_gss_acquire_initiator_creds(
+    const char* principal, gss_cred_id_t* creds
+) {
+    double stat_start;
+    OM_uint32 maj_stat;
+    OM_uint32 min_stat;
+    gss_buffer_desc principal_token = GSS_C_EMPTY_BUFFER;
+    gss_name_t name;
+
+    principal_token.length = strlen(principal);
+    principal_token.value = (char *)principal;
+
+    maj_stat = gss_import_name(
+        &min_stat, &principal_token, GSS_C_NT_USER_NAME, &name
+    );
+    if (GSS_ERROR(maj_stat)) {
+        set_gss_error(maj_stat, min_stat);
+        return AUTH_GSS_ERROR;
+    }
+
+    stat_start = STATS_START();
+    maj_stat = gss_acquire_cred(
+        &min_stat, name, GSS_C_INDEFINITE, GSS_C_NO_OID_SET,
+        GSS_C_INITIATE, creds, NULL, NULL
+    );
+    STATS_END(STAT_ACQUIRE_CRED, stat_start, GSS_ERROR(maj_stat));
+    if (GSS_ERROR(maj_stat)) {
+        gss_release_name(&min_stat, &name);
+        set_gss_error(maj_stat, min_stat);
+        return AUTH_GSS_ERROR;
+    }
+
+    maj_stat = gss_release_name(&min_stat, &name);
+    if (GSS_ERROR(maj_stat)) {
+        set_gss_error(maj_stat, min_stat);
+        return AUTH_GSS_ERROR;
+    }
+
+    return AUTH_GSS_COMPLETE;
+}
+
+/*
+ * Gets a service ticket for service into the credential cache by starting,
+ * and then discarding, a security context for it, so that later handshakes
+ * find the ticket cached instead of asking the KDC. Uses no Python API, so it
+ * may run with the GIL released. The outcome is left in maj_stat and
+ * min_stat.
+ */
+void authenticate_gss_prewarm(
+    const char* service, gss_cred_id_t creds, OM_uint32* maj_stat,
+    OM_uint32* min_stat
+) {
+    double stat_start;
+    OM_uint32 ignore;
+    gss_buffer_desc name_token = GSS_C_EMPTY_BUFFER;
+    gss_buffer_desc output_token = GSS_C_EMPTY_BUFFER;
+    gss_name_t server_name = GSS_C_NO_NAME;
+    gss_ctx_id_t context = GSS_C_NO_CONTEXT;
+
+    name_token.length = strlen(service);
+    name_token.value = (char *)service;
+
+    *maj_stat = gss_import_name(
+        min_stat, &name_token, gss_krb5_nt_service_name, &server_name
+    );
+    if (GSS_ERROR(*maj_stat)) {
+        return;
+    }
+
+    stat_start = STATS_START();
+    *maj_stat = gss_init_sec_context(
+        min_stat,
+        creds,
+        &context,
+        server_name,
+        GSS_C_NO_OID,
+        0,
+        0,
+        GSS_C_NO_CHANNEL_BINDINGS,
+        GSS_C_NO_BUFFER,
+        NULL,
+        &output_token,
+        NULL,
+        NULL
+    );
+    STATS_END(STAT_INIT_SEC_CONTEXT, stat_start, GSS_ERROR(*maj_stat));
+
+    if (output_token.value) {
+        gss_release_buffer(&ignore, &output_token);
+    }
+    if (context != GSS_C_NO_CONTEXT) {
+        gss_delete_sec_context(&ignore, &context, GSS_C_NO_BUFFER);
+    }
+    gss_release_name(&ignore, &server_name);
+}
+
 int authenticate_gss_client_clean(gss_client_state *state)
 {
     OM_uint32 maj_stat;
@@ -210,57 +363,55 @@ int authenticate_gss_client_clean(gss_client_state *state)
             &min_stat, &state->context, GSS_C_NO_BUFFER
         );
     }
+    // Shared names and credentials are only released by their last user
+    if (state->shared_name != NULL) {
+        release_shared_cred(state->shared_name);
+        state->shared_name = NULL;
+        state->server_name = GSS_C_NO_NAME;
+    }
     if (state->server_name != GSS_C_NO_NAME) {
         maj_stat = gss_release_name(&min_stat, &state->server_name);
     }
-    if (
-        state->client_creds != GSS_C_NO_CREDENTIAL &&
-        ! (state->gss_flags & GSS_C_DELEG_FLAG)
-    ) {
+    if (state->shared_creds != NULL) {
+        release_shared_cred(state->shared_creds);
+        state->shared_creds = NULL;
+        state->client_creds = GSS_C_NO_CREDENTIAL;
+    }
+    // Credentials borrowed from a server context belong to it
+    if (state->client_creds != GSS_C_NO_CREDENTIAL && state->owns_creds) {
         maj_stat = gss_release_cred(&min_stat, &state->client_creds);
     }
     if (state->username != NULL) {
         free(state->username);
         state->username = NULL;
     }
-    if (state->response != NULL) {
-        free(state->response);
-        state->response = NULL;
-    }
+    clear_response(&state->response, &state->response_token);
+    state->established = 0;
     
     return ret;
 }
 
-int authenticate_gss_client_step(
-    gss_client_state* state, const char* challenge, struct gss_channel_bindings_struct* channel_bindings
+/*
+ * Does one client step with a raw input token. On success output_token holds
+ * the raw token to send to the server, which the caller must release with
+ * gss_release_buffer.
+ */
+int authenticate_gss_client_step_token(
+    gss_client_state* state, gss_buffer_t input_token,
+    struct gss_channel_bindings_struct* channel_bindings,
+    gss_buffer_t output_token
 ) {
+    double stat_start;
     OM_uint32 maj_stat;
     OM_uint32 min_stat;
-    gss_buffer_desc input_token = GSS_C_EMPTY_BUFFER;
-    gss_buffer_desc output_token = GSS_C_EMPTY_BUFFER;
     int ret = AUTH_GSS_CONTINUE;
-    
-    // Always clear out the old response
-    if (state->response != NULL) {
-        free(state->response);
-        state->response = NULL;
-    }
-    
-    // If there is a challenge (data from the server) we need to give it to GSS
-    if (challenge && *challenge) {
-        size_t len;
-        input_token.value = base64_decode(challenge, &len);
-        if (input_token.value == NULL)
-        {
-            PyErr_NoMemory();
-            ret = AUTH_GSS_ERROR;
-            goto end;
-        }
-        input_token.length = len;
-    }
-    
+
+    output_token->length = 0;
+    output_token->value = NULL;
+
     // Do GSSAPI step
-    Py_BEGIN_ALLOW_THREADS
+    STATS_BEGIN_ALLOW_THREADS
+    stat_start = STATS_START();
     maj_stat = gss_init_sec_context(
         &min_stat,
         state->client_creds,
@@ -270,13 +421,14 @@ int authenticate_gss_client_step(
         (OM_uint32)state->gss_flags,
         0,
         channel_bindings,
-        &input_token,
+        input_token,
         NULL,
-        &output_token,
+        output_token,
         NULL,
         NULL
     );
-    Py_END_ALLOW_THREADS
+    STATS_END(STAT_INIT_SEC_CONTEXT, stat_start, GSS_ERROR(maj_stat));
+    STATS_END_ALLOW_THREADS
     
     if ((maj_stat != GSS_S_COMPLETE) && (maj_stat != GSS_S_CONTINUE_NEEDED)) {
         set_gss_error(maj_stat, min_stat);
@@ -285,56 +437,51 @@ int authenticate_gss_client_step(
     }
     
     ret = (maj_stat == GSS_S_COMPLETE) ? AUTH_GSS_COMPLETE : AUTH_GSS_CONTINUE;
-    // Grab the client response to send back to the server
-    if (output_token.length) {
-        state->response = base64_encode((const unsigned char *)output_token.value, output_token.length);
-        if (state->response == NULL) {
-            PyErr_NoMemory();
-            ret = AUTH_GSS_ERROR;
-            goto end;
-        }
-        maj_stat = gss_release_buffer(&min_stat, &output_token);
-    }
     
-    // Try to get the user name if we have completed all GSS operations
+    // The user name is looked up from the context when it is first asked for
     if (ret == AUTH_GSS_COMPLETE) {
-        gss_name_t gssuser = GSS_C_NO_NAME;
-        maj_stat = gss_inquire_context(&min_stat, state->context, &gssuser, NULL, NULL, NULL,  NULL, NULL, NULL);
-        if (GSS_ERROR(maj_stat)) {
-            set_gss_error(maj_stat, min_stat);
-            ret = AUTH_GSS_ERROR;
-            goto end;
+        state->established = 1;
+        if (state->username != NULL) {
+            free(state->username);
+            state->username = NULL;
         }
-        
-        gss_buffer_desc name_token;
-        name_token.length = 0;
-        maj_stat = gss_display_name(&min_stat, gssuser, &name_token, NULL);
-        if (GSS_ERROR(maj_stat)) {
-            if (name_token.value) {
-                gss_release_buffer(&min_stat, &name_token);
-            }
-            gss_release_name(&min_stat, &gssuser);
-            
-            set_gss_error(maj_stat, min_stat);
+    }
+
+end:
+    if (ret == AUTH_GSS_ERROR && output_token->value) {
+        gss_release_buffer(&min_stat, output_token);
+    }
+    return ret;
+}
+
+int authenticate_gss_client_step(
+    gss_client_state* state, const char* challenge, struct gss_channel_bindings_struct* channel_bindings
+) {
+    OM_uint32 min_stat;
+    gss_buffer_desc input_token = GSS_C_EMPTY_BUFFER;
+    gss_buffer_desc output_token = GSS_C_EMPTY_BUFFER;
+    int ret = AUTH_GSS_CONTINUE;
+    
+    // Always clear out the old response
+    clear_response(&state->response, &state->response_token);
+    
+    // If there is a challenge (data from the server) we need to give it to GSS
+    if (challenge && *challenge) {
+        if (decode_challenge(challenge, &input_token) == AUTH_GSS_ERROR) {
             ret = AUTH_GSS_ERROR;
             goto end;
-        } else {
-            if (state->username != NULL) {                                                                                                    
-                free(state->username);                                                                                                        
-                state->username = NULL;                                                                                                       
-            }                                                                                                                                 
-            state->username = (char *)malloc(name_token.length + 1);
-            if (state->username == NULL) {
-                PyErr_NoMemory();
-                ret = AUTH_GSS_ERROR;
-                goto end;
-            }
-            strncpy(state->username, (char*) name_token.value, name_token.length);
-            state->username[name_token.length] = 0;
-            gss_release_buffer(&min_stat, &name_token);
-            gss_release_name(&min_stat, &gssuser);
         }
     }
+    
+    ret = authenticate_gss_client_step_token(
+        state, &input_token, channel_bindings, &output_token
+    );
+    if (ret == AUTH_GSS_ERROR) {
+        goto end;
+    }
+    
+    // Keep the client response to send back to the server
+    keep_response(&state->response_token, &output_token);
 
 end:
     if (output_token.value) {
@@ -343,13 +490,296 @@ end:
     if (input_token.value) {
         free(input_token.value);
     }
-    return ret;
+    return ret;
+}
+
+/*
+ * Unwraps a raw token received on context. On success output_token holds the
+ * raw message, which the caller must release with gss_release_buffer, and
+ * conf tells whether it was encrypted.
+ */
+int authenticate_gss_unwrap_token(
+    gss_ctx_id_t context, gss_buffer_t input_token, gss_buffer_t output_token,
+    int *conf
+) {
+    double stat_start;
+    OM_uint32 maj_stat;
+    OM_uint32 min_stat;
+
+    output_token->length = 0;
+    output_token->value = NULL;
+    *conf = 0;
+
+    stat_start = STATS_START();
+    maj_stat = gss_unwrap(
+        &min_stat,
+        context,
+        input_token,
+        output_token,
+        conf,
+        NULL
+    );
+    STATS_END(STAT_UNWRAP, stat_start, GSS_ERROR(maj_stat));
+
+    if (maj_stat != GSS_S_COMPLETE) {
+        if (output_token->value) {
+            gss_release_buffer(&min_stat, output_token);
+        }
+        set_gss_error(maj_stat, min_stat);
+        return AUTH_GSS_ERROR;
+    }
+
+    return AUTH_GSS_COMPLETE;
+}
+
+/*
+ * Wraps a raw message for sending on context, with confidentiality if protect
+ * is set. On success output_token holds the raw token, which the caller must
+ * release with gss_release_buffer.
+ */
+int authenticate_gss_wrap_token(
+    gss_ctx_id_t context, gss_buffer_t input_token, int protect,
+    gss_buffer_t output_token
+) {
+    double stat_start;
+    OM_uint32 maj_stat;
+    OM_uint32 min_stat;
+
+    output_token->length = 0;
+    output_token->value = NULL;
+
+    stat_start = STATS_START();
+    maj_stat = gss_wrap(
+        &min_stat,
+        context,
+        protect,
+        GSS_C_QOP_DEFAULT,
+        input_token,
+        NULL,
+        output_token
+    );
+    STATS_END(STAT_WRAP, stat_start, GSS_ERROR(maj_stat));
+
+    if (maj_stat != GSS_S_COMPLETE) {
+        if (output_token->value) {
+            gss_release_buffer(&min_stat, output_token);
+        }
+        set_gss_error(maj_stat, min_stat);
+        return AUTH_GSS_ERROR;
+    }
+
+    return AUTH_GSS_COMPLETE;
+}
+
+/*
+ * Wraps each message in turn for sending on context. Touches no Python state,
+ * so it may run with the GIL released. Each message records its own status;
+ * a failure does not stop the rest of the batch. Successful outputs must be
+ * released with gss_release_buffer.
+ */
+void authenticate_gss_wrap_many(
+    gss_ctx_id_t context, gss_message* messages, size_t count, int protect
+) {
+    double stat_start;
+    size_t i;
+
+    for (i = 0; i < count; i++) {
+        gss_message *message = &messages[i];
+
+        message->output.length = 0;
+        message->output.value = NULL;
+        message->conf = 0;
+        stat_start = STATS_START();
+        message->maj_stat = gss_wrap(
+            &message->min_stat,
+            context,
+            protect,
+            GSS_C_QOP_DEFAULT,
+            &message->input,
+            &message->conf,
+            &message->output
+        );
+        STATS_END(STAT_WRAP, stat_start, GSS_ERROR(message->maj_stat));
+        if (message->maj_stat != GSS_S_COMPLETE && message->output.value) {
+            OM_uint32 min_stat;
+            gss_release_buffer(&min_stat, &message->output);
+        }
+    }
+}
+
+/*
+ * Unwraps each message in turn, as authenticate_gss_wrap_many does for
+ * wrapping. conf tells whether each message was encrypted.
+ */
+void authenticate_gss_unwrap_many(
+    gss_ctx_id_t context, gss_message* messages, size_t count
+) {
+    double stat_start;
+    size_t i;
+
+    for (i = 0; i < count; i++) {
+        gss_message *message = &messages[i];
+
+        message->output.length = 0;
+        message->output.value = NULL;
+        message->conf = 0;
+        stat_start = STATS_START();
+        message->maj_stat = gss_unwrap(
+            &message->min_stat,
+            context,
+            &message->input,
+            &message->output,
+            &message->conf,
+            NULL
+        );
+        STATS_END(STAT_UNWRAP, stat_start, GSS_ERROR(message->maj_stat));
+        if (message->maj_stat != GSS_S_COMPLETE && message->output.value) {
+            OM_uint32 min_stat;
+            gss_release_buffer(&min_stat, &message->output);
+        }
+    }
+}
+
+/*
+ * Sets max_input to the largest message that wraps into a token of at most
+ * max_output bytes on context.
+ */
+int authenticate_gss_wrap_size_limit(
+    gss_ctx_id_t context, int protect, OM_uint32 max_output,
+    OM_uint32 *max_input
+) {
+    OM_uint32 maj_stat;
+    OM_uint32 min_stat;
+
+    *max_input = 0;
+    maj_stat = gss_wrap_size_limit(
+        &min_stat,
+        context,
+        protect,
+        GSS_C_QOP_DEFAULT,
+        max_output,
+        max_input
+    );
+
+    if (GSS_ERROR(maj_stat)) {
+        set_gss_error(maj_stat, min_stat);
+        return AUTH_GSS_ERROR;
+    }
+
+    return AUTH_GSS_COMPLETE;
+}
+
+/*
+ * Fills in the GSS_FRAME_BUFFERS buffer types and lengths needed to wrap a
+ * message of length bytes in place. The caller points each buffer into a
+ * single allocation of their combined length, which then holds the token.
+ */
+int authenticate_gss_wrap_iov_length(
+    gss_ctx_id_t context, int protect, size_t length, gss_iov_buffer_desc *iov
+) {
+    OM_uint32 maj_stat;
+    OM_uint32 min_stat;
+    int i;
+
+    iov[GSS_FRAME_HEADER].type = GSS_IOV_BUFFER_TYPE_HEADER;
+    iov[GSS_FRAME_DATA].type = GSS_IOV_BUFFER_TYPE_DATA;
+    iov[GSS_FRAME_PADDING].type = GSS_IOV_BUFFER_TYPE_PADDING;
+    iov[GSS_FRAME_TRAILER].type = GSS_IOV_BUFFER_TYPE_TRAILER;
+    for (i = 0; i < GSS_FRAME_BUFFERS; i++) {
+        iov[i].buffer.length = 0;
+        iov[i].buffer.value = NULL;
+    }
+    iov[GSS_FRAME_DATA].buffer.length = length;
+
+    maj_stat = gss_wrap_iov_length(
+        &min_stat,
+        context,
+        protect,
+        GSS_C_QOP_DEFAULT,
+        NULL,
+        iov,
+        GSS_FRAME_BUFFERS
+    );
+
+    if (GSS_ERROR(maj_stat)) {
+        set_gss_error(maj_stat, min_stat);
+        return AUTH_GSS_ERROR;
+    }
+
+    return AUTH_GSS_COMPLETE;
+}
+
+/*
+ * Wraps the data buffer of iov in place, filling in the header, padding and
+ * trailer. Touches no Python state, so it may run with the GIL released.
+ */
+void authenticate_gss_wrap_iov(
+    gss_ctx_id_t context, int protect, gss_iov_buffer_desc *iov,
+    OM_uint32 *maj_stat, OM_uint32 *min_stat
+) {
+    double stat_start;
+
+    stat_start = STATS_START();
+    *maj_stat = gss_wrap_iov(
+        min_stat,
+        context,
+        protect,
+        GSS_C_QOP_DEFAULT,
+        NULL,
+        iov,
+        GSS_FRAME_BUFFERS
+    );
+    STATS_END(STAT_WRAP, stat_start, GSS_ERROR(*maj_stat));
+}
+
+/*
+ * Unwraps the token in stream in place. On success data points at the
+ * message inside stream, unless the mechanism chose to allocate it, in which
+ * case data_allocated is set and the caller must release it with
+ * gss_release_buffer. Touches no Python state, so it may run with the GIL
+ * released.
+ */
+void authenticate_gss_unwrap_iov(
+    gss_ctx_id_t context, gss_buffer_t stream, gss_buffer_t data,
+    int *data_allocated, int *conf, OM_uint32 *maj_stat, OM_uint32 *min_stat
+) {
+    gss_iov_buffer_desc iov[2];
+    double stat_start;
+
+    iov[0].type = GSS_IOV_BUFFER_TYPE_STREAM;
+    iov[0].buffer = *stream;
+    iov[1].type = GSS_IOV_BUFFER_TYPE_DATA;
+    iov[1].buffer.length = 0;
+    iov[1].buffer.value = NULL;
+    *conf = 0;
+
+    stat_start = STATS_START();
+    *maj_stat = gss_unwrap_iov(min_stat, context, conf, NULL, iov, 2);
+    STATS_END(STAT_UNWRAP, stat_start, GSS_ERROR(*maj_stat));
+
+    *data = iov[1].buffer;
+    *data_allocated = (iov[1].type & GSS_IOV_BUFFER_FLAG_ALLOCATED) != 0;
+    if (GSS_ERROR(*maj_stat) && *data_allocated) {
+        OM_uint32 ignored;
+        gss_release_iov_buffer(&ignored, &iov[1], 1);
+        data->length = 0;
+        data->value = NULL;
+        *data_allocated = 0;
+    }
+}
+
+/*
+ * Raises GSSError for a status obtained without the GIL held, such as that
+ * of a prewarmed service, a frame or a message that failed in a batch.
+ */
+void set_gss_status_error(OM_uint32 maj_stat, OM_uint32 min_stat)
+{
+    set_gss_error(maj_stat, min_stat);
 }
 
 int authenticate_gss_client_unwrap(
     gss_client_state *state, const char *challenge
 ) {
-	OM_uint32 maj_stat;
 	OM_uint32 min_stat;
 	gss_buffer_desc input_token = GSS_C_EMPTY_BUFFER;
 	gss_buffer_desc output_token = GSS_C_EMPTY_BUFFER;
@@ -357,55 +787,29 @@ int authenticate_gss_client_unwrap(
 	int conf = 0;
     
 	// Always clear out the old response
-	if (state->response != NULL) {
-		free(state->response);
-		state->response = NULL;
-		state->responseConf = 0;
-	}
+	clear_response(&state->response, &state->response_token);
+	state->responseConf = 0;
     
 	// If there is a challenge (data from the server) we need to give it to GSS
 	if (challenge && *challenge) {
-		size_t len;
-		input_token.value = base64_decode(challenge, &len);
-		if (input_token.value == NULL) {
-		    PyErr_NoMemory();
+		if (decode_challenge(challenge, &input_token) == AUTH_GSS_ERROR) {
 		    ret = AUTH_GSS_ERROR;
 		    goto end;
 		}
-		input_token.length = len;
 	}
     
 	// Do GSSAPI step
-	maj_stat = gss_unwrap(
-        &min_stat,
-        state->context,
-        &input_token,
-        &output_token,
-        &conf,
-        NULL
+	ret = authenticate_gss_unwrap_token(
+        state->context, &input_token, &output_token, &conf
     );
-    
-	if (maj_stat != GSS_S_COMPLETE)	{
-		set_gss_error(maj_stat, min_stat);
-		ret = AUTH_GSS_ERROR;
+	if (ret == AUTH_GSS_ERROR) {
 		goto end;
-	} else {
-		ret = AUTH_GSS_COMPLETE;
-    }
+	}
     
-	// Grab the client response
+	// Keep the client response
 	if (output_token.length) {
-		state->response = base64_encode(
-            (const unsigned char *)output_token.value, output_token.length
-        );
-		if (state->response == NULL)
-		{
-		    PyErr_NoMemory();
-		    ret = AUTH_GSS_ERROR;
-		    goto end;
-		}
+		keep_response(&state->response_token, &output_token);
 		state->responseConf = conf;
-		maj_stat = gss_release_buffer(&min_stat, &output_token);
 	}
 
 end:
@@ -422,30 +826,23 @@ int authenticate_gss_client_wrap(
     gss_client_state* state, const char* challenge, const char* user,
     int protect
 ) {
-	OM_uint32 maj_stat;
 	OM_uint32 min_stat;
 	gss_buffer_desc input_token = GSS_C_EMPTY_BUFFER;
 	gss_buffer_desc output_token = GSS_C_EMPTY_BUFFER;
 	int ret = AUTH_GSS_CONTINUE;
+	unsigned char *decoded = NULL;
 	char buf[4096], server_conf_flags;
 	unsigned long buf_size;
     
 	// Always clear out the old response
-	if (state->response != NULL) {
-		free(state->response);
-		state->response = NULL;
-	}
+	clear_response(&state->response, &state->response_token);
     
 	if (challenge && *challenge) {
-		size_t len;
-		input_token.value = base64_decode(challenge, &len);
-		if (input_token.value == NULL)
-		{
-		    PyErr_NoMemory();
+		if (decode_challenge(challenge, &input_token) == AUTH_GSS_ERROR) {
 		    ret = AUTH_GSS_ERROR;
 		    goto end;
 		}
-		input_token.length = len;
+		decoded = input_token.value;
 	}
     
 	if (user) {
@@ -453,7 +850,6 @@ int authenticate_gss_client_wrap(
 		server_conf_flags = ((char*) input_token.value)[0];
 		((char*) input_token.value)[0] = 0;
 		buf_size = ntohl(*((long *) input_token.value));
-		free(input_token.value);
 #ifdef PRINTFS
 		printf(
             "User: %s, %c%c%c\n", user,
@@ -475,60 +871,49 @@ int authenticate_gss_client_wrap(
 	}
     
 	// Do GSSAPI wrap
-	maj_stat = gss_wrap(
-        &min_stat,
-        state->context,
-        protect,
-        GSS_C_QOP_DEFAULT,
-        &input_token,
-        NULL,
-        &output_token
+	ret = authenticate_gss_wrap_token(
+        state->context, &input_token, protect, &output_token
     );
-    
-	if (maj_stat != GSS_S_COMPLETE)	{
-		set_gss_error(maj_stat, min_stat);
-		ret = AUTH_GSS_ERROR;
+	if (ret == AUTH_GSS_ERROR) {
 		goto end;
-	} else {
-		ret = AUTH_GSS_COMPLETE;
-    }
-	// Grab the client response to send back to the server
-	if (output_token.length) {
-		state->response = base64_encode((const unsigned char *)output_token.value, output_token.length);
-		if (state->response == NULL) {
-		    PyErr_NoMemory();
-		    ret = AUTH_GSS_ERROR;
-		    goto end;
-		}
-		maj_stat = gss_release_buffer(&min_stat, &output_token);
 	}
+	// Keep the client response to send back to the server
+	keep_response(&state->response_token, &output_token);
 
 end:
 	if (output_token.value) {
 		gss_release_buffer(&min_stat, &output_token);
     }
+	if (decoded) {
+		free(decoded);
+	}
 	return ret;
 }
 
 int authenticate_gss_client_inquire_cred(gss_client_state* state)
 {
+    double stat_start;
     OM_uint32 maj_stat;
     OM_uint32 min_stat;
     gss_cred_id_t client_creds = GSS_C_NO_CREDENTIAL;
     gss_buffer_desc name_token = GSS_C_EMPTY_BUFFER;
     gss_name_t name = GSS_C_NO_NAME;
+    const char *username = NULL;
     int ret = AUTH_GSS_COMPLETE;
 
     // Check whether credentials have already been obtained.
-    if (state->username != NULL) {
+    ret = authenticate_gss_client_username(state, &username);
+    if (ret == AUTH_GSS_ERROR || username != NULL) {
         goto end;
     }
 
     // Get credentials
+    stat_start = STATS_START();
     maj_stat = gss_acquire_cred(
         &min_stat, GSS_C_NO_NAME, GSS_C_INDEFINITE,
         GSS_C_NO_OID_SET, GSS_C_INITIATE, &client_creds, NULL, NULL
     );
+    STATS_END(STAT_ACQUIRE_CRED, stat_start, GSS_ERROR(maj_stat));
 
     if (GSS_ERROR(maj_stat)) {
         set_gss_error(maj_stat, min_stat);
@@ -577,61 +962,424 @@ end:
     return ret;
 }
 
-int authenticate_gss_server_init(const char *service, gss_server_state *state)
+/*
+ * Gets the user name of a client state, looking it up from the established
+ * context the first time it is asked for. *username is NULL until the
+ * context is established, unless authenticate_gss_client_inquire_cred set it.
+ */
+int authenticate_gss_client_username(
+    gss_client_state* state, const char** username
+) {
+    OM_uint32 maj_stat;
+    OM_uint32 min_stat;
+    gss_name_t gssuser = GSS_C_NO_NAME;
+    int ret = AUTH_GSS_COMPLETE;
+
+    if (
+        state->username == NULL && state->established &&
+        state->context != GSS_C_NO_CONTEXT
+    ) {
+        maj_stat = gss_inquire_context(
+            &min_stat, state->context, &gssuser, NULL, NULL, NULL, NULL, NULL,
+            NULL
+        );
+        if (GSS_ERROR(maj_stat)) {
+            set_gss_error(maj_stat, min_stat);
+            return AUTH_GSS_ERROR;
+        }
+        ret = copy_display_name(gssuser, &state->username);
+        gss_release_name(&min_stat, &gssuser);
+    }
+
+    *username = state->username;
+    return ret;
+}
+
+/*
+ * Gets the base64 encoded response of the last step, wrap or unwrap, or NULL
+ * if there is none.
+ */
+int authenticate_gss_client_response(
+    gss_client_state* state, const char** response
+) {
+    if (encode_response(&state->response, &state->response_token) == AUTH_GSS_ERROR) {
+        return AUTH_GSS_ERROR;
+    }
+    *response = state->response;
+    return AUTH_GSS_COMPLETE;
+}
+
+/*
+ * Imports the acceptor name for service and acquires its credentials. The
+ * literal service "DELEGATE" acquires default credentials usable both to
+ * accept and to initiate, for accepting delegated credentials. The outcome
+ * is left in maj_stat and min_stat rather than raised, as a failed refresh
+ * of shared credentials is not reported.
+ */
+static void acquire_acceptor_creds(
+    const char *service, gss_name_t *name, gss_cred_id_t *creds,
+    OM_uint32 *maj_stat, OM_uint32 *min_stat
+) {
+    double stat_start;
+    gss_buffer_desc name_token = GSS_C_EMPTY_BUFFER;
+    int cred_usage = GSS_C_ACCEPT;
+
+    *name = GSS_C_NO_NAME;
+    *creds = GSS_C_NO_CREDENTIAL;
+
+    // Import server name first
+    if (strcmp(service, "DELEGATE") == 0) {
+        cred_usage = GSS_C_BOTH;
+    }
+    else {
+        name_token.length = strlen(service);
+        name_token.value = (char *)service;
+
+        *maj_stat = gss_import_name(
+            min_stat, &name_token, GSS_C_NT_HOSTBASED_SERVICE, name
+        );
+
+        if (GSS_ERROR(*maj_stat)) {
+            return;
+        }
+    }
+
+    // Get credentials
+    stat_start = STATS_START();
+    *maj_stat = gss_acquire_cred(
+        min_stat, *name, GSS_C_INDEFINITE, GSS_C_NO_OID_SET,
+        cred_usage, creds, NULL, NULL
+    );
+    STATS_END(STAT_ACQUIRE_CRED, stat_start, GSS_ERROR(*maj_stat));
+}
+
+/*
+ * Acceptor credentials shared between server contexts, and target names and
+ * initiator credentials shared between client contexts. Each context holds a
+ * reference on the gss_shared_cred it was initialized with, so replacing the
+ * credential after a keytab change, or dropping the Python object it came
+ * from, never pulls it from under a context that is still stepping.
+ */
+static pthread_mutex_t shared_cred_lock = PTHREAD_MUTEX_INITIALIZER;
+
+/*
+ * Returns a new shared credential for service, or NULL with the GSSAPI
+ * status in maj_stat and min_stat. NULL with a status of GSS_S_COMPLETE
+ * means memory ran out.
+ */
+static gss_shared_cred* new_shared_cred(
+    const char *service, OM_uint32 *maj_stat, OM_uint32 *min_stat
+) {
+    gss_shared_cred *shared;
+    OM_uint32 ignore;
+
+    *maj_stat = GSS_S_COMPLETE;
+    *min_stat = 0;
+
+    shared = (gss_shared_cred *)malloc(sizeof(gss_shared_cred));
+    if (shared == NULL) {
+        return NULL;
+    }
+    shared->refcount = 1;
+
+    acquire_acceptor_creds(
+        service, &shared->name, &shared->creds, maj_stat, min_stat
+    );
+    if (GSS_ERROR(*maj_stat)) {
+        if (shared->creds != GSS_C_NO_CREDENTIAL) {
+            gss_release_cred(&ignore, &shared->creds);
+        }
+        if (shared->name != GSS_C_NO_NAME) {
+            gss_release_name(&ignore, &shared->name);
+        }
+        free(shared);
+        return NULL;
+    }
+
+    return shared;
+}
+
+static gss_shared_cred* alloc_shared_cred(void)
+{
+    gss_shared_cred *shared;
+
+    shared = (gss_shared_cred *)malloc(sizeof(gss_shared_cred));
+    if (shared == NULL) {
+        PyErr_NoMemory();
+        return NULL;
+    }
+    shared->refcount = 1;
+    shared->name = GSS_C_NO_NAME;
+    shared->creds = GSS_C_NO_CREDENTIAL;
+
+    return shared;
+}
+
+/*
+ * Imports the name of service, in the form "type@fqdn", once for any number
+ * of client contexts.
+ */
+gss_shared_cred* import_target_name(const char *service)
 {
+    gss_shared_cred *shared;
     OM_uint32 maj_stat;
     OM_uint32 min_stat;
     gss_buffer_desc name_token = GSS_C_EMPTY_BUFFER;
+
+    shared = alloc_shared_cred();
+    if (shared == NULL) {
+        return NULL;
+    }
+
+    name_token.length = strlen(service);
+    name_token.value = (char *)service;
+
+    maj_stat = gss_import_name(
+        &min_stat, &name_token, gss_krb5_nt_service_name, &shared->name
+    );
+    if (GSS_ERROR(maj_stat)) {
+        set_gss_error(maj_stat, min_stat);
+        release_shared_cred(shared);
+        return NULL;
+    }
+
+    return shared;
+}
+
+/*
+ * Acquires initiator credentials once for any number of client contexts,
+ * from ccache if given, else for principal if given, else the default ones.
+ */
+gss_shared_cred* acquire_client_credential(
+    const char *principal, const char *ccache
+) {
+    gss_shared_cred *shared;
+    double stat_start;
+    OM_uint32 maj_stat;
+    OM_uint32 min_stat;
+    int ret;
+
+    shared = alloc_shared_cred();
+    if (shared == NULL) {
+        return NULL;
+    }
+
+    if (ccache && *ccache) {
+        ret = import_ccache_creds(ccache, &shared->creds);
+    }
+    else if (principal && *principal) {
+        ret = authenticate_gss_acquire_initiator_creds(
+            principal, &shared->creds
+        );
+    }
+    else {
+        stat_start = STATS_START();
+        maj_stat = gss_acquire_cred(
+            &min_stat, GSS_C_NO_NAME, GSS_C_INDEFINITE, GSS_C_NO_OID_SET,
+            GSS_C_INITIATE, &shared->creds, NULL, NULL
+        );
+        STATS_END(STAT_ACQUIRE_CRED, stat_start, GSS_ERROR(maj_stat));
+        ret = AUTH_GSS_COMPLETE;
+        if (GSS_ERROR(maj_stat)) {
+            set_gss_error(maj_stat, min_stat);
+            ret = AUTH_GSS_ERROR;
+        }
+    }
+
+    if (ret == AUTH_GSS_ERROR) {
+        release_shared_cred(shared);
+        return NULL;
+    }
+
+    return shared;
+}
+
+void hold_shared_cred(gss_shared_cred *shared)
+{
+    pthread_mutex_lock(&shared_cred_lock);
+    shared->refcount++;
+    pthread_mutex_unlock(&shared_cred_lock);
+}
+
+void release_shared_cred(gss_shared_cred *shared)
+{
+    OM_uint32 min_stat;
+    int refcount;
+
+    pthread_mutex_lock(&shared_cred_lock);
+    refcount = --shared->refcount;
+    pthread_mutex_unlock(&shared_cred_lock);
+
+    if (refcount == 0) {
+        if (shared->creds != GSS_C_NO_CREDENTIAL) {
+            gss_release_cred(&min_stat, &shared->creds);
+        }
+        if (shared->name != GSS_C_NO_NAME) {
+            gss_release_name(&min_stat, &shared->name);
+        }
+        free(shared);
+    }
+}
+
+static void stamp_server_credential(gss_server_credential *credential)
+{
+    krb5_context kcontext;
+
+    credential->checked = time(NULL);
+    if (acquire_krb5_context(&kcontext)) {
+        memset(&credential->stamp, 0, sizeof(keytab_stamp));
+        return;
+    }
+    get_keytab_stamp(
+        kcontext, credential->ktname, sizeof(credential->ktname),
+        &credential->stamp
+    );
+}
+
+gss_server_credential* acquire_server_credential(const char *service)
+{
+    gss_server_credential *credential;
+    OM_uint32 maj_stat;
+    OM_uint32 min_stat;
+
+    credential = (gss_server_credential *)calloc(1, sizeof(gss_server_credential));
+    if (credential == NULL) {
+        PyErr_NoMemory();
+        return NULL;
+    }
+
+    credential->service = strdup(service);
+    if (credential->service == NULL) {
+        PyErr_NoMemory();
+        free(credential);
+        return NULL;
+    }
+
+    stamp_server_credential(credential);
+
+    credential->current = new_shared_cred(service, &maj_stat, &min_stat);
+    if (credential->current == NULL) {
+        if (GSS_ERROR(maj_stat)) {
+            set_gss_error(maj_stat, min_stat);
+        } else {
+            PyErr_NoMemory();
+        }
+        free(credential->service);
+        free(credential);
+        return NULL;
+    }
+
+    return credential;
+}
+
+void free_server_credential(gss_server_credential *credential)
+{
+    if (credential->current) {
+        release_shared_cred(credential->current);
+    }
+    free(credential->service);
+    free(credential);
+}
+
+/*
+ * Returns a new reference to the current credential, acquiring it again first
+ * if the keytab changed since it was acquired. The keytab is checked at most
+ * once per second. If acquiring fails the previous credential keeps being
+ * used, and acquiring is tried again on the next check.
+ */
+static gss_shared_cred* get_server_credential(gss_server_credential *credential)
+{
+    gss_shared_cred *shared;
+    char ktname[sizeof(credential->ktname)];
+    keytab_stamp stamp;
+    OM_uint32 maj_stat;
+    OM_uint32 min_stat;
+    int changed = 0;
+    time_t now = time(NULL);
+
+    pthread_mutex_lock(&shared_cred_lock);
+    if (credential->checked != now) {
+        strcpy(ktname, credential->ktname);
+        stamp = credential->stamp;
+        stamp_server_credential(credential);
+
+        changed = (
+            strcmp(ktname, credential->ktname) != 0 ||
+            stamp.valid != credential->stamp.valid ||
+            (stamp.valid && ! same_keytab_stamp(&stamp, &credential->stamp))
+        );
+    }
+    pthread_mutex_unlock(&shared_cred_lock);
+
+    if (changed) {
+        gss_shared_cred *fresh = new_shared_cred(
+            credential->service, &maj_stat, &min_stat
+        );
+
+        pthread_mutex_lock(&shared_cred_lock);
+        if (fresh == NULL) {
+            strcpy(credential->ktname, ktname);
+            credential->stamp = stamp;
+            shared = NULL;
+        } else {
+            shared = credential->current;
+            credential->current = fresh;
+        }
+        pthread_mutex_unlock(&shared_cred_lock);
+
+        if (shared != NULL) {
+            release_shared_cred(shared);
+        }
+    }
+
+    pthread_mutex_lock(&shared_cred_lock);
+    shared = credential->current;
+    shared->refcount++;
+    pthread_mutex_unlock(&shared_cred_lock);
+
+    return shared;
+}
+
+int authenticate_gss_server_init(
+    const char *service, gss_server_credential *credential,
+    gss_server_state *state
+) {
+    OM_uint32 maj_stat;
+    OM_uint32 min_stat;
     int ret = AUTH_GSS_COMPLETE;
     
     state->context = GSS_C_NO_CONTEXT;
     state->server_name = GSS_C_NO_NAME;
     state->client_name = GSS_C_NO_NAME;
     state->server_creds = GSS_C_NO_CREDENTIAL;
+    state->shared_creds = NULL;
     state->client_creds = GSS_C_NO_CREDENTIAL;
     state->username = NULL;
     state->targetname = NULL;
     state->response = NULL;
+    state->response_token.length = 0;
+    state->response_token.value = NULL;
     state->ccname = NULL;
-    int cred_usage = GSS_C_ACCEPT;
-    
-    // Server name may be empty which means we aren't going to create our own creds
-    size_t service_len = strlen(service);
-    if (service_len != 0) {
-        // Import server name first
-        if (strcmp(service, "DELEGATE") == 0) {
-	    cred_usage = GSS_C_BOTH;
-        }
-        else {
-            name_token.length = strlen(service);
-            name_token.value = (char *)service;
-        
-            maj_stat = gss_import_name(
-                &min_stat, &name_token, GSS_C_NT_HOSTBASED_SERVICE,
-                &state->server_name
-            );
-        
-            if (GSS_ERROR(maj_stat)) {
-                set_gss_error(maj_stat, min_stat);
-                ret = AUTH_GSS_ERROR;
-                goto end;
-            }
-	}
+    state->owns_ccache = 0;
+    state->lifetime = 0;
 
-        // Get credentials
-        maj_stat = gss_acquire_cred(
-            &min_stat, state->server_name, GSS_C_INDEFINITE, GSS_C_NO_OID_SET,
-            cred_usage, &state->server_creds, NULL, NULL
+    // Reuse already acquired credentials when we were given some
+    if (credential != NULL) {
+        state->shared_creds = get_server_credential(credential);
+        state->server_creds = state->shared_creds->creds;
+    }
+    // Server name may be empty which means we aren't going to create our own creds
+    else if (strlen(service) != 0) {
+        acquire_acceptor_creds(
+            service, &state->server_name, &state->server_creds, &maj_stat,
+            &min_stat
         );
-
         if (GSS_ERROR(maj_stat)) {
             set_gss_error(maj_stat, min_stat);
             ret = AUTH_GSS_ERROR;
-            goto end;
         }
     }
-    
-end:
+
     return ret;
 }
 
@@ -652,12 +1400,107 @@ int authenticate_gss_server_clean(gss_server_state *state)
     if (state->client_name != GSS_C_NO_NAME) {
         maj_stat = gss_release_name(&min_stat, &state->client_name);
     }
+    if (state->shared_creds != NULL) {
+        release_shared_cred(state->shared_creds);
+        state->shared_creds = NULL;
+        state->server_creds = GSS_C_NO_CREDENTIAL;
+    }
     if (state->server_creds != GSS_C_NO_CREDENTIAL) {
         maj_stat = gss_release_cred(&min_stat, &state->server_creds);
     }
-    if (state->client_creds != GSS_C_NO_CREDENTIAL) {
-        maj_stat = gss_release_cred(&min_stat, &state->client_creds);
+    if (state->client_creds != GSS_C_NO_CREDENTIAL) {
+        maj_stat = gss_release_cred(&min_stat, &state->client_creds);
+    }
+    if (state->username != NULL) {
+        free(state->username);
+        state->username = NULL;
+    }
+    if (state->targetname != NULL) {
+        free(state->targetname);
+        state->targetname = NULL;
+    }
+    clear_response(&state->response, &state->response_token);
+    release_delegated_ccache(state);
+    
+    return ret;
+}
+
+/*
+ * Forgets the cache delegated credentials were stored in, destroying it if
+ * it is one only this process can use. FILE caches are left for the caller.
+ */
+static void release_delegated_ccache(gss_server_state *state)
+{
+    krb5_context context;
+    krb5_ccache ccache;
+
+    if (state->ccname == NULL) {
+        return;
+    }
+
+    if (
+        state->owns_ccache &&
+        acquire_krb5_context(&context) == 0 &&
+        krb5_cc_resolve(context, state->ccname, &ccache) == 0
+    ) {
+        krb5_cc_destroy(context, ccache);
+    }
+
+    free(state->ccname);
+    state->ccname = NULL;
+    state->owns_ccache = 0;
+}
+
+/*
+ * Does one server step with a raw input token. On success output_token holds
+ * the raw token to send back to the client, which the caller must release
+ * with gss_release_buffer.
+ */
+int authenticate_gss_server_step_token(
+    gss_server_state *state, gss_buffer_t input_token,
+    gss_buffer_t output_token
+) {
+    double stat_start;
+    OM_uint32 maj_stat;
+    OM_uint32 min_stat;
+    int ret = AUTH_GSS_CONTINUE;
+    
+    output_token->length = 0;
+    output_token->value = NULL;
+    
+    if (input_token->length == 0) {
+        PyErr_SetString(
+            KrbException_class, "No challenge parameter in request from client"
+        );
+        ret = AUTH_GSS_ERROR;
+        goto end;
+    }
+    
+    STATS_BEGIN_ALLOW_THREADS
+    stat_start = STATS_START();
+    maj_stat = gss_accept_sec_context(
+        &min_stat,
+        &state->context,
+        state->server_creds,
+        input_token,
+        GSS_C_NO_CHANNEL_BINDINGS,
+        &state->client_name,
+        NULL,
+        output_token,
+        NULL,
+        &state->lifetime,
+        &state->client_creds
+    );
+    STATS_END(STAT_ACCEPT_SEC_CONTEXT, stat_start, GSS_ERROR(maj_stat));
+    STATS_END_ALLOW_THREADS
+    
+    if (GSS_ERROR(maj_stat)) {
+        set_gss_error(maj_stat, min_stat);
+        ret = AUTH_GSS_ERROR;
+        goto end;
     }
+    
+    // The user and target names are looked up when they are first asked for
     if (state->username != NULL) {
         free(state->username);
         state->username = NULL;
@@ -666,44 +1509,33 @@ int authenticate_gss_server_clean(gss_server_state *state)
         free(state->targetname);
         state->targetname = NULL;
     }
-    if (state->response != NULL) {
-        free(state->response);
-        state->response = NULL;
-    }
-    if (state->ccname != NULL) {
-        free(state->ccname);
-        state->ccname = NULL;
-    }
+
+    ret = AUTH_GSS_COMPLETE;
     
+end:
+    if (ret == AUTH_GSS_ERROR && output_token->value) {
+        gss_release_buffer(&min_stat, output_token);
+    }
     return ret;
 }
 
 int authenticate_gss_server_step(
     gss_server_state *state, const char *challenge
 ) {
-    OM_uint32 maj_stat;
     OM_uint32 min_stat;
     gss_buffer_desc input_token = GSS_C_EMPTY_BUFFER;
     gss_buffer_desc output_token = GSS_C_EMPTY_BUFFER;
     int ret = AUTH_GSS_CONTINUE;
     
     // Always clear out the old response
-    if (state->response != NULL) {
-        free(state->response);
-        state->response = NULL;
-    }
+    clear_response(&state->response, &state->response_token);
     
     // If there is a challenge (data from the server) we need to give it to GSS
     if (challenge && *challenge) {
-        size_t len;
-        input_token.value = base64_decode(challenge, &len);
-        if (input_token.value == NULL)
-        {
-            PyErr_NoMemory();
+        if (decode_challenge(challenge, &input_token) == AUTH_GSS_ERROR) {
             ret = AUTH_GSS_ERROR;
             goto end;
         }
-        input_token.length = len;
     } else {
         PyErr_SetString(
             KrbException_class, "No challenge parameter in request from client"
@@ -712,109 +1544,275 @@ int authenticate_gss_server_step(
         goto end;
     }
     
-    Py_BEGIN_ALLOW_THREADS
-    maj_stat = gss_accept_sec_context(
-        &min_stat,
-        &state->context,
-        state->server_creds,
-        &input_token,
-        GSS_C_NO_CHANNEL_BINDINGS,
-        &state->client_name,
-        NULL,
-        &output_token,
-        NULL,
-        NULL,
-        &state->client_creds
-    );
-    Py_END_ALLOW_THREADS
-    
-    if (GSS_ERROR(maj_stat)) {
-        set_gss_error(maj_stat, min_stat);
-        ret = AUTH_GSS_ERROR;
+    ret = authenticate_gss_server_step_token(state, &input_token, &output_token);
+    if (ret == AUTH_GSS_ERROR) {
         goto end;
     }
     
-    // Grab the server response to send back to the client
-    if (output_token.length) {
-        state->response = base64_encode(
-            (const unsigned char *)output_token.value, output_token.length
-        );
-        if (state->response == NULL)
-        {
-            PyErr_NoMemory();
-            ret = AUTH_GSS_ERROR;
-            goto end;
-        }
-        maj_stat = gss_release_buffer(&min_stat, &output_token);
-    }
+    // Keep the server response to send back to the client
+    keep_response(&state->response_token, &output_token);
     
-    // Get the user name
-    maj_stat = gss_display_name(
-        &min_stat, state->client_name, &output_token, NULL
-    );
-    if (GSS_ERROR(maj_stat)) {
-        set_gss_error(maj_stat, min_stat);
-        ret = AUTH_GSS_ERROR;
-        goto end;
+end:
+    if (output_token.value) {
+        gss_release_buffer(&min_stat, &output_token);
     }
-    state->username = (char *)malloc(output_token.length + 1);
-    if (state->username == NULL)
-    {
-        PyErr_NoMemory();
-        ret = AUTH_GSS_ERROR;
-        goto end;
+    if (input_token.value) {
+        free(input_token.value);
     }
-    strncpy(state->username, (char*) output_token.value, output_token.length);
-    state->username[output_token.length] = 0;
-    
-    // Get the target name if no server creds were supplied
-    if (state->server_creds == GSS_C_NO_CREDENTIAL) {
-        gss_name_t target_name = GSS_C_NO_NAME;
+    return ret;
+}
+
+int authenticate_gss_server_has_delegated(gss_server_state *state)
+{
+    return (state->client_creds != GSS_C_NO_CREDENTIAL);
+}
+
+/*
+ * Gets the name of the authenticated client, or NULL before a step has
+ * succeeded. The name is only formatted the first time it is asked for.
+ */
+int authenticate_gss_server_username(
+    gss_server_state *state, const char **username
+) {
+    int ret = AUTH_GSS_COMPLETE;
+
+    if (state->username == NULL && state->client_name != GSS_C_NO_NAME) {
+        ret = copy_display_name(state->client_name, &state->username);
+    }
+
+    *username = state->username;
+    return ret;
+}
+
+/*
+ * Gets the name the client asked for when the context was initialized
+ * without a service name, so any acceptor in the keytab could be used.
+ * Otherwise, or before a step has succeeded, *targetname is NULL.
+ */
+int authenticate_gss_server_target_name(
+    gss_server_state *state, const char **targetname
+) {
+    OM_uint32 maj_stat;
+    OM_uint32 min_stat;
+    gss_name_t target_name = GSS_C_NO_NAME;
+    int ret = AUTH_GSS_COMPLETE;
+
+    if (
+        state->targetname == NULL &&
+        state->server_creds == GSS_C_NO_CREDENTIAL &&
+        state->client_name != GSS_C_NO_NAME &&
+        state->context != GSS_C_NO_CONTEXT
+    ) {
         maj_stat = gss_inquire_context(
             &min_stat, state->context, NULL, &target_name, NULL, NULL, NULL,
             NULL, NULL
         );
         if (GSS_ERROR(maj_stat)) {
             set_gss_error(maj_stat, min_stat);
-            ret = AUTH_GSS_ERROR;
-            goto end;
+            return AUTH_GSS_ERROR;
         }
-        maj_stat = gss_display_name(
-            &min_stat, target_name, &output_token, NULL
+        ret = copy_display_name(target_name, &state->targetname);
+        gss_release_name(&min_stat, &target_name);
+    }
+
+    *targetname = state->targetname;
+    return ret;
+}
+
+/*
+ * Gets the base64 encoded response of the last step, or NULL if there is
+ * none.
+ */
+int authenticate_gss_server_response(
+    gss_server_state *state, const char **response
+) {
+    if (encode_response(&state->response, &state->response_token) == AUTH_GSS_ERROR) {
+        return AUTH_GSS_ERROR;
+    }
+    *response = state->response;
+    return AUTH_GSS_COMPLETE;
+}
+
+/*
+ * Copies the printable form of name into a newly allocated string, which the
+ * caller must free.
+ */
+static int copy_display_name(gss_name_t name, char **out)
+{
+    OM_uint32 maj_stat;
+    OM_uint32 min_stat;
+    gss_buffer_desc name_token = GSS_C_EMPTY_BUFFER;
+
+    maj_stat = gss_display_name(&min_stat, name, &name_token, NULL);
+    if (GSS_ERROR(maj_stat)) {
+        set_gss_error(maj_stat, min_stat);
+        return AUTH_GSS_ERROR;
+    }
+
+    *out = (char *)malloc(name_token.length + 1);
+    if (*out == NULL) {
+        gss_release_buffer(&min_stat, &name_token);
+        PyErr_NoMemory();
+        return AUTH_GSS_ERROR;
+    }
+    memcpy(*out, name_token.value, name_token.length);
+    (*out)[name_token.length] = 0;
+    gss_release_buffer(&min_stat, &name_token);
+
+    return AUTH_GSS_COMPLETE;
+}
+
+/*
+ * Serialises an established context into token, which the caller must
+ * release with gss_release_buffer. GSSAPI deletes the context as it exports
+ * it, so *context is left as GSS_C_NO_CONTEXT whether or not this succeeds.
+ */
+static int export_context(gss_ctx_id_t *context, gss_buffer_t token)
+{
+    OM_uint32 maj_stat;
+    OM_uint32 min_stat;
+    int open = 0;
+
+    token->length = 0;
+    token->value = NULL;
+
+    if (*context != GSS_C_NO_CONTEXT) {
+        maj_stat = gss_inquire_context(
+            &min_stat, *context, NULL, NULL, NULL, NULL, NULL, NULL, &open
         );
         if (GSS_ERROR(maj_stat)) {
             set_gss_error(maj_stat, min_stat);
-            ret = AUTH_GSS_ERROR;
-            goto end;
-        }
-        state->targetname = (char *)malloc(output_token.length + 1);
-        if (state->targetname == NULL)
-        {
-            PyErr_NoMemory();
-            ret = AUTH_GSS_ERROR;
-            goto end;
+            return AUTH_GSS_ERROR;
         }
-        strncpy(
-            state->targetname, (char*) output_token.value, output_token.length
+    }
+    if (! open) {
+        PyErr_SetObject(
+            KrbException_class,
+            Py_BuildValue("(s)", "Only an established context can be exported")
         );
-        state->targetname[output_token.length] = 0;
+        return AUTH_GSS_ERROR;
     }
 
-    ret = AUTH_GSS_COMPLETE;
-    
-end:
-    if (output_token.length) {
-        gss_release_buffer(&min_stat, &output_token);
+    maj_stat = gss_export_sec_context(&min_stat, context, token);
+    if (GSS_ERROR(maj_stat)) {
+        set_gss_error(maj_stat, min_stat);
+        return AUTH_GSS_ERROR;
     }
-    if (input_token.value) {
-        free(input_token.value);
+
+    return AUTH_GSS_COMPLETE;
+}
+
+/*
+ * Exports the established context of a client state into token, as
+ * export_context does. The user name is looked up first, as it cannot be
+ * once the context is gone.
+ */
+int authenticate_gss_client_export(
+    gss_client_state *state, gss_buffer_t token
+) {
+    const char *username;
+
+    if (authenticate_gss_client_username(state, &username) == AUTH_GSS_ERROR) {
+        return AUTH_GSS_ERROR;
     }
-    return ret;
+    return export_context(&state->context, token);
 }
 
-int authenticate_gss_server_has_delegated(gss_server_state *state)
-{
-    return (state->client_creds != GSS_C_NO_CREDENTIAL);
+/*
+ * Exports the established context of a server state into token, as
+ * export_context does, looking up the target name first.
+ */
+int authenticate_gss_server_export(
+    gss_server_state *state, gss_buffer_t token
+) {
+    const char *targetname;
+
+    if (authenticate_gss_server_target_name(state, &targetname) == AUTH_GSS_ERROR) {
+        return AUTH_GSS_ERROR;
+    }
+    return export_context(&state->context, token);
+}
+
+/*
+ * Fills in a client state from a context exported with
+ * authenticate_gss_client_export. On error the state must still be cleaned.
+ */
+int authenticate_gss_client_import(
+    gss_buffer_t token, gss_client_state *state
+) {
+    OM_uint32 maj_stat;
+    OM_uint32 min_stat;
+    OM_uint32 flags = 0;
+
+    state->context = GSS_C_NO_CONTEXT;
+    state->server_name = GSS_C_NO_NAME;
+    state->shared_name = NULL;
+    state->mech_oid = GSS_C_NO_OID;
+    state->gss_flags = 0;
+    state->client_creds = GSS_C_NO_CREDENTIAL;
+    state->shared_creds = NULL;
+    state->owns_creds = 0;
+    state->established = 0;
+    state->username = NULL;
+    state->response = NULL;
+    state->response_token.length = 0;
+    state->response_token.value = NULL;
+    state->responseConf = 0;
+
+    maj_stat = gss_import_sec_context(&min_stat, token, &state->context);
+    if (GSS_ERROR(maj_stat)) {
+        set_gss_error(maj_stat, min_stat);
+        return AUTH_GSS_ERROR;
+    }
+
+    maj_stat = gss_inquire_context(
+        &min_stat, state->context, NULL, &state->server_name, NULL, NULL,
+        &flags, NULL, NULL
+    );
+    if (GSS_ERROR(maj_stat)) {
+        set_gss_error(maj_stat, min_stat);
+        return AUTH_GSS_ERROR;
+    }
+    state->gss_flags = flags;
+    state->established = 1;
+
+    return AUTH_GSS_COMPLETE;
+}
+
+/*
+ * Fills in a server state from a context exported with
+ * authenticate_gss_server_export. The imported context has no acceptor
+ * credentials and no delegated credentials. On error the state must still be
+ * cleaned.
+ */
+int authenticate_gss_server_import(
+    gss_buffer_t token, gss_server_state *state
+) {
+    OM_uint32 maj_stat;
+    OM_uint32 min_stat;
+    int ret;
+
+    ret = authenticate_gss_server_init("", NULL, state);
+    if (ret == AUTH_GSS_ERROR) {
+        return ret;
+    }
+
+    maj_stat = gss_import_sec_context(&min_stat, token, &state->context);
+    if (GSS_ERROR(maj_stat)) {
+        set_gss_error(maj_stat, min_stat);
+        return AUTH_GSS_ERROR;
+    }
+
+    maj_stat = gss_inquire_context(
+        &min_stat, state->context, &state->client_name, NULL,
+        &state->lifetime, NULL, NULL, NULL, NULL
+    );
+    if (GSS_ERROR(maj_stat)) {
+        set_gss_error(maj_stat, min_stat);
+        return AUTH_GSS_ERROR;
+    }
+
+    return AUTH_GSS_COMPLETE;
 }
 
 static void set_gss_error(OM_uint32 err_maj, OM_uint32 err_min)
@@ -822,8 +1820,9 @@ static void set_gss_error(OM_uint32 err_maj, OM_uint32 err_min)
     OM_uint32 maj_stat, min_stat;
     OM_uint32 msg_ctx = 0;
     gss_buffer_desc status_string;
-    char buf_maj[512];
-    char buf_min[512];
+    // Left empty if GSSAPI cannot describe a code
+    char buf_maj[512] = "";
+    char buf_min[512] = "";
     
     do {
         maj_stat = gss_display_status(
@@ -837,7 +1836,10 @@ static void set_gss_error(OM_uint32 err_maj, OM_uint32 err_min)
         if (GSS_ERROR(maj_stat)) {
             break;
         }
-        strncpy(buf_maj, (char*) status_string.value, sizeof(buf_maj));
+        snprintf(
+            buf_maj, sizeof(buf_maj), "%.*s", (int) status_string.length,
+            (char*) status_string.value
+        );
         gss_release_buffer(&min_stat, &status_string);
         
         maj_stat = gss_display_status(
@@ -849,7 +1851,10 @@ static void set_gss_error(OM_uint32 err_maj, OM_uint32 err_min)
             &status_string
         );
         if (! GSS_ERROR(maj_stat)) {
-            strncpy(buf_min, (char*) status_string.value, sizeof(buf_min));
+            snprintf(
+                buf_min, sizeof(buf_min), "%.*s",
+                (int) status_string.length, (char*) status_string.value
+            );
             gss_release_buffer(&min_stat, &status_string);
         }
     } while (!GSS_ERROR(maj_stat) && msg_ctx != 0);
@@ -860,10 +1865,11 @@ static void set_gss_error(OM_uint32 err_maj, OM_uint32 err_min)
     );
 }
 
-int authenticate_gss_server_store_delegate(gss_server_state *state)
-{
+int authenticate_gss_server_store_delegate(
+    gss_server_state *state, const char *cache_type
+) {
     gss_cred_id_t delegated_cred = state->client_creds;
-    char *princ_name = state->username;
+    const char *princ_name = NULL;
     OM_uint32 maj_stat, min_stat;
     krb5_principal princ = NULL;
     krb5_ccache ccache = NULL;
@@ -871,6 +1877,17 @@ int authenticate_gss_server_store_delegate(gss_server_state *state)
     krb5_context context;
     int ret = 500;
 
+    if (
+        strcmp(cache_type, "FILE") != 0 &&
+        strcmp(cache_type, "MEMORY") != 0 &&
+        strcmp(cache_type, "KEYRING") != 0
+    ) {
+        PyErr_SetString(
+            PyExc_ValueError, "cache_type must be FILE, MEMORY or KEYRING"
+        );
+        return AUTH_GSS_ERROR;
+    }
+
     if (delegated_cred == GSS_C_NO_CREDENTIAL){
         PyErr_SetObject(
             KrbException_class,
@@ -879,7 +1896,11 @@ int authenticate_gss_server_store_delegate(gss_server_state *state)
         return AUTH_GSS_ERROR;
     }
 
-    problem = krb5_init_context(&context);
+    if (authenticate_gss_server_username(state, &princ_name) == AUTH_GSS_ERROR) {
+        return AUTH_GSS_ERROR;
+    }
+
+    problem = acquire_krb5_context(&context);
     if (problem) {
         PyErr_SetObject(
             KrbException_class,
@@ -901,7 +1922,9 @@ int authenticate_gss_server_store_delegate(gss_server_state *state)
         goto end;
     }
 
-    problem = create_krb5_ccache(state, context, princ, &ccache);
+    release_delegated_ccache(state);
+
+    problem = create_krb5_ccache(state, context, princ, cache_type, &ccache);
     if (problem) {
         PyErr_SetObject(
             KrbException_class,
@@ -932,14 +1955,67 @@ end:
     if (ccache) {
         krb5_cc_destroy(context, ccache);
     }
-    krb5_free_context(context);
 
     return ret;
 }
 
+/*
+ * Creates a new ccache of a collection type such as MEMORY or KEYRING. These
+ * are not visible outside the process (or login session), so the server state
+ * owns the cache and destroys it when it is cleaned.
+ */
+static int create_unique_krb5_ccache(
+    gss_server_state *state, krb5_context kcontext, krb5_principal princ,
+    const char *cache_type, krb5_ccache *ccache
+) {
+    krb5_error_code problem;
+    krb5_ccache tmp_ccache = NULL;
+    char *fullname = NULL;
+
+    problem = krb5_cc_new_unique(kcontext, cache_type, NULL, &tmp_ccache);
+    if (problem) {
+        PyErr_SetObject(
+            KrbException_class,
+            Py_BuildValue(
+                "(s:s)", "Error creating the credential cache",
+                krb5_get_err_text(kcontext, problem)
+            )
+        );
+        return 1;
+    }
+
+    problem = krb5_cc_initialize(kcontext, tmp_ccache, princ);
+    if (! problem) {
+        problem = krb5_cc_get_full_name(kcontext, tmp_ccache, &fullname);
+    }
+    if (problem) {
+        PyErr_SetObject(
+            KrbException_class,
+            Py_BuildValue(
+                "(s:s)", "Error initialising the credential cache",
+                krb5_get_err_text(kcontext, problem)
+            )
+        );
+        krb5_cc_destroy(kcontext, tmp_ccache);
+        return 1;
+    }
+
+    state->ccname = strdup(fullname);
+    krb5_free_string(kcontext, fullname);
+    if (state->ccname == NULL) {
+        PyErr_NoMemory();
+        krb5_cc_destroy(kcontext, tmp_ccache);
+        return 1;
+    }
+    state->owns_ccache = 1;
+
+    *ccache = tmp_ccache;
+    return 0;
+}
+
 int create_krb5_ccache(
     gss_server_state *state, krb5_context kcontext, krb5_principal princ,
-    krb5_ccache *ccache
+    const char *cache_type, krb5_ccache *ccache
 ) {
     int fd;
     char ccname[32];
@@ -947,6 +2023,12 @@ int create_krb5_ccache(
     int ret;
     krb5_ccache tmp_ccache = NULL;
 
+    if (cache_type != NULL && strcmp(cache_type, "FILE") != 0) {
+        return create_unique_krb5_ccache(
+            state, kcontext, princ, cache_type, ccache
+        );
+    }
+
     snprintf(ccname, sizeof(ccname), "/tmp/krb5cc_pyserv_XXXXXX");
     fd = mkstemp(ccname);
     if (fd < 0) {
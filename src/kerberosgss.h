@@ -14,55 +14,118 @@
  * limitations under the License.
  **/
 
+#ifndef KERBEROSGSS_H
+#define KERBEROSGSS_H
+
 #include <gssapi/gssapi.h>
 #include <gssapi/gssapi_generic.h>
 #include <gssapi/gssapi_krb5.h>
 
+#include "kerberoskeytab.h"
+
 #define krb5_get_err_text(context,code) error_message(code)
 
 #define AUTH_GSS_ERROR      -1
 #define AUTH_GSS_COMPLETE    1
 #define AUTH_GSS_CONTINUE    0
 
+/*
+ * Buffers used to wrap a message in place with authenticate_gss_wrap_iov.
+ * They are laid out contiguously in this order, which gives the same token
+ * gss_wrap would produce.
+ */
+#define GSS_FRAME_HEADER    0
+#define GSS_FRAME_DATA      1
+#define GSS_FRAME_PADDING   2
+#define GSS_FRAME_TRAILER   3
+#define GSS_FRAME_BUFFERS   4
+
 #define GSS_AUTH_P_NONE         1
 #define GSS_AUTH_P_INTEGRITY    2
 #define GSS_AUTH_P_PRIVACY      4
 
+/*
+ * A name and credentials, either of which may be absent, shared by reference
+ * between contexts.
+ */
+typedef struct {
+    int              refcount;
+    gss_name_t       name;
+    gss_cred_id_t    creds;
+} gss_shared_cred;
+
 typedef struct {
     gss_ctx_id_t     context;
     gss_name_t       server_name;
+    gss_shared_cred* shared_name;
     gss_OID          mech_oid;
     long int         gss_flags;
     gss_cred_id_t    client_creds;
+    gss_shared_cred* shared_creds;
+    int              owns_creds;
+    int              established;
     char*            username;
     char*            response;
+    gss_buffer_desc  response_token;
     int              responseConf;
 } gss_client_state;
 
+typedef struct {
+    gss_buffer_desc  input;
+    gss_buffer_desc  output;
+    int              conf;
+    OM_uint32        maj_stat;
+    OM_uint32        min_stat;
+} gss_message;
+
+typedef struct {
+    char*            service;
+    gss_shared_cred* current;
+    char             ktname[1024];
+    keytab_stamp     stamp;
+    time_t           checked;
+} gss_server_credential;
+
 typedef struct {
     gss_ctx_id_t     context;
     gss_name_t       server_name;
     gss_name_t       client_name;
     gss_cred_id_t    server_creds;
+    gss_shared_cred* shared_creds;
     gss_cred_id_t    client_creds;
     char*            username;
     char*            targetname;
     char*            response;
+    gss_buffer_desc  response_token;
     char*            ccname;
+    int              owns_ccache;
+    OM_uint32        lifetime;
 } gss_server_state;
 
-char* server_principal_details(const char* service, const char* hostname);
-
 int authenticate_gss_client_init(
-    const char* service, const char* principal, long int gss_flags,
+    const char* service, gss_shared_cred* target, const char* principal,
+    gss_shared_cred* credential, const char* ccache, long int gss_flags,
     gss_server_state* delegatestate, gss_OID mech_oid, gss_client_state* state
 );
+int authenticate_gss_acquire_initiator_creds(
+    const char* principal, gss_cred_id_t* creds
+);
+void authenticate_gss_prewarm(
+    const char* service, gss_cred_id_t creds, OM_uint32* maj_stat,
+    OM_uint32* min_stat
+);
+void set_gss_status_error(OM_uint32 maj_stat, OM_uint32 min_stat);
 int authenticate_gss_client_clean(
     gss_client_state *state
 );
 int authenticate_gss_client_step(
     gss_client_state *state, const char *challenge, struct gss_channel_bindings_struct *channel_bindings
 );
+int authenticate_gss_client_step_token(
+    gss_client_state* state, gss_buffer_t input_token,
+    struct gss_channel_bindings_struct* channel_bindings,
+    gss_buffer_t output_token
+);
 int authenticate_gss_client_unwrap(
     gss_client_state* state, const char* challenge
 );
@@ -70,22 +133,94 @@ int authenticate_gss_client_wrap(
     gss_client_state* state, const char* challenge, const char* user,
     int protect
 );
+int authenticate_gss_wrap_token(
+    gss_ctx_id_t context, gss_buffer_t input_token, int protect,
+    gss_buffer_t output_token
+);
+int authenticate_gss_unwrap_token(
+    gss_ctx_id_t context, gss_buffer_t input_token, gss_buffer_t output_token,
+    int *conf
+);
+void authenticate_gss_wrap_many(
+    gss_ctx_id_t context, gss_message* messages, size_t count, int protect
+);
+void authenticate_gss_unwrap_many(
+    gss_ctx_id_t context, gss_message* messages, size_t count
+);
+int authenticate_gss_wrap_size_limit(
+    gss_ctx_id_t context, int protect, OM_uint32 max_output,
+    OM_uint32* max_input
+);
+int authenticate_gss_wrap_iov_length(
+    gss_ctx_id_t context, int protect, size_t length, gss_iov_buffer_desc* iov
+);
+void authenticate_gss_wrap_iov(
+    gss_ctx_id_t context, int protect, gss_iov_buffer_desc* iov,
+    OM_uint32* maj_stat, OM_uint32* min_stat
+);
+void authenticate_gss_unwrap_iov(
+    gss_ctx_id_t context, gss_buffer_t stream, gss_buffer_t data,
+    int* data_allocated, int* conf, OM_uint32* maj_stat, OM_uint32* min_stat
+);
+int authenticate_gss_client_export(
+    gss_client_state* state, gss_buffer_t token
+);
+int authenticate_gss_client_import(
+    gss_buffer_t token, gss_client_state* state
+);
 int authenticate_gss_client_inquire_cred(
     gss_client_state* state
 );
+int authenticate_gss_client_username(
+    gss_client_state* state, const char** username
+);
+int authenticate_gss_client_response(
+    gss_client_state* state, const char** response
+);
+
+gss_server_credential* acquire_server_credential(const char* service);
+void free_server_credential(gss_server_credential* credential);
+gss_shared_cred* import_target_name(const char* service);
+gss_shared_cred* acquire_client_credential(
+    const char* principal, const char* ccache
+);
+void hold_shared_cred(gss_shared_cred* shared);
+void release_shared_cred(gss_shared_cred* shared);
 
 int authenticate_gss_server_init(
-    const char* service, gss_server_state* state
+    const char* service, gss_server_credential* credential,
+    gss_server_state* state
 );
 int authenticate_gss_server_clean(
     gss_server_state *state
 );
+int authenticate_gss_server_export(
+    gss_server_state *state, gss_buffer_t token
+);
+int authenticate_gss_server_import(
+    gss_buffer_t token, gss_server_state *state
+);
 int authenticate_gss_server_step(
     gss_server_state *state, const char *challenge
 );
+int authenticate_gss_server_step_token(
+    gss_server_state *state, gss_buffer_t input_token,
+    gss_buffer_t output_token
+);
 int authenticate_gss_server_store_delegate(
-    gss_server_state *state
+    gss_server_state *state, const char *cache_type
 );
 int authenticate_gss_server_has_delegated(
     gss_server_state *state
 );
+int authenticate_gss_server_username(
+    gss_server_state *state, const char **username
+);
+int authenticate_gss_server_target_name(
+    gss_server_state *state, const char **targetname
+);
+int authenticate_gss_server_response(
+    gss_server_state *state, const char **response
+);
+
+#endif
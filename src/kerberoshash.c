@@ -0,0 +1,71 @@
+/**
+ * Copyright (c) 2026 Apple Inc. All rights reserved.
+ *
+ * Licensed under the Apache License, Version 2.0 (the "License");
+ * you may not use this file except in compliance with the License.
+ * You may obtain a copy of the License at
+ *
+ *     http://www.apache.org/licenses/LICENSE-2.0
+ *
+ * Unless required by applicable law or agreed to in writing, software
+ * distributed under the License is distributed on an "AS IS" BASIS,
+ * WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+ * See the License for the specific language governing permissions and
+ * limitations under the License.
+ **/
+
+#include "kerberoshash.h"
+
+#include <openssl/evp.h>
+
+#include <stdint.h>
+#include <string.h>
+
+/*
+ * SHA-256 and scrypt (RFC 7914) for deriving cache keys, from OpenSSL's
+ * libcrypto, which the Kerberos libraries are usually built on as well.
+ */
+
+/*
+ * Hashes len bytes of data into digest, which must hold SHA256_DIGEST_SIZE
+ * bytes. The digest is all zeroes in the unlikely event that libcrypto
+ * fails.
+ */
+void sha256(const void *data, size_t len, unsigned char *digest)
+{
+    if (! EVP_Digest(data, len, digest, NULL, EVP_sha256(), NULL)) {
+        memset(digest, 0, SHA256_DIGEST_SIZE);
+    }
+}
+
+/*
+ * Derives outlen bytes from passwd and salt with scrypt. N must be a power
+ * of two greater than one. Uses 128 * r * N bytes of memory. Returns -1 if
+ * the parameters are invalid or memory cannot be allocated.
+ */
+int scrypt(
+    const void *passwd, size_t passwdlen, const void *salt, size_t saltlen,
+    uint64_t N, uint32_t r, uint32_t p, unsigned char *out, size_t outlen
+) {
+    uint64_t maxmem;
+
+    if (N < 2 || (N & (N - 1)) != 0 || r == 0 || p == 0) {
+        return -1;
+    }
+
+    // libcrypto refuses more than 32 MB unless told otherwise; allow what
+    // these parameters need, which is all it allocates
+    if (N > (UINT64_MAX / 128 / r) - 2 - p) {
+        return -1;
+    }
+    maxmem = 128 * (uint64_t)r * (N + 2 + p);
+
+    if (! EVP_PBE_scrypt(
+        (const char *)passwd, passwdlen, (const unsigned char *)salt, saltlen,
+        N, r, p, maxmem, out, outlen
+    )) {
+        return -1;
+    }
+
+    return 0;
+}
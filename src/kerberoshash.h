@@ -0,0 +1,31 @@
+/**
+ * Copyright (c) 2026 Apple Inc. All rights reserved.
+ *
+ * Licensed under the Apache License, Version 2.0 (the "License");
+ * you may not use this file except in compliance with the License.
+ * You may obtain a copy of the License at
+ *
+ *     http://www.apache.org/licenses/LICENSE-2.0
+ *
+ * Unless required by applicable law or agreed to in writing, software
+ * distributed under the License is distributed on an "AS IS" BASIS,
+ * WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+ * See the License for the specific language governing permissions and
+ * limitations under the License.
+ **/
+
+#ifndef KERBEROSHASH_H
+#define KERBEROSHASH_H
+
+#include <stddef.h>
+#include <stdint.h>
+
+#define SHA256_DIGEST_SIZE 32
+
+void sha256(const void *data, size_t len, unsigned char *digest);
+int scrypt(
+    const void *passwd, size_t passwdlen, const void *salt, size_t saltlen,
+    uint64_t N, uint32_t r, uint32_t p, unsigned char *out, size_t outlen
+);
+
+#endif
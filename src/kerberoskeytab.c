@@ -0,0 +1,660 @@
+/**
+ * Copyright (c) 2026 Apple Inc. All rights reserved.
+ *
+ * Licensed under the Apache License, Version 2.0 (the "License");
+ * you may not use this file except in compliance with the License.
+ * You may obtain a copy of the License at
+ *
+ *     http://www.apache.org/licenses/LICENSE-2.0
+ *
+ * Unless required by applicable law or agreed to in writing, software
+ * distributed under the License is distributed on an "AS IS" BASIS,
+ * WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+ * See the License for the specific language governing permissions and
+ * limitations under the License.
+ **/
+
+#include <Python.h>
+#include "kerberoskeytab.h"
+#include "kerberoscontext.h"
+#include "kerberosmodule.h"
+#include "kerberosstats.h"
+
+#include <pthread.h>
+#include <stdio.h>
+#include <stdlib.h>
+#include <string.h>
+#include <sys/stat.h>
+
+/*
+ * getServerPrincipalDetails used to walk the whole default keytab on every
+ * call. Instead the keytab is read once into an index of its principals,
+ * hashed on the "service/hostname" part of the name, and read again only when
+ * the keytab file changes (different name, inode, size or mtime, to the
+ * nanosecond). Keytabs that are not plain files cannot be stamped and are
+ * read on every call.
+ *
+ * Callers hold the GIL while they wait for cached_index_lock, so nothing
+ * done with the lock held may call into Python, which could run code that
+ * needs the lock or releases the GIL. Errors are kept in a keytab_error and
+ * results copied out, and Python objects are built once the lock is released.
+ */
+
+#define KEYTAB_NAME_LEN 1024
+
+typedef struct {
+    char          *principal;
+    size_t        key_len;
+    krb5_kvno     kvno;
+    krb5_enctype  enctype;
+} keytab_principal;
+
+typedef struct {
+    char              name[KEYTAB_NAME_LEN];
+    keytab_stamp      stamp;
+    keytab_principal  *entries;
+    size_t            count;
+    size_t            capacity;
+    size_t            *buckets;
+    size_t            nbuckets;
+} keytab_index;
+
+/*
+ * The timing of a keytab read. Reads happen with cached_index_lock held, and
+ * recording a statistic may call the trace callback, so it is recorded by
+ * record_scan once the lock is released.
+ */
+typedef struct {
+    double  start;      /* 0.0 if the keytab was not read or not timed */
+    double  elapsed;
+    int     failed;
+} keytab_scan;
+
+/*
+ * A failure while the lock is held, raised by raise_keytab_error once it is
+ * released. A NULL message means memory ran out.
+ */
+typedef struct {
+    const char  *message;
+    int         code;
+} keytab_error;
+
+static pthread_mutex_t cached_index_lock = PTHREAD_MUTEX_INITIALIZER;
+static keytab_index cached_index;
+
+/*
+ * Fills in the default keytab name and, for file based keytabs, the stamp of
+ * the file. stamp->valid is zero if the keytab cannot be stamped.
+ */
+void get_keytab_stamp(
+    krb5_context context, char *name, size_t name_len, keytab_stamp *stamp
+) {
+    const char *path = name;
+    struct stat st;
+
+    memset(stamp, 0, sizeof(keytab_stamp));
+
+    if (krb5_kt_default_name(context, name, (int)name_len)) {
+        name[0] = 0;
+        return;
+    }
+
+    if (strncmp(name, "FILE:", 5) == 0) {
+        path = name + 5;
+    } else if (strncmp(name, "WRFILE:", 7) == 0) {
+        path = name + 7;
+    } else if (name[0] != '/') {
+        return;
+    }
+
+    if (stat(path, &st) != 0) {
+        return;
+    }
+
+    stamp->valid = 1;
+    stamp->dev = st.st_dev;
+    stamp->ino = st.st_ino;
+    stamp->mtime = st.st_mtime;
+#if defined(__APPLE__)
+    stamp->mtime_nsec = st.st_mtimespec.tv_nsec;
+#else
+    stamp->mtime_nsec = st.st_mtim.tv_nsec;
+#endif
+    stamp->size = st.st_size;
+}
+
+int same_keytab_stamp(const keytab_stamp *a, const keytab_stamp *b)
+{
+    return (
+        a->valid && b->valid &&
+        a->dev == b->dev &&
+        a->ino == b->ino &&
+        a->mtime == b->mtime &&
+        a->mtime_nsec == b->mtime_nsec &&
+        a->size == b->size
+    );
+}
+
+static size_t hash_key(const char *key, size_t key_len)
+{
+    // FNV-1a
+    size_t hash = 2166136261u;
+    size_t i;
+
+    for (i = 0; i < key_len; i++) {
+        hash ^= (unsigned char)key[i];
+        hash *= 16777619u;
+    }
+
+    return hash;
+}
+
+/*
+ * The key of a principal is everything before the realm separator, i.e. the
+ * "service/hostname" that getServerPrincipalDetails is asked for.
+ */
+static size_t principal_key_len(const char *principal)
+{
+    const char *p;
+
+    for (p = principal; *p; p++) {
+        if (*p == '\\' && p[1]) {
+            p++;
+        } else if (*p == '@') {
+            break;
+        }
+    }
+
+    return p - principal;
+}
+
+static void clear_index(keytab_index *index)
+{
+    size_t i;
+
+    for (i = 0; i < index->count; i++) {
+        free(index->entries[i].principal);
+    }
+    free(index->entries);
+    free(index->buckets);
+    memset(index, 0, sizeof(keytab_index));
+}
+
+static int add_index_entry(
+    keytab_index *index, const char *principal, krb5_kvno kvno,
+    krb5_enctype enctype
+) {
+    keytab_principal *entry;
+
+    if (index->count == index->capacity) {
+        size_t capacity = index->capacity ? index->capacity * 2 : 64;
+        keytab_principal *entries = (keytab_principal *)realloc(
+            index->entries, capacity * sizeof(keytab_principal)
+        );
+        if (entries == NULL) {
+            return 0;
+        }
+        index->entries = entries;
+        index->capacity = capacity;
+    }
+
+    entry = &index->entries[index->count];
+    entry->principal = strdup(principal);
+    if (entry->principal == NULL) {
+        return 0;
+    }
+    entry->key_len = principal_key_len(principal);
+    entry->kvno = kvno;
+    entry->enctype = enctype;
+    index->count++;
+
+    return 1;
+}
+
+static int build_buckets(keytab_index *index)
+{
+    size_t nbuckets = 16;
+    size_t i;
+
+    while (nbuckets < index->count * 2) {
+        nbuckets *= 2;
+    }
+
+    index->buckets = (size_t *)calloc(nbuckets, sizeof(size_t));
+    if (index->buckets == NULL) {
+        return 0;
+    }
+    index->nbuckets = nbuckets;
+
+    // Buckets hold entry index + 1, only the first entry for a key is kept
+    for (i = 0; i < index->count; i++) {
+        keytab_principal *entry = &index->entries[i];
+        size_t slot = hash_key(entry->principal, entry->key_len) & (nbuckets - 1);
+
+        while (index->buckets[slot]) {
+            keytab_principal *other = &index->entries[index->buckets[slot] - 1];
+            if (
+                other->key_len == entry->key_len &&
+                memcmp(other->principal, entry->principal, entry->key_len) == 0
+            ) {
+                break;
+            }
+            slot = (slot + 1) & (nbuckets - 1);
+        }
+        if (! index->buckets[slot]) {
+            index->buckets[slot] = i + 1;
+        }
+    }
+
+    return 1;
+}
+
+static void raise_keytab_error(const keytab_error *error)
+{
+    if (error->message == NULL) {
+        PyErr_NoMemory();
+    } else {
+        PyErr_SetObject(
+            KrbException_class,
+            Py_BuildValue("((s:i))", error->message, error->code)
+        );
+    }
+}
+
+static void set_keytab_error(
+    keytab_error *error, const char *message, int code
+) {
+    error->message = message;
+    error->code = code;
+}
+
+/*
+ * Reads the default keytab in one pass and times it in scan. Fills in error
+ * and returns zero on failure.
+ */
+static int read_keytab_index(
+    krb5_context kcontext, keytab_index *index, keytab_scan *scan,
+    keytab_error *error
+) {
+    int code;
+    int ret = 0;
+    krb5_keytab kt = NULL;
+    krb5_kt_cursor cursor = NULL;
+    krb5_keytab_entry entry;
+    char* pname = NULL;
+
+    scan->start = STATS_START();
+
+    if ((code = krb5_kt_default(kcontext, &kt))) {
+        set_keytab_error(error, "Cannot get default keytab", code);
+        goto end;
+    }
+
+    if ((code = krb5_kt_start_seq_get(kcontext, kt, &cursor))) {
+        set_keytab_error(
+            error, "Cannot get sequence cursor from keytab", code
+        );
+        goto end;
+    }
+
+    while ((code = krb5_kt_next_entry(kcontext, kt, &entry, &cursor)) == 0) {
+        int added;
+
+        if ((code = krb5_unparse_name(kcontext, entry.principal, &pname))) {
+            set_keytab_error(
+                error, "Cannot parse principal name from keytab", code
+            );
+            krb5_free_keytab_entry_contents(kcontext, &entry);
+            goto end;
+        }
+
+        added = add_index_entry(index, pname, entry.vno, entry.key.enctype);
+        krb5_free_unparsed_name(kcontext, pname);
+        krb5_free_keytab_entry_contents(kcontext, &entry);
+        if (! added) {
+            set_keytab_error(error, NULL, 0);
+            goto end;
+        }
+    }
+
+    if (! build_buckets(index)) {
+        set_keytab_error(error, NULL, 0);
+        goto end;
+    }
+
+    ret = 1;
+
+end:
+    if (cursor) {
+        krb5_kt_end_seq_get(kcontext, kt, &cursor);
+    }
+    if (kt) {
+        krb5_kt_close(kcontext, kt);
+    }
+    if (! ret) {
+        clear_index(index);
+    }
+    if (scan->start != 0.0) {
+        scan->elapsed = cache_now() - scan->start;
+        scan->failed = ! ret;
+    }
+
+    return ret;
+}
+
+/*
+ * Records the keytab read timed in scan, if any. Must be called with
+ * cached_index_lock released.
+ */
+static void record_scan(const keytab_scan *scan)
+{
+    if (scan->start != 0.0) {
+        stats_record_elapsed(STAT_KEYTAB_SCAN, scan->elapsed, scan->failed);
+    }
+}
+
+static const keytab_principal* find_principal(
+    const keytab_index *index, const char* service, const char* hostname
+) {
+    char key[1024];
+    size_t key_len;
+    size_t slot;
+
+    if (index->nbuckets == 0) {
+        return NULL;
+    }
+
+    snprintf(key, sizeof(key), "%s/%s", service, hostname);
+    key_len = strlen(key);
+
+    slot = hash_key(key, key_len) & (index->nbuckets - 1);
+    while (index->buckets[slot]) {
+        const keytab_principal *entry = &index->entries[index->buckets[slot] - 1];
+        if (
+            entry->key_len == key_len &&
+            memcmp(entry->principal, key, key_len) == 0
+        ) {
+            return entry;
+        }
+        slot = (slot + 1) & (index->nbuckets - 1);
+    }
+
+    return NULL;
+}
+
+/*
+ * Makes sure cached_index matches the current default keytab. Must be called
+ * with cached_index_lock held. Returns the index to use, which is a freshly
+ * read one in *scratch if the keytab cannot be cached, or NULL with error
+ * filled in. A read of the keytab is timed in scan.
+ */
+static keytab_index* current_index(
+    keytab_index *scratch, keytab_scan *scan, keytab_error *error
+) {
+    krb5_context kcontext;
+    char name[KEYTAB_NAME_LEN];
+    keytab_stamp stamp;
+    int code;
+
+    code = acquire_krb5_context(&kcontext);
+    if (code) {
+        set_keytab_error(error, "Cannot initialize Kerberos5 context", code);
+        return NULL;
+    }
+
+    get_keytab_stamp(kcontext, name, sizeof(name), &stamp);
+
+    if (! stamp.valid) {
+        memset(scratch, 0, sizeof(keytab_index));
+        return read_keytab_index(kcontext, scratch, scan, error) ? scratch : NULL;
+    }
+
+    if (
+        strcmp(cached_index.name, name) == 0 &&
+        same_keytab_stamp(&cached_index.stamp, &stamp)
+    ) {
+        return &cached_index;
+    }
+
+    clear_index(&cached_index);
+    if (! read_keytab_index(kcontext, &cached_index, scan, error)) {
+        return NULL;
+    }
+    strcpy(cached_index.name, name);
+    cached_index.stamp = stamp;
+
+    return &cached_index;
+}
+
+static void free_strings(char **strings, size_t count)
+{
+    size_t i;
+
+    if (strings == NULL) {
+        return;
+    }
+    for (i = 0; i < count; i++) {
+        free(strings[i]);
+    }
+    free(strings);
+}
+
+char* server_principal_details(const char* service, const char* hostname)
+{
+    keytab_scan scan = {0.0, 0.0, 0};
+    keytab_error error = {NULL, 0};
+    keytab_index scratch;
+    keytab_index *index;
+    const keytab_principal *entry = NULL;
+    char* result = NULL;
+
+    pthread_mutex_lock(&cached_index_lock);
+
+    index = current_index(&scratch, &scan, &error);
+    if (index != NULL) {
+        entry = find_principal(index, service, hostname);
+        if (entry != NULL) {
+            result = strdup(entry->principal);
+        }
+        if (index == &scratch) {
+            clear_index(&scratch);
+        }
+    }
+
+    pthread_mutex_unlock(&cached_index_lock);
+    record_scan(&scan);
+
+    if (index == NULL) {
+        raise_keytab_error(&error);
+    } else if (entry == NULL) {
+        PyErr_SetObject(
+            KrbException_class,
+            Py_BuildValue("((s:i))", "Principal not found in keytab", -1)
+        );
+    } else if (result == NULL) {
+        PyErr_NoMemory();
+    }
+
+    return result;
+}
+
+/*
+ * Looks up every (service, hostname) pair in pairs against one view of the
+ * keytab. Principals that are not found are returned as None.
+ */
+PyObject* server_principal_details_many(PyObject* pairs)
+{
+    keytab_scan scan = {0.0, 0.0, 0};
+    keytab_error error = {NULL, 0};
+    keytab_index scratch;
+    keytab_index *index = NULL;
+    PyObject *seq = NULL;
+    PyObject *pyresult = NULL;
+    const char **names = NULL;
+    char **principals = NULL;
+    Py_ssize_t count;
+    Py_ssize_t i;
+
+    seq = PySequence_Fast(
+        pairs, "Expected an iterable of (service, hostname) tuples"
+    );
+    if (seq == NULL) {
+        return NULL;
+    }
+    count = PySequence_Fast_GET_SIZE(seq);
+
+    // Service and host name of each pair, borrowed from the items of seq
+    names = (const char **)calloc(count ? count * 2 : 1, sizeof(char *));
+    principals = (char **)calloc(count ? count : 1, sizeof(char *));
+    if (names == NULL || principals == NULL) {
+        PyErr_NoMemory();
+        goto end;
+    }
+
+    for (i = 0; i < count; i++) {
+        PyObject *item = PySequence_Fast_GET_ITEM(seq, i);
+
+        if (! PyTuple_Check(item)) {
+            PyErr_SetString(
+                PyExc_TypeError, "Expected a (service, hostname) tuple"
+            );
+            goto end;
+        }
+        if (! PyArg_ParseTuple(item, "ss", &names[2 * i], &names[2 * i + 1])) {
+            goto end;
+        }
+    }
+
+    pthread_mutex_lock(&cached_index_lock);
+
+    index = current_index(&scratch, &scan, &error);
+    if (index != NULL) {
+        for (i = 0; i < count; i++) {
+            const keytab_principal *entry = find_principal(
+                index, names[2 * i], names[2 * i + 1]
+            );
+
+            if (entry == NULL) {
+                continue;
+            }
+            principals[i] = strdup(entry->principal);
+            if (principals[i] == NULL) {
+                set_keytab_error(&error, NULL, 0);
+                break;
+            }
+        }
+        if (index == &scratch) {
+            clear_index(&scratch);
+        }
+        if (i < count) {
+            index = NULL;
+        }
+    }
+
+    pthread_mutex_unlock(&cached_index_lock);
+    record_scan(&scan);
+
+    if (index == NULL) {
+        raise_keytab_error(&error);
+        goto end;
+    }
+
+    pyresult = PyList_New(count);
+    if (pyresult == NULL) {
+        goto end;
+    }
+    for (i = 0; i < count; i++) {
+        PyObject *pyprincipal;
+
+        if (principals[i] == NULL) {
+            pyprincipal = Py_None;
+            Py_INCREF(pyprincipal);
+        } else {
+            pyprincipal = Py_BuildValue("s", principals[i]);
+            if (pyprincipal == NULL) {
+                Py_CLEAR(pyresult);
+                break;
+            }
+        }
+        PyList_SET_ITEM(pyresult, i, pyprincipal);
+    }
+
+end:
+    free_strings(principals, (size_t)count);
+    free((void *)names);
+    Py_DECREF(seq);
+
+    return pyresult;
+}
+
+/*
+ * Returns a list of (principal, kvno, enctype) tuples, one per keytab entry,
+ * in keytab order.
+ */
+PyObject* keytab_principals(void)
+{
+    keytab_scan scan = {0.0, 0.0, 0};
+    keytab_error error = {NULL, 0};
+    keytab_index scratch;
+    keytab_index *index = NULL;
+    keytab_principal *entries = NULL;
+    size_t count = 0;
+    PyObject *pyresult = NULL;
+    size_t i;
+
+    pthread_mutex_lock(&cached_index_lock);
+
+    index = current_index(&scratch, &scan, &error);
+    if (index != NULL) {
+        count = index->count;
+        entries = (keytab_principal *)calloc(
+            count ? count : 1, sizeof(keytab_principal)
+        );
+        for (i = 0; entries != NULL && i < count; i++) {
+            entries[i] = index->entries[i];
+            entries[i].principal = strdup(index->entries[i].principal);
+            if (entries[i].principal == NULL) {
+                break;
+            }
+        }
+        if (index == &scratch) {
+            clear_index(&scratch);
+        }
+        if (entries == NULL || i < count) {
+            set_keytab_error(&error, NULL, 0);
+            index = NULL;
+        }
+    }
+
+    pthread_mutex_unlock(&cached_index_lock);
+    record_scan(&scan);
+
+    if (index == NULL) {
+        raise_keytab_error(&error);
+        goto end;
+    }
+
+    pyresult = PyList_New(count);
+    if (pyresult == NULL) {
+        goto end;
+    }
+    for (i = 0; i < count; i++) {
+        PyObject *item = Py_BuildValue(
+            "(sIi)", entries[i].principal, (unsigned int)entries[i].kvno,
+            (int)entries[i].enctype
+        );
+        if (item == NULL) {
+            Py_CLEAR(pyresult);
+            break;
+        }
+        PyList_SET_ITEM(pyresult, i, item);
+    }
+
+end:
+    for (i = 0; entries != NULL && i < count; i++) {
+        free(entries[i].principal);
+    }
+    free(entries);
+
+    return pyresult;
+}
@@ -0,0 +1,44 @@
+/**
+ * Copyright (c) 2026 Apple Inc. All rights reserved.
+ *
+ * Licensed under the Apache License, Version 2.0 (the "License");
+ * you may not use this file except in compliance with the License.
+ * You may obtain a copy of the License at
+ *
+ *     http://www.apache.org/licenses/LICENSE-2.0
+ *
+ * Unless required by applicable law or agreed to in writing, software
+ * distributed under the License is distributed on an "AS IS" BASIS,
+ * WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+ * See the License for the specific language governing permissions and
+ * limitations under the License.
+ **/
+
+#ifndef KERBEROSKEYTAB_H
+#define KERBEROSKEYTAB_H
+
+#include <gssapi/gssapi.h>
+#include <gssapi/gssapi_generic.h>
+#include <gssapi/gssapi_krb5.h>
+
+#include <sys/types.h>
+
+typedef struct {
+    int    valid;
+    dev_t  dev;
+    ino_t  ino;
+    time_t mtime;
+    long   mtime_nsec;
+    off_t  size;
+} keytab_stamp;
+
+void get_keytab_stamp(
+    krb5_context context, char *name, size_t name_len, keytab_stamp *stamp
+);
+int same_keytab_stamp(const keytab_stamp *a, const keytab_stamp *b);
+
+char* server_principal_details(const char* service, const char* hostname);
+PyObject* server_principal_details_many(PyObject* pairs);
+PyObject* keytab_principals(void);
+
+#endif
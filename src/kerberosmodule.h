@@ -0,0 +1,52 @@
+/**
+ * Copyright (c) 2026 Apple Inc. All rights reserved.
+ *
+ * Licensed under the Apache License, Version 2.0 (the "License");
+ * you may not use this file except in compliance with the License.
+ * You may obtain a copy of the License at
+ *
+ *     http://www.apache.org/licenses/LICENSE-2.0
+ *
+ * Unless required by applicable law or agreed to in writing, software
+ * distributed under the License is distributed on an "AS IS" BASIS,
+ * WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+ * See the License for the specific language governing permissions and
+ * limitations under the License.
+ **/
+
+#ifndef KERBEROSMODULE_H
+#define KERBEROSMODULE_H
+
+#include <Python.h>
+
+/*
+ * The exception classes. Each interpreter that imports the module has its
+ * own set, held in the module's state.
+ */
+typedef struct {
+    PyObject*   KrbError;
+    PyObject*   BasicAuthError;
+    PyObject*   PwdChangeError;
+    PyObject*   GSSError;
+} kerberos_module_state;
+
+/*
+ * Returns the state of the module imported by the calling thread's
+ * interpreter. Must be called with the GIL held, as raising an exception
+ * must; never returns NULL.
+ */
+kerberos_module_state* get_module_state(void);
+
+/*
+ * Whether the calling thread runs in the main interpreter. Process-wide hooks
+ * that call back into Python from native threads, the trace callback and the
+ * kerberos.aio worker pool, are only available there.
+ */
+int is_main_interpreter(void);
+
+#define KrbException_class (get_module_state()->KrbError)
+#define BasicAuthException_class (get_module_state()->BasicAuthError)
+#define PwdChangeException_class (get_module_state()->PwdChangeError)
+#define GssException_class (get_module_state()->GSSError)
+
+#endif
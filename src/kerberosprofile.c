@@ -0,0 +1,459 @@
+/**
+ * Copyright (c) 2026 Apple Inc. All rights reserved.
+ *
+ * Licensed under the Apache License, Version 2.0 (the "License");
+ * you may not use this file except in compliance with the License.
+ * You may obtain a copy of the License at
+ *
+ *     http://www.apache.org/licenses/LICENSE-2.0
+ *
+ * Unless required by applicable law or agreed to in writing, software
+ * distributed under the License is distributed on an "AS IS" BASIS,
+ * WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+ * See the License for the specific language governing permissions and
+ * limitations under the License.
+ **/
+
+#include "kerberosprofile.h"
+#include "kerberosmodule.h"
+
+#include <gssapi/gssapi_krb5.h>
+
+#include <errno.h>
+#include <pthread.h>
+#include <stdlib.h>
+#include <string.h>
+
+/*
+ * The configuration is converted once into a tree of sections and relations
+ * and handed to the profile library through a vtable, so contexts created
+ * from it never touch the filesystem or parse anything. The tree never
+ * changes once built: copies of the profile, one per krb5 context, share it
+ * and only bump its reference count.
+ */
+
+typedef struct config_node {
+    char                *name;
+    char                *value;     /* NULL for a section */
+    struct config_node  *children;
+    size_t              count;
+} config_node;
+
+typedef struct {
+    int          refcount;
+    config_node  root;
+} config_tree;
+
+typedef struct {
+    const config_node  *section;
+    char               *name;       /* NULL to list the whole section */
+    int                flags;
+    size_t             index;
+} config_iterator;
+
+static pthread_mutex_t tree_lock = PTHREAD_MUTEX_INITIALIZER;
+
+static void free_node(config_node *node)
+{
+    size_t i;
+
+    for (i = 0; i < node->count; i++) {
+        free_node(&node->children[i]);
+    }
+    free(node->children);
+    free(node->name);
+    free(node->value);
+}
+
+static const config_node *find_section(
+    const config_node *section, const char *name
+) {
+    size_t i;
+
+    for (i = 0; i < section->count; i++) {
+        const config_node *child = &section->children[i];
+
+        if (child->value == NULL && strcmp(child->name, name) == 0) {
+            return child;
+        }
+    }
+    return NULL;
+}
+
+/*
+ * Follows names through nested sections, stopping before the last name, and
+ * sets length to the number of names. Returns NULL if a section on the way
+ * is missing.
+ */
+static const config_node *walk(
+    const config_tree *tree, const char *const *names, size_t *length
+) {
+    const config_node *section = &tree->root;
+    size_t i;
+
+    for (*length = 0; names[*length] != NULL; (*length)++);
+
+    for (i = 0; section != NULL && i + 1 < *length; i++) {
+        section = find_section(section, names[i]);
+    }
+
+    return section;
+}
+
+static long tree_get_values(
+    void *cbdata, const char *const *names, char ***ret_values
+) {
+    const config_node *section;
+    char **values;
+    size_t length, found = 0, i;
+
+    *ret_values = NULL;
+
+    section = walk((config_tree *)cbdata, names, &length);
+    if (section == NULL || length == 0) {
+        return PROF_NO_SECTION;
+    }
+
+    values = (char **)calloc(section->count + 1, sizeof(char *));
+    if (values == NULL) {
+        return ENOMEM;
+    }
+
+    for (i = 0; i < section->count; i++) {
+        const config_node *child = &section->children[i];
+
+        if (child->value == NULL || strcmp(child->name, names[length - 1])) {
+            continue;
+        }
+        values[found] = strdup(child->value);
+        if (values[found++] == NULL) {
+            profile_free_list(values);
+            return ENOMEM;
+        }
+    }
+
+    if (found == 0) {
+        free(values);
+        return PROF_NO_RELATION;
+    }
+
+    *ret_values = values;
+    return 0;
+}
+
+static void tree_free_values(void *cbdata, char **values)
+{
+    profile_free_list(values);
+}
+
+static void tree_cleanup(void *cbdata)
+{
+    config_tree *tree = (config_tree *)cbdata;
+    int refcount;
+
+    pthread_mutex_lock(&tree_lock);
+    refcount = --tree->refcount;
+    pthread_mutex_unlock(&tree_lock);
+
+    if (refcount == 0) {
+        free_node(&tree->root);
+        free(tree);
+    }
+}
+
+static long tree_copy(void *cbdata, void **ret_cbdata)
+{
+    config_tree *tree = (config_tree *)cbdata;
+
+    pthread_mutex_lock(&tree_lock);
+    tree->refcount++;
+    pthread_mutex_unlock(&tree_lock);
+
+    *ret_cbdata = tree;
+    return 0;
+}
+
+/*
+ * With PROFILE_ITER_LIST_SECTION names is a section whose contents are
+ * listed; otherwise its last name is a relation or subsection within the
+ * section named by the others, whose entries are listed.
+ */
+static long tree_iterator_create(
+    void *cbdata, const char *const *names, int flags, void **ret_iter
+) {
+    config_iterator *iter;
+    const config_node *section;
+    size_t length;
+
+    *ret_iter = NULL;
+
+    section = walk((config_tree *)cbdata, names, &length);
+    if (section != NULL && length > 0 && (flags & PROFILE_ITER_LIST_SECTION)) {
+        section = find_section(section, names[length - 1]);
+    }
+    if (section == NULL) {
+        return PROF_NO_SECTION;
+    }
+
+    iter = (config_iterator *)calloc(1, sizeof(config_iterator));
+    if (iter == NULL) {
+        return ENOMEM;
+    }
+    iter->section = section;
+    iter->flags = flags;
+    if (length > 0 && ! (flags & PROFILE_ITER_LIST_SECTION)) {
+        iter->name = strdup(names[length - 1]);
+        if (iter->name == NULL) {
+            free(iter);
+            return ENOMEM;
+        }
+    }
+
+    *ret_iter = iter;
+    return 0;
+}
+
+static long tree_iterator(
+    void *cbdata, void *iter_arg, char **ret_name, char **ret_value
+) {
+    config_iterator *iter = (config_iterator *)iter_arg;
+
+    *ret_name = NULL;
+    *ret_value = NULL;
+
+    while (iter->index < iter->section->count) {
+        const config_node *child = &iter->section->children[iter->index++];
+
+        if (iter->name != NULL && strcmp(child->name, iter->name)) {
+            continue;
+        }
+        if ((iter->flags & PROFILE_ITER_SECTIONS_ONLY) && child->value) {
+            continue;
+        }
+        if ((iter->flags & PROFILE_ITER_RELATIONS_ONLY) && ! child->value) {
+            continue;
+        }
+
+        *ret_name = strdup(child->name);
+        if (*ret_name == NULL) {
+            return ENOMEM;
+        }
+        if (child->value != NULL) {
+            *ret_value = strdup(child->value);
+            if (*ret_value == NULL) {
+                free(*ret_name);
+                *ret_name = NULL;
+                return ENOMEM;
+            }
+        }
+        break;
+    }
+
+    return 0;
+}
+
+static void tree_iterator_free(void *cbdata, void *iter_arg)
+{
+    config_iterator *iter = (config_iterator *)iter_arg;
+
+    free(iter->name);
+    free(iter);
+}
+
+static void tree_free_string(void *cbdata, char *string)
+{
+    free(string);
+}
+
+static struct profile_vtable tree_vtable = {
+    1,
+    tree_get_values,
+    tree_free_values,
+    tree_cleanup,
+    tree_copy,
+    tree_iterator_create,
+    tree_iterator,
+    tree_iterator_free,
+    tree_free_string,
+};
+
+/* Building the tree */
+
+static int build_section(config_node *section, PyObject *dict);
+
+static char *copy_string(PyObject *object, const char *what)
+{
+    const char *value = NULL;
+    char *copy;
+
+    if (! PyArg_Parse(object, "s", &value)) {
+        PyErr_Format(
+            PyExc_TypeError, "Kerberos configuration %s must be strings", what
+        );
+        return NULL;
+    }
+    copy = strdup(value);
+    if (copy == NULL) {
+        PyErr_NoMemory();
+    }
+    return copy;
+}
+
+/*
+ * Relation values are written the way krb5.conf spells them, so booleans
+ * become "true" or "false".
+ */
+static char *copy_value(PyObject *object)
+{
+    PyObject *text;
+    char *value;
+
+    if (PyBool_Check(object)) {
+        value = strdup(object == Py_True ? "true" : "false");
+        if (value == NULL) {
+            PyErr_NoMemory();
+        }
+        return value;
+    }
+
+    if (! PyNumber_Check(object) || PyFloat_Check(object)) {
+        return copy_string(object, "values");
+    }
+
+    text = PyObject_Str(object);
+    if (text == NULL) {
+        return NULL;
+    }
+    value = copy_string(text, "values");
+    Py_DECREF(text);
+
+    return value;
+}
+
+static size_t entry_count(PyObject *value)
+{
+    if (PyList_Check(value) || PyTuple_Check(value)) {
+        return (size_t)PySequence_Fast_GET_SIZE(value);
+    }
+    return 1;
+}
+
+static int build_entry(config_node *node, PyObject *key, PyObject *value)
+{
+    node->name = copy_string(key, "names");
+    if (node->name == NULL) {
+        return 0;
+    }
+
+    if (PyDict_Check(value)) {
+        return build_section(node, value);
+    }
+
+    node->value = copy_value(value);
+    return node->value != NULL;
+}
+
+static int build_section(config_node *section, PyObject *dict)
+{
+    PyObject *key, *value;
+    Py_ssize_t position = 0;
+    size_t count = 0;
+
+    while (PyDict_Next(dict, &position, &key, &value)) {
+        count += entry_count(value);
+    }
+
+    section->children = (config_node *)calloc(
+        count ? count : 1, sizeof(config_node)
+    );
+    if (section->children == NULL) {
+        PyErr_NoMemory();
+        return 0;
+    }
+
+    position = 0;
+    while (PyDict_Next(dict, &position, &key, &value)) {
+        Py_ssize_t i, length;
+
+        if (! PyList_Check(value) && ! PyTuple_Check(value)) {
+            if (! build_entry(&section->children[section->count++], key, value)) {
+                return 0;
+            }
+            continue;
+        }
+
+        // A list gives the relation once per item, in order
+        length = PySequence_Fast_GET_SIZE(value);
+        for (i = 0; i < length; i++) {
+            PyObject *item = PySequence_Fast_GET_ITEM(value, i);
+
+            if (PyDict_Check(item) || PyList_Check(item) || PyTuple_Check(item)) {
+                PyErr_SetString(
+                    PyExc_TypeError,
+                    "Kerberos configuration lists must hold plain values"
+                );
+                return 0;
+            }
+            if (! build_entry(&section->children[section->count++], key, item)) {
+                return 0;
+            }
+        }
+    }
+
+    return 1;
+}
+
+profile_t profile_from_dict(PyObject *config)
+{
+    PyObject *key, *value;
+    Py_ssize_t position = 0;
+    config_tree *tree;
+    profile_t profile = NULL;
+    long code;
+
+    if (! PyDict_Check(config)) {
+        PyErr_SetString(
+            PyExc_TypeError, "The Kerberos configuration must be a dict"
+        );
+        return NULL;
+    }
+    while (PyDict_Next(config, &position, &key, &value)) {
+        if (! PyDict_Check(value)) {
+            PyErr_SetString(
+                PyExc_TypeError,
+                "Each section of the Kerberos configuration must be a dict"
+            );
+            return NULL;
+        }
+    }
+
+    tree = (config_tree *)calloc(1, sizeof(config_tree));
+    if (tree == NULL) {
+        PyErr_NoMemory();
+        return NULL;
+    }
+    tree->refcount = 1;
+
+    if (! build_section(&tree->root, config)) {
+        free_node(&tree->root);
+        free(tree);
+        return NULL;
+    }
+
+    // On success the profile owns the tree and releases it with cleanup
+    code = profile_init_vtable(&tree_vtable, tree, &profile);
+    if (code) {
+        free_node(&tree->root);
+        free(tree);
+        PyErr_SetObject(
+            KrbException_class,
+            Py_BuildValue(
+                "(s:s)", "Cannot create the Kerberos configuration",
+                error_message(code)
+            )
+        );
+        return NULL;
+    }
+
+    return profile;
+}
@@ -0,0 +1,32 @@
+/**
+ * Copyright (c) 2026 Apple Inc. All rights reserved.
+ *
+ * Licensed under the Apache License, Version 2.0 (the "License");
+ * you may not use this file except in compliance with the License.
+ * You may obtain a copy of the License at
+ *
+ *     http://www.apache.org/licenses/LICENSE-2.0
+ *
+ * Unless required by applicable law or agreed to in writing, software
+ * distributed under the License is distributed on an "AS IS" BASIS,
+ * WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+ * See the License for the specific language governing permissions and
+ * limitations under the License.
+ **/
+
+#ifndef KERBEROSPROFILE_H
+#define KERBEROSPROFILE_H
+
+#include <Python.h>
+
+#include <profile.h>
+
+/*
+ * Builds a read-only profile held in memory from a dict laid out like
+ * krb5.conf: sections map to dicts, whose values are strings, integers,
+ * booleans, lists of those for repeated relations, or dicts for subsections.
+ * Returns NULL with an exception set if the dict is not laid out that way.
+ */
+profile_t profile_from_dict(PyObject *config);
+
+#endif
@@ -16,6 +16,9 @@
 
 #include <Python.h>
 #include "kerberospw.h"
+#include "kerberoscontext.h"
+#include "kerberosmodule.h"
+#include "kerberosstats.h"
 
 #include <stdio.h>
 #include <stdlib.h>
@@ -23,8 +26,6 @@
 
 #undef PRINTFS
 
-extern PyObject *PwdChangeException_class;
-
 static void set_pwchange_error(krb5_context context, krb5_error_code code)
 {
     PyErr_SetObject(
@@ -44,6 +45,7 @@ static krb5_error_code verify_krb5_user(
     krb5_get_init_creds_opt gic_options;
     krb5_error_code code;
     int ret = 0;
+    double stat_start;
     
 #ifdef PRINTFS
     {
@@ -63,11 +65,15 @@ static krb5_error_code verify_krb5_user(
 
     memset(creds, 0, sizeof(krb5_creds));
     
+    STATS_BEGIN_ALLOW_THREADS
+    stat_start = STATS_START();
     code = krb5_get_init_creds_password(
         context, creds, principal,
         (char *)password, NULL, NULL, 0,
         (char *)service, &gic_options
     );
+    STATS_END(STAT_GET_INIT_CREDS_PASSWORD, stat_start, code != 0);
+    STATS_END_ALLOW_THREADS
     if (code) {
         set_pwchange_error(context, code);
         goto end;
@@ -88,12 +94,13 @@ int change_user_krb5pwd(
     int             ret = 0;
     int             bytes = 0;
     char            *name = NULL;
+    double          stat_start;
 
     const char* service = "kadmin/changepw";
     int result_code;
     krb5_data result_code_string, result_string;
 
-    code = krb5_init_context(&kcontext);
+    code = acquire_krb5_context(&kcontext);
     if (code) {
         PyErr_SetObject(
             PwdChangeException_class,
@@ -123,8 +130,12 @@ int change_user_krb5pwd(
         goto end;
     }
 
+    STATS_BEGIN_ALLOW_THREADS
+    stat_start = STATS_START();
     code = krb5_change_password(kcontext, &creds, (char*)newpswd,
                                 &result_code, &result_code_string, &result_string);
+    STATS_END(STAT_CHANGE_PASSWORD, stat_start, code != 0 || result_code != 0);
+    STATS_END_ALLOW_THREADS
     if (code) {
         set_pwchange_error(kcontext, code);
         goto end;
@@ -166,7 +177,6 @@ end:
     if (client) {
         krb5_free_principal(kcontext, client);
     }
-    krb5_free_context(kcontext);
 
     return ret;
 }
@@ -0,0 +1,241 @@
+/**
+ * Copyright (c) 2026 Apple Inc. All rights reserved.
+ *
+ * Licensed under the Apache License, Version 2.0 (the "License");
+ * you may not use this file except in compliance with the License.
+ * You may obtain a copy of the License at
+ *
+ *     http://www.apache.org/licenses/LICENSE-2.0
+ *
+ * Unless required by applicable law or agreed to in writing, software
+ * distributed under the License is distributed on an "AS IS" BASIS,
+ * WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+ * See the License for the specific language governing permissions and
+ * limitations under the License.
+ **/
+
+#include "kerberossession.h"
+#include "kerberoscache.h"
+#include "kerberoshash.h"
+
+#include <pthread.h>
+#include <stdlib.h>
+#include <string.h>
+
+/*
+ * Optional cache of authenticated sessions on the acceptor. Once a handshake
+ * completes, the server may issue its own session identifier (a cookie, a
+ * connection ID) and remember the client principal under it, so that later
+ * requests in the same session are authenticated by a lookup instead of
+ * another AP-REQ. Identifiers are stored as salted SHA-256 digests, so the
+ * table neither holds the identifiers themselves nor lets a client choose
+ * which bucket they land in. The digest also covers the acceptor's service
+ * name, so a session issued for one service is not found by another in the
+ * same process. Entries live for ttl seconds, but never longer than the
+ * context that authenticated them.
+ */
+typedef struct {
+    char             username[SESSION_NAME_SIZE];
+} session_cache_value;
+
+typedef struct {
+    int              enabled;
+    double           ttl;
+    unsigned char    salt[16];
+} session_cache_settings;
+
+static pthread_once_t session_cache_once = PTHREAD_ONCE_INIT;
+static pthread_mutex_t session_cache_lock = PTHREAD_MUTEX_INITIALIZER;
+static ttl_cache session_cache;
+static session_cache_settings cache_settings;
+static session_cache_stats cache_stats;
+
+static void init_session_cache(void)
+{
+    ttl_cache_init(&session_cache, sizeof(session_cache_value), NULL);
+}
+
+/*
+ * Sets up or reconfigures the cache, discarding anything already cached.
+ * Returns 0, or -1 with errno set if the salt or table cannot be created.
+ */
+int enable_session_cache(size_t max_entries, double ttl)
+{
+    unsigned char salt[sizeof(cache_settings.salt)];
+
+    pthread_once(&session_cache_once, init_session_cache);
+
+    if (cache_random_salt(salt, sizeof(salt)) != 0) {
+        return -1;
+    }
+
+    if (ttl_cache_resize(&session_cache, max_entries) != 0) {
+        return -1;
+    }
+
+    pthread_mutex_lock(&session_cache_lock);
+    cache_settings.enabled = 1;
+    cache_settings.ttl = ttl;
+    memcpy(cache_settings.salt, salt, sizeof(salt));
+    pthread_mutex_unlock(&session_cache_lock);
+
+    return 0;
+}
+
+void disable_session_cache(void)
+{
+    pthread_once(&session_cache_once, init_session_cache);
+
+    pthread_mutex_lock(&session_cache_lock);
+    cache_settings.enabled = 0;
+    pthread_mutex_unlock(&session_cache_lock);
+
+    ttl_cache_resize(&session_cache, 0);
+}
+
+void clear_session_cache(void)
+{
+    pthread_once(&session_cache_once, init_session_cache);
+    ttl_cache_clear(&session_cache);
+}
+
+void get_session_cache_stats(session_cache_stats *stats)
+{
+    pthread_once(&session_cache_once, init_session_cache);
+
+    pthread_mutex_lock(&session_cache_lock);
+    *stats = cache_stats;
+    pthread_mutex_unlock(&session_cache_lock);
+
+    stats->entries = ttl_cache_count(&session_cache);
+}
+
+/*
+ * Copies the current settings and derives the key for session_id of service
+ * (NULL for none) under them: the digest of the salt, the service name and
+ * its terminating NUL, and session_id. Returns 0 if the cache is disabled.
+ */
+static int session_cache_key(
+    const char *service, const void *session_id, size_t length,
+    session_cache_settings *settings, unsigned char *key
+) {
+    unsigned char *salted;
+    size_t service_length;
+
+    pthread_once(&session_cache_once, init_session_cache);
+
+    pthread_mutex_lock(&session_cache_lock);
+    *settings = cache_settings;
+    pthread_mutex_unlock(&session_cache_lock);
+
+    if (! settings->enabled) {
+        return 0;
+    }
+
+    if (service == NULL) {
+        service = "";
+    }
+    service_length = strlen(service) + 1;
+
+    salted = (unsigned char *)malloc(
+        sizeof(settings->salt) + service_length + length
+    );
+    if (salted == NULL) {
+        return -1;
+    }
+    memcpy(salted, settings->salt, sizeof(settings->salt));
+    memcpy(salted + sizeof(settings->salt), service, service_length);
+    memcpy(
+        salted + sizeof(settings->salt) + service_length, session_id, length
+    );
+    sha256(salted, sizeof(settings->salt) + service_length + length, key);
+    free(salted);
+
+    return 1;
+}
+
+static void count_event(unsigned long *counter)
+{
+    pthread_mutex_lock(&session_cache_lock);
+    (*counter)++;
+    pthread_mutex_unlock(&session_cache_lock);
+}
+
+/*
+ * Remembers username for session_id of service, for the configured ttl or
+ * lifetime seconds, whichever is shorter. Returns 1 if it was stored, 0 if
+ * the cache is disabled or the name is too long to store, and -1 if memory
+ * cannot be allocated.
+ */
+int session_cache_put(
+    const char *service, const void *session_id, size_t length,
+    const char *username, double lifetime
+) {
+    session_cache_settings settings;
+    session_cache_value value;
+    unsigned char key[CACHE_KEY_SIZE];
+    size_t name_length = strlen(username);
+    int status;
+
+    if (name_length >= sizeof(value.username)) {
+        return 0;
+    }
+
+    status = session_cache_key(service, session_id, length, &settings, key);
+    if (status <= 0) {
+        return status;
+    }
+
+    memset(&value, 0, sizeof(value));
+    memcpy(value.username, username, name_length);
+
+    if (ttl_cache_put(
+        &session_cache, key, &value,
+        lifetime < settings.ttl ? lifetime : settings.ttl
+    ) != 0) {
+        return -1;
+    }
+    count_event(&cache_stats.stores);
+
+    return 1;
+}
+
+/*
+ * Copies the principal remembered for session_id of service into username,
+ * which must hold SESSION_NAME_SIZE bytes. Returns 1 on a hit, 0 on a miss
+ * or if the cache is disabled, and -1 if memory cannot be allocated.
+ */
+int session_cache_get(
+    const char *service, const void *session_id, size_t length,
+    char *username
+) {
+    session_cache_settings settings;
+    session_cache_value value;
+    unsigned char key[CACHE_KEY_SIZE];
+    int status;
+
+    status = session_cache_key(service, session_id, length, &settings, key);
+    if (status <= 0) {
+        return status;
+    }
+
+    if (! ttl_cache_get(&session_cache, key, &value)) {
+        count_event(&cache_stats.misses);
+        return 0;
+    }
+    count_event(&cache_stats.hits);
+    memcpy(username, value.username, sizeof(value.username));
+
+    return 1;
+}
+
+void session_cache_remove(
+    const char *service, const void *session_id, size_t length
+) {
+    session_cache_settings settings;
+    unsigned char key[CACHE_KEY_SIZE];
+
+    if (session_cache_key(service, session_id, length, &settings, key) > 0) {
+        ttl_cache_remove(&session_cache, key);
+    }
+}
@@ -0,0 +1,52 @@
+/**
+ * Copyright (c) 2026 Apple Inc. All rights reserved.
+ *
+ * Licensed under the Apache License, Version 2.0 (the "License");
+ * you may not use this file except in compliance with the License.
+ * You may obtain a copy of the License at
+ *
+ *     http://www.apache.org/licenses/LICENSE-2.0
+ *
+ * Unless required by applicable law or agreed to in writing, software
+ * distributed under the License is distributed on an "AS IS" BASIS,
+ * WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+ * See the License for the specific language governing permissions and
+ * limitations under the License.
+ **/
+
+#ifndef KERBEROSSESSION_H
+#define KERBEROSSESSION_H
+
+#include <stddef.h>
+
+/*
+ * The longest principal name, including its terminating NUL, that can be
+ * remembered for a session. Names are stored inline so that a lookup never
+ * follows a pointer into an entry another thread may evict.
+ */
+#define SESSION_NAME_SIZE 512
+
+typedef struct {
+    unsigned long    hits;
+    unsigned long    misses;
+    unsigned long    stores;
+    size_t           entries;
+} session_cache_stats;
+
+int enable_session_cache(size_t max_entries, double ttl);
+void disable_session_cache(void);
+void clear_session_cache(void);
+void get_session_cache_stats(session_cache_stats *stats);
+int session_cache_put(
+    const char *service, const void *session_id, size_t length,
+    const char *username, double lifetime
+);
+int session_cache_get(
+    const char *service, const void *session_id, size_t length,
+    char *username
+);
+void session_cache_remove(
+    const char *service, const void *session_id, size_t length
+);
+
+#endif
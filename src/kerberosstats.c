@@ -0,0 +1,360 @@
+/**
+ * Copyright (c) 2026 Apple Inc. All rights reserved.
+ *
+ * Licensed under the Apache License, Version 2.0 (the "License");
+ * you may not use this file except in compliance with the License.
+ * You may obtain a copy of the License at
+ *
+ *     http://www.apache.org/licenses/LICENSE-2.0
+ *
+ * Unless required by applicable law or agreed to in writing, software
+ * distributed under the License is distributed on an "AS IS" BASIS,
+ * WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+ * See the License for the specific language governing permissions and
+ * limitations under the License.
+ **/
+
+#include <Python.h>
+
+#include "kerberosmodule.h"
+#include "kerberosstats.h"
+
+#include <pthread.h>
+#include <string.h>
+
+typedef struct {
+    unsigned long long  calls;
+    unsigned long long  errors;
+    double              total;
+    double              max;
+    unsigned long long  buckets[STAT_BUCKETS];
+} stat_counters;
+
+static const char *stat_names[STAT_COUNT] = {
+    "acquire_cred",
+    "init_sec_context",
+    "accept_sec_context",
+    "wrap",
+    "unwrap",
+    "keytab_scan",
+    "get_init_creds_password",
+    "change_password",
+};
+
+int stats_active = 0;
+
+static int stats_enabled = 0;
+static pthread_mutex_t stats_lock = PTHREAD_MUTEX_INITIALIZER;
+static stat_counters counters[STAT_COUNT];
+
+// Read or changed with the GIL held and stats_lock taken, apart from the
+// unlocked check in stats_record, which is rechecked under the lock. The GIL
+// alone does not protect it on free-threaded builds.
+static PyObject *trace_callback = NULL;
+
+static void update_active(void)
+{
+    stats_active = stats_enabled || trace_callback != NULL;
+}
+
+static int bucket_for(double elapsed)
+{
+    double limit = 1e-6;
+    int i;
+
+    for (i = 0; i < STAT_BUCKETS - 1; i++, limit *= 2) {
+        if (elapsed < limit) {
+            return i;
+        }
+    }
+
+    return STAT_BUCKETS - 1;
+}
+
+#if PY_VERSION_HEX >= 0x030d0000
+    #define attached_thread_state PyThreadState_GetUnchecked
+#elif PY_VERSION_HEX >= 0x03090000
+    #define attached_thread_state _PyThreadState_UncheckedGet
+#endif
+
+// The interpreter each thread works for while it runs without the GIL, set
+// by STATS_BEGIN_ALLOW_THREADS and passed on to worker threads.
+static pthread_key_t interpreter_key;
+static pthread_once_t interpreter_key_once = PTHREAD_ONCE_INIT;
+static int interpreter_key_error = 0;
+
+static void create_interpreter_key(void)
+{
+    interpreter_key_error = pthread_key_create(&interpreter_key, NULL);
+}
+
+/*
+ * Returns the interpreter the calling thread works for while it has no GIL,
+ * or NULL if it has not been set.
+ */
+PyInterpreterState* stats_thread_interpreter(void)
+{
+    pthread_once(&interpreter_key_once, create_interpreter_key);
+    if (interpreter_key_error) {
+        return NULL;
+    }
+
+    return (PyInterpreterState *)pthread_getspecific(interpreter_key);
+}
+
+/*
+ * Sets the interpreter the calling thread works for while it has no GIL and
+ * returns the previous one, so it can be put back. May be called with or
+ * without the GIL.
+ */
+PyInterpreterState* stats_set_thread_interpreter(PyInterpreterState *interp)
+{
+    PyInterpreterState *previous = stats_thread_interpreter();
+
+    if (! interpreter_key_error) {
+        pthread_setspecific(interpreter_key, interp);
+    }
+
+    return previous;
+}
+
+/*
+ * The callback belongs to the main interpreter, and PyGILState only knows
+ * about that one, so calls made for other interpreters are not traced.
+ * Returns 1 if the calling thread holds the GIL of the main interpreter, 0 if
+ * it holds no GIL and works for the main interpreter, which includes threads
+ * Python does not know about, such as kerberos.aio workers, or -1 otherwise.
+ */
+static int trace_thread(void)
+{
+#ifdef attached_thread_state
+    PyThreadState *tstate = attached_thread_state();
+    PyInterpreterState *interp;
+
+    if (tstate != NULL) {
+        interp = PyThreadState_GetInterpreter(tstate);
+    } else {
+        interp = stats_thread_interpreter();
+    }
+    if (interp != NULL && interp != PyInterpreterState_Main()) {
+        return -1;
+    }
+    return tstate != NULL;
+#else
+    return 0;
+#endif
+}
+
+static void call_trace_callback(stat_op op, double elapsed, int failed)
+{
+    PyObject *callback;
+
+    pthread_mutex_lock(&stats_lock);
+    callback = trace_callback;
+    Py_XINCREF(callback);
+    pthread_mutex_unlock(&stats_lock);
+
+    if (callback != NULL) {
+        PyObject *type, *value, *traceback;
+        PyObject *result;
+
+        // The call may be traced while its own error is being raised
+        PyErr_Fetch(&type, &value, &traceback);
+        result = PyObject_CallFunction(
+            callback, "sdO", stat_names[op], elapsed,
+            failed ? Py_True : Py_False
+        );
+        if (result == NULL) {
+            PyErr_WriteUnraisable(callback);
+        } else {
+            Py_DECREF(result);
+        }
+        Py_DECREF(callback);
+        PyErr_Restore(type, value, traceback);
+    }
+}
+
+static void trace(stat_op op, double elapsed, int failed)
+{
+    PyGILState_STATE gstate;
+
+    switch (trace_thread()) {
+        case -1:
+            return;
+        case 1:
+            // PyGILState_Ensure would switch to the thread's own thread
+            // state, which need not be the one holding the GIL
+            call_trace_callback(op, elapsed, failed);
+            return;
+        default:
+            gstate = PyGILState_Ensure();
+            call_trace_callback(op, elapsed, failed);
+            PyGILState_Release(gstate);
+    }
+}
+
+/*
+ * Records one call that began at start (from cache_now). May be called with
+ * or without the GIL.
+ */
+void stats_record(stat_op op, double start, int failed)
+{
+    stats_record_elapsed(op, cache_now() - start, failed);
+}
+
+/*
+ * Records one call that took elapsed seconds, for calls timed under a lock
+ * and recorded once it is released, since recording may call the trace
+ * callback. May be called with or without the GIL.
+ */
+void stats_record_elapsed(stat_op op, double elapsed, int failed)
+{
+    if (stats_enabled) {
+        stat_counters *counter = &counters[op];
+
+        pthread_mutex_lock(&stats_lock);
+        counter->calls++;
+        if (failed) {
+            counter->errors++;
+        }
+        counter->total += elapsed;
+        if (elapsed > counter->max) {
+            counter->max = elapsed;
+        }
+        counter->buckets[bucket_for(elapsed)]++;
+        pthread_mutex_unlock(&stats_lock);
+    }
+
+    if (trace_callback != NULL) {
+        trace(op, elapsed, failed);
+    }
+}
+
+void enable_stats(void)
+{
+    pthread_mutex_lock(&stats_lock);
+    stats_enabled = 1;
+    update_active();
+    pthread_mutex_unlock(&stats_lock);
+}
+
+void disable_stats(void)
+{
+    pthread_mutex_lock(&stats_lock);
+    stats_enabled = 0;
+    update_active();
+    pthread_mutex_unlock(&stats_lock);
+}
+
+void reset_stats(void)
+{
+    pthread_mutex_lock(&stats_lock);
+    memset(counters, 0, sizeof(counters));
+    pthread_mutex_unlock(&stats_lock);
+}
+
+static PyObject* counter_to_dict(const stat_counters *counter)
+{
+    PyObject *histogram = PyList_New(STAT_BUCKETS);
+    double limit = 1e-6;
+    int i;
+
+    if (histogram == NULL) {
+        return NULL;
+    }
+
+    for (i = 0; i < STAT_BUCKETS; i++, limit *= 2) {
+        PyObject *bucket;
+
+        if (i < STAT_BUCKETS - 1) {
+            bucket = Py_BuildValue("(dK)", limit, counter->buckets[i]);
+        } else {
+            bucket = Py_BuildValue("(OK)", Py_None, counter->buckets[i]);
+        }
+        if (bucket == NULL) {
+            Py_DECREF(histogram);
+            return NULL;
+        }
+        PyList_SET_ITEM(histogram, i, bucket);
+    }
+
+    return Py_BuildValue(
+        "{s:K,s:K,s:d,s:d,s:N}",
+        "calls", counter->calls,
+        "errors", counter->errors,
+        "total", counter->total,
+        "max", counter->max,
+        "histogram", histogram
+    );
+}
+
+/*
+ * Returns a dict mapping each operation name to its counters.
+ */
+PyObject* get_stats(void)
+{
+    stat_counters snapshot[STAT_COUNT];
+    PyObject *stats;
+    int op;
+
+    pthread_mutex_lock(&stats_lock);
+    memcpy(snapshot, counters, sizeof(snapshot));
+    pthread_mutex_unlock(&stats_lock);
+
+    stats = PyDict_New();
+    if (stats == NULL) {
+        return NULL;
+    }
+
+    for (op = 0; op < STAT_COUNT; op++) {
+        PyObject *counter = counter_to_dict(&snapshot[op]);
+
+        if (
+            counter == NULL ||
+            PyDict_SetItemString(stats, stat_names[op], counter) != 0
+        ) {
+            Py_XDECREF(counter);
+            Py_DECREF(stats);
+            return NULL;
+        }
+        Py_DECREF(counter);
+    }
+
+    return stats;
+}
+
+/*
+ * Sets the callable invoked after every instrumented call, or removes it if
+ * callback is None. Must be called with the GIL held. The callback is called
+ * from whichever thread made the call, through the main interpreter, so it
+ * can only be set there, and calls made in other interpreters are not traced.
+ */
+int set_trace_callback(PyObject* callback)
+{
+    PyObject *previous;
+
+    if (! is_main_interpreter()) {
+        PyErr_SetString(
+            PyExc_RuntimeError,
+            "The trace callback can only be set in the main interpreter"
+        );
+        return 0;
+    }
+
+    if (callback == Py_None) {
+        callback = NULL;
+    } else if (! PyCallable_Check(callback)) {
+        PyErr_SetString(PyExc_TypeError, "Expected a callable or None");
+        return 0;
+    }
+
+    Py_XINCREF(callback);
+    pthread_mutex_lock(&stats_lock);
+    previous = trace_callback;
+    trace_callback = callback;
+    update_active();
+    pthread_mutex_unlock(&stats_lock);
+    Py_XDECREF(previous);
+
+    return 1;
+}
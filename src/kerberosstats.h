@@ -0,0 +1,96 @@
+/**
+ * Copyright (c) 2026 Apple Inc. All rights reserved.
+ *
+ * Licensed under the Apache License, Version 2.0 (the "License");
+ * you may not use this file except in compliance with the License.
+ * You may obtain a copy of the License at
+ *
+ *     http://www.apache.org/licenses/LICENSE-2.0
+ *
+ * Unless required by applicable law or agreed to in writing, software
+ * distributed under the License is distributed on an "AS IS" BASIS,
+ * WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+ * See the License for the specific language governing permissions and
+ * limitations under the License.
+ **/
+
+#ifndef KERBEROSSTATS_H
+#define KERBEROSSTATS_H
+
+#include <Python.h>
+
+#include "kerberoscache.h"
+
+/*
+ * The instrumented library calls. Keep in step with stat_names.
+ */
+typedef enum {
+    STAT_ACQUIRE_CRED,
+    STAT_INIT_SEC_CONTEXT,
+    STAT_ACCEPT_SEC_CONTEXT,
+    STAT_WRAP,
+    STAT_UNWRAP,
+    STAT_KEYTAB_SCAN,
+    STAT_GET_INIT_CREDS_PASSWORD,
+    STAT_CHANGE_PASSWORD,
+    STAT_COUNT
+} stat_op;
+
+/*
+ * Bucket i of a latency histogram counts calls that took less than 2**i
+ * microseconds; the last bucket counts everything slower.
+ */
+#define STAT_BUCKETS 24
+
+/*
+ * Nonzero while statistics or tracing are enabled. Instrumented calls only
+ * read the clock when it is set, so they cost a single load otherwise.
+ */
+extern int stats_active;
+
+/*
+ * Brackets one library call, which may run with or without the GIL:
+ *
+ *     double start = STATS_START();
+ *     maj_stat = gss_...(...);
+ *     STATS_END(STAT_..., start, GSS_ERROR(maj_stat));
+ */
+#define STATS_START() (stats_active ? cache_now() : 0.0)
+#define STATS_END(op, start, failed) \
+    do { \
+        if ((start) != 0.0) { \
+            stats_record((op), (start), (failed)); \
+        } \
+    } while (0)
+
+/*
+ * Py_BEGIN_ALLOW_THREADS and Py_END_ALLOW_THREADS for blocks that may reach
+ * STATS_END. A thread without the GIL cannot tell which interpreter it is
+ * running, so these note it for the trace callback.
+ */
+#if PY_VERSION_HEX >= 0x03090000
+    #define STATS_BEGIN_ALLOW_THREADS \
+        { \
+            PyInterpreterState *_stats_interp = \
+                stats_set_thread_interpreter(PyInterpreterState_Get()); \
+            Py_BEGIN_ALLOW_THREADS
+    #define STATS_END_ALLOW_THREADS \
+            Py_END_ALLOW_THREADS \
+            stats_set_thread_interpreter(_stats_interp); \
+        }
+#else
+    #define STATS_BEGIN_ALLOW_THREADS Py_BEGIN_ALLOW_THREADS
+    #define STATS_END_ALLOW_THREADS Py_END_ALLOW_THREADS
+#endif
+
+PyInterpreterState* stats_thread_interpreter(void);
+PyInterpreterState* stats_set_thread_interpreter(PyInterpreterState *interp);
+void stats_record(stat_op op, double start, int failed);
+void stats_record_elapsed(stat_op op, double elapsed, int failed);
+void enable_stats(void);
+void disable_stats(void);
+void reset_stats(void);
+PyObject* get_stats(void);
+int set_trace_callback(PyObject* callback);
+
+#endif
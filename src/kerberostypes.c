@@ -0,0 +1,1099 @@
+/**
+ * Copyright (c) 2026 Apple Inc. All rights reserved.
+ *
+ * Licensed under the Apache License, Version 2.0 (the "License");
+ * you may not use this file except in compliance with the License.
+ * You may obtain a copy of the License at
+ *
+ *     http://www.apache.org/licenses/LICENSE-2.0
+ *
+ * Unless required by applicable law or agreed to in writing, software
+ * distributed under the License is distributed on an "AS IS" BASIS,
+ * WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+ * See the License for the specific language governing permissions and
+ * limitations under the License.
+ **/
+
+#include <Python.h>
+
+#include "kerberostypes.h"
+#include "kerberosbasic.h"
+#include "kerberosstats.h"
+
+#if PY_VERSION_HEX >= 0x03020000
+    #define PyCObject_Check PyCapsule_CheckExact
+    #define PyCObject_AsVoidPtr(pobj) PyCapsule_GetPointer(pobj, NULL)
+#else
+    #define PyCapsule_GetPointer(pobj, name) PyCObject_AsVoidPtr(pobj)
+
+const char server_credential_desc[] = SERVER_CREDENTIAL_CAPSULE;
+#endif
+
+/*
+ * GSSClientContext and GSSServerContext keep the GSSAPI state inside the
+ * object itself, so attribute access is a plain field read and needs neither
+ * argument parsing nor a capsule lookup. Operations on the GSSAPI context hold
+ * the object's lock, which lets several threads share one context.
+ */
+
+static void acquire_lock(gss_context_object *context)
+{
+    if (! PyThread_acquire_lock(context->lock, NOWAIT_LOCK)) {
+        Py_BEGIN_ALLOW_THREADS
+        PyThread_acquire_lock(context->lock, WAIT_LOCK);
+        Py_END_ALLOW_THREADS
+    }
+}
+
+static int init_lock(gss_context_object *context)
+{
+    context->lock = PyThread_allocate_lock();
+    if (context->lock == NULL) {
+        PyErr_NoMemory();
+        return 0;
+    }
+    return 1;
+}
+
+/*
+ * Locks a context object for one operation. Contexts returned by
+ * authGSSClientInit and authGSSServerInit have no lock, so this does nothing
+ * for them. Returns 0 with ValueError set if the context has been closed.
+ */
+int lock_context(PyObject *context)
+{
+    gss_context_object *object = (gss_context_object *)context;
+
+    if (! GSSClientContext_Check(context) && ! GSSServerContext_Check(context)) {
+        return 1;
+    }
+
+    acquire_lock(object);
+    if (object->closed) {
+        PyThread_release_lock(object->lock);
+        PyErr_SetString(PyExc_ValueError, "Operation on a closed context");
+        return 0;
+    }
+
+    return 1;
+}
+
+void unlock_context(PyObject *context)
+{
+    if (GSSClientContext_Check(context) || GSSServerContext_Check(context)) {
+        PyThread_release_lock(((gss_context_object *)context)->lock);
+    }
+}
+
+/*
+ * Returns a string field of a context's state as a str, or None if it is
+ * NULL. A step on another thread may free and replace the field, so context
+ * objects are read under their lock. A closed context reads as None.
+ */
+PyObject *context_string(PyObject *context, char **field)
+{
+    gss_context_object *object = (gss_context_object *)context;
+    PyObject *value;
+
+    if (! GSSClientContext_Check(context) && ! GSSServerContext_Check(context)) {
+        return Py_BuildValue("s", *field);
+    }
+
+    acquire_lock(object);
+    value = Py_BuildValue("s", *field);
+    PyThread_release_lock(object->lock);
+
+    return value;
+}
+
+static void hold_context(PyObject *context)
+{
+    if (GSSClientContext_Check(context) || GSSServerContext_Check(context)) {
+        acquire_lock((gss_context_object *)context);
+    }
+}
+
+/*
+ * Like context_string, for strings of a client state that get works out the
+ * first time they are asked for. The state of a closed context has been
+ * cleaned, so get finds nothing to work out and it reads as None.
+ */
+PyObject *client_string(
+    PyObject *context, gss_client_state *state,
+    int (*get)(gss_client_state *, const char **)
+) {
+    const char *field = NULL;
+    PyObject *value = NULL;
+
+    hold_context(context);
+    if (get(state, &field) != AUTH_GSS_ERROR) {
+        value = Py_BuildValue("s", field);
+    }
+    unlock_context(context);
+
+    return value;
+}
+
+PyObject *server_string(
+    PyObject *context, gss_server_state *state,
+    int (*get)(gss_server_state *, const char **)
+) {
+    const char *field = NULL;
+    PyObject *value = NULL;
+
+    hold_context(context);
+    if (get(state, &field) != AUTH_GSS_ERROR) {
+        value = Py_BuildValue("s", field);
+    }
+    unlock_context(context);
+
+    return value;
+}
+
+static PyObject *context_enter(PyObject *self, PyObject *args)
+{
+    Py_INCREF(self);
+    return self;
+}
+
+static PyObject *context_closed(gss_context_object *self, void *closure)
+{
+    return PyBool_FromLong(self->closed);
+}
+
+/* GSSClientContext */
+
+static PyObject *client_new(PyTypeObject *type, PyObject *args, PyObject *keywds)
+{
+    const char *service = NULL;
+    PyObject *pyservice = NULL;
+    gss_shared_cred *target = NULL;
+    const char *principal = NULL;
+    gss_shared_cred *credential = NULL;
+    PyObject *pycredential = NULL;
+    const char *ccache = NULL;
+    gss_client_object *self = NULL;
+    gss_server_state *delegatestate = NULL;
+    PyObject *pydelegatestate = NULL;
+    gss_OID mech_oid = GSS_C_NO_OID;
+    PyObject *pymech_oid = NULL;
+    static char *kwlist[] = {
+        "service", "principal", "gssflags", "delegated", "mech_oid",
+        "ccache", "credential", NULL
+    };
+    long int gss_flags = GSS_C_MUTUAL_FLAG | GSS_C_SEQUENCE_FLAG;
+
+    if (! PyArg_ParseTupleAndKeywords(
+        args, keywds, "O|zlOOzO", kwlist,
+        &pyservice, &principal, &gss_flags, &pydelegatestate, &pymech_oid,
+        &ccache, &pycredential
+    )) {
+        return NULL;
+    }
+
+    if (! get_client_handles(
+        pyservice, pycredential, &service, &target, &credential
+    )) {
+        return NULL;
+    }
+
+    if (pydelegatestate != NULL && GSSServerContext_Check(pydelegatestate)) {
+        delegatestate = &((gss_server_object *)pydelegatestate)->state;
+    } else if (pydelegatestate != NULL && PyCObject_Check(pydelegatestate)) {
+        delegatestate = (gss_server_state*)PyCObject_AsVoidPtr(pydelegatestate);
+    }
+
+    if (pymech_oid != NULL && PyCObject_Check(pymech_oid)) {
+        mech_oid = (gss_OID)PyCObject_AsVoidPtr(pymech_oid);
+    }
+
+    self = (gss_client_object *)type->tp_alloc(type, 0);
+    if (self == NULL) {
+        return NULL;
+    }
+
+    if (! init_lock(&self->base)) {
+        Py_DECREF(self);
+        return NULL;
+    }
+
+    if (authenticate_gss_client_init(
+        service, target, principal, credential, ccache, gss_flags,
+        delegatestate, mech_oid, &self->state
+    ) == AUTH_GSS_ERROR) {
+        Py_DECREF(self);
+        return NULL;
+    }
+
+    // Borrowed delegated credentials must outlive this context
+    if (delegatestate != NULL) {
+        Py_INCREF(pydelegatestate);
+        self->delegated = pydelegatestate;
+    }
+
+    return (PyObject *)self;
+}
+
+static void client_dealloc(gss_client_object *self)
+{
+    if (! self->base.closed) {
+        authenticate_gss_client_clean(&self->state);
+    }
+    Py_XDECREF(self->delegated);
+    if (self->base.lock != NULL) {
+        PyThread_free_lock(self->base.lock);
+    }
+    Py_TYPE(self)->tp_free((PyObject *)self);
+}
+
+static PyObject *client_close(gss_client_object *self, PyObject *args)
+{
+    PyObject *delegated;
+
+    acquire_lock(&self->base);
+    if (! self->base.closed) {
+        authenticate_gss_client_clean(&self->state);
+        self->base.closed = 1;
+    }
+    delegated = self->delegated;
+    self->delegated = NULL;
+    PyThread_release_lock(self->base.lock);
+
+    Py_XDECREF(delegated);
+
+    Py_RETURN_NONE;
+}
+
+static PyObject *client_exit(gss_client_object *self, PyObject *args)
+{
+    Py_DECREF(client_close(self, NULL));
+
+    Py_RETURN_FALSE;
+}
+
+static PyObject *client_step(
+    gss_client_object *self, PyObject *args, PyObject *keywds
+) {
+    char *challenge = NULL;
+    PyObject *pychan_bindings = NULL;
+    struct gss_channel_bindings_struct *channel_bindings;
+    static char *kwlist[] = {"challenge", "channel_bindings", NULL};
+    int result = 0;
+
+    if (! PyArg_ParseTupleAndKeywords(
+        args, keywds, "s|O", kwlist, &challenge, &pychan_bindings
+    )) {
+        return NULL;
+    }
+
+    if (pychan_bindings == NULL) {
+        channel_bindings = GSS_C_NO_CHANNEL_BINDINGS;
+    } else {
+        if (! PyCObject_Check(pychan_bindings)) {
+            PyErr_SetString(PyExc_TypeError, "Expected a gss_channel_bindings_struct object");
+            return NULL;
+        }
+        channel_bindings = (struct gss_channel_bindings_struct *)PyCObject_AsVoidPtr(pychan_bindings);
+    }
+
+    if (! lock_context((PyObject *)self)) {
+        return NULL;
+    }
+    result = authenticate_gss_client_step(
+        &self->state, challenge, channel_bindings
+    );
+    unlock_context((PyObject *)self);
+
+    if (result == AUTH_GSS_ERROR) {
+        return NULL;
+    }
+
+    return Py_BuildValue("i", result);
+}
+
+static PyObject *client_wrap(
+    gss_client_object *self, PyObject *args, PyObject *keywds
+) {
+    char *challenge = NULL;
+    char *user = NULL;
+    int protect = 0;
+    static char *kwlist[] = {"data", "user", "protect", NULL};
+    int result = 0;
+
+    if (! PyArg_ParseTupleAndKeywords(
+        args, keywds, "s|zi", kwlist, &challenge, &user, &protect
+    )) {
+        return NULL;
+    }
+
+    if (! lock_context((PyObject *)self)) {
+        return NULL;
+    }
+    result = authenticate_gss_client_wrap(
+        &self->state, challenge, user, protect
+    );
+    unlock_context((PyObject *)self);
+
+    if (result == AUTH_GSS_ERROR) {
+        return NULL;
+    }
+
+    return Py_BuildValue("i", result);
+}
+
+static PyObject *client_unwrap(gss_client_object *self, PyObject *args)
+{
+    char *challenge = NULL;
+    int result = 0;
+
+    if (! PyArg_ParseTuple(args, "s", &challenge)) {
+        return NULL;
+    }
+
+    if (! lock_context((PyObject *)self)) {
+        return NULL;
+    }
+    result = authenticate_gss_client_unwrap(&self->state, challenge);
+    unlock_context((PyObject *)self);
+
+    if (result == AUTH_GSS_ERROR) {
+        return NULL;
+    }
+
+    return Py_BuildValue("i", result);
+}
+
+static PyObject *client_inquire_cred(gss_client_object *self, PyObject *args)
+{
+    int result = 0;
+
+    if (! lock_context((PyObject *)self)) {
+        return NULL;
+    }
+    result = authenticate_gss_client_inquire_cred(&self->state);
+    unlock_context((PyObject *)self);
+
+    if (result == AUTH_GSS_ERROR) {
+        return NULL;
+    }
+
+    return Py_BuildValue("i", result);
+}
+
+static PyObject *client_response(gss_client_object *self, void *closure)
+{
+    return client_string(
+        (PyObject *)self, &self->state, authenticate_gss_client_response
+    );
+}
+
+static PyObject *client_username(gss_client_object *self, void *closure)
+{
+    return client_string(
+        (PyObject *)self, &self->state, authenticate_gss_client_username
+    );
+}
+
+static PyObject *client_response_conf(gss_client_object *self, void *closure)
+{
+    return Py_BuildValue("i", self->state.responseConf);
+}
+
+static PyMethodDef client_methods[] = {
+    {
+        "step", (PyCFunction)client_step, METH_VARARGS | METH_KEYWORDS,
+        "Process a challenge from the server, as authGSSClientStep."
+    },
+    {
+        "wrap", (PyCFunction)client_wrap, METH_VARARGS | METH_KEYWORDS,
+        "Wrap a message for the server, as authGSSClientWrap."
+    },
+    {
+        "unwrap", (PyCFunction)client_unwrap, METH_VARARGS,
+        "Unwrap a message from the server, as authGSSClientUnwrap."
+    },
+    {
+        "inquire_cred", (PyCFunction)client_inquire_cred, METH_NOARGS,
+        "Look up the client user name, as authGSSClientInquireCred."
+    },
+    {
+        "close", (PyCFunction)client_close, METH_NOARGS,
+        "Release the GSSAPI context. Further operations raise ValueError."
+    },
+    {"__enter__", context_enter, METH_NOARGS, NULL},
+    {"__exit__", (PyCFunction)client_exit, METH_VARARGS, NULL},
+    {NULL, NULL, 0, NULL}
+};
+
+static PyGetSetDef client_getset[] = {
+    {"response", (getter)client_response, NULL, "The last response.", NULL},
+    {"username", (getter)client_username, NULL, "The client user name.", NULL},
+    {
+        "response_conf", (getter)client_response_conf, NULL,
+        "Whether the last unwrapped message was encrypted.", NULL
+    },
+    {"closed", (getter)context_closed, NULL, "Whether close was called.", NULL},
+    {NULL, NULL, NULL, NULL, NULL}
+};
+
+PyTypeObject GSSClientContext_Type = {
+    PyVarObject_HEAD_INIT(NULL, 0)
+    .tp_name = "kerberos.GSSClientContext",
+    .tp_basicsize = sizeof(gss_client_object),
+    .tp_dealloc = (destructor)client_dealloc,
+    .tp_flags = Py_TPFLAGS_DEFAULT,
+    .tp_doc = "A GSSAPI client context, taking the arguments of authGSSClientInit.",
+    .tp_methods = client_methods,
+    .tp_getset = client_getset,
+    .tp_new = client_new,
+};
+
+/* GSSServerContext */
+
+static PyObject *server_new(PyTypeObject *type, PyObject *args, PyObject *keywds)
+{
+    const char *service = NULL;
+    PyObject *pyservice = NULL;
+    gss_server_credential *credential = NULL;
+    gss_server_object *self = NULL;
+    static char *kwlist[] = {"service", NULL};
+
+    if (! PyArg_ParseTupleAndKeywords(args, keywds, "O", kwlist, &pyservice)) {
+        return NULL;
+    }
+
+    if (! get_server_service(pyservice, &service, &credential)) {
+        return NULL;
+    }
+
+    self = (gss_server_object *)type->tp_alloc(type, 0);
+    if (self == NULL) {
+        return NULL;
+    }
+
+    if (! init_lock(&self->base)) {
+        Py_DECREF(self);
+        return NULL;
+    }
+
+    if (authenticate_gss_server_init(
+        service, credential, &self->state
+    ) == AUTH_GSS_ERROR) {
+        Py_DECREF(self);
+        return NULL;
+    }
+
+    return (PyObject *)self;
+}
+
+static void server_dealloc(gss_server_object *self)
+{
+    if (! self->base.closed) {
+        authenticate_gss_server_clean(&self->state);
+    }
+    if (self->base.lock != NULL) {
+        PyThread_free_lock(self->base.lock);
+    }
+    Py_TYPE(self)->tp_free((PyObject *)self);
+}
+
+static PyObject *server_close(gss_server_object *self, PyObject *args)
+{
+    acquire_lock(&self->base);
+    if (! self->base.closed) {
+        authenticate_gss_server_clean(&self->state);
+        self->base.closed = 1;
+    }
+    PyThread_release_lock(self->base.lock);
+
+    Py_RETURN_NONE;
+}
+
+static PyObject *server_exit(gss_server_object *self, PyObject *args)
+{
+    Py_DECREF(server_close(self, NULL));
+
+    Py_RETURN_FALSE;
+}
+
+static PyObject *server_step(gss_server_object *self, PyObject *args)
+{
+    char *challenge = NULL;
+    int result = 0;
+
+    if (! PyArg_ParseTuple(args, "s", &challenge)) {
+        return NULL;
+    }
+
+    if (! lock_context((PyObject *)self)) {
+        return NULL;
+    }
+    result = authenticate_gss_server_step(&self->state, challenge);
+    unlock_context((PyObject *)self);
+
+    if (result == AUTH_GSS_ERROR) {
+        return NULL;
+    }
+
+    return Py_BuildValue("i", result);
+}
+
+static PyObject *server_store_delegate(
+    gss_server_object *self, PyObject *args, PyObject *keywds
+) {
+    const char *cache_type = "FILE";
+    static char *kwlist[] = {"cache_type", NULL};
+    int result = 0;
+
+    if (! PyArg_ParseTupleAndKeywords(
+        args, keywds, "|s", kwlist, &cache_type
+    )) {
+        return NULL;
+    }
+
+    if (! lock_context((PyObject *)self)) {
+        return NULL;
+    }
+    result = authenticate_gss_server_store_delegate(&self->state, cache_type);
+    unlock_context((PyObject *)self);
+
+    if (result == AUTH_GSS_ERROR) {
+        return NULL;
+    }
+
+    return Py_BuildValue("i", result);
+}
+
+static PyObject *server_response(gss_server_object *self, void *closure)
+{
+    return server_string(
+        (PyObject *)self, &self->state, authenticate_gss_server_response
+    );
+}
+
+static PyObject *server_username(gss_server_object *self, void *closure)
+{
+    return server_string(
+        (PyObject *)self, &self->state, authenticate_gss_server_username
+    );
+}
+
+static PyObject *server_target_name(gss_server_object *self, void *closure)
+{
+    return server_string(
+        (PyObject *)self, &self->state, authenticate_gss_server_target_name
+    );
+}
+
+static PyObject *server_ccache_name(gss_server_object *self, void *closure)
+{
+    return context_string((PyObject *)self, &self->state.ccname);
+}
+
+static PyObject *server_has_delegated(gss_server_object *self, void *closure)
+{
+    return PyBool_FromLong(authenticate_gss_server_has_delegated(&self->state));
+}
+
+static PyMethodDef server_methods[] = {
+    {
+        "step", (PyCFunction)server_step, METH_VARARGS,
+        "Process a challenge from the client, as authGSSServerStep."
+    },
+    {
+        "store_delegate", (PyCFunction)server_store_delegate,
+        METH_VARARGS | METH_KEYWORDS,
+        "Store delegated credentials, as authGSSServerStoreDelegate."
+    },
+    {
+        "close", (PyCFunction)server_close, METH_NOARGS,
+        "Release the GSSAPI context. Further operations raise ValueError."
+    },
+    {"__enter__", context_enter, METH_NOARGS, NULL},
+    {"__exit__", (PyCFunction)server_exit, METH_VARARGS, NULL},
+    {NULL, NULL, 0, NULL}
+};
+
+static PyGetSetDef server_getset[] = {
+    {"response", (getter)server_response, NULL, "The last response.", NULL},
+    {"username", (getter)server_username, NULL, "The client user name.", NULL},
+    {
+        "target_name", (getter)server_target_name, NULL,
+        "The service the client authenticated to.", NULL
+    },
+    {
+        "ccache_name", (getter)server_ccache_name, NULL,
+        "The credential cache written by store_delegate.", NULL
+    },
+    {
+        "has_delegated", (getter)server_has_delegated, NULL,
+        "Whether the client delegated credentials.", NULL
+    },
+    {"closed", (getter)context_closed, NULL, "Whether close was called.", NULL},
+    {NULL, NULL, NULL, NULL, NULL}
+};
+
+PyTypeObject GSSServerContext_Type = {
+    PyVarObject_HEAD_INIT(NULL, 0)
+    .tp_name = "kerberos.GSSServerContext",
+    .tp_basicsize = sizeof(gss_server_object),
+    .tp_dealloc = (destructor)server_dealloc,
+    .tp_flags = Py_TPFLAGS_DEFAULT,
+    .tp_doc = "A GSSAPI server context, taking the argument of authGSSServerInit.",
+    .tp_methods = server_methods,
+    .tp_getset = server_getset,
+    .tp_new = server_new,
+};
+
+/* Name and Credential */
+
+static void handle_dealloc(gss_handle_object *self)
+{
+    if (self->shared != NULL) {
+        release_shared_cred(self->shared);
+    }
+    Py_XDECREF(self->description);
+    Py_TYPE(self)->tp_free((PyObject *)self);
+}
+
+static PyObject *name_new(PyTypeObject *type, PyObject *args, PyObject *keywds)
+{
+    const char *service = NULL;
+    gss_handle_object *self = NULL;
+    static char *kwlist[] = {"service", NULL};
+
+    if (! PyArg_ParseTupleAndKeywords(args, keywds, "s", kwlist, &service)) {
+        return NULL;
+    }
+
+    self = (gss_handle_object *)type->tp_alloc(type, 0);
+    if (self == NULL) {
+        return NULL;
+    }
+
+    self->description = Py_BuildValue("s", service);
+    if (self->description == NULL) {
+        Py_DECREF(self);
+        return NULL;
+    }
+
+    self->shared = import_target_name(service);
+    if (self->shared == NULL) {
+        Py_DECREF(self);
+        return NULL;
+    }
+
+    return (PyObject *)self;
+}
+
+static PyObject *credential_new(
+    PyTypeObject *type, PyObject *args, PyObject *keywds
+) {
+    const char *principal = NULL;
+    const char *ccache = NULL;
+    gss_handle_object *self = NULL;
+    static char *kwlist[] = {"principal", "ccache", NULL};
+
+    if (! PyArg_ParseTupleAndKeywords(
+        args, keywds, "|zz", kwlist, &principal, &ccache
+    )) {
+        return NULL;
+    }
+
+    self = (gss_handle_object *)type->tp_alloc(type, 0);
+    if (self == NULL) {
+        return NULL;
+    }
+
+    self->description = Py_BuildValue("z", principal);
+    if (self->description == NULL) {
+        Py_DECREF(self);
+        return NULL;
+    }
+
+    self->shared = acquire_client_credential(principal, ccache);
+    if (self->shared == NULL) {
+        Py_DECREF(self);
+        return NULL;
+    }
+
+    return (PyObject *)self;
+}
+
+static PyObject *handle_description(gss_handle_object *self, void *closure)
+{
+    Py_INCREF(self->description);
+    return self->description;
+}
+
+static PyGetSetDef name_getset[] = {
+    {
+        "service", (getter)handle_description, NULL,
+        "The service principal, as given.", NULL
+    },
+    {NULL, NULL, NULL, NULL, NULL}
+};
+
+static PyGetSetDef credential_getset[] = {
+    {
+        "principal", (getter)handle_description, NULL,
+        "The client principal, as given, or None.", NULL
+    },
+    {NULL, NULL, NULL, NULL, NULL}
+};
+
+PyTypeObject Name_Type = {
+    PyVarObject_HEAD_INIT(NULL, 0)
+    .tp_name = "kerberos.Name",
+    .tp_basicsize = sizeof(gss_handle_object),
+    .tp_dealloc = (destructor)handle_dealloc,
+    .tp_flags = Py_TPFLAGS_DEFAULT,
+    .tp_doc = "A service principal imported once for authGSSClientInit.",
+    .tp_getset = name_getset,
+    .tp_new = name_new,
+};
+
+PyTypeObject Credential_Type = {
+    PyVarObject_HEAD_INIT(NULL, 0)
+    .tp_name = "kerberos.Credential",
+    .tp_basicsize = sizeof(gss_handle_object),
+    .tp_dealloc = (destructor)handle_dealloc,
+    .tp_flags = Py_TPFLAGS_DEFAULT,
+    .tp_doc = "Client credentials acquired once for authGSSClientInit.",
+    .tp_getset = credential_getset,
+    .tp_new = credential_new,
+};
+
+/* PasswordVerifier */
+
+typedef struct {
+    gss_context_object  base;
+    password_step       step;
+} password_verifier_object;
+
+/*
+ * Takes the verifier's lock, or returns 0 with ValueError set once the check
+ * has finished.
+ */
+static int lock_verifier(password_verifier_object *self)
+{
+    acquire_lock(&self->base);
+    if (self->base.closed) {
+        PyThread_release_lock(self->base.lock);
+        PyErr_SetString(PyExc_ValueError, "The password check has finished");
+        return 0;
+    }
+    return 1;
+}
+
+static void finish_verifier(password_verifier_object *self)
+{
+    password_step_clean(&self->step);
+    self->base.closed = 1;
+}
+
+static PyObject *verifier_new(
+    PyTypeObject *type, PyObject *args, PyObject *keywds
+) {
+    const char *user = NULL;
+    const char *pswd = NULL;
+    const char *service = NULL;
+    const char *default_realm = NULL;
+    password_verifier_object *self = NULL;
+    basicauth_result result;
+    static char *kwlist[] = {"user", "pswd", "service", "default_realm", NULL};
+
+    if (! PyArg_ParseTupleAndKeywords(
+        args, keywds, "ssss", kwlist, &user, &pswd, &service, &default_realm
+    )) {
+        return NULL;
+    }
+
+    self = (password_verifier_object *)type->tp_alloc(type, 0);
+    if (self == NULL) {
+        return NULL;
+    }
+    self->base.closed = 1;
+
+    if (! init_lock(&self->base)) {
+        Py_DECREF(self);
+        return NULL;
+    }
+
+    // Creating the krb5 context reads the configuration files
+    Py_BEGIN_ALLOW_THREADS
+    password_step_init(
+        user, pswd, service, default_realm, &self->step, &result
+    );
+    Py_END_ALLOW_THREADS
+
+    if (result.status != BASICAUTH_OK) {
+        set_basicauth_result_error(&result);
+        Py_DECREF(self);
+        return NULL;
+    }
+    self->base.closed = 0;
+
+    return (PyObject *)self;
+}
+
+static void verifier_dealloc(password_verifier_object *self)
+{
+    if (! self->base.closed) {
+        password_step_clean(&self->step);
+    }
+    if (self->base.lock != NULL) {
+        PyThread_free_lock(self->base.lock);
+    }
+    Py_TYPE(self)->tp_free((PyObject *)self);
+}
+
+static PyObject *verifier_close(password_verifier_object *self, PyObject *args)
+{
+    acquire_lock(&self->base);
+    if (! self->base.closed) {
+        finish_verifier(self);
+    }
+    PyThread_release_lock(self->base.lock);
+
+    Py_RETURN_NONE;
+}
+
+static PyObject *verifier_exit(password_verifier_object *self, PyObject *args)
+{
+    Py_DECREF(verifier_close(self, NULL));
+
+    Py_RETURN_FALSE;
+}
+
+static PyObject *verifier_step(
+    password_verifier_object *self, PyObject *args, PyObject *keywds
+) {
+    PyObject *pyreply = Py_None;
+    Py_buffer reply;
+    krb5_data request;
+    basicauth_result result;
+    PyObject *pyrequest = NULL;
+    int status;
+    static char *kwlist[] = {"reply", NULL};
+
+    if (! PyArg_ParseTupleAndKeywords(args, keywds, "|O", kwlist, &pyreply)) {
+        return NULL;
+    }
+
+    memset(&reply, 0, sizeof(reply));
+    if (pyreply != Py_None && PyObject_GetBuffer(
+        pyreply, &reply, PyBUF_SIMPLE
+    ) < 0) {
+        return NULL;
+    }
+
+    if (! lock_verifier(self)) {
+        if (pyreply != Py_None) {
+            PyBuffer_Release(&reply);
+        }
+        return NULL;
+    }
+
+    // Turning the password into a key is deliberately slow
+    STATS_BEGIN_ALLOW_THREADS
+    status = password_step_next(
+        &self->step, (const char *)reply.buf, (size_t)reply.len, &request,
+        &result
+    );
+    STATS_END_ALLOW_THREADS
+
+    if (status == PASSWORD_STEP_CONTINUE) {
+        pyrequest = PyBytes_FromStringAndSize(request.data, request.length);
+        krb5_free_data_contents(self->step.context, &request);
+    } else {
+        finish_verifier(self);
+        if (status == PASSWORD_STEP_COMPLETE) {
+            Py_INCREF(Py_None);
+            pyrequest = Py_None;
+        } else {
+            set_basicauth_result_error(&result);
+        }
+    }
+    PyThread_release_lock(self->base.lock);
+
+    if (pyreply != Py_None) {
+        PyBuffer_Release(&reply);
+    }
+
+    return pyrequest;
+}
+
+static PyObject *verifier_unreachable(
+    password_verifier_object *self, PyObject *args
+) {
+    basicauth_result result;
+
+    if (! lock_verifier(self)) {
+        return NULL;
+    }
+    password_step_unreachable(&self->step, &result);
+    finish_verifier(self);
+    PyThread_release_lock(self->base.lock);
+
+    set_basicauth_result_error(&result);
+
+    return NULL;
+}
+
+static PyObject *verifier_realm(password_verifier_object *self, void *closure)
+{
+    PyObject *value;
+
+    acquire_lock(&self->base);
+    value = Py_BuildValue("z", self->step.realm);
+    PyThread_release_lock(self->base.lock);
+
+    return value;
+}
+
+static PyObject *verifier_tcp_only(
+    password_verifier_object *self, void *closure
+) {
+    return PyBool_FromLong(self->step.tcp_only);
+}
+
+static PyMethodDef verifier_methods[] = {
+    {
+        "step", (PyCFunction)verifier_step, METH_VARARGS | METH_KEYWORDS,
+        "Process the KDC's reply and return the next request, or None."
+    },
+    {
+        "unreachable", (PyCFunction)verifier_unreachable, METH_NOARGS,
+        "Give up because no KDC answered, raising BasicAuthError."
+    },
+    {
+        "close", (PyCFunction)verifier_close, METH_NOARGS,
+        "Abandon the check. Further steps raise ValueError."
+    },
+    {"__enter__", context_enter, METH_NOARGS, NULL},
+    {"__exit__", (PyCFunction)verifier_exit, METH_VARARGS, NULL},
+    {NULL, NULL, 0, NULL}
+};
+
+static PyGetSetDef verifier_getset[] = {
+    {
+        "realm", (getter)verifier_realm, NULL,
+        "The realm whose KDC the last request is for.", NULL
+    },
+    {
+        "tcp_only", (getter)verifier_tcp_only, NULL,
+        "Whether requests must be sent over TCP.", NULL
+    },
+    {
+        "closed", (getter)context_closed, NULL,
+        "Whether the check has finished.", NULL
+    },
+    {NULL, NULL, NULL, NULL, NULL}
+};
+
+PyTypeObject PasswordVerifier_Type = {
+    PyVarObject_HEAD_INIT(NULL, 0)
+    .tp_name = "kerberos.PasswordVerifier",
+    .tp_basicsize = sizeof(password_verifier_object),
+    .tp_dealloc = (destructor)verifier_dealloc,
+    .tp_flags = Py_TPFLAGS_DEFAULT,
+    .tp_doc = "A checkPassword that the caller drives one KDC exchange at a time.",
+    .tp_methods = verifier_methods,
+    .tp_getset = verifier_getset,
+    .tp_new = verifier_new,
+};
+
+/*
+ * Gets the arguments of authGSSClientInit that may be handles: service, a
+ * str or a Name, and credential, a Credential or None. The handles are
+ * borrowed; the client state takes its own references on them.
+ */
+int get_client_handles(
+    PyObject *pyservice, PyObject *pycredential, const char **service,
+    gss_shared_cred **target, gss_shared_cred **credential
+) {
+    if (Name_Check(pyservice)) {
+        *target = ((gss_handle_object *)pyservice)->shared;
+    } else if (! PyArg_Parse(pyservice, "s", service)) {
+        return 0;
+    }
+
+    if (pycredential != NULL && pycredential != Py_None) {
+        if (! Credential_Check(pycredential)) {
+            PyErr_SetString(
+                PyExc_TypeError, "credential must be a kerberos.Credential"
+            );
+            return 0;
+        }
+        *credential = ((gss_handle_object *)pycredential)->shared;
+    }
+
+    return 1;
+}
+
+/*
+ * Gets the service argument of authGSSServerInit: a str, or a credential
+ * from acquireServerCredential. Other capsules, such as contexts or OIDs, are
+ * refused rather than taken for a credential.
+ */
+static int is_server_credential(PyObject *obj)
+{
+#if PY_VERSION_HEX >= 0x03020000
+    return PyCapsule_IsValid(obj, SERVER_CREDENTIAL_CAPSULE);
+#else
+    return (
+        PyCObject_Check(obj) &&
+        PyCObject_GetDesc(obj) == (void *)server_credential_desc
+    );
+#endif
+}
+
+int get_server_service(
+    PyObject *pyservice, const char **service,
+    gss_server_credential **credential
+) {
+    if (is_server_credential(pyservice)) {
+        *credential = (gss_server_credential *)PyCapsule_GetPointer(
+            pyservice, SERVER_CREDENTIAL_CAPSULE
+        );
+        return *credential != NULL;
+    }
+
+    return PyArg_Parse(pyservice, "s", service);
+}
+
+static int add_type(PyObject *module, const char *name, PyTypeObject *type)
+{
+    Py_INCREF(type);
+    if (PyModule_AddObject(module, name, (PyObject *)type) < 0) {
+        Py_DECREF(type);
+        return -1;
+    }
+    return 0;
+}
+
+int add_types(PyObject *module)
+{
+    if (
+        PyType_Ready(&GSSClientContext_Type) < 0 ||
+        PyType_Ready(&GSSServerContext_Type) < 0 ||
+        PyType_Ready(&Name_Type) < 0 ||
+        PyType_Ready(&Credential_Type) < 0 ||
+        PyType_Ready(&PasswordVerifier_Type) < 0
+    ) {
+        return -1;
+    }
+
+    if (
+        add_type(module, "GSSClientContext", &GSSClientContext_Type) < 0 ||
+        add_type(module, "GSSServerContext", &GSSServerContext_Type) < 0 ||
+        add_type(module, "Name", &Name_Type) < 0 ||
+        add_type(module, "Credential", &Credential_Type) < 0 ||
+        add_type(module, "PasswordVerifier", &PasswordVerifier_Type) < 0
+    ) {
+        return -1;
+    }
+
+    return 0;
+}
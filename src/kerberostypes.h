@@ -0,0 +1,98 @@
+/**
+ * Copyright (c) 2026 Apple Inc. All rights reserved.
+ *
+ * Licensed under the Apache License, Version 2.0 (the "License");
+ * you may not use this file except in compliance with the License.
+ * You may obtain a copy of the License at
+ *
+ *     http://www.apache.org/licenses/LICENSE-2.0
+ *
+ * Unless required by applicable law or agreed to in writing, software
+ * distributed under the License is distributed on an "AS IS" BASIS,
+ * WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+ * See the License for the specific language governing permissions and
+ * limitations under the License.
+ **/
+
+#ifndef KERBEROSTYPES_H
+#define KERBEROSTYPES_H
+
+#include <Python.h>
+#include <pythread.h>
+
+#include "kerberosgss.h"
+
+/*
+ * Common head of the context objects. The lock serialises every operation
+ * that uses the GSSAPI context; it is taken with the GIL released, so an
+ * operation that releases the GIL itself cannot deadlock other threads.
+ */
+typedef struct {
+    PyObject_HEAD
+    PyThread_type_lock  lock;
+    int                 closed;
+} gss_context_object;
+
+typedef struct {
+    gss_context_object  base;
+    gss_client_state    state;
+    PyObject*           delegated;
+} gss_client_object;
+
+typedef struct {
+    gss_context_object  base;
+    gss_server_state    state;
+} gss_server_object;
+
+/*
+ * A target name or initiator credential created once and passed to any
+ * number of client contexts. It never changes once created, so it needs no
+ * lock to be shared between threads.
+ */
+typedef struct {
+    PyObject_HEAD
+    gss_shared_cred*    shared;
+    PyObject*           description;
+} gss_handle_object;
+
+extern PyTypeObject GSSClientContext_Type;
+extern PyTypeObject GSSServerContext_Type;
+extern PyTypeObject Name_Type;
+extern PyTypeObject Credential_Type;
+extern PyTypeObject PasswordVerifier_Type;
+
+#define GSSClientContext_Check(op) PyObject_TypeCheck(op, &GSSClientContext_Type)
+#define GSSServerContext_Check(op) PyObject_TypeCheck(op, &GSSServerContext_Type)
+#define Name_Check(op) PyObject_TypeCheck(op, &Name_Type)
+#define Credential_Check(op) PyObject_TypeCheck(op, &Credential_Type)
+
+// The capsule name of the credentials from acquireServerCredential
+#define SERVER_CREDENTIAL_CAPSULE "kerberos.ServerCredential"
+
+#if PY_VERSION_HEX < 0x03020000
+// CObjects have no name, so credentials carry this as their description
+extern const char server_credential_desc[];
+#endif
+
+int add_types(PyObject *module);
+int get_client_handles(
+    PyObject *pyservice, PyObject *pycredential, const char **service,
+    gss_shared_cred **target, gss_shared_cred **credential
+);
+int get_server_service(
+    PyObject *pyservice, const char **service,
+    gss_server_credential **credential
+);
+int lock_context(PyObject *context);
+void unlock_context(PyObject *context);
+PyObject *context_string(PyObject *context, char **field);
+PyObject *client_string(
+    PyObject *context, gss_client_state *state,
+    int (*get)(gss_client_state *, const char **)
+);
+PyObject *server_string(
+    PyObject *context, gss_server_state *state,
+    int (*get)(gss_server_state *, const char **)
+);
+
+#endif
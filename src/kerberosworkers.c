@@ -0,0 +1,113 @@
+/**
+ * Copyright (c) 2026 Apple Inc. All rights reserved.
+ *
+ * Licensed under the Apache License, Version 2.0 (the "License");
+ * you may not use this file except in compliance with the License.
+ * You may obtain a copy of the License at
+ *
+ *     http://www.apache.org/licenses/LICENSE-2.0
+ *
+ * Unless required by applicable law or agreed to in writing, software
+ * distributed under the License is distributed on an "AS IS" BASIS,
+ * WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+ * See the License for the specific language governing permissions and
+ * limitations under the License.
+ **/
+
+#include "kerberosworkers.h"
+#include "kerberosstats.h"
+
+#include <pthread.h>
+#include <stdlib.h>
+#include <unistd.h>
+
+#define DEFAULT_WORKERS 4
+
+typedef struct {
+    pthread_mutex_t  lock;
+    worker_job       job;
+    void             *jobs;
+    size_t           count;
+    size_t           next;
+    PyInterpreterState *interpreter;
+} worker_queue;
+
+int default_worker_count(void)
+{
+    long cpus = sysconf(_SC_NPROCESSORS_ONLN);
+
+    return (cpus > 0) ? (int)cpus : DEFAULT_WORKERS;
+}
+
+static void *worker_main(void *arg)
+{
+    worker_queue *queue = (worker_queue *)arg;
+    size_t index;
+
+    // Traced for the interpreter that started the jobs
+    stats_set_thread_interpreter(queue->interpreter);
+
+    while (1) {
+        pthread_mutex_lock(&queue->lock);
+        index = queue->next++;
+        pthread_mutex_unlock(&queue->lock);
+
+        if (index >= queue->count) {
+            break;
+        }
+        queue->job(queue->jobs, index);
+    }
+
+    return NULL;
+}
+
+/*
+ * Runs job for every index in [0, count) on up to max_workers native threads
+ * and waits for all of them to finish. The calling thread takes part in the
+ * work, so this still completes if no extra thread could be started. Jobs
+ * must not touch Python state: callers release the GIL around this.
+ */
+void run_worker_jobs(
+    worker_job job, void *jobs, size_t count, int max_workers
+) {
+    worker_queue queue;
+    pthread_t *threads = NULL;
+    size_t nthreads = 0;
+    size_t started = 0;
+    size_t i;
+
+    if (count == 0) {
+        return;
+    }
+    if (max_workers <= 0) {
+        max_workers = default_worker_count();
+    }
+    nthreads = ((size_t)max_workers < count) ? (size_t)max_workers : count;
+
+    pthread_mutex_init(&queue.lock, NULL);
+    queue.job = job;
+    queue.jobs = jobs;
+    queue.count = count;
+    queue.next = 0;
+    queue.interpreter = stats_thread_interpreter();
+
+    if (nthreads > 1) {
+        threads = (pthread_t *)malloc((nthreads - 1) * sizeof(pthread_t));
+    }
+    if (threads != NULL) {
+        for (i = 0; i < nthreads - 1; i++) {
+            if (pthread_create(&threads[i], NULL, worker_main, &queue) != 0) {
+                break;
+            }
+            started++;
+        }
+    }
+
+    worker_main(&queue);
+
+    for (i = 0; i < started; i++) {
+        pthread_join(threads[i], NULL);
+    }
+    free(threads);
+    pthread_mutex_destroy(&queue.lock);
+}
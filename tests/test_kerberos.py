@@ -18,6 +18,57 @@ def test_service_principal():
     assert actual == expected, "The returned SPN does not match with test expectations"
 
 
+def test_service_principal_many():
+    expected = "HTTP/%s@%s" % (hostname, realm.upper())
+    actual = kerberos.getServerPrincipalDetailsMany(
+        [("HTTP", hostname), ("NOSUCHSERVICE", hostname), ("HTTP", hostname)]
+    )
+
+    assert actual == [expected, None, expected], "The returned SPNs do not match with test expectations"
+
+
+def test_keytab_principals():
+    entries = kerberos.getKeytabPrincipals()
+    principals = [principal for principal, kvno, enctype in entries]
+
+    assert "HTTP/%s@%s" % (hostname, realm.upper()) in principals, "HTTP principal missing from keytab listing"
+    for principal, kvno, enctype in entries:
+        assert kvno > 0, "Invalid kvno returned for %s" % principal
+
+
+def test_reload_config():
+    expected = kerberos.getServerPrincipalDetails("HTTP", hostname)
+    kerberos.reloadConfig()
+    actual = kerberos.getServerPrincipalDetails("HTTP", hostname)
+
+    assert actual == expected, "The SPN changed after reloading the configuration"
+
+
+def test_set_config():
+    service = "HTTP/%s" % hostname
+    kdcs = kerberos.getRealmKDCs(realm.upper())
+    config = {
+        "libdefaults": {"default_realm": realm.upper(), "dns_lookup_kdc": False, "udp_preference_limit": 1},
+        "realms": {
+            realm.upper(): {"kdc": kdcs},
+            "CONFIG.TEST": {"kdc": ["kdc1.config.test", "tcp/kdc2.config.test:750"]},
+        },
+    }
+
+    with pytest.raises(TypeError):
+        kerberos.setConfig({"libdefaults": {"default_realm": None}})
+
+    kerberos.setConfig(config)
+    try:
+        assert kerberos.getRealmKDCs("CONFIG.TEST") == ["kdc1.config.test", "tcp/kdc2.config.test:750"]
+        assert kerberos.getRealmKDCs(realm.upper()) == kdcs
+        assert kerberos.checkPassword(username, password, service, realm.upper()), "Checking of the password failed"
+    finally:
+        kerberos.setConfig(None)
+
+    assert kerberos.getRealmKDCs("CONFIG.TEST") == [], "The configuration files were not used again"
+
+
 def test_basic_check_password():
     service = "HTTP/%s" % hostname
     actual = kerberos.checkPassword(username, password, service, realm.upper())
@@ -25,6 +76,81 @@ def test_basic_check_password():
     assert actual, "Checking of the password failed"
 
 
+def test_basic_check_password_cache():
+    service = "HTTP/%s" % hostname
+    kerberos.enablePasswordCache(max_entries=16, ttl=60, negative_ttl=60, max_negative_ttl=60)
+    try:
+        before = kerberos.getPasswordCacheStats()
+        assert kerberos.checkPassword(username, password, service, realm.upper())
+        assert kerberos.checkPassword(username, password, service, realm.upper())
+        for _ in range(2):
+            with pytest.raises(kerberos.BasicAuthError):
+                kerberos.checkPassword(username, "xxx", service, realm.upper())
+        after = kerberos.getPasswordCacheStats()
+
+        assert after["misses"] - before["misses"] == 2, "Expected one KDC check per distinct password"
+        assert after["hits"] - before["hits"] == 1, "Expected the repeated good password to be cached"
+        assert after["negative_hits"] - before["negative_hits"] == 1, "Expected the repeated bad password to be cached"
+        assert after["entries"] == 2, "Expected one entry per distinct password"
+
+        kerberos.clearPasswordCache()
+        assert kerberos.getPasswordCacheStats()["entries"] == 0, "Cache not cleared"
+    finally:
+        kerberos.disablePasswordCache()
+
+
+def test_basic_check_passwords():
+    service = "HTTP/%s" % hostname
+    credentials = [
+        (username, password, service, realm.upper()),
+        (username, password + "-wrong", service, realm.upper()),
+        (username, password, service, realm.upper()),
+    ]
+    actual = kerberos.checkPasswords(credentials, max_workers=2)
+
+    assert len(actual) == 3, "Expected one result per credential tuple"
+    assert actual[0] is True, "Checking of the first password failed"
+    assert isinstance(actual[1], kerberos.BasicAuthError), "Wrong password was not reported"
+    assert actual[2] is True, "Checking of the third password failed"
+
+
+@pytest.mark.skipif(sys.version_info < (3, 7), reason="kerberos_kdc requires Python 3.7")
+def test_basic_check_password_nonblocking():
+    import asyncio
+    import socket
+    import kerberos_kdc
+
+    service = "HTTP/%s" % hostname
+    kdcs = kerberos.getRealmKDCs(realm.upper())
+    assert kdcs, "No KDC configured for %s" % realm.upper()
+
+    # A KDC that never answers, to be skipped after kdc_timeout
+    silent = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    silent.bind(("127.0.0.1", 0))
+    try:
+        kdcs = ["udp/127.0.0.1:%d" % silent.getsockname()[1]] + kdcs
+        checks = [
+            kerberos_kdc.PasswordCheck(username, pswd, service, realm.upper(), kdcs=kdcs, kdc_timeout=0.5)
+            for pswd in (password, password + "-wrong", password)
+        ]
+        kerberos_kdc.run(checks)
+
+        assert checks[0].result() is True, "Checking of the first password failed"
+        with pytest.raises(kerberos.BasicAuthError):
+            checks[1].result()
+        assert checks[2].result() is True, "Checking of the third password failed"
+
+        actual = asyncio.run(kerberos_kdc.check_password(username, password, service, realm.upper()))
+        assert actual is True, "check_password with the right password failed"
+    finally:
+        silent.close()
+
+    unreachable = kerberos_kdc.PasswordCheck(username, password, service, realm.upper(), kdcs=[])
+    kerberos_kdc.run([unreachable])
+    with pytest.raises(kerberos.BasicAuthError):
+        unreachable.result()
+
+
 def test_gssapi():
     """
     Return Code Values
@@ -65,6 +191,631 @@ def test_gssapi():
     assert rs == 1, "authGSSServerClean = %d, expecting it to be 0" % rs
 
 
+def test_gssapi_shared_server_credential():
+    service = "HTTP@%s" % hostname
+    credential = kerberos.acquireServerCredential(service)
+
+    for _ in range(2):
+        rc, vc = kerberos.authGSSClientInit(service)
+        assert rc == 1, "authGSSClientInit = %d, expecting 1" % rc
+
+        rs, vs = kerberos.authGSSServerInit(credential)
+        assert rs == 1, "authGSSServerInit = %d, expecting 1" % rs
+
+        rc = kerberos.authGSSClientStep(vc, "")
+        assert rc == 0, "authGSSClientStep = %d, expecting 0" % rc
+
+        rs = kerberos.authGSSServerStep(vs, kerberos.authGSSClientResponse(vc))
+        assert rs != -1, "authGSSServerStep = %d, not expecting it to be -1" % rs
+
+        expected_username = "%s@%s" % (username, realm.upper())
+        server_user_name = kerberos.authGSSServerUserName(vs)
+        assert server_user_name == expected_username, "Invalid server username returned"
+
+    # Other capsules are not taken for a credential
+    rc, vc = kerberos.authGSSClientInit(service)
+    for other in (kerberos.GSS_MECH_OID_KRB5, vc):
+        with pytest.raises(TypeError):
+            kerberos.authGSSServerInit(other)
+        with pytest.raises(TypeError):
+            kerberos.GSSServerContext(other)
+
+
+def test_gssapi_store_delegate_memory():
+    service = "HTTP@%s" % hostname
+    flags = kerberos.GSS_C_DELEG_FLAG | kerberos.GSS_C_MUTUAL_FLAG | kerberos.GSS_C_SEQUENCE_FLAG
+    rc, vc = kerberos.authGSSClientInit(service, gssflags=flags)
+    rs, vs = kerberos.authGSSServerInit(service)
+
+    kerberos.authGSSClientStep(vc, "")
+    rs = kerberos.authGSSServerStep(vs, kerberos.authGSSClientResponse(vc))
+    assert rs != -1, "authGSSServerStep = %d, not expecting it to be -1" % rs
+
+    with pytest.raises(ValueError):
+        kerberos.authGSSServerStoreDelegate(vs, cache_type="NOSUCHTYPE")
+
+    kerberos.authGSSServerStoreDelegate(vs, cache_type="MEMORY")
+    ccname = kerberos.authGSSServerCacheName(vs)
+    assert ccname.startswith("MEMORY:"), "Unexpected cache name %s" % ccname
+
+    rc, vo = kerberos.authGSSClientInit(service, ccache=ccname)
+    assert rc == 1, "authGSSClientInit = %d, expecting 1" % rc
+    rc = kerberos.authGSSClientStep(vo, "")
+    assert rc == 0, "authGSSClientStep = %d, expecting 0" % rc
+
+    expected_username = "%s@%s" % (username, realm.upper())
+    kerberos.authGSSClientInquireCred(vo)
+    assert kerberos.authGSSClientUserName(vo) == expected_username, "Invalid onward client username returned"
+
+
+def test_gssapi_session_cache():
+    service = "HTTP@%s" % hostname
+    kerberos.enableSessionCache(max_entries=8, ttl=60)
+    try:
+        rc, vc = kerberos.authGSSClientInit(service)
+        rs, vs = kerberos.authGSSServerInit(service)
+        rc, client_token = kerberos.authGSSClientStepRaw(vc)
+
+        with pytest.raises(ValueError):
+            kerberos.authGSSServerCacheSession(vs, "session-1")
+
+        kerberos.authGSSServerStepRaw(vs, client_token)
+        assert kerberos.authGSSServerCacheSession(vs, "session-1")
+        kerberos.authGSSServerClean(vs)
+
+        expected_username = "%s@%s" % (username, realm.upper())
+        assert kerberos.authGSSServerLookupSession("session-1") == expected_username
+        assert kerberos.authGSSServerLookupSession(b"session-1") == expected_username
+        assert kerberos.authGSSServerLookupSession("session-2") is None
+
+        kerberos.authGSSServerForgetSession("session-1")
+        assert kerberos.authGSSServerLookupSession("session-1") is None
+
+        # Sessions of one service are not found under another
+        rc, vc = kerberos.authGSSClientInit(service)
+        rs, vs = kerberos.authGSSServerInit(service)
+        rc, client_token = kerberos.authGSSClientStepRaw(vc)
+        kerberos.authGSSServerStepRaw(vs, client_token)
+        assert kerberos.authGSSServerCacheSession(vs, "session-3", service)
+        kerberos.authGSSServerClean(vs)
+        assert kerberos.authGSSServerLookupSession("session-3", service) == expected_username
+        assert kerberos.authGSSServerLookupSession("session-3") is None
+        assert kerberos.authGSSServerLookupSession("session-3", "OTHER@%s" % hostname) is None
+        kerberos.authGSSServerForgetSession("session-3", service)
+        assert kerberos.authGSSServerLookupSession("session-3", service) is None
+
+        stats = kerberos.getSessionCacheStats()
+        assert stats["hits"] >= 2 and stats["misses"] >= 2, stats
+        assert 0 < stats["hit_rate"] < 1, stats
+    finally:
+        kerberos.disableSessionCache()
+
+    assert kerberos.authGSSServerLookupSession("session-1") is None
+
+
+def test_stats_and_tracing():
+    service = "HTTP@%s" % hostname
+    traced = []
+    kerberos.resetStats()
+    kerberos.enableStats()
+    kerberos.setTraceCallback(lambda operation, seconds, failed: traced.append(operation))
+    try:
+        rc, vc = kerberos.authGSSClientInit(service)
+        rs, vs = kerberos.authGSSServerInit(service)
+        kerberos.authGSSClientStep(vc, "")
+        kerberos.authGSSServerStep(vs, kerberos.authGSSClientResponse(vc))
+        stats = kerberos.getStats()
+    finally:
+        kerberos.setTraceCallback(None)
+        kerberos.disableStats()
+
+    for operation in ("init_sec_context", "accept_sec_context", "acquire_cred"):
+        assert stats[operation]["calls"] >= 1, "No %s calls counted" % operation
+        assert sum(count for limit, count in stats[operation]["histogram"]) == stats[operation]["calls"]
+        assert operation in traced, "No %s calls traced" % operation
+    assert stats["init_sec_context"]["errors"] == 0, "Unexpected init_sec_context errors"
+
+    kerberos.resetStats()
+    assert kerberos.getStats()["init_sec_context"]["calls"] == 0, "Counters not reset"
+
+
+def test_trace_callback_subinterpreter():
+    _testcapi = pytest.importorskip("_testcapi")
+    if sys.version_info < (3, 9) or not hasattr(_testcapi, "run_in_subinterp"):
+        pytest.skip("This test requires sub-interpreters with their own module.")
+
+    traced = []
+    kerberos.setTraceCallback(lambda operation, seconds, failed: traced.append(operation))
+    try:
+        # On the thread that started the sub-interpreter and on one of its own
+        result = _testcapi.run_in_subinterp(
+            "import kerberos, threading\n"
+            "def step():\n"
+            "    rc, vc = kerberos.authGSSClientInit(%r)\n"
+            "    kerberos.authGSSClientStep(vc, '')\n"
+            "step()\n"
+            "thread = threading.Thread(target=step)\n"
+            "thread.start()\n"
+            "thread.join()\n" % ("HTTP@%s" % hostname)
+        )
+    finally:
+        kerberos.setTraceCallback(None)
+
+    assert result == 0, "The sub-interpreter failed"
+    assert traced == [], "Calls traced from a sub-interpreter: %r" % traced
+
+
+def test_trace_callback_keytab_scan():
+    path = os.environ.get("KRB5_KTNAME", "/etc/krb5.keytab").split(":", 1)[-1]
+    if not os.access(path, os.W_OK):
+        pytest.skip("This test requires a writable keytab file.")
+
+    expected = "HTTP/%s@%s" % (hostname, realm.upper())
+    traced = []
+
+    def callback(operation, seconds, failed):
+        traced.append(operation)
+        # The keytab is recorded as read once it can be looked up again
+        if operation == "keytab_scan":
+            assert kerberos.getServerPrincipalDetails("HTTP", hostname) == expected
+
+    st = os.stat(path)
+    kerberos.setTraceCallback(callback)
+    try:
+        os.utime(path, (st.st_atime, st.st_mtime + 1))
+        actual = kerberos.getServerPrincipalDetails("HTTP", hostname)
+    finally:
+        kerberos.setTraceCallback(None)
+        os.utime(path, (st.st_atime, st.st_mtime))
+
+    assert actual == expected
+    assert "keytab_scan" in traced, "Reading the keytab was not traced"
+
+
+def test_prewarm_service_tickets():
+    spns = ["HTTP@%s" % hostname, "NOSUCHSERVICE@%s" % hostname]
+    results = kerberos.prewarmServiceTickets(spns, max_workers=2)
+
+    assert [spn for spn, seconds, error in results] == spns, "Expected one result per SPN in order"
+    assert results[0][2] is None, "Prewarming the HTTP service ticket failed: %s" % (results[0][2],)
+    assert results[0][1] >= 0, "Invalid timing returned"
+    assert isinstance(results[1][2], kerberos.GSSError), "Prewarming an unknown service succeeded"
+
+
+def test_gssapi_raw():
+    service = "HTTP@%s" % hostname
+    rc, vc = kerberos.authGSSClientInit(service)
+    rs, vs = kerberos.authGSSServerInit(service)
+
+    rc, client_token = kerberos.authGSSClientStepRaw(vc)
+    assert rc == 0, "authGSSClientStepRaw = %d, expecting 0" % rc
+    assert isinstance(client_token, bytes) and client_token, "No raw client token returned"
+
+    rs, server_token = kerberos.authGSSServerStepRaw(vs, bytearray(client_token))
+    assert rs == 1, "authGSSServerStepRaw = %d, expecting 1" % rs
+
+    rc, client_token = kerberos.authGSSClientStepRaw(vc, memoryview(server_token))
+    assert rc == 1, "authGSSClientStepRaw = %d, expecting 1" % rc
+
+    message = b"raw message"
+    wrapped = kerberos.authGSSClientWrapRaw(vc, message, 1)
+    unwrapped, conf = kerberos.authGSSServerUnwrapRaw(vs, wrapped)
+    assert unwrapped == message, "Server did not unwrap the client message"
+    assert conf == 1, "Client message was not encrypted"
+
+    wrapped = kerberos.authGSSServerWrapRaw(vs, message)
+    unwrapped = kerberos.authGSSClientUnwrapRaw(vc, wrapped)
+    assert unwrapped == message, "Client did not unwrap the server message"
+    assert kerberos.authGSSClientResponseConf(vc) == 0, "Server message was unexpectedly encrypted"
+
+
+def test_gssapi_invalid_base64():
+    service = "HTTP@%s" % hostname
+    rc, vc = kerberos.authGSSClientInit(service)
+    try:
+        kerberos.authGSSClientStep(vc, "not*base64")
+    except kerberos.KrbError:
+        pass
+    else:
+        assert False, "authGSSClientStep accepted invalid base64"
+    kerberos.authGSSClientClean(vc)
+
+
+def test_gssapi_wrap_many():
+    service = "HTTP@%s" % hostname
+    rc, vc = kerberos.authGSSClientInit(service)
+    rs, vs = kerberos.authGSSServerInit(service)
+    rc, client_token = kerberos.authGSSClientStepRaw(vc)
+    rs, server_token = kerberos.authGSSServerStepRaw(vs, client_token)
+    kerberos.authGSSClientStepRaw(vc, server_token)
+
+    messages = [b"first", bytearray(b"second"), b""]
+    wrapped = kerberos.authGSSClientWrapMany(vc, messages, 1)
+    assert len(wrapped) == len(messages), "Expected one token per message"
+    for message, token in zip(messages, wrapped):
+        assert kerberos.authGSSServerUnwrapRaw(vs, token) == (bytes(message), 1)
+
+    tokens = [kerberos.authGSSServerWrapRaw(vs, message) for message in messages]
+    tokens.insert(1, b"not a token")
+    unwrapped = kerberos.authGSSClientUnwrapMany(vc, tokens)
+    assert isinstance(unwrapped[1], kerberos.GSSError), "Bad token was unwrapped"
+    del unwrapped[1]
+    assert unwrapped == [(bytes(message), 0) for message in messages]
+
+
+def test_gssapi_wrap_iov_streaming():
+    import io
+    import kerberos_stream
+
+    service = "HTTP@%s" % hostname
+    rc, vc = kerberos.authGSSClientInit(service)
+    rs, vs = kerberos.authGSSServerInit(service)
+    rc, client_token = kerberos.authGSSClientStepRaw(vc)
+    rs, server_token = kerberos.authGSSServerStepRaw(vs, client_token)
+    kerberos.authGSSClientStepRaw(vc, server_token)
+
+    limit = kerberos.authGSSClientWrapSizeLimit(vc, 4096, 1)
+    assert 0 < limit < 4096, "Unexpected wrap size limit %d" % limit
+    token = kerberos.authGSSClientWrapIov(vc, b"x" * limit, 1)
+    assert len(token) <= 4096, "Token exceeds the requested size"
+
+    # In-place tokens interoperate with the copying functions
+    assert kerberos.authGSSServerUnwrapRaw(vs, token) == (b"x" * limit, 1)
+    token = kerberos.authGSSServerWrapRaw(vs, b"reply", 1)
+    assert kerberos.authGSSClientUnwrapIov(vc, token) == (b"reply", 1)
+
+    payload = os.urandom(1024 * 1024 + 7)
+    framed = io.BytesIO()
+    kerberos_stream.write_frames(
+        kerberos_stream.wrap_stream(vc, io.BytesIO(payload), max_token_size=4096),
+        framed,
+    )
+    framed.seek(0)
+    received = kerberos_stream.unwrap_stream(
+        vs, kerberos_stream.read_frames(framed, 4096), server=True
+    )
+    assert b"".join(received) == payload, "Payload changed in transit"
+
+
+def test_gssapi_export_import_context():
+    service = "HTTP@%s" % hostname
+    rc, vc = kerberos.authGSSClientInit(service)
+    rs, vs = kerberos.authGSSServerInit(service)
+
+    try:
+        kerberos.authGSSServerExportContext(vs)
+    except kerberos.KrbError:
+        pass
+    else:
+        assert False, "Exported a context before the handshake"
+
+    rc, client_token = kerberos.authGSSClientStepRaw(vc)
+    rs, server_token = kerberos.authGSSServerStepRaw(vs, client_token)
+    kerberos.authGSSClientStepRaw(vc, server_token)
+    # Advance the sequence numbers before handing the contexts over
+    wrapped = kerberos.authGSSClientWrapRaw(vc, b"before", 1)
+    assert kerberos.authGSSServerUnwrapRaw(vs, wrapped) == (b"before", 1)
+
+    exported = kerberos.authGSSServerExportContext(vs)
+    assert isinstance(exported, bytes) and exported, "No exported context"
+    try:
+        kerberos.authGSSServerWrapRaw(vs, b"stale")
+    except kerberos.GSSError:
+        pass
+    else:
+        assert False, "Exported context was still usable"
+
+    rs, vs = kerberos.authGSSServerImportContext(bytearray(exported))
+    assert rs == 1, "authGSSServerImportContext = %d, expecting 1" % rs
+    assert kerberos.authGSSServerUserName(vs).startswith(username)
+    assert kerberos.authGSSServerTargetName(vs).startswith("HTTP")
+
+    rc, vc = kerberos.authGSSClientImportContext(
+        kerberos.authGSSClientExportContext(vc)
+    )
+    assert kerberos.authGSSClientUserName(vc).startswith(username)
+
+    wrapped = kerberos.authGSSClientWrapRaw(vc, b"after", 1)
+    assert kerberos.authGSSServerUnwrapRaw(vs, wrapped) == (b"after", 1)
+    wrapped = kerberos.authGSSServerWrapRaw(vs, b"reply", 1)
+    assert kerberos.authGSSClientUnwrapRaw(vc, wrapped) == b"reply"
+
+
+def test_gssapi_results_on_demand():
+    service = "HTTP@%s" % hostname
+    rc, vc = kerberos.authGSSClientInit(service)
+    # Without a service name any acceptor in the keytab may be used, and the
+    # target name tells which one was
+    rs, vs = kerberos.authGSSServerInit("")
+
+    assert kerberos.authGSSServerUserName(vs) is None
+    assert kerberos.authGSSServerTargetName(vs) is None
+    assert kerberos.authGSSServerResponse(vs) is None
+
+    kerberos.authGSSClientStep(vc, "")
+    response = kerberos.authGSSClientResponse(vc)
+    assert response == kerberos.authGSSClientResponse(vc)
+    assert kerberos.authGSSClientUserName(vc) is None
+
+    kerberos.authGSSServerStep(vs, response)
+    kerberos.authGSSClientStep(vc, kerberos.authGSSServerResponse(vs))
+
+    expected_username = "%s@%s" % (username, realm.upper())
+    assert kerberos.authGSSClientUserName(vc) == expected_username
+    assert kerberos.authGSSServerUserName(vs) == expected_username
+
+    # The names outlive the context once it is exported
+    kerberos.authGSSServerExportContext(vs)
+    assert kerberos.authGSSServerUserName(vs) == expected_username
+    assert kerberos.authGSSServerTargetName(vs).startswith("HTTP")
+
+    kerberos.authGSSClientClean(vc)
+    kerberos.authGSSServerClean(vs)
+
+
+def test_gssapi_name_and_credential():
+    service = "HTTP@%s" % hostname
+    principal = "%s@%s" % (username, realm.upper())
+    name = kerberos.Name(service)
+    credential = kerberos.Credential(principal)
+    assert name.service == service
+    assert credential.principal == principal
+
+    import threading
+
+    acceptor = kerberos.acquireServerCredential(service)
+    usernames = []
+
+    # The same name and credential serve threads handshaking at once
+    def handshake():
+        for _ in range(5):
+            rc, vc = kerberos.authGSSClientInit(name, credential=credential)
+            rs, vs = kerberos.authGSSServerInit(acceptor)
+            rc, token = kerberos.authGSSClientStepRaw(vc)
+            kerberos.authGSSServerStepRaw(vs, token)
+            usernames.append(kerberos.authGSSServerUserName(vs))
+
+    threads = [threading.Thread(target=handshake) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert usernames == [principal] * 20
+
+    # Contexts keep the name and credential they were created with
+    with kerberos.GSSClientContext(name, credential=credential) as vc:
+        del name, credential
+        assert vc.step("") == 0
+
+    try:
+        kerberos.authGSSClientInit(
+            service, principal=principal, credential=kerberos.Credential()
+        )
+    except ValueError:
+        pass
+    else:
+        assert False, "Combined a credential with a principal"
+
+
+def test_gssapi_context_objects():
+    service = "HTTP@%s" % hostname
+    with kerberos.GSSClientContext(service) as vc, kerberos.GSSServerContext(service) as vs:
+        rc = vc.step("")
+        assert rc == 0, "step = %d, expecting 0" % rc
+
+        rs = vs.step(vc.response)
+        assert rs != -1, "step = %d, not expecting it to be -1" % rs
+
+        # The objects are accepted wherever a context is
+        rc = kerberos.authGSSClientStep(vc, kerberos.authGSSServerResponse(vs))
+        assert rc != -1, "authGSSClientStep = %d, not expecting it to be -1" % rc
+
+        expected_username = "%s@%s" % (username, realm.upper())
+        assert vs.username == expected_username, "Invalid server username returned"
+        assert vc.username == expected_username, "Invalid client username returned"
+
+    assert vc.closed and vs.closed, "Contexts not closed by the with statement"
+    with pytest.raises(ValueError):
+        vc.step("")
+    vc.close()
+
+
+def test_gssapi_context_object_threads():
+    import threading
+
+    service = "HTTP@%s" % hostname
+    credential = kerberos.acquireServerCredential(service)
+    vc = kerberos.GSSClientContext(service)
+    vc.step("")
+    vs = kerberos.GSSServerContext(credential)
+    vs.step(vc.response)
+    vc.step(vs.response)
+
+    errors = []
+
+    def wrap():
+        try:
+            for _ in range(20):
+                kerberos.authGSSClientWrapRaw(vc, b"message")
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=wrap) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert not errors, "Wrapping on a shared context failed: %s" % (errors,)
+
+
+def test_free_threaded_stress():
+    import sysconfig
+    import threading
+
+    # Importing the module must not turn the GIL back on
+    if sysconfig.get_config_var("Py_GIL_DISABLED"):
+        assert not sys._is_gil_enabled(), "Importing kerberos enabled the GIL"
+
+    service = "HTTP@%s" % hostname
+    credential = kerberos.acquireServerCredential(service)
+    shared = kerberos.GSSServerContext(credential)
+    barrier = threading.Barrier(8)
+    errors = []
+
+    def handshakes():
+        try:
+            barrier.wait()
+            for _ in range(50):
+                vc = kerberos.GSSClientContext(service)
+                vc.step("")
+                initial = vc.response
+                vs = kerberos.GSSServerContext(credential)
+                vs.step(initial)
+                vc.step(vs.response)
+                assert vs.username.startswith(username)
+
+                token = kerberos.authGSSClientWrapRaw(vc, b"message", 1)
+                assert kerberos.authGSSServerUnwrapRaw(vs, token) == (b"message", 1)
+
+                # Errors are raised concurrently from every thread
+                try:
+                    kerberos.authGSSServerUnwrapRaw(vs, b"not a token")
+                except kerberos.GSSError as e:
+                    assert isinstance(e.args[0], tuple)
+                else:
+                    raise AssertionError("Unwrapped a bad token")
+                try:
+                    kerberos.authGSSClientStep(vc, "not*base64")
+                except kerberos.KrbError:
+                    pass
+                else:
+                    raise AssertionError("Accepted invalid base64")
+
+                # Steps and reads of one context race with each other
+                try:
+                    shared.step(initial)
+                except kerberos.KrbError:
+                    pass
+                shared.username
+                shared.response
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=handshakes) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert not errors, "Concurrent authentication failed: %s" % (errors,)
+
+
+@pytest.mark.skipif(sys.version_info < (3, 7), reason="kerberos.aio requires Python 3.7")
+def test_aio_handshake():
+    import asyncio
+    import kerberos.aio
+
+    async def handshake():
+        service = "HTTP@%s" % hostname
+        rc, vc = kerberos.authGSSClientInit(service)
+        rs, vs = kerberos.authGSSServerInit(service)
+
+        rc = await kerberos.aio.client_step(vc, "", timeout=30)
+        assert rc == 0, "client_step = %d, expecting 0" % rc
+        rs = await kerberos.aio.server_step(vs, kerberos.authGSSClientResponse(vc))
+        assert rs == 1, "server_step = %d, expecting 1" % rs
+        rc = await kerberos.aio.client_step(vc, kerberos.authGSSServerResponse(vs))
+        assert rc == 1, "client_step = %d, expecting 1" % rc
+
+        results = await asyncio.gather(
+            kerberos.aio.check_password(username, password, "HTTP/%s" % hostname, realm.upper()),
+            kerberos.aio.check_password(username, "xxx", "HTTP/%s" % hostname, realm.upper()),
+            return_exceptions=True,
+        )
+        assert results[0] is True, "check_password with the right password failed"
+        assert isinstance(results[1], kerberos.BasicAuthError), "check_password with the wrong password passed"
+
+    asyncio.run(handshake())
+
+
+def test_spnego_wsgi_middleware():
+    import kerberos_spnego
+
+    service = "HTTP@%s" % hostname
+    seen = {}
+
+    def app(environ, start_response):
+        seen["principal"] = environ.get(kerberos_spnego.PRINCIPAL_KEY)
+        start_response("200 OK", [("Content-Type", "text/plain")])
+        return [b"ok"]
+
+    def start_response(status, headers, exc_info=None):
+        seen["status"] = status
+        seen["headers"] = dict(headers)
+
+    middleware = kerberos_spnego.NegotiateMiddleware(app, service)
+
+    middleware({}, start_response)
+    assert seen["status"].startswith("401"), "Unauthenticated request was let through"
+    assert seen["headers"]["WWW-Authenticate"] == "Negotiate"
+
+    rc, vc = kerberos.authGSSClientInit(service, gssflags=kerberos.GSS_C_MUTUAL_FLAG)
+    kerberos.authGSSClientStep(vc, "")
+    environ = {"HTTP_AUTHORIZATION": "Negotiate %s" % kerberos.authGSSClientResponse(vc)}
+    body = middleware(environ, start_response)
+
+    assert body == [b"ok"], "Authenticated request did not reach the application"
+    assert seen["status"] == "200 OK"
+    assert seen["principal"] == "%s@%s" % (username, realm.upper())
+    assert environ["REMOTE_USER"] == seen["principal"]
+    scheme, token = seen["headers"]["WWW-Authenticate"].split(" ", 1)
+    assert scheme == "Negotiate"
+    assert kerberos.authGSSClientStep(vc, token) == 1, "Mutual authentication token was not accepted"
+
+
+@pytest.mark.skipif(sys.version_info < (3, 7), reason="ASGI middleware requires Python 3.7")
+def test_spnego_asgi_middleware():
+    import asyncio
+    import kerberos_spnego
+
+    service = "HTTP@%s" % hostname
+    seen = {}
+
+    async def app(scope, receive, send):
+        seen["principal"] = scope.get(kerberos_spnego.PRINCIPAL_KEY)
+        await send({"type": "http.response.start", "status": 200, "headers": []})
+        await send({"type": "http.response.body", "body": b"ok"})
+
+    async def receive():
+        return {"type": "http.request", "body": b""}
+
+    async def request(headers):
+        messages = []
+
+        async def send(message):
+            messages.append(message)
+
+        scope = {"type": "http", "method": "GET", "path": "/", "headers": headers}
+        await middleware(scope, receive, send)
+        return messages[0]["status"], dict(messages[0]["headers"])
+
+    middleware = kerberos_spnego.NegotiateASGIMiddleware(app, service)
+
+    status, headers = asyncio.run(request([]))
+    assert status == 401, "Unauthenticated request was let through"
+
+    rc, vc = kerberos.authGSSClientInit(service, gssflags=kerberos.GSS_C_MUTUAL_FLAG)
+    kerberos.authGSSClientStep(vc, "")
+    value = "Negotiate %s" % kerberos.authGSSClientResponse(vc)
+    status, headers = asyncio.run(request([(b"authorization", value.encode("ascii"))]))
+
+    assert status == 200, "Authenticated request did not reach the application"
+    assert seen["principal"] == "%s@%s" % (username, realm.upper())
+    token = headers[b"www-authenticate"].decode("ascii").split(" ", 1)[1]
+    assert kerberos.authGSSClientStep(vc, token) == 1, "Mutual authentication token was not accepted"
+
+
 def test_http_endpoint():
     service = "HTTP@%s" % hostname
     url = "http://%s:%s/" % (hostname, port)
@@ -112,6 +863,88 @@ def test_http_endpoint():
     kerberos.authGSSClientClean(vc)
 
 
+def test_http_endpoint_negotiate_auth():
+    import kerberos_requests
+
+    assert kerberos_requests.parse_challenge(None) is None
+    assert kerberos_requests.parse_challenge("Basic realm=\"x\"") is None
+    assert kerberos_requests.parse_challenge("Negotiate") == ""
+    assert kerberos_requests.parse_challenge("Basic realm=\"x\", Negotiate YWJj") == "YWJj"
+
+    url = "http://%s:%s/" % (hostname, port)
+    auth = kerberos_requests.NegotiateAuth()
+    session = requests.Session()
+    session.auth = auth
+
+    # The first request is challenged and sent again with a token
+    response = session.get(url)
+    assert response.status_code == 200
+    assert [r.status_code for r in response.history] == [401]
+
+    # The host is remembered, so the next request needs a single round trip
+    response = session.get(url)
+    assert response.status_code == 200
+    assert response.history == []
+
+    # A handler sending tokens up front never sees the challenge
+    response = requests.get(url, auth=kerberos_requests.NegotiateAuth(preemptive=True))
+    assert response.status_code == 200
+    assert response.history == []
+
+
+@pytest.mark.skipif(sys.version_info < (3, 7), reason="kerberos_spnego requires Python 3.7")
+def test_negotiate_auth_session_cookie():
+    import threading
+    import wsgiref.simple_server
+    import kerberos_requests
+    import kerberos_spnego
+
+    def app(environ, start_response):
+        start_response("200 OK", [("Content-Type", "text/plain")])
+        return [environ[kerberos_spnego.PRINCIPAL_KEY].encode("utf-8")]
+
+    class QuietHandler(wsgiref.simple_server.WSGIRequestHandler):
+        def log_message(self, format, *args):
+            pass
+
+    kerberos.enableSessionCache(max_entries=8, ttl=60)
+    middleware = kerberos_spnego.NegotiateMiddleware(app, "HTTP@%s" % hostname, session_cookie="krbsession")
+    # The cookie is only sent back over plain HTTP without the Secure flag
+    middleware.acceptor.cookie_attributes = "Path=/"
+    server = wsgiref.simple_server.make_server("127.0.0.1", 0, middleware, handler_class=QuietHandler)
+    thread = threading.Thread(target=server.serve_forever)
+    thread.start()
+    try:
+        url = "http://127.0.0.1:%d/" % server.server_address[1]
+        expected = "%s@%s" % (username, realm.upper())
+        session = requests.Session()
+        session.auth = kerberos_requests.NegotiateAuth(hostname_override=hostname)
+
+        response = session.get(url)
+        assert response.status_code == 200
+        assert "krbsession" in session.cookies, "No session cookie was issued"
+        cookie = session.cookies["krbsession"]
+
+        # A token sent with the cookie is still answered with a mutual
+        # authentication token, and the session is kept
+        response = session.get(url)
+        assert response.status_code == 200
+        assert response.history == []
+        assert response.headers["WWW-Authenticate"].startswith("Negotiate ")
+        assert "Set-Cookie" not in response.headers
+        assert response.text == expected
+
+        # The cookie alone is enough
+        response = requests.get(url, cookies={"krbsession": cookie})
+        assert response.status_code == 200
+        assert response.text == expected
+    finally:
+        server.shutdown()
+        thread.join()
+        server.server_close()
+        kerberos.disableSessionCache()
+
+
 def test_leaks_server_linux():
     # The method used here to check for file descriptor leaks is specific to Linux
     if "linux" not in sys.platform: